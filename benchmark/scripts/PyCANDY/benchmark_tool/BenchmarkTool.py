@@ -108,6 +108,17 @@ class BenchmarkTool:
         #print(dataTensorInitial)
         # 返回 queryTensor 和 dataTensor
         return queryTensor, dataTensorInitial, dataTensorStream
+    def getQueryAndInitialTensors(self):
+        """
+        只返回 queryTensor 和初始张量, 流数据留在数据加载器中由 insertBatchProcess 分块读取。
+        
+        :return: tuple - (queryTensor, dataTensorInitial, streamRows)
+        """
+        initialRows = int(self.configMap.get("initialRows", 1))
+        initialRows = min(initialRows, self.dataLoader.size())
+        dataTensorInitial = self.dataLoader.getDataAt(0, initialRows).nan_to_num(0)
+        queryTensor = self.dataLoader.getQuery().nan_to_num(0)
+        return queryTensor, dataTensorInitial, self.dataLoader.size() - initialRows
     def generateTimestamps(self, rows, eventRate):
         """
         根据给定的 eventRate 为 tensor 的每行生成均匀递增的事件时间戳和处理时间戳。
@@ -167,6 +178,14 @@ class BenchmarkTool:
         ru = self.indexPtr.searchTensor(q,annk)
       
         return ru
+    def queryIdsProcess(self,q,annk=1):
+        """
+        查找并返回id与距离, 可直接用于calculateRecallById
+        :param q: torch.Tensor -待查找的向量
+        :param annk: int - 查找多少个
+        :return: Tuple[torch.Tensor, torch.Tensor] (nq x annk) 的id与距离
+        """
+        return self.indexPtr.searchWithDistances(q,annk)
     def deleteBatchProcess(self, eventTimestamps, deleteTensor, batchSize,windowObj=None):
         """
         批量删除向量并更新处理时间戳。
@@ -234,13 +253,18 @@ class BenchmarkTool:
         批量插入向量并更新处理时间戳。
         
         :param eventTimestamps: torch.Tensor - 每个向量的事件时间戳
-        :param insertTensor: torch.Tensor - 插入的向量数据
+        :param insertTensor: torch.Tensor - 插入的向量数据, 为None时从数据加载器的initialRows处用nextChunk分块读取
         :param batchSize: int - 批量大小
         :param windowObj: 窗体对象, 如果非空需要提供setProgressBar函数设置进度条
         :return: torch.Tensor - 更新后的处理时间戳
         """
         # 获取行数（总向量数）
-        numRows = insertTensor.size(0)
+        if insertTensor is None:
+            numRows = eventTimestamps.size(0)
+            initialRows = min(int(self.configMap.get("initialRows", 1)), self.dataLoader.size())
+            self.dataLoader.resetStream(initialRows)
+        else:
+            numRows = insertTensor.size(0)
         
         # 初始化处理时间戳为零
         processingTimestamps = torch.zeros(numRows, dtype=torch.int64)
@@ -264,7 +288,10 @@ class BenchmarkTool:
                 tNow = (time.time() - start_time)*1e6
 
             # 获取当前批次的数据
-            subTensor = insertTensor[startRow:endRow]
+            if insertTensor is None:
+                subTensor = self.dataLoader.nextChunk(endRow - startRow).nan_to_num(0)
+            else:
+                subTensor = insertTensor[startRow:endRow]
             self.indexPtr.insertTensor(subTensor)  # 当前批次的张量数据
             
             # 获取当前处理时间戳（微秒）
@@ -309,23 +336,103 @@ def calculateRecall(ground_truth: List[torch.Tensor], prob: List[torch.Tensor])
     :return: float - Calculated recall value
     """
     true_positives = 0
-    false_negatives = 0
+    total_rows = 0
 
-    # Iterate over each tensor in prob
+    # Compare all rows of prob_i against all rows of gd_i in one broadcast
     for i in range(len(prob)):
         gd_i = ground_truth[i]
         prob_i = prob[i]
-
-        # Check each row in prob_i to see if it exists in gd_i
-        for j in range(prob_i.size(0)):
-            if exist_row(gd_i, prob_i[j]):
-                true_positives += 1
-            else:
-                false_negatives += 1
+        total_rows += prob_i.size(0)
+        if prob_i.size(0) == 0 or gd_i.size(0) == 0:
+            continue
+        hits = (prob_i.unsqueeze(1) == gd_i.unsqueeze(0)).all(dim=2).any(dim=1)
+        true_positives += int(hits.sum().item())
 
     # Calculate recall
-    recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0.0
+    recall = true_positives / total_rows if total_rows > 0 else 0.0
     return recall
+
+def idHitMask(ground_truth_ids: torch.Tensor, prob_ids: torch.Tensor, k: int = -1) -> torch.Tensor:
+    """
+    Mark which returned ids are true neighbors, for the whole batch at once.
+    
+    :param ground_truth_ids: torch.Tensor - (nq x kg) int64 ids of exact neighbors, negative for empty slots
+    :param prob_ids: torch.Tensor - (nq x k) int64 ids to be validated, negative for empty slots
+    :param k: int - only the first k columns are evaluated, <=0 for all columns of prob_ids
+    :return: torch.Tensor - (nq x k) bool tensor, True at hits, repeated ids are counted once
+    """
+    if k <= 0 or k > prob_ids.size(1):
+        k = prob_ids.size(1)
+    kg = min(k, ground_truth_ids.size(1))
+    prob_k = prob_ids[:, :k].to(torch.int64).contiguous()
+    if k == 0 or kg == 0:
+        return torch.zeros_like(prob_k, dtype=torch.bool)
+    gd_sorted = ground_truth_ids[:, :kg].to(torch.int64).sort(dim=1).values.contiguous()
+    pos = torch.searchsorted(gd_sorted, prob_k).clamp(max=kg - 1)
+    hits = (gd_sorted.gather(1, pos) == prob_k) & (prob_k >= 0)
+    # Drop repeated ids, so that one true neighbor is never counted twice
+    vals, order = torch.sort(prob_k, dim=1, stable=True)
+    first_seen = torch.ones_like(prob_k, dtype=torch.bool)
+    first_seen[:, 1:] = vals[:, 1:] != vals[:, :-1]
+    keep = torch.empty_like(first_seen).scatter_(1, order, first_seen)
+    return hits & keep
+
+def calculateRecallById(ground_truth_ids: torch.Tensor, prob_ids: torch.Tensor, k: int = -1) -> float:
+    """
+    Calculate recall@k by comparing id matrices, e.g., the ids returned by searchWithDistances.
+    
+    :param ground_truth_ids: torch.Tensor - (nq x kg) int64 ids of exact neighbors, negative for empty slots
+    :param prob_ids: torch.Tensor - (nq x k) int64 ids to be validated, negative for empty slots
+    :param k: int - the k of recall@k, <=0 for all columns of prob_ids
+    :return: float - Calculated recall value
+    """
+    if k <= 0 or k > prob_ids.size(1):
+        k = prob_ids.size(1)
+    hits = idHitMask(ground_truth_ids, prob_ids, k)
+    expected = int((ground_truth_ids[:, :min(k, ground_truth_ids.size(1))] >= 0).sum().item())
+    return hits.sum().item() / expected if expected > 0 else 0.0
+
+def calculateMAPById(ground_truth_ids: torch.Tensor, prob_ids: torch.Tensor, k: int = -1) -> float:
+    """
+    Calculate the mean average precision (MAP@k) by comparing id matrices.
+    
+    :param ground_truth_ids: torch.Tensor - (nq x kg) int64 ids of exact neighbors, negative for empty slots
+    :param prob_ids: torch.Tensor - (nq x k) int64 ids to be validated in rank order, negative for empty slots
+    :param k: int - the k of MAP@k, <=0 for all columns of prob_ids
+    :return: float - Calculated MAP value
+    """
+    if k <= 0 or k > prob_ids.size(1):
+        k = prob_ids.size(1)
+    if prob_ids.size(0) == 0:
+        return 0.0
+    hits = idHitMask(ground_truth_ids, prob_ids, k).to(torch.float64)
+    expected = (ground_truth_ids[:, :min(k, ground_truth_ids.size(1))] >= 0).sum(dim=1).clamp(min=1)
+    precision_at_rank = hits.cumsum(dim=1) / torch.arange(1, k + 1, dtype=torch.float64)
+    ap = (precision_at_rank * hits).sum(dim=1) / expected
+    return ap.mean().item()
+
+def calculateDistanceRatio(ground_truth_distances: torch.Tensor, prob_distances: torch.Tensor, k: int = -1) -> float:
+    """
+    Calculate the ratio between returned and exact neighbor distances, 1.0 is the best.
+    Non-finite entries (e.g., the NaN of empty slots) are skipped rank-wise.
+    
+    :param ground_truth_distances: torch.Tensor - (nq x k) distances of exact neighbors in rank order
+    :param prob_distances: torch.Tensor - (nq x k) distances of returned results in rank order
+    :param k: int - only the first k columns are evaluated, <=0 for all columns
+    :return: float - average over queries of sum(prob_distances)/sum(ground_truth_distances)
+    """
+    cols = min(ground_truth_distances.size(1), prob_distances.size(1))
+    if k <= 0 or k > cols:
+        k = cols
+    gd = ground_truth_distances[:, :k].to(torch.float64)
+    pd = prob_distances[:, :k].to(torch.float64)
+    valid = torch.isfinite(gd) & torch.isfinite(pd)
+    gd_sum = torch.where(valid, gd, torch.zeros_like(gd)).sum(dim=1)
+    pd_sum = torch.where(valid, pd, torch.zeros_like(pd)).sum(dim=1)
+    usable = gd_sum != 0
+    if not usable.any():
+        return 0.0
+    return (pd_sum[usable] / gd_sum[usable]).mean().item()
 def getLatencyPercentile(fraction: float, event_time: torch.Tensor, processed_time: torch.Tensor) -> int:
     """
     Calculate the latency percentile from event and processed time tensors.
@@ -343,12 +450,9 @@ def getLatencyPercentile(fraction: float, event_time: torch.Tensor, processed_ti
         print("Error: No valid latency found.")
         return 0
 
-    # Sort the valid latency values
-    valid_latency_sorted = torch.sort(valid_latency).values
-
     # Calculate the index for the percentile
-    t = len(valid_latency_sorted) * fraction
-    idx = int(t) if int(t) < len(valid_latency_sorted) else len(valid_latency_sorted) - 1
+    t = valid_latency.numel() * fraction
+    idx = int(t) if int(t) < valid_latency.numel() else valid_latency.numel() - 1
 
-    # Return the latency at the desired percentile
-    return valid_latency_sorted[idx].item()
\ No newline at end of file
+    # Select the latency at the desired percentile, without sorting all of them
+    return torch.kthvalue(valid_latency, idx + 1).values.item()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import time
+import PyCANDY as candy
+from BenchmarkTool import BenchmarkTool, calculateRecall, getLatencyPercentile
+
+# keys deciding which data a run sees, runs agreeing on them share one loaded dataset
+DATASET_KEYS = ("dataLoaderTag", "dataPath", "queryPath", "vecDim", "vecVolume", "querySize", "normalizeTensor",
+                "useSeparateQuery", "queryNoiseFraction", "seed", "dataAttr", "queryAttr", "vecsFormat")
+# keys used only while streaming or searching, a built initial index does not depend on them
+RUNTIME_KEYS = ("batchSize", "eventRateTps", "ANNK", "cutOffTimeSeconds", "waitPendingWrite", "staticDataSet")
+
+
+class SweepDataset:
+    def __init__(self, config):
+        """
+        load a dataset once, all runs in this process read the same tensors
+
+        :param config: dict - the config of the first run using this dataset
+        """
+        self.loader = candy.createDataLoader(config.get("dataLoaderTag", "random"))
+        self.loader.setConfig(candy.dictToConfigMap(config))
+        self.dataTensor = self.loader.getData().nan_to_num(0).contiguous()
+        self.queryTensor = self.loader.getQuery().nan_to_num(0).contiguous()
+        self.groundTruth = {}
+
+    def rows(self):
+        return self.dataTensor.size(0)
+
+
+class SweepDriver:
+    def __init__(self, refTag='flat'):
+        """
+        run many configs in this process, reusing loaded datasets, ground truth and initial indexes, runs changing
+        the index start from a snapshot of the initial one when the index supports it
+
+        :param refTag: str - the index giving the ground truth
+        """
+        self.refTag = refTag
+        self.datasets = {}
+        self.initialIndexes = {}
+
+    @staticmethod
+    def datasetKey(config):
+        return tuple((k, config[k]) for k in DATASET_KEYS if k in config)
+
+    @staticmethod
+    def indexKey(config):
+        return tuple(sorted((k, v) for k, v in config.items() if k not in RUNTIME_KEYS))
+
+    @staticmethod
+    def isReadOnly(config, dataset):
+        """
+        whether a run leaves its initial index untouched, i.e., it neither deletes nor streams rows
+        """
+        initialRows = min(int(config.get("initialRows", 1)), dataset.rows())
+        return int(config.get("deleteRows", 0)) == 0 and initialRows >= dataset.rows()
+
+    def getDataset(self, config):
+        key = self.datasetKey(config)
+        if key not in self.datasets:
+            print(f"Loading dataset {key}")
+            self.datasets[key] = SweepDataset(config)
+        return self.datasets[key]
+
+    def makeTool(self, config, dataset, indexTag):
+        """
+        a BenchmarkTool bound to a cached dataset instead of a fresh data loader
+        """
+        tool = BenchmarkTool()
+        tool.configMap = config
+        tool.configMapRaw = candy.dictToConfigMap(config)
+        tool.dataLoader = dataset.loader
+        tool.isRef = 0
+        tool.indexPtr = candy.createIndex(indexTag)
+        tool.indexPtr.setConfig(tool.configMapRaw)
+        return tool
+
+    def forkTool(self, tool, config):
+        """
+        a BenchmarkTool on a snapshot of the index of tool, so runs changing the index can start from one build
+
+        :param tool: BenchmarkTool - the tool holding the built initial index
+        :param config: dict - the config of the run using the snapshot
+        :return: BenchmarkTool, or None if the index does not support snapshots
+        """
+        copied = tool.indexPtr.snapshot()
+        if copied is None:
+            return None
+        forked = BenchmarkTool()
+        forked.configMap = config
+        forked.configMapRaw = tool.configMapRaw
+        forked.dataLoader = tool.dataLoader
+        forked.isRef = 0
+        forked.indexPtr = copied
+        return forked
+
+    def loadInitial(self, tool, dataset, initialRows):
+        start_time = time.time()
+        if initialRows > 0:
+            tool.indexPtr.loadInitialTensor(dataset.dataTensor[:initialRows])
+        constructionTime = int((time.time() - start_time) * 1e6)
+        tool.indexPtr.setFrozenLevel(int(tool.configMap.get("frozenLevel", 1)))
+        return constructionTime
+
+    def getGroundTruth(self, config, dataset):
+        """
+        the exact results after the deletes and inserts of a run, computed once per dataset and setting
+        """
+        initialRows = min(int(config.get("initialRows", 1)), dataset.rows())
+        deleteRows = int(config.get("deleteRows", 0))
+        annk = int(config.get("ANNK", 10))
+        key = (initialRows, deleteRows, annk, config.get("metricType", "L2"))
+        if key not in dataset.groundTruth:
+            tool = self.makeTool(config, dataset, self.refTag)
+            self.loadInitial(tool, dataset, initialRows)
+            if deleteRows > 0:
+                tool.indexPtr.deleteTensor(dataset.dataTensor[:deleteRows], 1)
+            if initialRows < dataset.rows():
+                tool.indexPtr.insertTensor(dataset.dataTensor[initialRows:])
+            dataset.groundTruth[key] = tool.indexPtr.searchTensor(dataset.queryTensor, annk)
+        return dataset.groundTruth[key]
+
+    def runConfig(self, config):
+        """
+        run one config like main.py does, the stream comes from the cached dataset
+
+        :param config: dict - the full config of this run
+        :return: dict - recall, latency, QPS and construction time, plus whether the initial index was reused
+        """
+        dataset = self.getDataset(config)
+        indexTag = config.get("indexTag", 'flat')
+        batchSize = int(config.get("batchSize", 1000))
+        eventRate = int(config.get("eventRateTps", 1000))
+        annk = int(config.get("ANNK", 10))
+        deleteRows = int(config.get("deleteRows", 0))
+        initialRows = min(int(config.get("initialRows", 1)), dataset.rows())
+        readOnly = self.isReadOnly(config, dataset)
+        key = (self.datasetKey(config), self.indexKey(config))
+        tool = None
+        reused = key in self.initialIndexes
+        if reused:
+            template, constructionTime = self.initialIndexes[key]
+            tool = template if readOnly else self.forkTool(template, config)
+            reused = tool is not None
+        if reused:
+            tool.configMap = config
+        else:
+            tool = self.makeTool(config, dataset, indexTag)
+            constructionTime = self.loadInitial(tool, dataset, initialRows)
+            if readOnly:
+                self.initialIndexes[key] = (tool, constructionTime)
+            else:
+                template = self.forkTool(tool, config)
+                if template is not None:
+                    self.initialIndexes[key] = (template, constructionTime)
+        resultDic = {'constructionTime': float(constructionTime), 'reusedInitialIndex': int(reused)}
+        latDelete = 0
+        if deleteRows > 0:
+            eventTimestamps = tool.generateTimestamps(deleteRows, eventRate)
+            processed = tool.deleteBatchProcess(eventTimestamps, dataset.dataTensor[:deleteRows], batchSize)
+            latDelete = getLatencyPercentile(0.95, eventTimestamps, processed)
+        latInsert = 0
+        if initialRows < dataset.rows():
+            streamTensor = dataset.dataTensor[initialRows:]
+            eventTimestamps = tool.generateTimestamps(streamTensor.size(0), eventRate)
+            processed = tool.insertBatchProcess(eventTimestamps, streamTensor, batchSize)
+            latInsert = getLatencyPercentile(0.95, eventTimestamps, processed)
+        start_time = time.time()
+        annsResult = tool.queryProcess(dataset.queryTensor, annk)
+        queryTime = max(int((time.time() - start_time) * 1e6), 1)
+        resultDic['recall'] = float(calculateRecall(self.getGroundTruth(config, dataset), annsResult))
+        resultDic['95%latency(Insert)'] = float(latInsert)
+        resultDic['95%latency(Del)'] = float(latDelete)
+        resultDic['QPS'] = float(dataset.queryTensor.size(0) * 1e6) / queryTime
+        return resultDic
+
+    def runSweep(self, baseConfig, variants, keepDatasets=False):
+        """
+        run each variant on top of a base config, variants sharing a dataset are grouped so it is loaded once
+
+        :param baseConfig: dict - the common config, e.g., from candy.configMapToDict
+        :param variants: dict - run id -> dict of the keys overriding baseConfig, e.g., indexTag and its parameters
+        :param keepDatasets: bool - keep each dataset after its group is done, otherwise it is dropped to save memory
+        :return: dict - run id -> result dict of runConfig
+        """
+        configs = {runId: {**baseConfig, **v} for runId, v in variants.items()}
+        order = sorted(configs, key=lambda r: str(self.datasetKey(configs[r])))
+        results = {}
+        lastKey = None
+        for runId in order:
+            key = self.datasetKey(configs[runId])
+            if not keepDatasets and lastKey is not None and key != lastKey:
+                self.dropDataset(lastKey)
+            lastKey = key
+            print(f"Run {runId}")
+            results[runId] = self.runConfig(configs[runId])
+        return {runId: results[runId] for runId in configs}
+
+    def dropDataset(self, key):
+        """
+        drop one cached dataset and the initial indexes built on it
+        """
+        self.datasets.pop(key, None)
+        for k in [k for k in self.initialIndexes if k[0] == key]:
+            del self.initialIndexes[k]
+
+    def release(self):
+        """
+        drop all cached datasets and indexes
+        """
+        self.datasets.clear()
+        self.initialIndexes.clear()
@@ -21,7 +21,7 @@ class BenchmarkTask():
         annk = int(self.config_map.get("ANNK", 10))
         print(f" Batch size = {batchSize},event rata = {eventRate}, annk = {annk},query size ={querySize}")
         print("Benchmark started...")
-        queryTensor, dataTensorInitial, dataTensorStream = self.benchmark_tool.getQueryAndDataTensors()
+        queryTensor, dataTensorInitial, streamRows = self.benchmark_tool.getQueryAndInitialTensors()
         self.benchmark_tool.loadInitial()
         print("Done loading initial tensor")
         # 删除向量处理
@@ -34,8 +34,8 @@ class BenchmarkTask():
 
         # 插入处理
         print("Start insert process")
-        self.eventTimestampsInsert = self.benchmark_tool.generateTimestamps(dataTensorStream.size(0), eventRate)
-        self.processedTimeStampsInsert = self.benchmark_tool.insertBatchProcess(self.eventTimestampsInsert, dataTensorStream, batchSize)
+        self.eventTimestampsInsert = self.benchmark_tool.generateTimestamps(streamRows, eventRate)
+        self.processedTimeStampsInsert = self.benchmark_tool.insertBatchProcess(self.eventTimestampsInsert, None, batchSize)
         print("Run query process")
         start_time = time.time()
         self.resultTensor = self.benchmark_tool.queryProcess(queryTensor,annk)
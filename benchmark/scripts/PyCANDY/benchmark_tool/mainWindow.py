@@ -49,7 +49,7 @@ class BenchmarkThread(QThread):
         annk = int(self.config_map.get("ANNK", 10))
         print(f" Batch size = {batchSize},event rata = {eventRate}, annk = {annk}")
         self.log_signal.emit("Benchmark started...")
-        queryTensor, dataTensorInitial, dataTensorStream = self.benchmark_tool.getQueryAndDataTensors()
+        queryTensor, dataTensorInitial, streamRows = self.benchmark_tool.getQueryAndInitialTensors()
         self.benchmark_tool.loadInitial()
         self.log_signal.emit("Done loading initial tensor")
         # 删除向量处理
@@ -64,8 +64,8 @@ class BenchmarkThread(QThread):
 
         # 插入处理
         self.log_signal.emit("Start insert process")
-        self.eventTimestampsInsert = self.benchmark_tool.generateTimestamps(dataTensorStream.size(0), eventRate)
-        self.processedTimeStampsInsert = self.benchmark_tool.insertBatchProcess(self.eventTimestampsInsert, dataTensorStream, batchSize,self)
+        self.eventTimestampsInsert = self.benchmark_tool.generateTimestamps(streamRows, eventRate)
+        self.processedTimeStampsInsert = self.benchmark_tool.insertBatchProcess(self.eventTimestampsInsert, None, batchSize,self)
         self.log_signal.emit("Run query process")
         start_time = time.time()
         self.resultTensor = self.benchmark_tool.queryProcess(queryTensor,annk)
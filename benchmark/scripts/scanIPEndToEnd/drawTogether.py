@@ -19,9 +19,12 @@ from matplotlib import ticker
 from matplotlib.ticker import LogLocator, LinearLocator
 
 import os
+import glob
+import shutil
 import pandas as pd
 import sys
 from OoOCommon import *
+from parallelRun import *
 
 OPT_FONT_NAME = 'Helvetica'
 TICK_FONT_SIZE = 22
@@ -49,6 +52,10 @@ matplotlib.rcParams['xtick.labelsize'] = TICK_FONT_SIZE
 matplotlib.rcParams['ytick.labelsize'] = TICK_FONT_SIZE
 matplotlib.rcParams['font.family'] = OPT_FONT_NAME
 matplotlib.rcParams['pdf.fonttype'] = 42
+# cores given to each run, exported as its OMP_NUM_THREADS
+THREADS_PER_RUN = 1
+# runs at once, 0 for as many as the cores allow, 1 to run one by one as before
+MAX_PARALLEL_RUNS = int(os.environ.get("MAX_PARALLEL_RUNS", 0))
 dataset_vecDim_mapping = {
     'DPR': 768,
     'SIFT': 128,
@@ -107,78 +114,86 @@ dataset_dataLoaderTag_mapping = {
 }
 
 
-def runPeriod(exePath, algoTag, resultPath, configTemplate="config.csv", prefixTagRaw="null"):
-    # resultFolder="periodTests"
+def preparePeriod(exePath, algoTag, resultPath, configTemplate="config.csv", prefixTagRaw="null"):
+    """
+    make the isolated working folder and config of one run
+    :return: the run id, its folder and its config name
+    """
     prefixTag = str(prefixTagRaw)
-    configFname = "config_period_" + str(prefixTag) + ".csv"
     configTemplate = "config_e2e_static_lazy.csv"
-    # clear old files
-    os.system("cd " + exePath + "&& sudo rm *.csv")
-    os.system("cp perfListEvaluation.csv " + exePath)
-    # editConfig(configTemplate, exePath + configFname, "earlierEmitMs", 0)
-    editConfig(configTemplate, "t0.csv", "vecDim", int(dataset_vecDim_mapping[prefixTag]))
-    editConfig("t0.csv", "t1.csv", "dataPath", (dataset_dataPath_mapping[prefixTag]))
-    editConfig("t1.csv", "t0.csv", "queryPath", (dataset_queryPath_mapping[prefixTag]))
-    editConfig("t0.csv", "temp2.csv", "dataLoaderTag", (dataset_dataLoaderTag_mapping[prefixTag]))
-    editConfig("temp2.csv", exePath + "temp1.csv", "faissIndexTag", algoTag)
+    runId = os.path.basename(os.path.normpath(resultPath)) + "_" + prefixTag
+    runDir = prepareRunDir(exePath, runId, "onlineInsert", ["perfListEvaluation.csv"] + glob.glob("*.rbt"))
+    editConfig(configTemplate, runDir + "t0.csv", "vecDim", int(dataset_vecDim_mapping[prefixTag]))
+    editConfig(runDir + "t0.csv", runDir + "t1.csv", "dataPath", (dataset_dataPath_mapping[prefixTag]))
+    editConfig(runDir + "t1.csv", runDir + "t0.csv", "queryPath", (dataset_queryPath_mapping[prefixTag]))
+    editConfig(runDir + "t0.csv", runDir + "temp2.csv", "dataLoaderTag", (dataset_dataLoaderTag_mapping[prefixTag]))
+    editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "faissIndexTag", algoTag)
     if (algoTag == 'LSH'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "numberOfBuckets", 1)
-        editConfig(exePath + "temp2.csv", exePath + "temp3.csv", "useCRS", 0)
-        editConfig(exePath + "temp3.csv", exePath + "temp4.csv", "congestionDropWorker_algoTag", "onlineIVFLSH")
-        editConfig(exePath + "temp4.csv", exePath + "temp1.csv", "encodeLen", 3)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "numberOfBuckets", 1)
+        editConfig(runDir + "temp2.csv", runDir + "temp3.csv", "useCRS", 0)
+        editConfig(runDir + "temp3.csv", runDir + "temp4.csv", "congestionDropWorker_algoTag", "onlineIVFLSH")
+        editConfig(runDir + "temp4.csv", runDir + "temp1.csv", "encodeLen", 3)
     if (algoTag == 'LSH-H'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "onlineIVFLSH")
-        editConfig(exePath + "temp2.csv", exePath + "temp4.csv", "useCRS", 0)
-        editConfig(exePath + "temp4.csv", exePath + "temp1.csv", "encodeLen", 3)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "onlineIVFLSH")
+        editConfig(runDir + "temp2.csv", runDir + "temp4.csv", "useCRS", 0)
+        editConfig(runDir + "temp4.csv", runDir + "temp1.csv", "encodeLen", 3)
     if (algoTag == 'flatAMMIP'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "flatAMMIP")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "sketchSize", 256)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "flatAMMIP")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "sketchSize", 256)
     if (algoTag == 'flatAMMIPSMPPCA'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "flatAMMIP")
-        editConfig(exePath + "temp2.csv", exePath + "temp4.csv", "sketchSize", 128)
-        editConfig(exePath + "temp4.csv", exePath + "temp1.csv", "ammAlgo", 'smp-pca')
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "flatAMMIP")
+        editConfig(runDir + "temp2.csv", runDir + "temp4.csv", "sketchSize", 128)
+        editConfig(runDir + "temp4.csv", runDir + "temp1.csv", "ammAlgo", 'smp-pca')
     if (algoTag == 'flat'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "flat")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "sketchSize", 256)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "flat")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "sketchSize", 256)
     if (algoTag == 'NSW'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "NSW")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "is_NSW", 1)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "NSW")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "is_NSW", 1)
     if (algoTag == 'nnDescent'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "nnDescent")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "frozenLevel", 1)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "nnDescent")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "frozenLevel", 1)
     if (algoTag == 'onlinePQ'):
-        editConfig(exePath + "temp1.csv", exePath + "temp3.csv", "faissIndexTag", "PQ")
-        editConfig(exePath + "temp3.csv", exePath + "temp2.csv", "isOnlinePQ", 1)
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "sketchSize", 256)
+        editConfig(runDir + "temp1.csv", runDir + "temp3.csv", "faissIndexTag", "PQ")
+        editConfig(runDir + "temp3.csv", runDir + "temp2.csv", "isOnlinePQ", 1)
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "sketchSize", 256)
     if (algoTag == 'Flann'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "Flann")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "sketchSize", 256)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "Flann")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "sketchSize", 256)
     if (algoTag == 'DPG'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "DPG")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "frozenLevel", 1)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "DPG")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "frozenLevel", 1)
     if (algoTag == 'LSHAPG'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "LSHAPG")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "frozenLevel", 1)
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "LSHAPG")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "frozenLevel", 1)
     if (algoTag == 'SPTAG'):
-        editConfig(exePath + "temp1.csv", exePath + "temp2.csv", "congestionDropWorker_algoTag", "SPTAG")
-        editConfig(exePath + "temp2.csv", exePath + "temp1.csv", "frozenLevel", 1)
-    exeTag = "onlineInsert"
-    # prepare new file
-    os.system("rm -rf " + exePath + "*.rbt")
-    os.system("cp *.rbt " + exePath)
-    # run
+        editConfig(runDir + "temp1.csv", runDir + "temp2.csv", "congestionDropWorker_algoTag", "SPTAG")
+        editConfig(runDir + "temp2.csv", runDir + "temp1.csv", "frozenLevel", 1)
+    # all runs share one ground truth cache, which is written atomically
+    with open(runDir + "temp1.csv", "a") as f:
+        f.write("groundTruthPrefix," + exePath + "onlineInsert_GroundTruth,String\n")
+    for f in ["t0.csv", "t1.csv", "temp2.csv", "temp3.csv", "temp4.csv"]:
+        if os.path.exists(runDir + f):
+            os.remove(runDir + f)
     if (algoTag == 'nnDescent2 '):
-        os.system("cp dummy.csv " + exePath + "onlineInsert_result.csv")
-    else:
-        os.system("cd " + exePath + "&& export OMP_NUM_THREADS=1 &&" + "sudo ./" + exeTag + " " + 'temp1.csv')
-    # copy result
-    os.system("sudo rm -rf " + resultPath + "/" + str(prefixTag))
-    os.system("sudo mkdir " + resultPath + "/" + str(prefixTag))
+        shutil.copy("dummy.csv", runDir + "onlineInsert_result.csv")
+    return runId, runDir, "temp1.csv"
 
-    os.system("cd " + exePath + "&& sudo cp *.csv " + resultPath + "/" + str(prefixTag))
+
+def runPeriod(exePath, algoTag, resultPath, configTemplate="config.csv", prefixTagRaw="null"):
+    """
+    run one algorithm on one dataset and wait for it
+    """
+    runId, runDir, configName = preparePeriod(exePath, algoTag, resultPath, configTemplate, prefixTagRaw)
+    if (algoTag != 'nnDescent2 '):
+        runSweep({runId: (runDir, configName)}, THREADS_PER_RUN, 1)
+    collectResult(runDir, resultPath + "/" + str(prefixTagRaw))
 
 
 def runPeriodVector(exePath, algoTag, resultPath, prefixTag, configTemplate="config.csv", reRun=1):
+    """
+    run the missing datasets of one algorithm one by one, runSweepAll runs the whole sweep at once
+    """
     for i in range(len(prefixTag)):
         if reRun == 2:
             if checkResultSingle(prefixTag[i], resultPath) == 1:
@@ -189,6 +204,25 @@ def runPeriodVector(exePath, algoTag, resultPath, prefixTag, configTemplate="con
             runPeriod(exePath, algoTag, resultPath, configTemplate, prefixTag[i])
 
 
+def runSweepAll(exePath, jobs, configTemplate="config.csv"):
+    """
+    run every (algoTag, resultPath, prefixTag) job in its own folder, MAX_PARALLEL_RUNS at once on disjoint cores,
+    and collect the outputs by run id
+    """
+    runs = {}
+    targets = {}
+    for algoTag, resultPath, prefixTag in jobs:
+        runId, runDir, configName = preparePeriod(exePath, algoTag, resultPath, configTemplate, prefixTag)
+        targets[runId] = (runDir, resultPath + "/" + str(prefixTag))
+        if (algoTag != 'nnDescent2 '):
+            runs[runId] = (runDir, configName)
+    codes = runSweep(runs, THREADS_PER_RUN, MAX_PARALLEL_RUNS)
+    for runId in targets:
+        if codes.get(runId, 0) != 0:
+            print("run " + runId + " failed, see " + targets[runId][0] + "run.log")
+        collectResult(targets[runId][0], targets[runId][1])
+
+
 def readResultSingle(singleValue, resultPath):
     print(singleValue)
     resultFname = resultPath + "/" + str(singleValue) + "/onlineInsert_result.csv"
@@ -264,6 +298,7 @@ def compareMethod(exeSpace, commonPathBase, resultPaths, csvTemplate, algos, dat
     froAll = []
     resultIsComplete = 1
     algoCnt = 0
+    jobs = []
     for i in range(len(algos)):
         resultPath = commonPathBase + resultPaths[i]
         algoTag = algos[i]
@@ -271,18 +306,21 @@ def compareMethod(exeSpace, commonPathBase, resultPaths, csvTemplate, algos, dat
         if (reRun == 1):
             os.system("sudo rm -rf " + resultPath)
             os.system("sudo mkdir " + resultPath)
-            runPeriodVector(exeSpace, algoTag, resultPath, scanVec, csvTemplate)
+            jobs += [(algoTag, resultPath, v) for v in scanVec]
         else:
             if (reRun == 2):
-                resultIsComplete = checkResultVector(scanVec, resultPath)
-                if resultIsComplete == 1:
+                if checkResultVector(scanVec, resultPath) == 1:
                     print(algoTag + " is complete, skip")
                 else:
                     print(algoTag + " is incomplete, redo it")
                     if os.path.exists(resultPath) == False:
                         os.system("sudo mkdir " + resultPath)
-                    runPeriodVector(exeSpace, algoTag, resultPath, scanVec, csvTemplate, 2)
-                    resultIsComplete = checkResultVector(scanVec, resultPath)
+                    jobs += [(algoTag, resultPath, v) for v in scanVec if checkResultSingle(v, resultPath) == 0]
+    runSweepAll(exeSpace, jobs, csvTemplate)
+    for i in range(len(algos)):
+        resultPath = commonPathBase + resultPaths[i]
+        if (reRun == 2):
+            resultIsComplete = checkResultVector(dataSetName, resultPath)
         # exit()
         if resultIsComplete:
             elapsedTime, incrementalBuild, incrementalSearch, recall, pendingWaitTime, l2Stall, l3Stall, totalStall, froVec = readResultVector(
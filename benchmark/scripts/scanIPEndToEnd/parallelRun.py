@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Run a sweep of benchmark programs in parallel, each run in its own folder on its own cores
+import concurrent.futures
+import os
+import queue
+import shutil
+import subprocess
+
+# entries of exePath shared by all runs through symbolic links, the relative paths in configs stay valid
+SHARED_ENTRIES = ["datasets", "perfLists", "CL"]
+
+
+def splitCores(threadsPerRun=1, maxParallelRuns=0):
+    """
+    split the cores this process may use into disjoint sets, one set per concurrent run
+    :param threadsPerRun: cores given to each run, also its OMP_NUM_THREADS
+    :param maxParallelRuns: at most this many sets, <=0 for as many as the cores allow
+    :return: list of core lists
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    threadsPerRun = max(1, min(int(threadsPerRun), len(cores)))
+    coreSets = [cores[i:i + threadsPerRun] for i in range(0, len(cores) - threadsPerRun + 1, threadsPerRun)]
+    if maxParallelRuns > 0:
+        coreSets = coreSets[:maxParallelRuns]
+    return coreSets
+
+
+def prepareRunDir(exePath, runId, exeTag="onlineInsert", extraFiles=(), useSudo=True):
+    """
+    create an empty working folder for one run under exePath/runs, with the executable and datasets linked
+    :param exePath: the folder holding the built benchmark programs
+    :param runId: the unique name of this run
+    :param exeTag: the program to run
+    :param extraFiles: files copied into the folder, e.g., perf lists and prebuilt indexes
+    :param useSudo: whether old outputs may be owned by root
+    :return: the folder, ending with /
+    """
+    runDir = os.path.join(exePath, "runs", str(runId)) + "/"
+    if useSudo:
+        os.system("sudo rm -rf " + runDir)
+    shutil.rmtree(runDir, ignore_errors=True)
+    os.makedirs(runDir)
+    for entry in [exeTag] + SHARED_ENTRIES:
+        src = os.path.join(exePath, entry)
+        if os.path.exists(src):
+            os.symlink(os.path.abspath(src), runDir + entry)
+    for f in extraFiles:
+        shutil.copy(f, runDir)
+    return runDir
+
+
+def launchRun(runDir, cores, exeTag="onlineInsert", configName="config.csv", useSudo=True):
+    """
+    run one program in its folder, pinned to the given cores, and wait for it
+    :return: the return code, and the run log is kept as run.log in the folder
+    the cores are set by taskset, a preexec_fn is not safe here as runs are launched from threads
+    """
+    env = dict(os.environ)
+    env["OMP_NUM_THREADS"] = str(len(cores))
+    cmd = ["taskset", "-c", ",".join(str(c) for c in cores), "./" + exeTag, configName]
+    if useSudo:
+        cmd = ["sudo", "env", "OMP_NUM_THREADS=" + str(len(cores))] + cmd
+    with open(runDir + "run.log", "w") as log:
+        proc = subprocess.Popen(cmd, cwd=runDir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        return proc.wait()
+
+
+def runSweep(runs, threadsPerRun=1, maxParallelRuns=0, exeTag="onlineInsert", useSudo=True):
+    """
+    run all prepared runs on a bounded pool, each holding one core set while it runs
+    :param runs: dict of runId -> (runDir, configName), the folders made by prepareRunDir
+    :param threadsPerRun: cores per run
+    :param maxParallelRuns: at most this many runs at once, <=0 for as many as the cores allow, 1 for serial runs
+    :return: dict of runId -> return code
+    """
+    coreSets = splitCores(threadsPerRun, maxParallelRuns)
+    freeCores = queue.Queue()
+    for c in coreSets:
+        freeCores.put(c)
+
+    def worker(runId):
+        runDir, configName = runs[runId]
+        cores = freeCores.get()
+        try:
+            print("start " + str(runId) + " on cores " + str(cores))
+            return launchRun(runDir, cores, exeTag, configName, useSudo)
+        finally:
+            freeCores.put(cores)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(coreSets)) as pool:
+        futures = {pool.submit(worker, runId): runId for runId in runs}
+        for f in concurrent.futures.as_completed(futures):
+            runId = futures[f]
+            results[runId] = f.result()
+            print("finish " + str(runId) + " with code " + str(results[runId]))
+    return results
+
+
+def collectResult(runDir, resultDir, useSudo=True):
+    """
+    copy the csv outputs of one run into its result folder, replacing the old ones
+    """
+    if useSudo:
+        os.system("sudo rm -rf " + resultDir + " && sudo mkdir -p " + resultDir)
+        os.system("cd " + runDir + " && sudo cp *.csv " + resultDir)
+        return
+    shutil.rmtree(resultDir, ignore_errors=True)
+    os.makedirs(resultDir)
+    for f in os.listdir(runDir):
+        if f.endswith(".csv"):
+            shutil.copy(runDir + f, resultDir)
@@ -12,7 +12,7 @@
 
 using namespace INTELLI;
 static inline CANDY::AbstractIndexPtr indexPtr = nullptr;
-static inline std::vector<INTELLI::IntelliTimeStampPtr> timeStamps;
+static inline INTELLI::IntelliTimeStampBufferPtr timeStamps;
 static inline timer_t timerid;
 
 bool fileExists(const std::string &filename) {
@@ -94,7 +94,9 @@ static inline void earlyTerminateTimerCallBack() {
     indexPtr->endHPC();
   }
   auto briefOutCfg = newConfigMap();
-  UtilityFunctions::saveTimeStampToFile("multiRW_timestamps.csv", timeStamps);
+  if (timeStamps != nullptr) {
+    UtilityFunctions::saveTimeStampToFile("multiRW_timestamps.csv", timeStamps);
+  }
   generateEarlyAbortResultCsv(briefOutCfg, "multiRW_result.csv");
   exit(-1);
 }
@@ -151,14 +153,18 @@ int main(int argc, char **argv) {
   }
   dataLoader->setConfig(inMap);
   int64_t initialRows = inMap->tryI64("initialRows", 0, true);
-  auto dataTensorAll = dataLoader->getData().nan_to_num(0);
-  //auto dataTensorAll = dataLoader->getData();
-  auto dataTensorInitial = dataTensorAll.slice(0, 0, initialRows);
-  auto dataTensorStreamAll = dataTensorAll.slice(0, initialRows, dataTensorAll.size(0));
+  /**
+   * @brief only the initial rows are held, the stream is pulled chunk by chunk from the loader
+   */
+  initialRows = std::min(initialRows, dataLoader->size());
+  auto dataTensorInitial = dataLoader->getDataAt(0, initialRows).nan_to_num(0);
+  int64_t streamRowsAll = dataLoader->size() - initialRows;
+  int64_t vecDim = dataLoader->getDimension();
+  const int64_t gdChunkRows = 65536;
   //auto queryTensor = dataLoader->getQuery();
   auto queryTensorAll = dataLoader->getQuery().nan_to_num(0);
   int64_t currSeq = 0;
-  int64_t dbSeqRows = dataTensorStreamAll.size(0) / s_numberOfRWSeq;
+  int64_t dbSeqRows = streamRowsAll / s_numberOfRWSeq;
   int64_t querySeqRows = queryTensorAll.size(0) / s_numberOfRWSeq;
   int64_t ANNK = inMap->tryI64("ANNK", 5, true);
   int64_t pendingWriteTime = 0;
@@ -181,9 +187,16 @@ int main(int argc, char **argv) {
   CANDY::IndexTable indexTable2;
   auto gdIndex = indexTable2.getIndex("faiss");
   gdIndex->setConfig(gdMap);
-  if (initialRows > 0) {
-    gdIndex->loadInitialTensor(dataTensorInitial);
-  }
+  /**
+   * @brief the ground truth index is only fed when a ground truth has to be computed
+   */
+  int64_t gdStreamRows = -1;
+  std::string groundTruthPrefix = inMap->tryString("groundTruthPrefix", "onlineInsert_GroundTruth", true);
+  int64_t groundTruthRedo = inMap->tryI64("groundTruthRedo", 0, true);
+  std::string groundTruthDataset = inMap->tryString("groundTruthDataset", dataLoaderTag, true);
+  std::string metricType = inMap->tryString("metricType", "IP", true);
+  INTELLI::GroundTruthStore gdStore(groundTruthPrefix);
+  auto dataHash = INTELLI::GroundTruthStore::hashTensor(dataTensorInitial);
   if (cutOffTimeSeconds > 0) {
     setEarlyTerminateTimer(cutOffTimeSeconds);
     s_timeOutSeconds = cutOffTimeSeconds;
@@ -192,41 +205,42 @@ int main(int argc, char **argv) {
   }
   INTELLI_INFO("3.0 Load initial tensor!");
   INTELLI_INFO(
-      "Initial tensor: Dimension =" + std::to_string(dataTensorInitial.size(1)) + ",#data="
+      "Initial tensor: Dimension =" + std::to_string(vecDim) + ",#data="
           + std::to_string(dataTensorInitial.size(0)));
   if (initialRows > 0) {
     indexPtr->loadInitialTensor(dataTensorInitial);
   }
   int64_t frozenLevel = inMap->tryI64("frozenLevel", 1, true);
   indexPtr->setFrozenLevel(frozenLevel);
+  dataLoader->resetStream(initialRows);
   for (; currSeq < s_numberOfRWSeq; currSeq++) {
     INTELLI_INFO("RW seq" + std::to_string(currSeq) + "/" + std::to_string(s_numberOfRWSeq));
     int64_t dbTensorStartRow = dbSeqRows * currSeq;
     int64_t dbTensorEndRow =
-        (dbSeqRows * (currSeq + 1) > dataTensorStreamAll.size(0)) ? dataTensorStreamAll.size(0) : dbSeqRows
+        (dbSeqRows * (currSeq + 1) > streamRowsAll) ? streamRowsAll : dbSeqRows
             * (currSeq + 1);
     s_curSeq = currSeq;
-    auto dataTensorStream = dataTensorStreamAll.slice(0, dbTensorStartRow, dbTensorEndRow);
+    int64_t seqRows = dbTensorEndRow - dbTensorStartRow;
 
     int64_t qTensorStartRow = querySeqRows * currSeq;
     int64_t qTensorEndRow =
         (querySeqRows * (currSeq + 1) > queryTensorAll.size(0)) ? queryTensorAll.size(0) : querySeqRows * (currSeq + 1);
     auto queryTensor = queryTensorAll.slice(0, qTensorStartRow, qTensorEndRow);
-    int64_t batchSize = inMap->tryI64("batchSize", dataTensorStream.size(0), true);
+    int64_t batchSize = inMap->tryI64("batchSize", seqRows, true);
 
     INTELLI_INFO(
-        "Streaming tensor: Dimension =" + std::to_string(dataTensorStream.size(1)) + ",#data="
-            + std::to_string(dataTensorStream.size(0)) + ",#query="
+        "Streaming tensor: Dimension =" + std::to_string(vecDim) + ",#data="
+            + std::to_string(seqRows) + ",#query="
             + std::to_string(queryTensor.size(0)));
 
     /**
     * @brief 3. create the timestamps
     */
     INTELLI::IntelliTimeStampGenerator timeStampGen;
-    inMap->edit("streamingTupleCnt", (int64_t) dataTensorStream.size(0));
+    inMap->edit("streamingTupleCnt", (int64_t) seqRows);
     timeStampGen.setConfig(inMap);
-    timeStamps = timeStampGen.getTimeStamps();
-    INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps.size()));
+    timeStamps = timeStampGen.getTimeStampBuffer();
+    INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps->size()));
 
     /**
      * @brief 5. streaming feed
@@ -234,10 +248,10 @@ int main(int argc, char **argv) {
     uint64_t startRow = 0;
     uint64_t endRow = startRow + batchSize;
     uint64_t tNow = 0;
-    uint64_t tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+    uint64_t tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
     uint64_t tp = 0;
     uint64_t tDone = 0;
-    uint64_t aRows = dataTensorStream.size(0);
+    uint64_t aRows = seqRows;
 
     auto start = std::chrono::high_resolution_clock::now();
 
@@ -255,15 +269,13 @@ int main(int argc, char **argv) {
       /**
        * @brief now, the whole batch has arrived, compute
        */
-      auto subA = dataTensorStream.slice(0, startRow, endRow);
+      auto subA = dataLoader->nextChunk(endRow - startRow).nan_to_num(0);
       indexPtr->insertTensor(subA);
       tp = chronoElapsedTime(start);
       /**
        * @brief the new arrived A will be no longer probed, so we can assign the processed time now
        */
-      for (size_t i = startRow; i < endRow; i++) {
-        timeStamps[i]->processedTime = tp;
-      }
+      timeStamps->setProcessed(startRow, endRow, tp);
       /**
        * @brief update the indexes
        */
@@ -277,7 +289,7 @@ int main(int argc, char **argv) {
         INTELLI_INFO("Done" + to_string(prossed) + "%(" + to_string(startRow) + "/" + to_string(aRows) + ")");
         prossedOld = prossed;
       }
-      tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+      tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
 
     }
     tDone = chronoElapsedTime(start);
@@ -291,28 +303,49 @@ int main(int argc, char **argv) {
     }
     INTELLI_INFO("Insert is done, let us validate the results");
     auto startQuery = std::chrono::high_resolution_clock::now();
-    auto indexResults = indexPtr->searchTensor(queryTensor, ANNK);
+    /**
+     * @brief the recall is evaluated on ids, only an index that returns no ids is evaluated on its result rows
+     */
+    auto indexIds =
+        UtilityFunctions::idsToMatrix(indexPtr->searchIndex(queryTensor, ANNK), queryTensor.size(0), ANNK);
+    std::vector<torch::Tensor> indexResults;
+    if (!indexIds.defined()) {
+      indexResults = indexPtr->searchTensor(queryTensor, ANNK);
+    }
     tNow = chronoElapsedTime(startQuery);
     INTELLI_INFO("Query done in " + to_string(tNow / 1000) + "ms");
     uint64_t queryLatency = tNow;
 
-    std::string groundTruthPrefix = inMap->tryString("groundTruthPrefix", "onlineInsert_GroundTruth", true);
-
-    std::string probeName = groundTruthPrefix + "/" + std::to_string(indexResults.size() - 1) + ".rbt";
-    double recall = 0.0;
-
-    {
-      INTELLI_INFO("Ground truth does not exist, so I'll create it");
-
-      gdIndex->insertTensor(dataTensorStream);
-
-      auto gdResults = gdIndex->searchTensor(queryTensor, ANNK);
-      INTELLI_INFO("Ground truth is done");
-      recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
-      UtilityFunctions::tensorListToFile(gdResults, groundTruthPrefix);
-      //std::cout<<"index results"<<indexResults[0]<<std::endl;
-      //std::cout<<"ground truth results"<<gdResults[0]<<std::endl;
+    for (int64_t i = dbTensorStartRow; i < dbTensorEndRow; i += gdChunkRows) {
+      auto chunk = dataLoader->getDataAt(initialRows + i, initialRows + std::min(i + gdChunkRows, dbTensorEndRow));
+      dataHash = INTELLI::GroundTruthStore::hashTensor(chunk.nan_to_num(0), dataHash);
+    }
+    auto [gdIds, gdDistances] = gdStore.getOrCompute(groundTruthDataset, initialRows, dbTensorEndRow, ANNK,
+                                                     metricType,
+                                                     INTELLI::GroundTruthStore::hashTensor(queryTensor, dataHash),
+                                                     [&]() {
+          if (gdStreamRows < 0) {
+            if (initialRows > 0) {
+              gdIndex->loadInitialTensor(dataTensorInitial);
+            }
+            gdStreamRows = 0;
+          }
+          for (int64_t i = gdStreamRows; i < dbTensorEndRow; i += gdChunkRows) {
+            auto gdNew = dataLoader->getDataAt(initialRows + i, initialRows + std::min(i + gdChunkRows, dbTensorEndRow));
+            gdIndex->insertTensor(gdNew.nan_to_num(0));
+          }
+          gdStreamRows = dbTensorEndRow;
+          return gdIndex->searchWithDistances(queryTensor, ANNK);
+        }, groundTruthRedo != 0);
+    INTELLI_INFO("Ground truth is done");
+    if (!indexIds.defined()) {
+      INTELLI_WARNING(indexTag + " returns no ids, match its result rows instead");
+      auto gdRows = dataLoader->getDataByIds(gdIds.flatten().clamp_min(0)).nan_to_num(0);
+      auto gdResults = INTELLI::GroundTruthStore::idsToTensorList(
+          torch::arange(gdIds.numel()).view_as(gdIds).masked_fill(gdIds.lt(0), -1), gdRows);
+      std::tie(gdIds, indexIds) = UtilityFunctions::rowsToIds(gdResults, indexResults, ANNK);
     }
+    double recall = UtilityFunctions::calculateRecallById(gdIds, indexIds, ANNK);
 
     double throughput = aRows * 1e6 / tDone;
     throughputVec[currSeq] = throughput;
@@ -13,7 +13,7 @@
 
 using namespace INTELLI;
 static inline CANDY::AbstractIndexPtr indexPtr = nullptr;
-static inline std::vector<INTELLI::IntelliTimeStampPtr> timeStamps, tsDel;
+static inline INTELLI::IntelliTimeStampBufferPtr timeStamps, tsDel;
 static inline timer_t timerid;
 
 bool fileExists(const std::string &filename) {
@@ -114,10 +114,10 @@ int main(int argc, char **argv) {
   INTELLI::IntelliTimeStampGenerator timeStampGen, tsGen2;
   inMap->edit("streamingTupleCnt", (int64_t) std::max(streamSize, deleteRows));
   timeStampGen.setConfig(inMap);
-  timeStamps = timeStampGen.getTimeStamps();
+  timeStamps = timeStampGen.getTimeStampBuffer();
   tsGen2.setConfig(inMap);
-  tsDel = tsGen2.getTimeStamps();
-  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps.size()));
+  tsDel = tsGen2.getTimeStampBuffer();
+  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps->size()));
   int64_t batchSize = inMap->tryI64("batchSize", streamSize, true);
   /**
    * @brief 4. creat index
@@ -137,7 +137,7 @@ int main(int argc, char **argv) {
   uint64_t startRow = 0;
   uint64_t endRow = startRow + batchSize;
   uint64_t tNow = 0;
-  uint64_t tEXpectedArrival = tsDel[endRow - 1]->arrivalTime;
+  uint64_t tEXpectedArrival = tsDel->arrivalTime[endRow - 1];
   uint64_t tp = 0;
   uint64_t tDone = 0;
   uint64_t aRows = deleteRows;
@@ -167,6 +167,7 @@ int main(int argc, char **argv) {
   indexPtr->setFrozenLevel(frozenLevel);
   INTELLI_INFO("3.1  Delete NOW!!!");
   double prossedOld = 0;
+  dataLoader->resetStream(0);
   while (startRow < aRows) {
     tNow = chronoElapsedTime(start);
     //index++;
@@ -180,16 +181,14 @@ int main(int argc, char **argv) {
     /**
      * @brief now, the whole batch has arrived, compute
      */
-    auto subA = dataLoader->getDataAt((int64_t) startRow, (int64_t) endRow);
+    auto subA = dataLoader->nextChunk((int64_t) (endRow - startRow));
     //std::cout<<subA;
     indexPtr->deleteTensor(subA);
     tp = chronoElapsedTime(start);
     /**
      * @brief the new arrived A will be no longer probed, so we can assign the processed time now
      */
-    for (size_t i = startRow; i < endRow; i++) {
-      tsDel[i]->processedTime = tp;
-    }
+    tsDel->setProcessed(startRow, endRow, tp);
     /**
      * @brief update the indexes
      */
@@ -203,7 +202,7 @@ int main(int argc, char **argv) {
       INTELLI_INFO("Done" + to_string(prossed) + "%(" + to_string(startRow) + "/" + to_string(aRows) + ")");
       prossedOld = prossed;
     }
-    tEXpectedArrival = tsDel[endRow - 1]->arrivalTime;
+    tEXpectedArrival = tsDel->arrivalTime[endRow - 1];
 
   }
   tDone = chronoElapsedTime(start);
@@ -213,7 +212,7 @@ int main(int argc, char **argv) {
   startRow = 0;
   endRow = startRow + batchSize;
   tNow = 0;
-  tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+  tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
   tp = 0;
   tDone = 0;
   aRows = streamSize;
@@ -221,6 +220,7 @@ int main(int argc, char **argv) {
 
   indexPtr->setFrozenLevel(frozenLevel);
   prossedOld = 0;
+  dataLoader->resetStream(initialRows);
   while (startRow < aRows) {
     tNow = chronoElapsedTime(start);
     //index++;
@@ -233,15 +233,13 @@ int main(int argc, char **argv) {
     /**
      * @brief now, the whole batch has arrived, compute
      */
-    auto subA = dataLoader->getDataAt((int64_t) startRow + initialRows, (int64_t) endRow + initialRows);
+    auto subA = dataLoader->nextChunk((int64_t) (endRow - startRow));
     indexPtr->insertTensor(subA);
     tp = chronoElapsedTime(start);
     /**
      * @brief the new arrived A will be no longer probed, so we can assign the processed time now
      */
-    for (size_t i = startRow; i < endRow; i++) {
-      timeStamps[i]->processedTime = tp;
-    }
+    timeStamps->setProcessed(startRow, endRow, tp);
     /**
      * @brief update the indexes
      */
@@ -255,7 +253,7 @@ int main(int argc, char **argv) {
       INTELLI_INFO("Done" + to_string(prossed) + "%(" + to_string(startRow) + "/" + to_string(aRows) + ")");
       prossedOld = prossed;
     }
-    tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+    tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
 
   }
   tDone = chronoElapsedTime(start);
@@ -286,7 +284,11 @@ int main(int argc, char **argv) {
     INTELLI_INFO("Ground truth exists, so I load it");
     auto gdResults = UtilityFunctions::tensorListFromFile(groundTruthPrefix, indexResults.size());
     INTELLI_INFO("Ground truth is loaded");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
+    /**
+     * @brief deletions renumber the index, so the result rows are numbered jointly before comparing ids
+     */
+    auto [gdIds, indexIds] = UtilityFunctions::rowsToIds(gdResults, indexResults, ANNK);
+    recall = UtilityFunctions::calculateRecallById(gdIds, indexIds, ANNK);
   } else {
     INTELLI_INFO("Ground truth does not exist, so I'll create it");
     auto gdMap = newConfigMap();
@@ -303,12 +305,13 @@ int main(int argc, char **argv) {
     startRow = 0;
     endRow = startRow + batchSize;
     aRows = deleteRows;
+    dataLoader->resetStream(0);
     while (startRow < aRows) {
 
       /**
        * @brief now, the whole batch has arrived, compute
        */
-      auto subA = dataLoader->getDataAt((int64_t) startRow , (int64_t) endRow );
+      auto subA = dataLoader->nextChunk((int64_t) (endRow - startRow));
       gdIndex->deleteTensor(subA);
 
       /**
@@ -323,12 +326,18 @@ int main(int argc, char **argv) {
 
     /* auto subADel = dataLoader->getDataAt((int64_t) 0, (int64_t) deleteRows);
      gdIndex->deleteTensor(subADel);*/
-    auto subAInsert = dataLoader->getDataAt((int64_t) initialRows, (int64_t) (initialRows + streamSize));
-    gdIndex->insertTensor(subAInsert);
+    dataLoader->resetStream(initialRows);
+    while (dataLoader->hasNextChunk()) {
+      gdIndex->insertTensor(dataLoader->nextChunk(batchSize));
+    }
 
     auto gdResults = gdIndex->searchTensor(queryTensor, ANNK);
     INTELLI_INFO("Ground truth is done");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
+    /**
+     * @brief deletions renumber the index, so the result rows are numbered jointly before comparing ids
+     */
+    auto [gdIds, indexIds] = UtilityFunctions::rowsToIds(gdResults, indexResults, ANNK);
+    recall = UtilityFunctions::calculateRecallById(gdIds, indexIds, ANNK);
     UtilityFunctions::tensorListToFile(gdResults, groundTruthPrefix);
     //std::cout<<"index results"<<indexResults[0]<<std::endl;
     //std::cout<<"ground truth results"<<gdResults[0]<<std::endl;
@@ -12,7 +12,7 @@
 
 using namespace INTELLI;
 static inline CANDY::AbstractIndexPtr indexPtr = nullptr;
-static inline std::vector<INTELLI::IntelliTimeStampPtr> timeStamps;
+static inline INTELLI::IntelliTimeStampBufferPtr timeStamps;
 static inline timer_t timerid;
 
 bool fileExists(const std::string &filename) {
@@ -88,29 +88,32 @@ int main(int argc, char **argv) {
   }
   dataLoader->setConfig(inMap);
   int64_t initialRows = inMap->tryI64("initialRows", 0, true);
-  auto dataTensorAll = dataLoader->getData().nan_to_num(0);
-  //auto dataTensorAll = dataLoader->getData();
-  auto dataTensorInitial = dataTensorAll.slice(0, 0, initialRows);
-  auto dataTensorStream = dataTensorAll.slice(0, initialRows, dataTensorAll.size(0));
+  /**
+   * @brief only the initial rows are held, the stream is pulled chunk by chunk from the loader
+   */
+  initialRows = std::min(initialRows, dataLoader->size());
+  auto dataTensorInitial = dataLoader->getDataAt(0, initialRows).nan_to_num(0);
+  int64_t streamRows = dataLoader->size() - initialRows;
+  int64_t vecDim = dataLoader->getDimension();
   //auto queryTensor = dataLoader->getQuery();
   auto queryTensor = dataLoader->getQuery().nan_to_num(0);
   INTELLI_INFO(
-      "Initial tensor: Demension =" + std::to_string(dataTensorInitial.size(1)) + ",#data="
+      "Initial tensor: Demension =" + std::to_string(vecDim) + ",#data="
           + std::to_string(dataTensorInitial.size(0)));
   INTELLI_INFO(
-      "Streaming tensor: Demension =" + std::to_string(dataTensorStream.size(1)) + ",#data="
-          + std::to_string(dataTensorStream.size(0)) + ",#query="
+      "Streaming tensor: Demension =" + std::to_string(vecDim) + ",#data="
+          + std::to_string(streamRows) + ",#query="
           + std::to_string(queryTensor.size(0)));
 
   /**
   * @brief 3. create the timestamps
   */
   INTELLI::IntelliTimeStampGenerator timeStampGen;
-  inMap->edit("streamingTupleCnt", (int64_t) dataTensorStream.size(0));
+  inMap->edit("streamingTupleCnt", (int64_t) streamRows);
   timeStampGen.setConfig(inMap);
-  timeStamps = timeStampGen.getTimeStamps();
-  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps.size()));
-  int64_t batchSize = inMap->tryI64("batchSize", dataTensorStream.size(0), true);
+  timeStamps = timeStampGen.getTimeStampBuffer();
+  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps->size()));
+  int64_t batchSize = inMap->tryI64("batchSize", streamRows, true);
   /**
    * @brief 4. creat index
    */
@@ -129,10 +132,10 @@ int main(int argc, char **argv) {
   uint64_t startRow = 0;
   uint64_t endRow = startRow + batchSize;
   uint64_t tNow = 0;
-  uint64_t tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+  uint64_t tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
   uint64_t tp = 0;
   uint64_t tDone = 0;
-  uint64_t aRows = dataTensorStream.size(0);
+  uint64_t aRows = streamRows;
   if (cutOffTimeSeconds > 0) {
     setEarlyTerminateTimer(cutOffTimeSeconds);
     s_timeOutSeconds = cutOffTimeSeconds;
@@ -151,6 +154,22 @@ int main(int argc, char **argv) {
     }*/
     indexPtr->loadInitialTensor(dataTensorInitial);
   }
+  /**
+   * @brief optional recall along the stream, ground truth is followed incrementally rather than recomputed
+   */
+  int64_t ANNK = inMap->tryI64("ANNK", 5, true);
+  int64_t recallCheckpoints = inMap->tryI64("recallCheckpoints", 0, true);
+  INTELLI::IncrementalGroundTruth gdTracker;
+  int64_t trackedRows = 0, nextCheckpoint = 1;
+  std::vector<double> checkpointRecalls;
+  std::vector<int64_t> checkpointRows;
+  if (recallCheckpoints > 0) {
+    gdTracker.setQueries(queryTensor, ANNK, inMap->tryString("metricType", "IP", true));
+    if (initialRows > 0) {
+      gdTracker.insertTensor(dataTensorInitial);
+    }
+  }
+  dataLoader->resetStream(initialRows);
   auto start = std::chrono::high_resolution_clock::now();
   int64_t frozenLevel = inMap->tryI64("frozenLevel", 1, true);
   indexPtr->setFrozenLevel(frozenLevel);
@@ -168,14 +187,37 @@ int main(int argc, char **argv) {
     /**
      * @brief now, the whole batch has arrived, compute
      */
-    auto subA = dataTensorStream.slice(0, startRow, endRow);
+    auto subA = dataLoader->nextChunk(endRow - startRow).nan_to_num(0);
     indexPtr->insertTensor(subA);
     tp = chronoElapsedTime(start);
     /**
      * @brief the new arrived A will be no longer probed, so we can assign the processed time now
      */
-    for (size_t i = startRow; i < endRow; i++) {
-      timeStamps[i]->processedTime = tp;
+    timeStamps->setProcessed(startRow, endRow, tp);
+    /**
+     * @brief checkpoint the recall, the time spent here is excluded from the stream clock
+     */
+    if (recallCheckpoints > 0 && (int64_t) endRow * recallCheckpoints >= (int64_t) aRows * nextCheckpoint) {
+      auto cpStart = std::chrono::high_resolution_clock::now();
+      gdTracker.insertTensor(dataLoader->getDataAt(initialRows + trackedRows, initialRows + endRow).nan_to_num(0));
+      trackedRows = endRow;
+      auto cpIds = gdTracker.getIds();
+      auto cpResultIds = UtilityFunctions::idsToMatrix(indexPtr->searchIndex(queryTensor, ANNK), queryTensor.size(0),
+                                                       ANNK);
+      if (!cpResultIds.defined()) {
+        auto cpRows = dataLoader->getDataByIds(cpIds.flatten().clamp_min(0)).nan_to_num(0);
+        auto cpGd = INTELLI::GroundTruthStore::idsToTensorList(
+            torch::arange(cpIds.numel()).view_as(cpIds).masked_fill(cpIds.lt(0), -1), cpRows);
+        std::tie(cpIds, cpResultIds) =
+            UtilityFunctions::rowsToIds(cpGd, indexPtr->searchTensor(queryTensor, ANNK), ANNK);
+      }
+      checkpointRecalls.push_back(UtilityFunctions::calculateRecallById(cpIds, cpResultIds, ANNK));
+      checkpointRows.push_back(endRow);
+      INTELLI_INFO("Recall at " + to_string(endRow) + " rows is " + to_string(checkpointRecalls.back()));
+      while ((int64_t) endRow * recallCheckpoints >= (int64_t) aRows * nextCheckpoint) {
+        nextCheckpoint++;
+      }
+      start += std::chrono::high_resolution_clock::now() - cpStart;
     }
     /**
      * @brief update the indexes
@@ -190,11 +232,10 @@ int main(int argc, char **argv) {
       INTELLI_INFO("Done" + to_string(prossed) + "%(" + to_string(startRow) + "/" + to_string(aRows) + ")");
       prossedOld = prossed;
     }
-    tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+    tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
 
   }
   tDone = chronoElapsedTime(start);
-  int64_t ANNK = inMap->tryI64("ANNK", 5, true);
   int64_t pendingWriteTime = 0;
   if (waitPendingWrite) {
     INTELLI_WARNING("There is pending write, wait first");
@@ -205,46 +246,75 @@ int main(int argc, char **argv) {
   }
   INTELLI_INFO("Insert is done, let us validate the results");
   auto startQuery = std::chrono::high_resolution_clock::now();
-  auto indexResults = indexPtr->searchTensor(queryTensor, ANNK);
+  /**
+   * @brief the recall is evaluated on ids, only an index that returns no ids is evaluated on its result rows
+   */
+  auto indexIds = UtilityFunctions::idsToMatrix(indexPtr->searchIndex(queryTensor, ANNK), queryTensor.size(0), ANNK);
+  std::vector<torch::Tensor> indexResults;
+  if (!indexIds.defined()) {
+    indexResults = indexPtr->searchTensor(queryTensor, ANNK);
+  }
   tNow = chronoElapsedTime(startQuery);
   INTELLI_INFO("Query done in " + to_string(tNow / 1000) + "ms");
   uint64_t queryLatency = tNow;
   indexPtr->endHPC();
   indexPtr->isHPCStarted = false;
   std::string groundTruthPrefix = inMap->tryString("groundTruthPrefix", "onlineInsert_GroundTruth", true);
-
-  std::string probeName = groundTruthPrefix + "/" + std::to_string(indexResults.size() - 1) + ".rbt";
-  double recall = 0.0;
-  int64_t groundTruthRedo = inMap->tryI64("groundTruthRedo", 1, true);
-
-  if (fileExists(probeName) && (groundTruthRedo == 0)) {
-    INTELLI_INFO("Ground truth exists, so I load it");
-    auto gdResults = UtilityFunctions::tensorListFromFile(groundTruthPrefix, indexResults.size());
-    INTELLI_INFO("Ground truth is loaded");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
+  int64_t groundTruthRedo = inMap->tryI64("groundTruthRedo", 0, true);
+  std::string groundTruthDataset = inMap->tryString("groundTruthDataset", dataLoaderTag, true);
+  std::string metricType = inMap->tryString("metricType", "IP", true);
+  /**
+   * @brief a loader may ship the exact neighbors of its queries, e.g., ann-benchmarks files, then nothing is computed
+   */
+  torch::Tensor gdIds;
+  if (inMap->tryI64("useStoredGroundTruth", 1, true) != 0) {
+    gdIds = dataLoader->getNeighbors(ANNK);
+  }
+  if (gdIds.defined()) {
+    INTELLI_INFO("Use the ground truth stored with the data");
   } else {
-    INTELLI_INFO("Ground truth does not exist, so I'll create it");
-    auto gdMap = newConfigMap();
-    gdMap->loadFrom(*inMap);
-    gdMap->edit("faissIndexTag", "flat");
-    CANDY::IndexTable indexTable2;
-    auto gdIndex = indexTable2.getIndex("faiss");
-    gdIndex->setConfig(gdMap);
-    if (initialRows > 0) {
-      gdIndex->loadInitialTensor(dataTensorInitial);
+    /**
+     * @brief the ground truth is reused only if it was computed on exactly the same rows and queries
+     */
+    const int64_t gdChunkRows = 65536;
+    auto dataHash = INTELLI::GroundTruthStore::hashTensor(dataTensorInitial);
+    for (int64_t i = 0; i < streamRows; i += gdChunkRows) {
+      auto chunk = dataLoader->getDataAt(initialRows + i, initialRows + std::min(i + gdChunkRows, streamRows));
+      dataHash = INTELLI::GroundTruthStore::hashTensor(chunk.nan_to_num(0), dataHash);
     }
-    gdIndex->insertTensor(dataTensorStream);
-
-    auto gdResults = gdIndex->searchTensor(queryTensor, ANNK);
-    INTELLI_INFO("Ground truth is done");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
-    UtilityFunctions::tensorListToFile(gdResults, groundTruthPrefix);
-    //std::cout<<"index results"<<indexResults[0]<<std::endl;
-    //std::cout<<"ground truth results"<<gdResults[0]<<std::endl;
+    dataHash = INTELLI::GroundTruthStore::hashTensor(queryTensor, dataHash);
+    INTELLI::GroundTruthStore gdStore(groundTruthPrefix);
+    auto gdComputed = gdStore.getOrCompute(groundTruthDataset, initialRows, aRows, ANNK, metricType,
+                                           dataHash, [&]() {
+          auto gdMap = newConfigMap();
+          gdMap->loadFrom(*inMap);
+          gdMap->edit("faissIndexTag", "flat");
+          CANDY::IndexTable indexTable2;
+          auto gdIndex = indexTable2.getIndex("faiss");
+          gdIndex->setConfig(gdMap);
+          if (initialRows > 0) {
+            gdIndex->loadInitialTensor(dataTensorInitial);
+          }
+          dataLoader->resetStream(initialRows);
+          while (dataLoader->hasNextChunk()) {
+            gdIndex->insertTensor(dataLoader->nextChunk(gdChunkRows).nan_to_num(0));
+          }
+          return gdIndex->searchWithDistances(queryTensor, ANNK);
+        }, groundTruthRedo != 0);
+    gdIds = std::get<0>(gdComputed);
+  }
+  INTELLI_INFO("Ground truth is done");
+  if (!indexIds.defined()) {
+    INTELLI_WARNING(indexTag + " returns no ids, match its result rows instead");
+    auto gdRows = dataLoader->getDataByIds(gdIds.flatten().clamp_min(0)).nan_to_num(0);
+    auto gdResults = INTELLI::GroundTruthStore::idsToTensorList(
+        torch::arange(gdIds.numel()).view_as(gdIds).masked_fill(gdIds.lt(0), -1), gdRows);
+    std::tie(gdIds, indexIds) = UtilityFunctions::rowsToIds(gdResults, indexResults, ANNK);
   }
+  double recall = UtilityFunctions::calculateRecallById(gdIds, indexIds, ANNK);
 
   double throughput = aRows * 1e6 / tDone;
-  double throughputByElements = throughput * dataTensorStream.size(1);
+  double throughputByElements = throughput * vecDim;
   double latency95 = UtilityFunctions::getLatencyPercentage(0.95, timeStamps);
   auto briefOutCfg = newConfigMap();
   briefOutCfg->edit("throughput", throughput);
@@ -254,6 +324,10 @@ int main(int argc, char **argv) {
   briefOutCfg->edit("pendingWrite", pendingWriteTime);
   briefOutCfg->edit("latencyOfQuery", queryLatency);
   briefOutCfg->edit("normalExit", (int64_t) 1);
+  for (size_t i = 0; i < checkpointRecalls.size(); i++) {
+    briefOutCfg->edit("recallAtCheckpoint_" + to_string(i), checkpointRecalls[i]);
+    briefOutCfg->edit("rowsAtCheckpoint_" + to_string(i), checkpointRows[i]);
+  }
   briefOutCfg->toFile("onlineInsert_result.csv");
   std::cout << "brief results\n" << briefOutCfg->toString() << std::endl;
   UtilityFunctions::saveTimeStampToFile("onlineInsert_timestamps.csv", timeStamps);
@@ -12,7 +12,7 @@
 #include <CANDY/LSHAPGIndex.h>
 using namespace INTELLI;
 static inline CANDY::AbstractIndexPtr indexPtr = nullptr;
-static inline std::vector<INTELLI::IntelliTimeStampPtr> timeStamps;
+static inline INTELLI::IntelliTimeStampBufferPtr timeStamps;
 static inline timer_t timerid;
 
 bool fileExists(const std::string &filename) {
@@ -108,8 +108,8 @@ int main(int argc, char **argv) {
   INTELLI::IntelliTimeStampGenerator timeStampGen;
   inMap->edit("streamingTupleCnt", (int64_t) dataTensorStream.size(0));
   timeStampGen.setConfig(inMap);
-  timeStamps = timeStampGen.getTimeStamps();
-  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps.size()));
+  timeStamps = timeStampGen.getTimeStampBuffer();
+  INTELLI_INFO("3.TimeStampSize =" + std::to_string(timeStamps->size()));
   int64_t batchSize = inMap->tryI64("batchSize", dataTensorStream.size(0), true);
   /**
    * @brief 4. creat index
@@ -127,7 +127,7 @@ int main(int argc, char **argv) {
   uint64_t startRow = 0;
   uint64_t endRow = startRow + batchSize;
   uint64_t tNow = 0;
-  uint64_t tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+  uint64_t tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
   uint64_t tp = 0;
   uint64_t tDone = 0;
   uint64_t aRows = dataTensorStream.size(0);
@@ -172,9 +172,7 @@ int main(int argc, char **argv) {
     /**
      * @brief the new arrived A will be no longer probed, so we can assign the processed time now
      */
-    for (size_t i = startRow; i < endRow; i++) {
-      timeStamps[i]->processedTime = tp;
-    }
+    timeStamps->setProcessed(startRow, endRow, tp);
     /**
      * @brief update the indexes
      */
@@ -188,7 +186,7 @@ int main(int argc, char **argv) {
       INTELLI_INFO("Done" + to_string(prossed) + "%(" + to_string(startRow) + "/" + to_string(aRows) + ")");
       prossedOld = prossed;
     }
-    tEXpectedArrival = timeStamps[endRow - 1]->arrivalTime;
+    tEXpectedArrival = timeStamps->arrivalTime[endRow - 1];
 
   }
   tDone = chronoElapsedTime(start);
@@ -203,43 +201,39 @@ int main(int argc, char **argv) {
   }
   INTELLI_INFO("Insert is done, let us validate the results");
   auto startQuery = std::chrono::high_resolution_clock::now();
-  auto indexResults = aknnIdx.searchTensor(queryTensor, ANNK);
+  auto indexIds = UtilityFunctions::idsToMatrix(aknnIdx.searchIndex(queryTensor, ANNK), queryTensor.size(0), ANNK);
   tNow = chronoElapsedTime(startQuery);
   INTELLI_INFO("Query done in " + to_string(tNow / 1000) + "ms");
   uint64_t queryLatency = tNow;
   aknnIdx.endHPC();
   aknnIdx.isHPCStarted = false;
   std::string groundTruthPrefix = inMap->tryString("groundTruthPrefix", "onlineInsert_GroundTruth", true);
-
-  std::string probeName = groundTruthPrefix + "/" + std::to_string(indexResults.size() - 1) + ".rbt";
-  double recall = 0.0;
   int64_t groundTruthRedo = inMap->tryI64("groundTruthRedo", 1, true);
-
-  if (fileExists(probeName) && (groundTruthRedo == 0)) {
-    INTELLI_INFO("Ground truth exists, so I load it");
-    auto gdResults = UtilityFunctions::tensorListFromFile(groundTruthPrefix, indexResults.size());
-    INTELLI_INFO("Ground truth is loaded");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
-  } else {
-    INTELLI_INFO("Ground truth does not exist, so I'll create it");
-    auto gdMap = newConfigMap();
-    gdMap->loadFrom(*inMap);
-    gdMap->edit("faissIndexTag", "flat");
-    CANDY::IndexTable indexTable2;
-    auto gdIndex = indexTable2.getIndex("faiss");
-    gdIndex->setConfig(gdMap);
-    if (initialRows > 0) {
-      gdIndex->loadInitialTensor(dataTensorInitial);
-    }
-    gdIndex->insertTensor(dataTensorStream);
-
-    auto gdResults = gdIndex->searchTensor(queryTensor, ANNK);
-    INTELLI_INFO("Ground truth is done");
-    recall = UtilityFunctions::calculateRecall(gdResults, indexResults);
-    UtilityFunctions::tensorListToFile(gdResults, groundTruthPrefix);
-    //std::cout<<"index results"<<indexResults[0]<<std::endl;
-    //std::cout<<"ground truth results"<<gdResults[0]<<std::endl;
-  }
+  std::string groundTruthDataset = inMap->tryString("groundTruthDataset", dataLoaderTag, true);
+  std::string metricType = inMap->tryString("metricType", "IP", true);
+  /**
+   * @brief the ground truth is reused only if it was computed on exactly the same rows and queries
+   */
+  auto dataHash = INTELLI::GroundTruthStore::hashTensor(dataTensorInitial);
+  dataHash = INTELLI::GroundTruthStore::hashTensor(dataTensorStream, dataHash);
+  dataHash = INTELLI::GroundTruthStore::hashTensor(queryTensor, dataHash);
+  INTELLI::GroundTruthStore gdStore(groundTruthPrefix);
+  auto [gdIds, gdDistances] = gdStore.getOrCompute(groundTruthDataset, initialRows, aRows, ANNK, metricType,
+                                                   dataHash, [&]() {
+        auto gdMap = newConfigMap();
+        gdMap->loadFrom(*inMap);
+        gdMap->edit("faissIndexTag", "flat");
+        CANDY::IndexTable indexTable2;
+        auto gdIndex = indexTable2.getIndex("faiss");
+        gdIndex->setConfig(gdMap);
+        if (initialRows > 0) {
+          gdIndex->loadInitialTensor(dataTensorInitial);
+        }
+        gdIndex->insertTensor(dataTensorStream);
+        return gdIndex->searchWithDistances(queryTensor, ANNK);
+      }, groundTruthRedo != 0);
+  INTELLI_INFO("Ground truth is done");
+  double recall = UtilityFunctions::calculateRecallById(gdIds, indexIds, ANNK);
 
   double throughput = aRows * 1e6 / tDone;
   double throughputByElements = throughput * dataTensorStream.size(1);
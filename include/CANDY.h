@@ -34,7 +34,9 @@
 * @subsection subsec_tag_loader Of data loaders (Please go to class @ref DataLoaderTable for more details)
 * - random @ref RandomDataLoader
 * - fvecs @ref FVECSDataLoader
+* - mmapVecs @ref MMapVECSDataLoader, streaming *.fvecs, *.ivecs and *.bvecs from a memory mapping
 * - hdf5 @ref HDF5DataLoader
+* - hdf5Stream @ref HDF5StreamDataLoader, streaming ann-benchmarks style *.hdf5 by hyperslabs with the stored ground truth
 * - zipf @ref ZipfDataLoader
 * - expFamily @ref ExpFamilyDataLoader
 * - exp, the exponential distribution in  @ref ExpFamilyDataLoader
@@ -158,6 +160,7 @@
 #include <DataLoader/DataLoaderTable.h>
 #include <DataLoader/RandomDataLoader.h>
 #include <DataLoader/FVECSDataLoader.h>
+#include <DataLoader/MMapVECSDataLoader.h>
 //#include <include/hdf5_config.h>
 //#if CANDY_HDF5 == 1
 //#include <DataLoader/HDF5DataLoader.h>
@@ -190,6 +193,10 @@
 #endif
 #include <Utils/IntelliLog.h>
 #include <Utils/UtilityFunctions.h>
+#include <Utils/GroundTruthStore.h>
+#include <Utils/IncrementalGroundTruth.h>
+#include <Utils/AdaptiveWaiter.hpp>
+#include <Utils/VisitedBitmap.hpp>
 //#include <Utils/BS_thread_pool.hpp>
 #include <Utils/IntelliTensorOP.hpp>
 #include <Utils/IntelliTimeStampGenerator.h>
@@ -20,6 +20,25 @@ namespace CANDY {
  * @ingroup  CANDY_lib_bottom The main body and interfaces of library function
  * @{
  */
+/**
+ * @enum IndexThreadSafety
+ * @brief The declaration of which concurrent calls one index instance can take
+ * @note Different instances never share mutable state, so they can always run in parallel
+ */
+enum IndexThreadSafety : int64_t {
+  /**
+   * @brief all calls on one instance must be serialized
+   */
+  THREAD_UNSAFE = 0,
+  /**
+   * @brief concurrent search calls are safe, but insert/delete/revise need exclusive access
+   */
+  THREAD_SAFE_READ = 1,
+  /**
+   * @brief any mix of concurrent insert, delete and search calls is safe
+   */
+  THREAD_SAFE_FULL = 2,
+};
 /**
  * @class AbstractIndex CANDY/AbstractIndex.h
  * @brief The abstract class of an index approach
@@ -147,6 +166,16 @@ class AbstractIndex {
      * @return std::vector<faiss::idx_t> the index, follow faiss's order
      */
     virtual std::vector<faiss::idx_t> searchIndexParam(torch::Tensor q, int64_t k, int64_t param);
+  /**
+   * @brief search the k-NN of a query tensor, return their ids and distances without materializing the vectors
+   * @param q the query tensor, allow multiple rows
+   * @param k the returned neighbors
+   * @return std::tuple<torch::Tensor, torch::Tensor>, the (n x k) int64 ids and the (n x k) float32 distances
+   * @note Follows faiss's order and convention, i.e., squared L2 under METRIC_L2 and inner product under
+   * METRIC_INNER_PRODUCT, missing results have id -1
+   * @note The default falls back to @ref searchIndex and @ref getTensorByIndex, override it to skip the reconstruction
+   */
+  virtual std::tuple<torch::Tensor, torch::Tensor> searchWithDistances(torch::Tensor &q, int64_t k);
   /**
    * @brief return a vector of tensors according to some index
    * @param idx the index, follow faiss's style, allow the KNN index of multiple queries
@@ -273,6 +302,13 @@ class AbstractIndex {
   virtual bool loadInitialTensorAndQueryDistribution(torch::Tensor &t, torch::Tensor &query);
 
 
+  /**
+   * @brief declare which concurrent calls this index can take, see @ref IndexThreadSafety
+   * @note The python bindings release the GIL in long-running calls, so this is what a python thread pool should
+   * check before sharing one instance across threads
+   * @return the thread safety level, default THREAD_UNSAFE
+   */
+  virtual IndexThreadSafety getThreadSafety(void);
   /**
    * @brief to reset the internal statistics of this index
    * @return whether the reset is executed
@@ -283,6 +319,16 @@ class AbstractIndex {
    * @return the statistics results in ConfigMapPtr
    */
   virtual INTELLI::ConfigMapPtr getIndexStatistics(void);
+  /**
+   * @brief take an independent in-memory copy of this index in its current state, e.g., right after
+   * @ref loadInitialTensor, so that many stream runs can start from one initial build
+   * @note the copy shares no mutable state with this index, so both can be updated concurrently
+   * @note the copy keeps the config and frozen level, but its HPC features are not started, call @ref startHPC on
+   * it as on a fresh index if they are used
+   * @note do not call it while other threads are updating this index
+   * @return the copy, nullptr if this index does not support snapshots
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 };
 
 /**
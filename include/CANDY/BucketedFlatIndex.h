@@ -29,6 +29,8 @@ namespace CANDY {
  * - vecDim, the dimension of vectors, default 768, I64
  * - initialVolume, the initial volume of inline database tensor, default 1000, I64
  * - expandStep, the step of expanding inline database, default 100, I64
+ * - storageType, the type of rows stored in buckets, float32, float16, uint8 or int8, default float32, String,
+ * see @ref FlatIndex, buckets are still assigned on the float32 view of rows
  * - numberOfBuckets, the number of titer buckets, default 1, I64, suggest 2^n
  * - bucketMode, the mode of assigning buckets, default 'mean', String, allow the following with its own parameters
     * - 'mean': the bucket is assigned by uniform quantization of the mean, the quantization step is assigned by numberOfBuckets require following parameters
@@ -76,6 +78,21 @@ class BucketedFlatIndex : public AbstractIndex {
    * @return the result tensor
    */
   torch::Tensor searchSingleRow(torch::Tensor &q, uint64_t bkt, int64_t k);
+  /**
+   * @brief gather the rows of a bucket and of its neighbor buckets, until there are at least k of them or no bucket is left
+   * @param bkt the bucket number which fits best
+   * @param k the returned neighbors
+   * @return the gathered rows
+   */
+  torch::Tensor expandCandidates(uint64_t bkt, int64_t k);
+  /**
+   * @brief search the k-NN of queries which fall into the same bucket, in one batch
+   * @param q the queries, allow multiple rows
+   * @param bkt the bucket number which fits best
+   * @param k the returned neighbors
+   * @return std::vector<torch::Tensor> the result tensor for each row of query
+   */
+  std::vector<torch::Tensor> searchBucketGroup(torch::Tensor &q, uint64_t bkt, int64_t k);
  public:
   BucketedFlatIndex() {
 
@@ -126,6 +143,14 @@ class BucketedFlatIndex : public AbstractIndex {
    * @return std::vector<torch::Tensor> the result tensor for each row of query
    */
   virtual std::vector<torch::Tensor> searchTensor(torch::Tensor &q, int64_t k);
+  /**
+   * @brief declare which concurrent calls this index can take
+   * @note search only reads the buckets, so concurrent searches are safe
+   * @return THREAD_SAFE_READ
+   */
+  virtual IndexThreadSafety getThreadSafety(void) {
+    return THREAD_SAFE_READ;
+  }
   /**
   * @brief load the initial tensors of a data base, use this BEFORE @ref insertTensor
   * @note This is majorly an offline function, and may be different from @ref insertTensor for some indexes
@@ -5,7 +5,10 @@
 #include <memory>
 #include <vector>
 #include <tuple>
+#include <string>
+#include <shared_mutex>
 #include <Utils/IntelliTensorOP.hpp>
+#include <Utils/BS_thread_pool.hpp>
 #include <CANDY/AbstractIndex.h>
 #include <CANDY/IndexTable.h>
 
@@ -16,16 +19,74 @@ using SearchResults = std::vector<torch::Tensor>;
 using SearchRecord = std::tuple<BatchIndex, QueryIndex, SearchResults>;
 
 namespace CANDY {
-
+/**
+ * @class LatencyHistogram CANDY/ConcurrentIndex.h
+ * @brief A log2-bucketed latency histogram, bucket i counts latencies in [2^i, 2^(i+1)) ns
+ * @note not thread-safe, keep one per thread and @ref merge them
+ */
+class LatencyHistogram {
+ public:
+  static constexpr size_t buckets = 48;
+  std::vector<int64_t> counts = std::vector<int64_t>(buckets, 0);
+  int64_t total = 0;
+  int64_t maxNs = 0;
+  LatencyHistogram() = default;
+  ~LatencyHistogram() = default;
+  /**
+   * @brief record one latency
+   * @param ns the latency in nanoseconds
+   */
+  void add(int64_t ns);
+  /**
+   * @brief add the counts of another histogram
+   */
+  void merge(const LatencyHistogram &other);
+  /**
+   * @brief the upper bound of the bucket holding the p-th quantile, 0 if empty
+   * @param p the quantile in [0,1]
+   */
+  int64_t quantileNs(double p) const;
+  /**
+   * @brief write count, p50/p95/p99/max and the comma-separated bucket counts into cfg
+   * @param cfg the config to edit
+   * @param prefix the prefix of keys, e.g., ccInsertLatency
+   */
+  void report(INTELLI::ConfigMapPtr cfg, const std::string &prefix) const;
+  void clear();
+};
+/**
+ * @class ConcurrentIndex CANDY/ConcurrentIndex.h
+ * @brief A container index to evaluate concurrent inserts and searches on another index
+ * @note the readers and writers run on a persistent thread pool created in @ref setConfig,
+ * each batch submits one task per reader and per writer and waits for them
+ * @note the latency of every insert and search is recorded, see @ref getIndexStatistics
+ * @note the evaluated index is guarded by its @ref IndexThreadSafety, writers hold an exclusive lock unless it is
+ * THREAD_SAFE_FULL, readers hold a shared lock if it is THREAD_SAFE_READ and an exclusive one if it is THREAD_UNSAFE,
+ * the measured latency includes waiting for the lock
+ * @note special parameters
+ * - concurrentAlgoTag the algo tag of the evaluated index, String, default flat
+ * - vecDim the dimension of vectors, I64, default 128
+ * - concurrentWriteRatio the fraction of writes in all operations of a batch, in (0,1], Double, default 0.5
+ * - concurrentBatchSize the inserted rows per batch, I64, default 100
+ * - concurrentNumThreads the default of reader and writer threads, I64, default 1
+ * - concurrentWriteThreads the writer threads, I64, default concurrentNumThreads
+ * - concurrentReadThreads the reader threads, I64, default concurrentNumThreads
+ */
 class ConcurrentIndex : public CANDY::AbstractIndex {
  protected:
   AbstractIndexPtr myIndexAlgo = nullptr;
   std::string myConfigString = "";
 
   int64_t vecDim = 0;
-  double writeRatio = 0.0;
+  double writeRatio = 0.5;
   int64_t numThreads = 1;
-  int64_t batchSize = 0;
+  int64_t writeThreads = 1;
+  int64_t readThreads = 1;
+  int64_t batchSize = 100;
+  std::shared_ptr<BS::thread_pool> pool = nullptr;
+  std::shared_mutex indexMutex;
+  IndexThreadSafety threadSafety = THREAD_UNSAFE;
+  LatencyHistogram insertLatency, searchLatency;
 
  public:
   ConcurrentIndex() {
@@ -45,6 +106,21 @@ class ConcurrentIndex : public CANDY::AbstractIndex {
   virtual std::vector<SearchRecord> ccInsertAndSearchTensor(torch::Tensor &t, torch::Tensor &qt, int64_t k);
 
   virtual std::vector<torch::Tensor> searchTensor(torch::Tensor &q, int64_t k);
+
+  virtual IndexThreadSafety getThreadSafety(void);
+  /**
+   * @brief clear the latency histograms
+   * @return true
+   */
+  virtual bool resetIndexStatistics(void);
+  /**
+   * @brief get the latency histograms of @ref ccInsertAndSearchTensor
+   * @note keys are ccInsertLatency* and ccSearchLatency*, with suffixes Count, P50Ns, P95Ns, P99Ns, MaxNs and
+   * Histogram, the later is the comma-separated counts of the log2 buckets, see @ref LatencyHistogram
+   * @note ccThreadSafety is the @ref IndexThreadSafety that guarded the last run
+   * @return the statistics results in ConfigMapPtr
+   */
+  virtual INTELLI::ConfigMapPtr getIndexStatistics(void);
 };
 
 typedef std::shared_ptr<class CANDY::ConcurrentIndex> ConcurrentIndexPtr;
@@ -34,6 +34,8 @@ namespace CANDY {
  *  - congestionDrop, whether or not drop the data when congestion occurs, I64, default 1
  *  - sharedBuild whether let all sharding using shared build, 1, I64
  *  - singleWorkerOpt whether optimize the searching under single worker, 1 I64
+ *  - waitSpinIterations, waitYieldIterations, waitParkMicroseconds, how workers wait for input and how
+ *  the reduce step waits for worker results, see @ref INTELLI::AdaptiveWaiter
  * @warnning
  * Make sure you are using 2D tensors!
  */
@@ -45,6 +47,7 @@ class CongestionDropIndex : public CANDY::AbstractIndex {
   int64_t fineGrainedParallelInsert;
   int64_t sharedBuild;
   int64_t singleWorkerOpt;
+  INTELLI::ConfigMapPtr myCfg = nullptr;
   void insertTensorInline(torch::Tensor &t);
   void partitionBuildInLine(torch::Tensor &t);
   void partitionLoadInLine(torch::Tensor &t);
@@ -53,6 +56,7 @@ class CongestionDropIndex : public CANDY::AbstractIndex {
  public:
   std::vector<TensorListIdxQueuePtr> reduceQueue;
   std::vector<TensorStrVecQueuePtr> reduceStrQueue;
+  INTELLI::AdaptiveWaiterPtr reduceWaiter;
   CongestionDropIndex() {
 
   }
@@ -77,6 +81,12 @@ class CongestionDropIndex : public CANDY::AbstractIndex {
    * @return bool whether the configuration is successful
    */
   virtual bool setConfig(INTELLI::ConfigMapPtr cfg);
+  /**
+   * @brief copy the index of each worker into a new @ref CongestionDropIndex with the same config
+   * @note waits for the pending operations of all workers, the workers of the copy are not started
+   * @return the copy, nullptr if the index of any worker does not support snapshots
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 
   /**
    * @brief insert a tensor
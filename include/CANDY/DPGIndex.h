@@ -7,10 +7,12 @@
 #define CANDY_INCLUDE_CANDY_DPGINDEX_H_
 
 #include <CANDY/AbstractIndex.h>
+#include <Utils/BS_thread_pool.hpp>
+#include <faiss/utils/distances.h>
 
 #include <functional>
+#include <mutex>
 #include <random>
-#include <unordered_set>
 
 namespace CANDY {
 
@@ -25,9 +27,19 @@ namespace CANDY {
  * the most directional diversity of edges in the original graph, and expand the
  * unidirectional edges into bidirectional edges. The offline construction of
  * the basic graph still uses the NNDescent algorithm in this implementation.
+ * @note rows are kept in one row-major float arena and the neighbors in
+ * fixed-degree flat arrays, distances are computed by the SIMD kernels of
+ * faiss on raw pointers, and searches mark visited nodes in a per-thread
+ * reusable bitmap
  * @note special parameters
  *  - parallelWorkers The number of paraller workers, I64, default 1 (set this
- * to less than 0 will use max hardware_concurrency);
+ * to less than 0 will use max hardware_concurrency), they are kept in one
+ * thread pool for the lifetime of the index;
+ *  - insertBatchSize, the rows inserted as one batch, larger batches search
+ * more rows in parallel but compare every two rows of a batch, default 256, I64
+ *  - consolidateRatio, a @ref deleteTensor triggers @ref consolidateDeletes
+ * once the deleted rows exceed this fraction of all rows, set <=0 to only
+ * consolidate manually, default 0.2, F64
  *  - vecDim, the dimension of vectors, default 768, I64
  *  - graphK, the neighbors of every node in internal data struct, default 20,
  * I64
@@ -44,74 +56,121 @@ class DPGIndex : public CANDY::AbstractIndex {
  protected:
   struct Neighbor {
     size_t id;
-    double distance;
+    float distance;
     bool flag;
-    size_t counter;
 
     Neighbor() = default;
-    Neighbor(size_t id, double distance, bool f)
-        : id(id), distance(distance), flag(f), counter(0) {}
+    Neighbor(size_t id, float distance, bool f)
+        : id(id), distance(distance), flag(f) {}
 
     inline bool operator<(const Neighbor &other) const {
       return distance < other.distance;
     }
   };
 
-  struct NhoodLayer0 {
-    std::mutex poolLock;
-    std::vector<Neighbor> pool;  // candidate pool (a max heap)
-    std::unordered_set<size_t> neighborIdxSet;
-
-    std::unordered_set<size_t> nnOld;  // old neighbors
-    std::unordered_set<size_t> nnNew;  // new neighbors
-    std::mutex rnnOldLock;
-    std::unordered_set<size_t> rnnOld;  // reverse old neighbors
-    std::mutex rnnNewLock;
-    std::unordered_set<size_t> rnnNew;  // reverse new neighbors
-
-    NhoodLayer0() = default;
-    NhoodLayer0(const NhoodLayer0 &other)
-        : pool(other.pool),
-          neighborIdxSet(other.neighborIdxSet),
-          nnOld(other.nnOld),
-          nnNew(other.nnNew),
-          rnnOld(other.rnnOld),
-          rnnNew(other.rnnNew) {}
-  };
-
-  struct NhoodLayer1 {
-    std::mutex neighborLock, reverseNeighborLock;
-    std::unordered_set<size_t> neighborIdxSet, reverseNeighborIdxSet;
-
-    NhoodLayer1() = default;
-    NhoodLayer1(const NhoodLayer1 &other)
-        : neighborIdxSet(other.neighborIdxSet),
-          reverseNeighborIdxSet(other.reverseNeighborIdxSet) {}
+  /**
+   * @brief the per-node sets of one NNDescent round, only alive during @ref nnDescent
+   */
+  struct DescentScratch {
+    std::vector<size_t> nnOld;   // old neighbors
+    std::vector<size_t> nnNew;   // new neighbors
+    std::vector<size_t> rnnOld;  // reverse old neighbors
+    std::vector<size_t> rnnNew;  // reverse new neighbors
   };
+  /**
+   * @brief the number of striped locks guarding the per-node adjacency
+   */
+  static constexpr size_t lockStripes = 1024;
 
   void nnDescent();
   void randomSample(std::mt19937 &rng, std::vector<size_t> &vec, size_t n,
                     size_t sampledCount);
-  bool updateLayer0Neighbor(size_t i, size_t j, double dist);
+  bool updateLayer0Neighbor(size_t i, size_t j, float dist);
   void addLayer1Neighbor(size_t i, size_t j);
   void removeLayer1Neighbor(size_t i, size_t j);
-  double calcDist(const torch::Tensor &ta, const torch::Tensor &tb);
-  torch::Tensor searchOnce(torch::Tensor q, int64_t k);
-  std::vector<faiss::idx_t> searchOnceIndex(torch::Tensor q, int64_t k);
-  std::vector<std::pair<double, size_t>> searchOnceInner(torch::Tensor q,
-                                                         int64_t k);
-  bool insertOnce(vector<std::pair<double, size_t>> &neighbors,
-                  torch::Tensor t);
-  bool deleteOnce(torch::Tensor t, int64_t k);
+  /**
+   * @brief the distance of two rows of vecDim floats, inner products are
+   * negated so that smaller is always nearer
+   */
+  inline float calcDist(const float *a, const float *b) const {
+    if (faissMetric == faiss::METRIC_L2) {
+      return faiss::fvec_L2sqr(a, b, vecDim);
+    }
+    return -faiss::fvec_inner_product(a, b, vecDim);
+  }
+  inline const float *vecAt(size_t i) const {
+    return vectors.data() + i * vecDim;
+  }
+  inline size_t rowCount() const { return deleted.size(); }
+  inline Neighbor *poolAt(size_t i) { return pool.data() + i * graphK; }
+  inline size_t *layer1At(size_t i) {
+    return layer1.data() + i * (graphK >> 1);
+  }
+  /**
+   * @brief append one row to the arena with empty adjacency
+   * @return the id of the row
+   */
+  size_t appendRow(const float *x);
+  torch::Tensor searchOnce(const float *q, int64_t k);
+  std::vector<faiss::idx_t> searchOnceIndex(const float *q, int64_t k);
+  std::vector<std::pair<float, size_t>> searchOnceInner(const float *q,
+                                                        int64_t k);
+  /**
+   * @brief insert n rows in one batch, the candidates of all rows are first
+   * searched in parallel against the graph before the batch (a snapshot) and
+   * among the batch itself, then merged into the graph
+   * @param x the n rows, row-major
+   * @param n the number of rows
+   */
+  void insertBatch(const float *x, size_t n);
+  /**
+   * @brief run action(i) for i in [0,idxSize) on @ref workerPool, blocks
+   * until all are done
+   * @note do not call it from inside an action, the pool would wait for itself
+   */
   void parallelFor(size_t idxSize, std::function<void(size_t)> action);
   void buildLayer1(size_t i);
+  /**
+   * @brief the bytes held by the arena and the adjacency, including unused
+   * capacity
+   */
+  size_t memoryBytes() const;
 
-  int64_t graphK, parallelWorkers, vecDim, frozenLevel;
+  int64_t graphK, parallelWorkers, vecDim, frozenLevel, insertBatchSize;
   double rho, delta;
-  std::vector<NhoodLayer0> graphLayer0;
-  std::vector<NhoodLayer1> graphLayer1;
-  std::vector<torch::Tensor> tensor;
-  std::unordered_set<size_t> deletedIdxSet;
+  /**
+   * @brief the long-lived workers of @ref parallelFor, created in @ref setConfig
+   */
+  std::shared_ptr<BS::thread_pool> workerPool = nullptr;
+  /**
+   * @brief the row-major arena of all rows, the id of a row is its position
+   */
+  std::vector<float> vectors;
+  /**
+   * @brief layer 0, graphK slots per node, the first poolSize[i] slots of
+   * node i form a max heap
+   */
+  std::vector<Neighbor> pool;
+  std::vector<uint32_t> poolSize;
+  /**
+   * @brief layer 1, (graphK>>1) slots per node of forward neighbors, and the
+   * unbounded reverse neighbors
+   */
+  std::vector<size_t> layer1;
+  std::vector<uint32_t> layer1Size;
+  std::vector<std::vector<size_t>> reverseLayer1;
+  std::vector<std::mutex> poolLocks = std::vector<std::mutex>(lockStripes);
+  std::vector<std::mutex> layer1Locks = std::vector<std::mutex>(lockStripes);
+  std::vector<std::mutex> reverseLayer1Locks =
+      std::vector<std::mutex>(lockStripes);
+  /**
+   * @brief one deleted flag per row
+   */
+  std::vector<uint8_t> deleted;
+  size_t deletedCount = 0;
+  double consolidateRatio = 0.2;
+  int64_t consolidations = 0, consolidatedRows = 0, reclaimedBytes = 0,
+          consolidateUs = 0;
 
  public:
   DPGIndex() = default;
@@ -192,6 +251,45 @@ class DPGIndex : public CANDY::AbstractIndex {
    */
     virtual std::vector<faiss::idx_t> searchIndex(torch::Tensor q, int64_t k);
 
+  /**
+   * @brief search the k-NN of a query tensor, return their ids and distances
+   * @param q the tensor, allow multiple rows
+   * @param k the returned neighbors
+   * @return the (n x k) int64 ids and the (n x k) float32 distances, sorted
+   * from the nearest
+   */
+  virtual std::tuple<torch::Tensor, torch::Tensor> searchWithDistances(
+      torch::Tensor &q, int64_t k);
+
+  /**
+   * @brief remove the deleted rows, like consolidate_delete of FreshDiskANN
+   * @note an alive row that has deleted rows in its layer 0 takes the alive
+   * layer 0 neighbors of those deleted rows as new candidates and keeps the
+   * nearest graphK, then the arena and the adjacency are compacted and layer 1
+   * is rebuilt
+   * @note the ids of rows become their ranks among the alive rows, i.e., the
+   * offsets used by @ref getTensorByIndex and @ref rawData
+   * @return the bytes reclaimed
+   */
+  virtual int64_t consolidateDeletes();
+  /**
+   * @brief clear the consolidation statistics
+   * @return true
+   */
+  virtual bool resetIndexStatistics(void);
+  /**
+   * @brief get the consolidation statistics
+   * @note keys are deletedRows (the current tombstones), consolidations,
+   * consolidatedRows, reclaimedBytes and consolidateUs
+   * @return the statistics results in ConfigMapPtr
+   */
+  virtual INTELLI::ConfigMapPtr getIndexStatistics(void);
+  /**
+   * @brief copy the rows and the graph into a new @ref DPGIndex with its own locks and worker pool
+   * @return the copy
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
+
   /**
    * @brief some extra set-ups if the index has HPC fetures
    * @return bool whether the HPC set-up is successful
@@ -53,9 +53,27 @@ class FaissIndex : public AbstractIndex {
   torch::Tensor dbTensor;
   int64_t lastNNZ;
   int64_t expandStep;
+  /**
+   * @brief the search behind @ref searchIndex and @ref searchIndexParam
+   * @param params the faiss search parameters of this call only, nullptr for those kept by the index
+   */
+  std::vector<faiss::idx_t> searchIndexWithParams(torch::Tensor q, int64_t k, const faiss::SearchParameters *params);
+  /**
+   * @brief the copy made by @ref snapshot, taking the ownership of copied, a clone of the index of src
+   */
+  FaissIndex(const FaissIndex &src, faiss::Index *copied);
  public:
 
   FaissIndex() = default;
+  /**
+   * @brief the index is owned, so copies are only made by @ref snapshot
+   */
+  FaissIndex(const FaissIndex &) = delete;
+  FaissIndex &operator=(const FaissIndex &) = delete;
+
+  ~FaissIndex() {
+    delete index;
+  }
 
   /**
    * @brief set the index-specific config related to one index
@@ -83,6 +101,13 @@ class FaissIndex : public AbstractIndex {
    * @return std::vector<faiss::idx_t> the index, follow faiss's order
    */
   virtual std::vector<faiss::idx_t> searchIndex(torch::Tensor q, int64_t k);
+  /**
+   * @brief search the k-NN of a query tensor, return their ids and distances
+   * @param q the tensor, allow multiple rows
+   * @param k the returned neighbors
+   * @return the (n x k) int64 ids and the (n x k) float32 distances, as given by the encapsulated faiss index
+   */
+  virtual std::tuple<torch::Tensor, torch::Tensor> searchWithDistances(torch::Tensor &q, int64_t k);
   /**
    * @brief search the k-NN of a query tensor, return the result tensors
    * @param t the tensor, allow multiple rows
@@ -90,6 +115,15 @@ class FaissIndex : public AbstractIndex {
    * @return std::vector<torch::Tensor> the result tensor for each row of query
    */
   virtual std::vector<torch::Tensor> searchTensor(torch::Tensor &q, int64_t k);
+  /**
+   * @brief declare which concurrent calls this index can take
+   * @note faiss search is const, and @ref searchIndexParam passes its efSearch to each search rather than editing
+   * the index, so concurrent searches are safe while nothing is written
+   * @return THREAD_SAFE_READ
+   */
+  virtual IndexThreadSafety getThreadSafety(void) {
+    return THREAD_SAFE_READ;
+  }
   /**
    * @brief return a vector of tensors according to some index
    * @param idx the index, follow faiss's style, allow the KNN index of multiple queries
@@ -99,12 +133,18 @@ class FaissIndex : public AbstractIndex {
   virtual std::vector<torch::Tensor> getTensorByIndex(std::vector<faiss::idx_t> &idx, int64_t k);
 
     /**
-     * @brief search the k-NN of a query tensor, return their index
-     * @param t the tensor, allow multiple rows
+     * @brief search the k-NN of a query tensor with the efSearch of HNSW and MNRU given per call
+     * @param q the tensor, allow multiple rows
      * @param k the returned neighbors
+     * @param param the efSearch of this search only, ignored by other index types
      * @return std::vector<faiss::idx_t> the index, follow faiss's order
      */
     virtual std::vector<faiss::idx_t> searchIndexParam(torch::Tensor q, int64_t k, int64_t param);
+  /**
+   * @brief copy this index by faiss::clone_index
+   * @return the copy, nullptr if faiss can not clone this type of index
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 };
 
 /**
@@ -22,18 +22,43 @@ namespace CANDY {
 /**
  * @class FlatIndex CANDY/FlatIndex.h
  * @brief The class of a flat index approach, using brutal force management
- * @note currently single thread
+ * @note currently single thread for writes, searches only read the inline database and can run concurrently
+ * @note searches scan the inline database tensor in place with faiss' blocked kernels (BLAS for batches,
+ * SIMD otherwise), no faiss index is built or copied per call; the squared norms of rows are kept
+ * incrementally for the L2 kernel
+ * @note rows can be kept in a compact type by storageType, and are then scanned by INTELLI::NativeDistance
+ * without widening the database, @ref rawData and the searched rows are still returned as float32
  * @note config parameters
  * - vecDim, the dimension of vectors, default 768, I64
  * - initialVolume, the initial volume of inline database tensor, default 1000, I64
  * - expandStep, the step of expanding inline database, default 100, I64
+ * - storageType, the type of stored rows, float32, float16, uint8 or int8, default float32, String
+ *  - inserted rows are cast to this type, so for uint8 and int8 they must already be in its value range,
+ *  e.g., BIGANN or SpaceV rows, and queries of the same integer type are compared exactly in integers
  */
 class FlatIndex : public AbstractIndex {
  protected:
   INTELLI::ConfigMapPtr myCfg = nullptr;
   torch::Tensor dbTensor;
+  /**
+   * @brief the squared L2 norm of each row in dbTensor, same capacity as dbTensor
+   */
+  torch::Tensor dbNorms;
   int64_t lastNNZ = 0;
   int64_t vecDim = 0, initialVolume = 1000, expandStep = 100;
+  torch::ScalarType storageType = torch::kFloat32;
+  /**
+   * @brief refresh dbNorms over rows [startRow, endRow), growing it if dbTensor has grown
+   */
+  void updateNorms(int64_t startRow, int64_t endRow);
+  /**
+   * @brief search the k-NN of q over the valid rows of dbTensor, without copying dbTensor
+   * @param q the query tensor, must be contiguous
+   * @param k the returned neighbors
+   * @param distances the output of q.size(0)*k distances
+   * @param idx the output of q.size(0)*k ids
+   */
+  void searchInPlace(torch::Tensor &q, int64_t k, float *distances, int64_t *idx);
  public:
   FlatIndex() {
 
@@ -83,6 +108,13 @@ class FlatIndex : public AbstractIndex {
    * @return std::vector<faiss::idx_t> the index, follow faiss's order
    */
   virtual std::vector<faiss::idx_t> searchIndex(torch::Tensor q, int64_t k);
+  /**
+   * @brief search the k-NN of a query tensor, return their ids and distances
+   * @param q the tensor, allow multiple rows
+   * @param k the returned neighbors
+   * @return the (n x k) int64 ids and the (n x k) float32 distances, written by faiss in place
+   */
+  virtual std::tuple<torch::Tensor, torch::Tensor> searchWithDistances(torch::Tensor &q, int64_t k);
   /**
    * @brief search the k-NN of a query tensor, return the result tensors
    * @param t the tensor, allow multiple rows
@@ -90,6 +122,14 @@ class FlatIndex : public AbstractIndex {
    * @return std::vector<torch::Tensor> the result tensor for each row of query
    */
   virtual std::vector<torch::Tensor> searchTensor(torch::Tensor &q, int64_t k);
+  /**
+   * @brief declare which concurrent calls this index can take
+   * @note search only reads the database tensor, so concurrent searches are safe
+   * @return THREAD_SAFE_READ
+   */
+  virtual IndexThreadSafety getThreadSafety(void) {
+    return THREAD_SAFE_READ;
+  }
   /**
    * @brief return a vector of tensors according to some index
    * @param idx the index, follow faiss's style, allow the KNN index of multiple queries
@@ -109,6 +149,17 @@ class FlatIndex : public AbstractIndex {
   virtual int64_t size() {
     return lastNNZ + 1;
   }
+  /**
+   * @brief the type of stored rows
+   */
+  torch::ScalarType getStorageType() {
+    return storageType;
+  }
+  /**
+   * @brief copy the stored rows into a new @ref FlatIndex
+   * @return the copy, nullptr for subclasses which do not override it
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 };
 
 /**
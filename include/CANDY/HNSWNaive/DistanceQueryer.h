@@ -25,6 +25,7 @@ public:
   faiss::MetricType faissMetric = faiss::METRIC_L2;
   size_t d_;
   torch::Tensor query_;
+  std::vector<float> queryBuf_;
 
   float *data_;
 
@@ -45,54 +46,46 @@ public:
         };
   DistanceQueryer() = default;
   /**
-   * @brief compute the distance between given idx's vector and query vector
-   * @param idx the target vector to be computed with query vector
-   * @return L2 Distance
+   * @brief compute the distance between a raw vector and query vector
+   * @param x the target vector of d_ floats, e.g., a row in the vector arena of @ref HNSW
+   * @return L2 Distance, or negative IP
    */
-  float operator()(INTELLI::TensorPtr idx) {
+  float operator()(const float *x) {
       // we always build using vanilla
     if (opt_mode_ == OPT_VANILLA || !is_search || (opt_mode_ == OPT_DCO && !is_rank)) {
-      auto idx_data = (*idx).contiguous().data_ptr<float>();
       if (faissMetric == faiss::METRIC_L2) {
-        return fvec_L2(data_, idx_data, d_);
+        return fvec_L2(data_, x, d_);
       } else {
-        return -fvec_IP(data_, idx_data, d_);
+        return -fvec_IP(data_, x, d_);
       }
     }
     if (opt_mode_ == OPT_LVQ) {
-      auto idx_data = (*idx).contiguous().data_ptr<float>();
       int8_t* first_codes_idx = new int8_t[d_];
       int8_t* first_codes_query = code_;
-      //float delta_idx = lvq_first_level(idx_data, d_, first_codes_idx);
-      //float delta_query = delta_query_;
-      lvq_first_level(idx_data, d_, first_codes_idx);
-
-      // during ranking, need to compute residual codes (second-level lvq)
-      if(is_rank){
-//          int8_t* second_codes_idx = new int8_t[d_];
-//          int8_t* second_codes_query = new int8_t[d_];
-//          lvq_second_level(idx_data, d_, second_codes_idx, delta_idx);
-//          lvq_second_level(data_, d_, second_codes_query, delta_query);
-//          for(size_t i=0; i<d_; i++){
-//              first_codes_idx[i]+=second_codes_idx[i];
-//              first_codes_query[i] += second_codes_query[i];
-//          }
-//          free(second_codes_idx);
-//          free(second_codes_query);
-      }
+      lvq_first_level(x, d_, first_codes_idx);
+      float dist;
       if (faissMetric == faiss::METRIC_L2) {
-          auto dist =  int8vec_L2(first_codes_idx, first_codes_query, d_);
-          free(first_codes_idx);
-          //free(first_codes_query);
-          return dist;
+          dist = int8vec_L2(first_codes_idx, first_codes_query, d_);
       } else {
-        auto dist = int8vec_IP(first_codes_idx, first_codes_query, d_);
-        free(first_codes_idx);
-        //free(first_codes_query);
-        return -dist;
+          dist = -int8vec_IP(first_codes_idx, first_codes_query, d_);
       }
+      delete[] first_codes_idx;
+      return dist;
+    }
+    if (opt_mode_ == OPT_DCO && is_rank) {
+      auto xt = torch::from_blob(const_cast<float *>(x), {1, (int64_t) d_});
+      return (*this)(std::make_shared<torch::Tensor>(xt));
     }
-    if(opt_mode_ == OPT_DCO && is_rank){
+    return 0;
+  }
+  /**
+   * @brief compute the distance between given idx's vector and query vector
+   * @param idx the target vector to be computed with query vector
+   * @return L2 Distance
+   * @note only the ranking of ADSampling needs a tensor, other cases go to the raw pointer version
+   */
+  float operator()(INTELLI::TensorPtr idx) {
+    if(opt_mode_ == OPT_DCO && is_search && is_rank){
         if(faissMetric == faiss::METRIC_L2){
             //assert(ads);
             //std::cout<< "this query"<<transformed;
@@ -102,8 +95,10 @@ public:
         } else {
             printf("ADSAMPLING DOES NOT SUPPORT INNER PRODUCT!\n");
         }
+        return 0;
     }
-    return 0;
+    auto idxC = (*idx).contiguous();
+    return (*this)(idxC.data_ptr<float>());
   }
 
   float operator()(const int8_t* code){
@@ -219,19 +214,34 @@ public:
   }
 
   void set_query(torch::Tensor &x) {
-    query_ = x;
-    data_ = (query_).contiguous().data_ptr<float>();
+    query_ = x.contiguous();
+    data_ = query_.data_ptr<float>();
+    if(opt_mode_ == OPT_LVQ){
+        if(code_!=nullptr){
+            delete[] code_;
+        }
+        code_ = new int8_t[d_];
+        delta_query_ = lvq_first_level(data_, d_, code_);
+    }
+  }
+
+  /**
+   * @brief set the query by copying a raw vector, which may live in a buffer that grows later
+   * @param x the query vector of d_ floats
+   */
+  void set_query(const float *x) {
+    queryBuf_.assign(x, x + d_);
+    data_ = queryBuf_.data();
     if(opt_mode_ == OPT_LVQ){
         if(code_!=nullptr){
-            free(code_);
+            delete[] code_;
         }
         code_ = new int8_t[d_];
         delta_query_ = lvq_first_level(data_, d_, code_);
     }
   }
 
-  int8_t* compute_code(INTELLI::TensorPtr idx){
-      auto data = (*idx).contiguous().data_ptr<float>();
+  int8_t* compute_code(const float *data){
       int8_t* codes = new int8_t[d_];
       lvq_first_level(data, d_, codes);
       return codes;
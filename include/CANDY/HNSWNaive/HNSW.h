@@ -9,6 +9,7 @@
 #include <faiss/MetricType.h>
 #include <faiss/utils/Heap.h>
 #include <faiss/utils/random.h>
+#include <algorithm>
 #include <queue>
 #include <string>
 #include <vector>
@@ -18,13 +19,13 @@ typedef std::vector<INTELLI::TensorPtr> TensorVec;
 namespace CANDY {
 /**
  * @class HNSWVertex CANDY/HNSWNaiveIndex/HNSW.h
- * @brief The class of a HNSW vertex, storing the data in each vertex
- * @note now storing each vertex's neighbors, visited number and level, with a
- * pointer to the vector
+ * @brief The class of a HNSW vertex, storing the links of each vertex
+ * @note now storing each vertex's neighbors and level, with a dense id; the
+ * vector itself lives in the arena of @ref HNSW at row vid
  */
 class HNSWVertex {
 public:
-  INTELLI::TensorPtr id;
+  /// dense id, also the row of this vertex in the vector arena
   faiss::idx_t vid;
   /// used for LVQ
   int8_t* code_final_ = nullptr;
@@ -32,54 +33,44 @@ public:
   INTELLI::TensorPtr transformed = nullptr;
   int level;
   std::vector<std::shared_ptr<HNSWVertex>> neighbors;
-  uint8_t visno;
-  HNSWVertex(INTELLI::TensorPtr id, int level, int num_neighbors)
-      : level(level) {
-    this->id = std::move(id);
-    visno = 0;
+  HNSWVertex(faiss::idx_t vid, int level, int num_neighbors)
+      : vid(vid), level(level) {
     neighbors =
         std::vector<std::shared_ptr<HNSWVertex>>(num_neighbors, nullptr);
   }
 };
 
 typedef std::shared_ptr<HNSWVertex> VertexPtr;
-/// Table to store visited iteration number during search and insert; Now only
-/// update the number and store nothing
+/**
+ * @class VisitedTable CANDY/HNSWNaiveIndex/HNSW.h
+ * @brief Epoch-stamped visited marks indexed by the dense vertex id, used in search and insert
+ * @note a vertex is visited iff its stamp equals the current epoch, so @ref advance clears all marks in O(1);
+ * the stamps are only reset when the epoch wraps around
+ * @note the table grows on demand, so one table can be kept across inserts
+ */
 class VisitedTable {
 public:
-  /// For Tensor t, use visited[TensorPtr] to define if its visited;
-  std::unordered_map<INTELLI::TensorPtr, uint8_t> visited_;
-  int visno;
+  std::vector<uint16_t> visited_;
+  uint16_t visno;
   VisitedTable() : visno(1){};
-  void set(VertexPtr idx) {
-    idx->visno = visno;
-    return;
-  }
-  bool get(VertexPtr idx) { return idx->visno == visno; }
-
-  void set(INTELLI::TensorPtr idx) {
-    for (auto it = visited_.begin(); it != visited_.end(); it++) {
-      if (torch::equal(*(it->first), *idx)) {
-        it->second = visno;
-        return;
-      }
+  explicit VisitedTable(size_t n) : visited_(n, 0), visno(1){};
+  void set(faiss::idx_t vid) {
+    if ((size_t) vid >= visited_.size()) {
+      visited_.resize(std::max((size_t) vid + 1, visited_.size() * 2), 0);
     }
-    visited_[idx] = visno;
-  };
-  bool get(INTELLI::TensorPtr idx) {
-    for (auto it = visited_.begin(); it != visited_.end(); it++) {
-      if (torch::equal(*(it->first), *idx)) {
-        return it->second == visno;
-      }
-    }
-    return false;
-  };
+    visited_[vid] = visno;
+  }
+  bool get(faiss::idx_t vid) const {
+    return (size_t) vid < visited_.size() && visited_[vid] == visno;
+  }
+  void set(const VertexPtr &idx) { set(idx->vid); }
+  bool get(const VertexPtr &idx) const { return get(idx->vid); }
   void advance() {
-    if (visno > 250) {
-      visno = 0;
-      return;
-    }
     visno++;
+    if (visno == 0) {
+      std::fill(visited_.begin(), visited_.end(), 0);
+      visno = 1;
+    }
   }
 };
 
@@ -88,14 +79,14 @@ public:
  * @class HNSW CANDY/HNSWNaiveIndex/HNSW.h
  * @brief The class of a HNSW structure, maintaining parameters and a vertex
  * entry point
- * @note now each vertex storing each vertex's neighbors, visited number and
- * level, with a pointer to the vector;
- * @note The HNSW structure does not store actual data of the graph except the
- * entry point
+ * @note now each vertex storing each vertex's neighbors and level, with a
+ * dense id;
+ * @note vectors are kept in one contiguous float arena, row vid of which is the
+ * vector of vertex vid, so a distance evaluation is a pointer offset
  */
 class HNSW {
 public:
-  typedef std::pair<float, INTELLI::TensorPtr> Node;
+  typedef std::pair<float, VertexPtr> Node;
   /// sort pairs from nearest to farthest by distance
   struct NodeDistCloser {
     float dist;
@@ -197,6 +188,10 @@ public:
   faiss::RandomGenerator rng;
   /// entry point on the top level
   VertexPtr entry_point_ = nullptr;
+  /// contiguous vectors, row vid belongs to vertex vid
+  std::vector<float> arena_;
+  /// vertices indexed by vid, nullptr before a vertex is linked
+  std::vector<VertexPtr> vertices_;
 
   typedef int64_t opt_mode_t;
   opt_mode_t opt_mode_ = OPT_VANILLA;
@@ -240,6 +235,26 @@ public:
    */
   void search(DistanceQueryer &qdis, int k, std::vector<VertexPtr> &I, float *D,
               VisitedTable &vt);
+  /**
+   * @brief append vectors to the arena
+   * @param x the (n x vecDim) vectors
+   * @return the vid of the first appended row, rows get consecutive vids
+   */
+  faiss::idx_t appendVectors(torch::Tensor &x);
+  /**
+   * @brief the vector of a vertex
+   * @param vid the dense id
+   * @return pointer to vecDim floats, invalidated by @ref appendVectors
+   */
+  inline float *getVector(faiss::idx_t vid) {
+    return arena_.data() + vid * vecDim_;
+  }
+  /**
+   * @brief the vector of a vertex as a (1 x vecDim) tensor view
+   */
+  torch::Tensor getTensor(faiss::idx_t vid) {
+    return torch::from_blob(getVector(vid), {1, vecDim_});
+  }
   int getLevelsByTensor(torch::Tensor &t);
   int getLevelsByPtr(INTELLI::TensorPtr idx);
   /**
@@ -348,24 +363,26 @@ void search_neighbors_to_add(
     CANDY::VisitedTable &vt);
 /**
  * @brief remove neighbors from the list to make it smaller than max_size
+ * @param hnsw HNSW structure
  * @param disq distance computer
  * @param resultSet_prev initial list to be removed
  * @param max_size size boundary
  */
 void hnsw_shrink_neighbor_list(
-    CANDY::DistanceQueryer &disq,
+    CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
     std::priority_queue<CANDY::HNSW::NodeDistCloser> &resultSet_prev,
     size_t max_size);
 /**
  * @brief Enumerate vertices from nearest to farthest from query, keep a
  * neighbor only if there is no previous neighbor that is closer
+ * @param hnsw HNSW structure
  * @param qdis distancecomputer
  * @param input input minheap to maintain candidates of neighbors
  * @param output output minheap to maintain pruned candidates of neighbors
  * @param max_size size to control
  */
 void shrink_neighbor_list(
-    CANDY::DistanceQueryer &qdis,
+    CANDY::HNSW &hnsw, CANDY::DistanceQueryer &qdis,
     std::priority_queue<CANDY::HNSW::NodeDistFarther> &input,
     std::vector<CANDY::HNSW::NodeDistFarther> &output, size_t max_size);
 
@@ -11,8 +11,11 @@
 namespace CANDY {
 /**
  * @class HNSWNaiveIndex CANDY/HNSWNaiveIndex.h
- * @brief The class of a HNSW index approach, store the data in each vertex
+ * @brief The class of a HNSW index approach, vertices get dense ids in insertion order and their vectors are
+ * kept in one contiguous arena
  * @note currently single thread
+ * @note visited checks are O(1) by an epoch-stamped array indexed by vertex id, see @ref VisitedTable
+ * @note searchIndex returns the insertion order of rows, -1 for missing results
  * @note config parameters
  * - vecDim, the dimension of vectors, default 768, I64
  * - maxConnection, number of maximum neighbor connection at each level, default
@@ -22,6 +25,8 @@ namespace CANDY {
 class HNSWNaiveIndex : public AbstractIndex {
 public:
   HNSW hnsw;
+  /// visited marks kept across inserts, grows with the graph
+  VisitedTable vt;
   bool is_NSW;
 
   bool is_local_lvq = true;
@@ -88,6 +93,11 @@ public:
      * @return std::vector<faiss::idx_t> the index, follow faiss's order
      */
     virtual std::vector<faiss::idx_t> searchIndex(torch::Tensor q, int64_t k);
+    /**
+     * @brief copy the vectors and the graph, vertices are relinked by vid, see @ref AbstractIndex::snapshot
+     * @return the copy
+     */
+    virtual std::shared_ptr<AbstractIndex> snapshot(void);
 
 };
 #define newHNSWNaiveIndex std::make_shared<CANDY::HNSWNaiveIndex>
@@ -81,6 +81,14 @@ public:
     * @return std::vector<faiss::idx_t> the index, follow faiss's order
     */
     virtual std::vector<faiss::idx_t> searchIndex(torch::Tensor q, int64_t k);
+    /**
+    * @brief search the k-NN of a query tensor, return their ids and distances
+    * @param q the tensor, allow multiple rows
+    * @param k the returned neighbors
+    * @return the (n x k) int64 ids and the (n x k) float32 distances
+    * @note the divGraph always ranks by squared L2, so are the returned distances
+    */
+    virtual std::tuple<torch::Tensor, torch::Tensor> searchWithDistances(torch::Tensor &q, int64_t k);
     /**
      * @brief search the k-NN of a query tensor, return the result tensors
      * @param t the tensor, allow multiple rows
@@ -95,6 +103,11 @@ public:
      * @return a vector of tensors, each tensor represent KNN results of one query in idx
      */
     virtual std::vector<torch::Tensor> getTensorByIndex(std::vector<faiss::idx_t> &idx, int64_t k);
+    /**
+     * @brief copy the rows, the hash tables and the graph, see @ref AbstractIndex::snapshot
+     * @return the copy
+     */
+    virtual std::shared_ptr<AbstractIndex> snapshot(void);
 private:
 
 
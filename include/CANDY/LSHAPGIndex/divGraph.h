@@ -213,6 +213,12 @@ public:
 	divGraph(Preprocess& prep, Parameter& param_, const std::string& file_, int T_,int efC_, double probC = 0.95, double probQ = 0.99);
 	divGraph(Preprocess* prep, const std::string& path, double probQ = 0.99);
     divGraph(Preprocess& prep, Parameter& param_, int T_,int efC_, double probC = 0.95, double probQ = 0.99);
+	/**
+	 * @brief deep copy of src, the copy owns its hash values, hash tables and link lists
+	 * @param src the graph to copy
+	 * @param prep the copied data of src, whose rows become myData of the copy
+	 */
+	divGraph(const divGraph& src, Preprocess& prep);
 };
 std::vector<queryN*> search_candy(float c, int k, divGraph* myGraph, Preprocess& prep, float beta, int qType);
 
@@ -7,10 +7,12 @@
 #define CANDY_INCLUDE_CANDY_NNDESCENTINDEX_H_
 
 #include <CANDY/AbstractIndex.h>
+#include <Utils/BS_thread_pool.hpp>
+#include <faiss/utils/distances.h>
 
 #include <functional>
+#include <mutex>
 #include <random>
-#include <unordered_set>
 
 namespace CANDY {
 
@@ -23,9 +25,16 @@ namespace CANDY {
  * @brief An index whose core algorithm is only used for offline construction,
  * but based on its main data structure we have implemented online update
  * operations that need to be optimized.
+ * @note rows are kept in one row-major float arena and the neighbors in
+ * fixed-degree flat arrays, distances are computed by the SIMD kernels of
+ * faiss on raw pointers, and searches mark visited nodes in a per-thread
+ * reusable bitmap
  * @note special parameters
  *  - parallelWorkers The number of paraller workers, I64, default 1 (set this
- * to less than 0 will use max hardware_concurrency);
+ * to less than 0 will use max hardware_concurrency), they are kept in one
+ * thread pool for the lifetime of the index;
+ *  - insertBatchSize, the rows inserted as one batch, larger batches search
+ * more rows in parallel but compare every two rows of a batch, default 256, I64
  *  - vecDim, the dimension of vectors, default 768, I64
  *  - graphK, the neighbors of every node in internal data struct, default 20,
  * I64
@@ -42,11 +51,11 @@ class NNDescentIndex : public CANDY::AbstractIndex {
  protected:
   struct Neighbor {
     size_t id;
-    double distance;
+    float distance;
     bool flag;
 
     Neighbor() = default;
-    Neighbor(size_t id, double distance, bool f)
+    Neighbor(size_t id, float distance, bool f)
         : id(id), distance(distance), flag(f) {}
 
     inline bool operator<(const Neighbor &other) const {
@@ -54,46 +63,84 @@ class NNDescentIndex : public CANDY::AbstractIndex {
     }
   };
 
-  struct Nhood {
-    std::mutex poolLock;
-    std::vector<Neighbor> pool;  // candidate pool (a max heap)
-    std::unordered_set<size_t> neighborIdxSet;
-
-    std::unordered_set<size_t> nnOld;  // old neighbors
-    std::unordered_set<size_t> nnNew;  // new neighbors
-    std::mutex rnnOldLock;
-    std::unordered_set<size_t> rnnOld;  // reverse old neighbors
-    std::mutex rnnNewLock;
-    std::unordered_set<size_t> rnnNew;  // reverse new neighbors
-
-    Nhood() = default;
-    Nhood(const Nhood &other)
-        : pool(other.pool),
-          neighborIdxSet(other.neighborIdxSet),
-          nnOld(other.nnOld),
-          nnNew(other.nnNew),
-          rnnOld(other.rnnOld),
-          rnnNew(other.rnnNew) {}
+  /**
+   * @brief the per-node sets of one NNDescent round, only alive during @ref nnDescent
+   */
+  struct DescentScratch {
+    std::vector<size_t> nnOld;   // old neighbors
+    std::vector<size_t> nnNew;   // new neighbors
+    std::vector<size_t> rnnOld;  // reverse old neighbors
+    std::vector<size_t> rnnNew;  // reverse new neighbors
   };
+  /**
+   * @brief the number of striped locks guarding the per-node neighbors
+   */
+  static constexpr size_t lockStripes = 1024;
 
   void nnDescent();
   void randomSample(std::mt19937 &rng, std::vector<size_t> &vec, size_t n,
                     size_t sampledCount);
-  bool updateNN(size_t i, size_t j, double dist);
-  double calcDist(const torch::Tensor &ta, const torch::Tensor &tb);
-  torch::Tensor searchOnce(torch::Tensor q, int64_t k);
-  std::vector<std::pair<double, size_t>> searchOnceInner(torch::Tensor q,
-                                                         int64_t k);
-  bool insertOnce(vector<std::pair<double, size_t>> &neighbors,
-                  torch::Tensor t);
-  bool deleteOnce(torch::Tensor t, int64_t k);
+  bool updateNN(size_t i, size_t j, float dist);
+  /**
+   * @brief the distance of two rows of vecDim floats, inner products are
+   * negated so that smaller is always nearer
+   */
+  inline float calcDist(const float *a, const float *b) const {
+    if (faissMetric == faiss::METRIC_L2) {
+      return faiss::fvec_L2sqr(a, b, vecDim);
+    }
+    return -faiss::fvec_inner_product(a, b, vecDim);
+  }
+  inline const float *vecAt(size_t i) const {
+    return vectors.data() + i * vecDim;
+  }
+  inline size_t rowCount() const { return deleted.size(); }
+  inline Neighbor *poolAt(size_t i) { return pool.data() + i * graphK; }
+  /**
+   * @brief append one row to the arena with no neighbors
+   * @return the id of the row
+   */
+  size_t appendRow(const float *x);
+  torch::Tensor searchOnce(const float *q, int64_t k);
+  std::vector<std::pair<float, size_t>> searchOnceInner(const float *q,
+                                                        int64_t k);
+  /**
+   * @brief insert n rows in one batch, the candidates of all rows are first
+   * searched in parallel against the graph before the batch (a snapshot) and
+   * among the batch itself, then merged into the graph
+   * @param x the n rows, row-major
+   * @param n the number of rows
+   */
+  void insertBatch(const float *x, size_t n);
+  /**
+   * @brief run action(i) for i in [0,idxSize) on @ref workerPool, blocks
+   * until all are done
+   * @note do not call it from inside an action, the pool would wait for itself
+   */
   void parallelFor(size_t idxSize, std::function<void(size_t)> action);
 
-  int64_t graphK, parallelWorkers, vecDim, frozenLevel;
+  int64_t graphK, parallelWorkers, vecDim, frozenLevel, insertBatchSize;
   double rho, delta;
-  std::vector<Nhood> graph;
-  std::vector<torch::Tensor> tensor;
-  std::unordered_set<size_t> deletedIdxSet;
+  /**
+   * @brief the long-lived workers of @ref parallelFor, created in @ref setConfig
+   */
+  std::shared_ptr<BS::thread_pool> workerPool = nullptr;
+  /**
+   * @brief the row-major arena of all rows, the id of a row is its position
+   */
+  std::vector<float> vectors;
+  /**
+   * @brief graphK slots per node, the first poolSize[i] slots of node i form
+   * a max heap
+   */
+  std::vector<Neighbor> pool;
+  std::vector<uint32_t> poolSize;
+  std::vector<std::mutex> poolLocks = std::vector<std::mutex>(lockStripes);
+  /**
+   * @brief one deleted flag per row
+   */
+  std::vector<uint8_t> deleted;
+  size_t deletedCount = 0;
 
  public:
   NNDescentIndex() = default;
@@ -189,6 +236,11 @@ class NNDescentIndex : public CANDY::AbstractIndex {
    * @return whether the building is successful
    */
   virtual bool offlineBuild(torch::Tensor &t);
+  /**
+   * @brief copy the rows and the graph into a new @ref NNDescentIndex with its own locks and worker pool
+   * @return the copy
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 };
 
 /**
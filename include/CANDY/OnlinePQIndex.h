@@ -15,6 +15,7 @@
 #include <CANDY/AbstractIndex.h>
 #include <CANDY/OnlinePQIndex/SimpleStreamClustering.h>
 #include <CANDY/OnlinePQIndex/IVFTensorEncodingList.h>
+#include <CANDY/OnlinePQIndex/PQCodeList.h>
 namespace CANDY {
 
 /**
@@ -36,6 +37,13 @@ namespace CANDY {
  * - maxBuildIteration, the maxium iterations of buildoing, default 1000, I64
  * - candidateTimes, the times of k to determine minimum candidates, default 1 ,I64
  * - disableADC, set this to 1 will disable ADC or residential computing and go back to IVFPQ, default 0 (means IVFADC mode), I64
+ * - adcScan, set this to 1 to keep only packed codes per coarse-grained bucket and search by distance tables, default 0, I64
+ * - adcProbes, the coarse-grained buckets probed by adcScan, default 1, I64
+ * - rerankTimes, the times of k shortlisted by adcScan for exact rerank, default 4, set 0 to drop the raw rows and
+ * return the decoded vectors, I64
+ * @note under adcScan, a query builds one subQuantizers x fineGrainedClusters table of squared L2 distances per probed
+ * bucket (against the residual of that bucket unless disableADC), then sums subQuantizers lookups per code, so the
+ * scan touches subQuantizers bytes instead of vecDim floats per row
  */
 class OnlinePQIndex : public AbstractIndex {
  protected:
@@ -57,6 +65,30 @@ class OnlinePQIndex : public AbstractIndex {
   std::vector<int64_t> coarseGrainedEncode(torch::Tensor &t, torch::Tensor *residential);
   std::vector<std::vector<uint8_t>> fineGrainedEncode(torch::Tensor &residential);
   IVFTensorEncodingList IVFList;
+  int64_t adcScan = 0, adcProbes = 1, rerankTimes = 4;
+  std::vector<PQCodeListPtr> codeLists;
+  /**
+   * @brief fill the distance table of a query residual, see @ref PQCodeList::scanWithTable
+   * @param residual the residual of the query to a coarse-grained centroid, vecDim floats
+   * @param fineCentroids the contiguous centroids of each sub quantizer
+   * @param table the table to fill, subQuantizers x ksub
+   * @param ksub the number of centroids per sub quantizer
+   */
+  void computeDistanceTable(const float *residual,
+                            std::vector<torch::Tensor> &fineCentroids,
+                            std::vector<float> &table,
+                            int64_t ksub);
+  /**
+   * @brief the approximate vector of a code in a bucket
+   */
+  torch::Tensor decodeEntry(int64_t bkt, const uint8_t *code);
+  /**
+   * @brief search one row by ADC scanning and exact rerank
+   * @param rowI the query row
+   * @param k the returned neighbors
+   * @return the k*vecDim result, zero-padded
+   */
+  torch::Tensor searchRowADC(torch::Tensor &rowI, int64_t k);
 
   /**
    * @brief the inline function of deleting  rows
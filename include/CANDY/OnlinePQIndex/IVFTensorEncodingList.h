@@ -9,6 +9,8 @@
 #include <vector>
 #include <list>
 #include <mutex>
+#include <shared_mutex>
+#include <atomic>
 namespace CANDY {
 /**
  * @ingroup  CANDY_lib_bottom_sub The support classes for index approaches
@@ -16,14 +18,24 @@ namespace CANDY {
  */
 /**
   * @class IVFListCell CANDY/OnlinePQIndex/IVFTensorEncodingList.h
-  * @brief a cell of row tensor pointers which have the same code
+  * @brief a cell of rows which have the same code
+  * @note the rows are kept in one contiguous (capacity x D) buffer which grows by doubling, along with an int64 id
+  * column, a deletion moves the last row into the hole
+  * @note @ref getAllTensors and @ref getIds return views into the buffers, an insertion only writes behind the
+  * existing rows, and a deletion first copies the buffers if any view of them is still alive, so a view taken
+  * under @ref lockShared stays a consistent snapshot after the lock is released
+  * @note readers take @ref lockShared and writers take @ref lock, the caller holds the lock of the bucket first
   */
 class IVFListCell {
  protected:
   int64_t tensors = 0;
-  std::list<INTELLI::TensorPtr> tl;
-  std::mutex m_mut;
+  torch::Tensor rowBuffer, idBuffer;
+  std::shared_mutex m_mut;
   std::vector<uint8_t> encode;
+  /**
+   * @brief make room for at least rows rows of cols columns
+   */
+  void reserveRows(int64_t rows, int64_t cols);
  public:
   IVFListCell() {}
   ~IVFListCell() {}
@@ -31,31 +43,45 @@ class IVFListCell {
     return tensors;
   }
   /**
-  * @brief lock this cell
+  * @brief lock this cell exclusively, for writers
   */
   void lock() {
-    while (!m_mut.try_lock());
+    m_mut.lock();
   }
   /**
-   * @brief unlock this cell
+   * @brief unlock this cell from @ref lock
    */
   void unlock() {
     m_mut.unlock();
   }
+  /**
+   * @brief lock this cell shared, for readers
+   */
+  void lockShared() {
+    m_mut.lock_shared();
+  }
+  /**
+   * @brief unlock this cell from @ref lockShared
+   */
+  void unlockShared() {
+    m_mut.unlock_shared();
+  }
   void setEncode(std::vector<uint8_t> _encode) {
     encode = _encode;
   }
-  std::vector<uint8_t> getEncode() {
+  const std::vector<uint8_t> &getEncode() {
     return encode;
   }
   /**
-   * @brief insert a tensor
+   * @brief insert the rows of a tensor
    * @param t the tensor
+   * @param id the id of the first row, the following rows get id+1, id+2..., -1 for no id
    */
-  void insertTensor(torch::Tensor &t);
+  void insertTensor(torch::Tensor &t, int64_t id = -1);
   /**
   * @brief insert a tensor pointer
   * @param tp the tensor pointer
+  * @note the rows are copied into this cell
   */
   void insertTensorPtr(INTELLI::TensorPtr tp);
   /**
@@ -67,16 +93,21 @@ class IVFListCell {
   bool deleteTensor(torch::Tensor &t);
   /**
   * @brief delete a tensor pointer
-  * @note will check the equal condition by pointer ==
+  * @note will check the equal condition by torch::equal, as rows are copied at insertion
  * @param tp the tensor pointer
    * @returen bool whether the tensor is realy deleted
  */
   bool deleteTensorPtr(INTELLI::TensorPtr tp);
   /**
-  * @brief get all of the tensors in list
- * @return a 2-D tensor contain all, torch::zeros({1,1}) if got nothing
+  * @brief get all of the tensors in this cell
+ * @return a 2-D view of all rows, torch::zeros({1,1}) if got nothing
  */
   torch::Tensor getAllTensors();
+  /**
+   * @brief get the ids of all rows, in the same order as @ref getAllTensors
+   * @return a 1-D int64 view
+   */
+  torch::Tensor getIds();
 
 };
 /**
@@ -94,12 +125,15 @@ typedef std::shared_ptr<CANDY::IVFListCell> IVFListCellPtr;
 /**
   * @class IVFListBucket CANDY/OnlinePQIndex/IVFTensorEncodingList.h
   * @brief a bucket of multiple @ref IVFListCell
+  * @note thread-safe, reads hold the bucket lock shared and the cell locks shared, an insertion or deletion holds the
+  * bucket lock shared and only the lock of its own cell exclusively, so searches proceed in parallel with writers
+  * to other cells, the bucket lock is only taken exclusively to create or drop a cell
   */
 class IVFListBucket {
  protected:
-  int64_t tensors = 0;
+  std::atomic<int64_t> tensors{0};
   std::list<IVFListCellPtr> cellPtrs;
-  std::mutex m_mut;
+  std::shared_mutex m_mut;
  public:
   IVFListBucket() {}
   ~IVFListBucket() {}
@@ -107,22 +141,35 @@ class IVFListBucket {
     return tensors;
   }
   /**
-   * @brief lock this bucket
+   * @brief lock this bucket exclusively
    */
   void lock() {
-    while (!m_mut.try_lock());
+    m_mut.lock();
   }
   /**
-   * @brief unlock this bucket
+   * @brief unlock this bucket from @ref lock
    */
   void unlock() {
     m_mut.unlock();
   }
+  /**
+   * @brief lock this bucket shared
+   */
+  void lockShared() {
+    m_mut.lock_shared();
+  }
+  /**
+   * @brief unlock this bucket from @ref lockShared
+   */
+  void unlockShared() {
+    m_mut.unlock_shared();
+  }
   /**
   * @brief insert a tensor with its encode
   * @param t the tensor
   * @param encode the corresponding encode
-   * @param isConcurrent whether this process is concurrently executed
+   * @param isConcurrent whether this process is concurrently executed, kept for compatibility as the locks are
+   * always taken
   */
   void insertTensorWithEncode(torch::Tensor &t, std::vector<uint8_t> &encode, bool isConcurrent = false);
   /**
@@ -159,6 +206,29 @@ class IVFListBucket {
 */
   int64_t sizeWithEncode(std::vector<uint8_t> &_encode);
   /**
+   * @brief append the views of all cells to views
+   * @param views the views, see @ref IVFListCell::getAllTensors
+   * @return the number of rows appended
+   */
+  int64_t collectTensors(std::vector<torch::Tensor> &views);
+  /**
+   * @brief append the view of the cell with a specific encode to views
+   * @param _encode the specified encode
+   * @param views the views
+   * @return the number of rows appended
+   */
+  int64_t collectTensorsWithEncode(std::vector<uint8_t> &_encode, std::vector<torch::Tensor> &views);
+  /**
+   * @brief append the views of cells in the order of hamming distance to _encode, until minNumber rows
+   * @param _encode the specified encode
+   * @param minNumber the minimum of desired rows
+   * @param views the views
+   * @return the number of rows appended
+   */
+  int64_t collectMinimumTensorsUnderHamming(std::vector<uint8_t> &_encode,
+                                            int64_t minNumber,
+                                            std::vector<torch::Tensor> &views);
+  /**
 * @brief get a minimum number of tensors under sorted hamming distance
  * @param _encode the specified encode
  * @param minNumber the minimum of desired tensors
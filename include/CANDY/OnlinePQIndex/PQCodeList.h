@@ -0,0 +1,118 @@
+/*! \file PQCodeList.h*/
+
+#ifndef CANDY_INCLUDE_CANDY_ONLINEPQINDEX_PQCODELIST_H_
+#define CANDY_INCLUDE_CANDY_ONLINEPQINDEX_PQCODELIST_H_
+#include <cstdint>
+#include <memory>
+#include <shared_mutex>
+#include <utility>
+#include <vector>
+namespace CANDY {
+/**
+ * @ingroup  CANDY_lib_bottom_sub The support classes for index approaches
+ * @{
+ */
+/**
+ * @class PQCodeList CANDY/OnlinePQIndex/PQCodeList.h
+ * @brief the packed uint8 PQ codes of one coarse-grained bucket, scanned by asymmetric distance tables
+ * @note entry i owns codeLen bytes at codes[i*codeLen], and, if rows are kept, vecDim floats at rows[i*vecDim]
+ * for the exact rerank, a deletion moves the last entry into the hole
+ * @note @ref init, @ref insertRow and @ref deleteRow lock this list exclusively by themselves, while a reader takes
+ * @ref lockShared before @ref scanWithTable and keeps it until it no longer uses @ref codeAt or @ref rowAt, as a
+ * deletion may move the entries it found
+ */
+class PQCodeList {
+ protected:
+  int64_t entries = 0;
+  int64_t codeLen = 0, vecDim = 0;
+  bool keepRows = true;
+  std::vector<uint8_t> codes;
+  std::vector<float> rows;
+  std::shared_mutex m_mut;
+ public:
+  PQCodeList() {}
+  ~PQCodeList() {}
+  /**
+   * @brief init this list
+   * @param _codeLen the bytes of one code, i.e., the number of sub quantizers
+   * @param _vecDim the dimension of rows
+   * @param _keepRows whether to keep the raw rows for rerank
+   */
+  void init(int64_t _codeLen, int64_t _vecDim, bool _keepRows);
+  /**
+   * @brief lock this list shared, for readers
+   */
+  void lockShared() {
+    m_mut.lock_shared();
+  }
+  /**
+   * @brief unlock this list from @ref lockShared
+   */
+  void unlockShared() {
+    m_mut.unlock_shared();
+  }
+  int64_t size() {
+    return entries;
+  }
+  /**
+   * @brief the bytes held by codes and rows
+   */
+  int64_t memoryBytes() {
+    return (int64_t) (codes.capacity() + rows.capacity() * sizeof(float));
+  }
+  const uint8_t *codeAt(int64_t i) const {
+    return codes.data() + i * codeLen;
+  }
+  /**
+   * @brief the raw row of entry i, nullptr if rows are not kept
+   */
+  const float *rowAt(int64_t i) const {
+    return keepRows ? rows.data() + i * vecDim : nullptr;
+  }
+  /**
+   * @brief append an entry
+   * @param row the raw row, ignored if rows are not kept
+   * @param code the code of codeLen bytes
+   */
+  void insertRow(const float *row, const uint8_t *code);
+  /**
+   * @brief delete the first entry with the same code, and the same raw row if rows are kept
+   * @param row the raw row
+   * @param code the code of codeLen bytes
+   * @return bool whether an entry is really deleted
+   */
+  bool deleteRow(const float *row, const uint8_t *code);
+  /**
+   * @brief scan all codes with a distance table, keeping the nearest in a bounded max-heap
+   * @note the caller holds @ref lockShared
+   * @param table the table of codeLen x ksub floats, table[m*ksub+j] is the distance of the m-th sub query to
+   * the j-th centroid of the m-th sub quantizer
+   * @param ksub the number of centroids per sub quantizer
+   * @param listNo the number of this list, the heap stores (listNo<<32)|entry as the label
+   * @param heap the max-heap of (distance,label), see std::push_heap
+   * @param heapSize the bound of heap
+   */
+  void scanWithTable(const float *table,
+                     int64_t ksub,
+                     int64_t listNo,
+                     std::vector<std::pair<float, int64_t>> &heap,
+                     size_t heapSize);
+};
+/**
+ * @ingroup  CANDY_lib_bottom_sub
+ * @typedef PQCodeListPtr
+ * @brief The class to describe a shared pointer to @ref PQCodeList
+ */
+typedef std::shared_ptr<CANDY::PQCodeList> PQCodeListPtr;
+/**
+ * @ingroup  CANDY_lib_bottom_sub
+ * @def newPQCodeList
+ * @brief (Macro) To creat a new @ref PQCodeList under shared pointer.
+ */
+#define  newPQCodeList make_shared<CANDY::PQCodeList>
+/**
+ * @}
+ */
+} // CANDY
+
+#endif //CANDY_INCLUDE_CANDY_ONLINEPQINDEX_PQCODELIST_H_
@@ -34,6 +34,10 @@ namespace CANDY {
  *  - fineGrainedParallelInsert, whether or not conduct the insert in an extremely fine-grained way, i.e., per-row, I64, default 0
  *  - sharedBuild whether let all sharding using shared build, 1, I64
  *  - congestionDrop, whether or not drop the data when congestion occurs, I64, default 0
+ *  - waitSpinIterations, waitYieldIterations, waitParkMicroseconds, how workers wait for input and how
+ *  the reduce step waits for worker results, see @ref INTELLI::AdaptiveWaiter
+ *  - storageType, the type of rows kept by flat or bucketed workers, see @ref FlatIndex, rows of uint8, int8 or
+ *  float16 can be inserted and queried as they are, the reduce step compares the collected rows in float32
  * @warnning
  * Make sure you are using 2D tensors!
  */
@@ -52,6 +56,7 @@ class ParallelPartitionIndex : public CANDY::AbstractIndex {
  public:
   std::vector<TensorListIdxQueuePtr> reduceQueue;
   std::vector<TensorStrVecQueuePtr> reduceStrQueue;
+  INTELLI::AdaptiveWaiterPtr reduceWaiter;
   ParallelPartitionIndex() {
 
   }
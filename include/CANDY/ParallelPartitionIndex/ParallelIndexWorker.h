@@ -13,6 +13,7 @@
 #include <Utils/IntelliTensorOP.hpp>
 #include <CANDY/IndexTable.h>
 #include <Utils/SPSCQueue.hpp>
+#include <Utils/AdaptiveWaiter.hpp>
 #include <CANDY/AbstractIndex.h>
 #include <faiss/IndexFlat.h>
 namespace CANDY {
@@ -105,6 +106,10 @@ typedef std::shared_ptr<INTELLI::SPSCQueue<CANDY::TensorStrVecPair>> TensorStrVe
  * - parallelWorker_queueSize The input queue size of this worker, I64, default 10
  * - vecDim the dimension of vectors, I674, default 768
  * - congestionDrop, whether or not drop the data when congestion occurs, I64, default 0
+ * - waitSpinIterations, waitYieldIterations, waitParkMicroseconds, how an idle worker waits for new work,
+ * see @ref INTELLI::AdaptiveWaiter
+ * @note producers wake the worker through @ref waiter, and the worker wakes the reducer through @ref reduceWaiter
+ * after pushing search results
  */
 class ParallelIndexWorker : public INTELLI::AbstractC20Thread {
  protected:
@@ -120,6 +125,12 @@ class ParallelIndexWorker : public INTELLI::AbstractC20Thread {
   int64_t ingestedVectors = 0;
   int64_t singleWorkerOpt;
   std::mutex m_mut;
+  INTELLI::AdaptiveWaiter waiter;
+  INTELLI::AdaptiveWaiterPtr reduceWaiter = nullptr;
+  /**
+   * @brief whether any of the input queues has something to do
+   */
+  bool hasPendingWork();
   /**
    * @brief The inline 'main" function of thread, as an interface
    * @note Normally re-write this in derived classes
@@ -142,15 +153,40 @@ class ParallelIndexWorker : public INTELLI::AbstractC20Thread {
   virtual void setReduceStrQueue(TensorStrVecQueuePtr rq) {
     reduceStrQueue = rq;
   }
+  /**
+   * @brief set the waiter to be notified after pushing to @ref reduceQueue or @ref reduceStrQueue
+   * @param rw the waiter shared with the reducer
+   */
+  virtual void setReduceWaiter(INTELLI::AdaptiveWaiterPtr rw) {
+    reduceWaiter = rw;
+  }
   virtual void setId(int64_t _id) {
     myId = _id;
   }
 
   virtual bool waitPendingOperations() {
-    while (!m_mut.try_lock());
-    m_mut.unlock();
+    std::lock_guard<std::mutex> lk(m_mut);
     return true;
   }
+  /**
+   * @brief take a snapshot of the index of this worker, see @ref AbstractIndex::snapshot
+   * @return the copy, nullptr if the index does not support snapshots
+   */
+  virtual AbstractIndexPtr snapshotIndex();
+  /**
+   * @brief replace the index of this worker, e.g., by the snapshot of another worker
+   * @param idx the index
+   * @param ingested the vectors already inserted into idx, see @ref getIngested
+   */
+  virtual void adoptIndex(AbstractIndexPtr idx, int64_t ingested);
+  /**
+   * @brief get the vectors inserted into this worker
+   * @return the count
+   */
+  virtual int64_t getIngested() {
+    std::lock_guard<std::mutex> lk(m_mut);
+    return ingestedVectors;
+  }
   /**
  * @brief load the initial tensors of a data base, use this BEFORE @ref insertTensor
  * @note This is majorly an offline function, and may be different from @ref insertTensor for some indexes
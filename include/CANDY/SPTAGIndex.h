@@ -43,6 +43,10 @@ class SPTAGIndex : public FlatIndex {
   bool isInitialized = true;
   int64_t SPTAGNumberOfInitialDynamicPivots,SPTAGMaxCheck,SPTAGGraphNeighborhoodSize,SPTAGRefineIterations;
   double SPTAGGraphNeighborhoodScale;
+  /**
+   * @brief the serialized blobs a snapshot is loaded from, kept alive as long as the snapshot
+   */
+  std::vector<SPTAG::ByteArray> snapshotBlobs;
  public:
   SPTAGIndex() {
 
@@ -91,6 +95,11 @@ class SPTAGIndex : public FlatIndex {
   virtual int64_t size() {
     return lastNNZ + 1;
   }
+  /**
+   * @brief copy this index by serializing the SPTAG index into memory blobs and loading them into a new instance
+   * @return the copy, nullptr if it is taken before @ref loadInitialTensor or SPTAG fails to serialize
+   */
+  virtual std::shared_ptr<AbstractIndex> snapshot(void);
 };
 
 /**
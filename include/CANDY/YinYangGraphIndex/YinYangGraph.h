@@ -12,6 +12,9 @@
 #include <queue>
 #include <memory>
 #include <map>
+#include <mutex>
+#include <shared_mutex>
+#include <atomic>
 namespace CANDY {
 
 class YinYangVertex;
@@ -291,23 +294,35 @@ class YinYangVertexMap {
 class YinYangGraph_ListCell {
  protected:
   YinYangVertexPtr vertex = nullptr;
-  std::mutex m_mut;
+  std::shared_mutex m_mut;
   std::vector<uint8_t> encode;
  public:
   YinYangGraph_ListCell() {}
   ~YinYangGraph_ListCell() {}
   /**
-  * @brief lock this cell
+  * @brief lock this cell exclusively, for writers
   */
   void lock() {
-    while (!m_mut.try_lock());
+    m_mut.lock();
   }
   /**
-   * @brief unlock this cell
+   * @brief unlock this cell from @ref lock
    */
   void unlock() {
     m_mut.unlock();
   }
+  /**
+   * @brief lock this cell shared, for readers
+   */
+  void lockShared() {
+    m_mut.lock_shared();
+  }
+  /**
+   * @brief unlock this cell from @ref lockShared
+   */
+  void unlockShared() {
+    m_mut.unlock_shared();
+  }
   void setEncode(std::vector<uint8_t> _encode) {
     encode = _encode;
   }
@@ -358,12 +373,14 @@ typedef std::shared_ptr<CANDY::YinYangGraph_ListCell> YinYangGraph_ListCellPtr;
 /**
   * @class YinYangGraph_ListBucket  CANDY/YinYangIndex/YinYangGraph.h
   * @brief a bucket of multiple @ref YinYangGraph_ListCell
+  * @note the list of cells is guarded by a shared lock, lookups hold it shared and only the creation of a cell holds
+  * it exclusively, see @ref IVFListBucket
   */
 class YinYangGraph_ListBucket {
  protected:
-  int64_t tensors = 0;
+  std::atomic<int64_t> tensors{0};
   std::list<YinYangGraph_ListCellPtr> cellPtrs;
-  std::mutex m_mut;
+  std::shared_mutex m_mut;
  public:
   YinYangGraph_ListBucket() {}
   ~YinYangGraph_ListBucket() {}
@@ -371,17 +388,29 @@ class YinYangGraph_ListBucket {
     return tensors;
   }
   /**
-   * @brief lock this bucket
+   * @brief lock this bucket exclusively
    */
   void lock() {
-    while (!m_mut.try_lock());
+    m_mut.lock();
   }
   /**
-   * @brief unlock this bucket
+   * @brief unlock this bucket from @ref lock
    */
   void unlock() {
     m_mut.unlock();
   }
+  /**
+   * @brief lock this bucket shared
+   */
+  void lockShared() {
+    m_mut.lock_shared();
+  }
+  /**
+   * @brief unlock this bucket from @ref lockShared
+   */
+  void unlockShared() {
+    m_mut.unlock_shared();
+  }
   /**
   * @brief insert a tensor with its encode
   * @param t the tensor
@@ -11,6 +11,7 @@
 #include <assert.h>
 //#include <torch/torch.h>
 #include <memory>
+#include <functional>
 
 namespace CANDY {
 /**
@@ -33,8 +34,38 @@ namespace CANDY {
 * - call @ref setConfig, this function will also generate the tensor A and B correspondingly
 * - call @ref getData to get the raw data
 * - call  @ref getQuery to get the query
+ * @note  Chunked streaming
+* - call @ref resetStream to place the cursor, then @ref nextChunk until it returns an empty tensor
+* - by default a chunk is cut by @ref getDataAt, so a loader which overrides @ref getDataAt and @ref size without
+* holding the whole data also streams in bounded memory
  */
 class AbstractDataLoader {
+ protected:
+  int64_t streamCursor = 0;
+  /**
+   * @brief gather rows [startPos,endPos) of a data which is generated block by block on demand
+   * @param startPos the first row, clamped into [0, @ref size)
+   * @param endPos the row after the last one, clamped into [startPos, @ref size)
+   * @param blockRows the rows of each block, the last block may be shorter
+   * @param generateBlock produce the rows of one block, the same rows for the same block at any time
+   * @note only the blocks covering this range are generated
+   * @return the data tensor
+   */
+  torch::Tensor blockRowsAt(int64_t startPos,
+                            int64_t endPos,
+                            int64_t blockRows,
+                            const std::function<torch::Tensor(int64_t)> &generateBlock);
+  /**
+   * @brief gather rows by their positions from a data which is generated block by block on demand
+   * @param ids the 1-D int64 positions, each in [0, @ref size)
+   * @param blockRows the rows of each block
+   * @param generateBlock produce the rows of one block
+   * @note the ids are visited in order, so every involved block is generated once
+   * @return the data tensor, one row per id
+   */
+  torch::Tensor blockRowsByIds(torch::Tensor ids,
+                               int64_t blockRows,
+                               const std::function<torch::Tensor(int64_t)> &generateBlock);
  public:
   AbstractDataLoader() = default;
 
@@ -88,6 +119,36 @@ class AbstractDataLoader {
    * @return the rows
    */
   virtual int64_t size();
+  /**
+   * @brief place the cursor of @ref nextChunk
+   * @param startPos the row where the next chunk starts, default 0
+   */
+  virtual void resetStream(int64_t startPos = 0);
+  /**
+   * @brief get the next chunk of data and move the cursor forward
+   * @param rows the maximum rows of this chunk
+   * @return the data tensor of at most rows rows, empty when the stream is exhausted
+   */
+  virtual torch::Tensor nextChunk(int64_t rows);
+  /**
+   * @brief whether @ref nextChunk still has rows to return
+   * @return bool
+   */
+  virtual bool hasNextChunk();
+  /**
+   * @brief get the data rows by their positions
+   * @param ids the 1-D int64 positions, each in [0, @ref size)
+   * @note used to recover the rows of ground truth without holding the whole data
+   * @return the data tensor, one row per id
+   */
+  virtual torch::Tensor getDataByIds(torch::Tensor ids);
+  /**
+   * @brief get the k-NN ids of the queries over all rows, if the data source ships them
+   * @param k the neighbors wanted
+   * @note the ids follow the row order of @ref getDataAt, so drivers can use them instead of computing ground truth
+   * @return the (querySize x k) int64 ids, an undefined tensor if not available
+   */
+  virtual torch::Tensor getNeighbors(int64_t k);
 };
 
 /**
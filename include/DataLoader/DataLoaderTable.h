@@ -29,7 +29,9 @@ namespace CANDY {
  * @note default tags
  * - random @ref RandomDataLoader
  * - fvecs @ref FVECSDataLoader
+ * - mmapVecs @ref MMapVECSDataLoader
  * - hdf5 @ref HDF5DataLoader
+ * - hdf5Stream @ref HDF5StreamDataLoader
  * - zipf @ref ZipfDataLoader
  * - expFamily @ref ExpFamilyDataLoader
  * - exp, the exponential distribution in  @ref ExpFamilyDataLoader
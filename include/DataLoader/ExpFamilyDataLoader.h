@@ -49,6 +49,10 @@ namespace CANDY {
  * - exp
  * - beta
 * - seed, the ExpFamily seed, default 7758258, I64
+* - generateOnTheFly, whether to generate rows only when they are read, default 0, I64
+ * - if 1, A is never materialized, the rows are produced in blocks of 4096 by a generator seeded per block, as in
+ * @ref RandomDataLoader, the column norms for normalizeTensor are found by one pass in @ref setConfig, and the query
+ * rows are drawn with replacement
 *  @note: default name tags
  * "ExpFamily": @ref ExpFamilyDataLoader
  */
@@ -62,14 +66,34 @@ class ExpFamilyDataLoader : public AbstractDataLoader {
   double driftOffset, queryNoiseFraction;
   int64_t normalizeTensor;
   double parameterBetaA, parameterBetaB;
+  int64_t generateOnTheFly = 0;
+  static constexpr int64_t blockRows = 4096;
+  torch::Tensor columnNorms;
 
-  torch::Tensor generateExp();
-  torch::Tensor generateGaussian();
+  torch::Tensor generateExp(int64_t rows, c10::optional<at::Generator> gen);
+  torch::Tensor generateGaussian(int64_t rows, c10::optional<at::Generator> gen);
   torch::Tensor generateBinomial();
-  torch::Tensor generatePoisson();
+  torch::Tensor generatePoisson(int64_t rows, c10::optional<at::Generator> gen);
 
-  torch::Tensor generateBeta();
+  torch::Tensor generateBeta(int64_t rows, c10::optional<at::Generator> gen);
+  /**
+   * @brief draw rows of the chosen distribution, not normalized
+   * @param rows the rows to draw
+   * @param gen the generator, the global one if not given
+   */
+  torch::Tensor generateRaw(int64_t rows, c10::optional<at::Generator> gen = c10::nullopt);
   torch::Tensor generateData();
+  /**
+   * @brief the raw draws of one block
+   * @param blockIdx the block, covering rows [blockIdx*blockRows, (blockIdx+1)*blockRows)
+   */
+  torch::Tensor rawBlock(int64_t blockIdx);
+  /**
+   * @brief generate the rows of one block, normalized and with the drift applied
+   * @param blockIdx the block
+   * @return the rows of this block, clamped into vecVolume
+   */
+  torch::Tensor generateBlock(int64_t blockIdx);
  public:
   ExpFamilyDataLoader() = default;
 
@@ -100,6 +124,28 @@ class ExpFamilyDataLoader : public AbstractDataLoader {
   * @return the generated query tensor
   */
   virtual torch::Tensor getQuery();
+  /**
+   * @brief get the data tensor at specific offset
+   * @note only the blocks covering this range are generated if generateOnTheFly=1
+   * @return the generated data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the data rows by their positions
+   * @note every involved block is generated once if generateOnTheFly=1
+   * @return the data tensor, one row per id
+   */
+  virtual torch::Tensor getDataByIds(torch::Tensor ids);
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows, i.e., vecVolume
+   */
+  virtual int64_t size();
 };
 
 /**
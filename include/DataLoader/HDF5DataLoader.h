@@ -38,6 +38,9 @@ namespace CANDY {
  * - no effect when query is loaded from separate file
 * - querySize, the size of query, default 10, I64
 * - seed, the random seed, default 7758258, I64
+* - streamFromFile, whether to hand all reads to @ref HDF5StreamDataLoader instead of loading the file, default 0, I64
+ * - if 1, A is never materialized, the file is read by hyperslabs and the first vecVolume rows are used in file
+ * order rather than sampled
 *  @note: default name tags
 * - hdf5: @ref HDF5DataLoader
  */
@@ -48,6 +51,11 @@ class HDF5DataLoader : public AbstractDataLoader {
   int64_t normalizeTensor;
   double queryNoiseFraction;
   int64_t useSeparateQuery;
+  int64_t streamFromFile = 0;
+  /**
+   * @brief the hyperslab reader which serves all reads if streamFromFile=1, nullptr otherwise
+   */
+  AbstractDataLoaderPtr fileReader = nullptr;
   bool generateData(std::string fname);
   bool generateQuery(std::string fname);
 
@@ -75,6 +83,43 @@ class HDF5DataLoader : public AbstractDataLoader {
   * @return the generated query tensor
   */
   virtual torch::Tensor getQuery();
+  /**
+   * @brief get the data tensor at specific offset
+   * @note only this range is read from the file if streamFromFile=1
+   * @return the data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the data rows by their positions
+   * @return the data tensor, one row per id
+   */
+  virtual torch::Tensor getDataByIds(torch::Tensor ids);
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows
+   */
+  virtual int64_t size();
+  /**
+   * @brief place the cursor of @ref nextChunk
+   * @param startPos the row where the next chunk starts, default 0
+   */
+  virtual void resetStream(int64_t startPos = 0);
+  /**
+   * @brief get the next chunk of data and move the cursor forward
+   * @param rows the maximum rows of this chunk
+   * @return the data tensor of at most rows rows, empty when the stream is exhausted
+   */
+  virtual torch::Tensor nextChunk(int64_t rows);
+  /**
+   * @brief whether @ref nextChunk still has rows to return
+   * @return bool
+   */
+  virtual bool hasNextChunk();
   /**
    * @brief the inline function to load tensor from *h5 or *.hdf5 file
    * @param fname the name of file
@@ -0,0 +1,164 @@
+/*! \file HDF5StreamDataLoader.h*/
+
+#ifndef CANDY_INCLUDE_DATALOADER_HDF5STREAMDATALOADER_H_
+#define CANDY_INCLUDE_DATALOADER_HDF5STREAMDATALOADER_H_
+
+#include <Utils/ConfigMap.hpp>
+#include <Utils/IntelliTensorOP.hpp>
+#include <assert.h>
+#include <future>
+#include <memory>
+#include <string>
+#include <DataLoader/AbstractDataLoader.h>
+namespace CANDY {
+/**
+ * @ingroup CANDY_DataLOADER
+ * @{
+ */
+/**
+ * @class HDF5StreamDataLoader DataLoader/HDF5StreamDataLoader.h
+ * @brief The class for streaming *.hdf5 or *.h5 files by hyperslabs, following the layout of ann-benchmarks
+ * @ingroup CANDY_DataLOADER
+ * @note:
+ * - Must have a global config by @ref setConfig
+ * - Unlike @ref HDF5DataLoader, the file is opened read-only and the data is never loaded as a whole, the first
+ * vecVolume rows of the data attribute are used in file order and each @ref getDataAt only reads its own hyperslab
+ * - @ref nextChunk reads the following chunk in the background while the caller processes the current one, all
+ * calls into hdf5 are still serialized, so a library built without thread safety is fine
+ * - @ref getNeighbors returns the stored ground truth, valid when all rows of the data attribute are used and the
+ * queries are the first rows of the query attribute, so drivers can skip computing it, and only when the distance
+ * attribute of the file matches metricType (euclidean for L2, angular for cossim, ip or dot for IP and dot)
+ * @note  Default behavior
+* - create
+* - call @ref setConfig, this function opens the file and loads the query
+* - call @ref getDataAt or @ref nextChunk to get ranges of data
+* - call  @ref getQuery to get the query
+* @note parameters of config
+* - vecDim, the dimension of vectors, default 512, I64
+* - vecVolume, the volume of vectors, default 10000, I64, <=0 for all rows of the data attribute
+* - dataPath, the path to the data file, datasets/hdf5/sun/sun.hdf5, String
+* - dataAttr, the attribute of data, default train, String
+* - queryAttr, the attribute of query, default test, String
+* - neighborsAttr, the attribute of stored ground truth ids, default neighbors, String
+* - metricType, the metric of the run, checked against the distance attribute of the file, default IP, String
+* - normalizeTensor, whether or not normalize the tensors in L2, 0 (no), I64
+ * - the column norms of the volume are computed once in @ref setConfig and each chunk is divided in place, the
+ * stored ground truth is then no longer used
+* - useSeparateQuery, whether or not load query from queryAttr, 1, I64
+* - queryNoiseFraction, the fraction of noise in query, default 0, allow 0~1, Double
+ * - no effect when query is loaded from separate attribute
+* - querySize, the size of query, default 10, I64, <=0 for all rows of queryAttr
+* - prefetchChunks, whether @ref nextChunk reads ahead, default 1, I64
+* - seed, the random seed, default 7758258, I64
+*  @note: default name tags
+* - hdf5Stream: @ref HDF5StreamDataLoader
+ */
+class HDF5StreamDataLoader : public AbstractDataLoader {
+ protected:
+  int64_t fileId = -1, dataId = -1;
+  int64_t fileRows = 0;
+  torch::Tensor B, columnNorms;
+  int64_t vecDim, vecVolume, querySize, seed;
+  int64_t normalizeTensor, useSeparateQuery, prefetchChunks;
+  double queryNoiseFraction;
+  std::string dataAttr, queryAttr, neighborsAttr, metricType;
+  bool neighborsValid = false;
+  /**
+   * @brief the chunk being read ahead by @ref nextChunk
+   */
+  std::future<torch::Tensor> pending;
+  int64_t pendingStart = -1, pendingEnd = -1;
+  /**
+   * @brief wait for and drop the chunk being read ahead, so that no other call runs into hdf5 meanwhile
+   */
+  void dropPending(void);
+  /**
+   * @brief read rows [startPos,endPos) of the data attribute and normalize them in place if required
+   */
+  torch::Tensor readRows(int64_t startPos, int64_t endPos);
+  /**
+   * @brief the column-wise l2 norms of the first vecVolume rows, by one streaming pass over hyperslabs
+   */
+  void computeColumnNorms(void);
+  bool generateQuery(void);
+  void close(void);
+ public:
+  HDF5StreamDataLoader() = default;
+
+  ~HDF5StreamDataLoader() {
+    close();
+  }
+
+  /**
+     * @brief Set the GLOBAL config map related to this loader
+     * @param cfg The config map
+      * @return bool whether the config is successfully set
+      * @note
+     */
+  virtual bool setConfig(INTELLI::ConfigMapPtr cfg);
+
+  /**
+   * @brief get all vecVolume rows of data
+   * @note this reads the whole volume, prefer @ref getDataAt or @ref nextChunk for large data
+   * @return the data tensor
+   */
+  virtual torch::Tensor getData();
+
+  /**
+   * @brief get rows [startPos,endPos) of data, read by one hyperslab
+   * @return the data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the next chunk of data and start reading the one after it in background
+   * @param rows the maximum rows of this chunk
+   * @return the data tensor of at most rows rows, empty when the stream is exhausted
+   */
+  virtual torch::Tensor nextChunk(int64_t rows);
+  /**
+   * @brief place the cursor of @ref nextChunk, dropping any chunk read ahead
+   * @param startPos the row where the next chunk starts, default 0
+   */
+  virtual void resetStream(int64_t startPos = 0);
+
+  /**
+  * @brief get the query tensor
+  * @return the query tensor
+  */
+  virtual torch::Tensor getQuery();
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows, i.e., vecVolume
+   */
+  virtual int64_t size();
+  /**
+   * @brief get the stored k-NN ids of the queries over all data rows
+   * @param k the neighbors wanted
+   * @return the (querySize x k) int64 ids, undefined if the file has no valid ground truth for this setting
+   */
+  virtual torch::Tensor getNeighbors(int64_t k);
+};
+
+/**
+ * @ingroup CANDY_DataLOADER
+ * @typedef HDF5StreamDataLoaderPtr
+ * @brief The class to describe a shared pointer to @ref HDF5StreamDataLoader
+ */
+typedef std::shared_ptr<class CANDY::HDF5StreamDataLoader> HDF5StreamDataLoaderPtr;
+/**
+ * @ingroup CANDY_DataLOADER
+ * @def newHDF5StreamDataLoader
+ * @brief (Macro) To creat a new @ref HDF5StreamDataLoader under shared pointer.
+ */
+#define newHDF5StreamDataLoader std::make_shared<CANDY::HDF5StreamDataLoader>
+/**
+ * @}
+ */
+} // CANDY
+
+#endif //CANDY_INCLUDE_DATALOADER_HDF5STREAMDATALOADER_H_
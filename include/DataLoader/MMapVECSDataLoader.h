@@ -0,0 +1,209 @@
+/*! \file MMapVECSDataLoader.h*/
+
+#ifndef CANDY_INCLUDE_DATALOADER_MMAPVECSDATALOADER_H_
+#define CANDY_INCLUDE_DATALOADER_MMAPVECSDATALOADER_H_
+
+#include <Utils/ConfigMap.hpp>
+#include <Utils/IntelliTensorOP.hpp>
+#include <assert.h>
+#include <memory>
+#include <string>
+#include <DataLoader/AbstractDataLoader.h>
+namespace CANDY {
+/**
+ * @ingroup CANDY_DataLOADER
+ * @{
+ */
+/**
+ * @ingroup CANDY_DataLOADER_FVECS The dataloader for *.vecs file
+ * @{
+ */
+/**
+ * @class MMapVECSFile DataLoader/MMapVECSDataLoader.h
+ * @brief A *.fvecs, *.ivecs or *.bvecs file mapped into memory
+ * @note every row of these files is a 4-byte dimension followed by the payload, so the payload of rows [start,end)
+ * is exposed by @ref rawView as a (end-start) x dim tensor with a row stride of the whole record, without copy
+ * @note the mapping is private and writable, so an accidental in-place write to a view only touches a private copy
+ * of that page, never the file
+ * @note the views keep this mapping alive
+ */
+class MMapVECSFile : public std::enable_shared_from_this<MMapVECSFile> {
+ protected:
+  int fd = -1;
+  uint8_t *base = nullptr;
+  size_t bytes = 0;
+  int64_t rows = 0, dim = 0, elemBytes = 4, rowBytes = 0;
+  torch::ScalarType dtype = torch::kFloat32;
+ public:
+  MMapVECSFile() = default;
+  ~MMapVECSFile() {
+    close();
+  }
+  /**
+   * @brief the format implied by the extension of a file name
+   * @param fname the file name
+   * @return fvecs, ivecs or bvecs, fvecs if unknown
+   */
+  static std::string formatOf(const std::string &fname);
+  /**
+   * @brief map a file
+   * @param fname the file name
+   * @param format fvecs, ivecs, bvecs or auto to follow the extension
+   * @param isSigned whether a bvecs payload is int8 instead of uint8
+   * @return whether the mapping is successful
+   */
+  bool open(const std::string &fname, const std::string &format = "auto", bool isSigned = false);
+  /**
+   * @brief unmap the file
+   * @note the views taken by @ref rawView must not be used afterwards, the destructor only runs after the last
+   * view is released
+   */
+  void close();
+  int64_t size() {
+    return rows;
+  }
+  int64_t getDimension() {
+    return dim;
+  }
+  /**
+   * @brief the type of payload, kFloat32, kInt32, kUInt8 or kInt8
+   */
+  torch::ScalarType getType() {
+    return dtype;
+  }
+  /**
+   * @brief the zero-copy strided view of rows [startPos,endPos), in the type of payload
+   * @note not contiguous, call contiguous() or to() when a dense tensor is needed
+   */
+  torch::Tensor rawView(int64_t startPos, int64_t endPos);
+};
+/**
+ * @ingroup CANDY_DataLOADER_FVECS
+ * @typedef MMapVECSFilePtr
+ * @brief The class to describe a shared pointer to @ref MMapVECSFile
+ */
+typedef std::shared_ptr<class CANDY::MMapVECSFile> MMapVECSFilePtr;
+/**
+ * @ingroup CANDY_DataLOADER_FVECS
+ * @def newMMapVECSFile
+ * @brief (Macro) To creat a new @ref MMapVECSFile under shared pointer.
+ */
+#define newMMapVECSFile std::make_shared<CANDY::MMapVECSFile>
+/**
+ * @class MMapVECSDataLoader DataLoader/MMapVECSDataLoader.h
+ * @brief The class for streaming *.fvecs, *.ivecs and *.bvecs data from a memory mapping
+ * @ingroup CANDY_DataLOADER
+ * @note:
+ * - Must have a global config by @ref setConfig
+ * - Unlike @ref FVECSDataLoader, the data is never loaded as a whole, the first vecVolume rows are used in file order
+ * and each @ref getDataAt only converts its own range, so a slice of SIFT1B or DEEP1B starts without holding the file
+ * in RAM
+ * - @ref getRawDataAt keeps the payload type, e.g., uint8 of bvecs, and copies nothing
+ * @note  Default behavior
+* - create
+* - call @ref setConfig, this function maps the data file and loads the query
+* - call @ref getDataAt to get ranges of data
+* - call  @ref getQuery to get the query
+* @note parameters of config
+* - vecDim, the dimension of vectors, default 128, I64
+* - vecVolume, the volume of vectors, default 10000, I64, <=0 for all rows of the file
+* - dataPath, the path to the data file, datasets/fvecs/sift10K/siftsmall_base.fvecs, String
+* - vecsFormat, the format of data and query files, fvecs, ivecs, bvecs or auto (by extension), default auto, String
+* - bvecsSigned, whether the bvecs payload is int8 rather than uint8, default 0, I64
+* - normalizeTensor, whether or not normalize the tensors in L2, 1 (yes), I64
+ * - the column norms of the volume are computed once in @ref setConfig, so every range is scaled as if the whole
+ * volume were normalized
+* - useSeparateQuery, whether or not load query separately, 1, I64
+* - queryPath, the path to query file, datasets/fvecs/sift10K/siftsmall_query.fvecs. String
+* - queryNoiseFraction, the fraction of noise in query, default 0, allow 0~1, Double
+ * - no effect when query is loaded from separate file
+* - querySize, the size of query, default 10, I64
+* - seed, the random seed, default 7758258, I64
+*  @note: default name tags
+* - "mmapVecs": @ref MMapVECSDataLoader
+ */
+class MMapVECSDataLoader : public AbstractDataLoader {
+ protected:
+  MMapVECSFilePtr dataFile = nullptr;
+  torch::Tensor B, columnNorms;
+  int64_t vecDim, vecVolume, querySize, seed;
+  int64_t normalizeTensor;
+  double queryNoiseFraction;
+  int64_t useSeparateQuery;
+  std::string vecsFormat;
+  bool generateQuery(std::string fname, bool isSigned);
+  /**
+   * @brief the column-wise l2 norms of the first vecVolume rows, by one streaming pass over the mapping
+   * @note dividing a range by these matches INTELLI::IntelliTensorOP::l2Normalize on the whole volume
+   */
+  void computeColumnNorms(void);
+ public:
+  MMapVECSDataLoader() = default;
+
+  ~MMapVECSDataLoader() = default;
+
+  /**
+     * @brief Set the GLOBAL config map related to this loader
+     * @param cfg The config map
+      * @return bool whether the config is successfully set
+      * @note
+     */
+  virtual bool setConfig(INTELLI::ConfigMapPtr cfg);
+
+  /**
+   * @brief get all vecVolume rows of data as a float tensor
+   * @note this converts the whole volume, prefer @ref getDataAt for large data
+   * @return the data tensor
+   */
+  virtual torch::Tensor getData();
+
+  /**
+   * @brief get rows [startPos,endPos) of data as a dense float tensor
+   * @note only this range is read and converted, clamped into [0,vecVolume)
+   * @return the data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the zero-copy view of rows [startPos,endPos) in the payload type, not normalized
+   * @return the strided view, see @ref MMapVECSFile::rawView
+   */
+  torch::Tensor getRawDataAt(int64_t startPos, int64_t endPos);
+
+  /**
+  * @brief get the query tensor
+  * @return the query tensor
+  */
+  virtual torch::Tensor getQuery();
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows, i.e., vecVolume
+   */
+  virtual int64_t size();
+};
+
+/**
+ * @ingroup CANDY_DataLOADER_FVECS
+ * @typedef MMapVECSDataLoaderPtr
+ * @brief The class to describe a shared pointer to @ref MMapVECSDataLoader
+ */
+typedef std::shared_ptr<class CANDY::MMapVECSDataLoader> MMapVECSDataLoaderPtr;
+/**
+ * @ingroup CANDY_DataLOADER_FVECS
+ * @def newMMapVECSDataLoader
+ * @brief (Macro) To creat a new @ref MMapVECSDataLoader under shared pointer.
+ */
+#define newMMapVECSDataLoader std::make_shared<CANDY::MMapVECSDataLoader>
+/**
+ * @}
+ */
+/**
+ * @}
+ */
+} // CANDY
+
+#endif //CANDY_INCLUDE_DATALOADER_MMAPVECSDATALOADER_H_
@@ -40,6 +40,10 @@ namespace CANDY {
  * - queryNoiseFraction, the fraction of noise in query, default 0, allow 0~1, Double
 * - querySize, the size of query, default 10, I64
 * - seed, the random seed, default 7758258, I64
+* - generateOnTheFly, whether to generate rows only when they are read, default 0, I64
+ * - if 1, A is never materialized, the rows are produced in blocks of 4096 by a generator seeded per block, so
+ * @ref getDataAt and @ref nextChunk return the same rows at any time in bounded memory, and the query rows are drawn
+ * with replacement
 *  @note: default name tags
  * "random": @ref RandomDataLoader
  */
@@ -49,6 +53,14 @@ class RandomDataLoader : public AbstractDataLoader {
   int64_t vecDim, vecVolume, querySize, seed;
   int64_t driftPosition;
   double driftOffset, queryNoiseFraction;
+  int64_t generateOnTheFly = 0;
+  static constexpr int64_t blockRows = 4096;
+  /**
+   * @brief generate the rows of one block, with the drift applied
+   * @param blockIdx the block, covering rows [blockIdx*blockRows, (blockIdx+1)*blockRows)
+   * @return the rows of this block, clamped into vecVolume
+   */
+  torch::Tensor generateBlock(int64_t blockIdx);
  public:
   RandomDataLoader() = default;
 
@@ -73,6 +85,28 @@ class RandomDataLoader : public AbstractDataLoader {
   * @return the generated query tensor
   */
   virtual torch::Tensor getQuery();
+  /**
+   * @brief get the data tensor at specific offset
+   * @note only the blocks covering this range are generated if generateOnTheFly=1
+   * @return the generated data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the data rows by their positions
+   * @note every involved block is generated once if generateOnTheFly=1
+   * @return the data tensor, one row per id
+   */
+  virtual torch::Tensor getDataByIds(torch::Tensor ids);
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows, i.e., vecVolume
+   */
+  virtual int64_t size();
 };
 
 /**
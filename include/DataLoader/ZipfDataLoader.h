@@ -42,6 +42,10 @@ namespace CANDY {
  * - queryNoiseFraction, the fraction of noise in query, default 0, allow 0~1, Double
 * - querySize, the size of query, default 10, I64
 * - seed, the Zipf seed, default 7758258, I64
+* - generateOnTheFly, whether to generate rows only when they are read, default 0, I64
+ * - if 1, A is never materialized, the rows are produced in blocks of 4096 by a generator seeded per block, as in
+ * @ref RandomDataLoader, the maxima used for scaling are found by one pass in @ref setConfig, and the query rows are
+ * drawn with replacement
 *  @note: default name tags
  * "Zipf": @ref ZipfDataLoader
  */
@@ -52,7 +56,32 @@ class ZipfDataLoader : public AbstractDataLoader {
   int64_t driftPosition;
   double driftOffset, queryNoiseFraction;
   double zipfAlpha;
+  int64_t generateOnTheFly = 0;
+  static constexpr int64_t blockRows = 4096;
+  /**
+   * @brief the smallest uniform draws before and after driftPosition, which decide the maxima of zipf values
+   */
+  double minUniform[2] = {1.0, 1.0};
   torch::Tensor generateZipfDistribution(int64_t n, int64_t m, double alpha);
+  /**
+   * @brief turn uniform draws into zipf values in place, scaled by the value of minU
+   * @param values the uniform draws
+   * @param alpha the zipf factor, 0 keeps the draws
+   * @param minU the smallest draw of the whole range to be scaled together
+   * @return values
+   */
+  static torch::Tensor zipfFromUniform(torch::Tensor values, double alpha, double minU);
+  /**
+   * @brief the uniform draws of one block
+   * @param blockIdx the block, covering rows [blockIdx*blockRows, (blockIdx+1)*blockRows)
+   */
+  torch::Tensor uniformBlock(int64_t blockIdx);
+  /**
+   * @brief generate the rows of one block, with the drift applied
+   * @param blockIdx the block
+   * @return the rows of this block, clamped into vecVolume
+   */
+  torch::Tensor generateBlock(int64_t blockIdx);
  public:
   ZipfDataLoader() = default;
 
@@ -77,6 +106,28 @@ class ZipfDataLoader : public AbstractDataLoader {
   * @return the generated query tensor
   */
   virtual torch::Tensor getQuery();
+  /**
+   * @brief get the data tensor at specific offset
+   * @note only the blocks covering this range are generated if generateOnTheFly=1
+   * @return the generated data tensor
+   */
+  virtual torch::Tensor getDataAt(int64_t startPos, int64_t endPos);
+  /**
+   * @brief get the data rows by their positions
+   * @note every involved block is generated once if generateOnTheFly=1
+   * @return the data tensor, one row per id
+   */
+  virtual torch::Tensor getDataByIds(torch::Tensor ids);
+  /**
+   * @brief get the dimension of data
+   * @return the dimension
+   */
+  virtual int64_t getDimension();
+  /**
+   * @brief get the number of rows of data
+   * @return the rows, i.e., vecVolume
+   */
+  virtual int64_t size();
 };
 
 /**
@@ -0,0 +1,124 @@
+/*! \file AdaptiveWaiter.hpp*/
+
+#ifndef _INCLUDE_UTILS_ADAPTIVEWAITER_HPP_
+#define _INCLUDE_UTILS_ADAPTIVEWAITER_HPP_
+#pragma once
+
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <Utils/ConfigMap.hpp>
+namespace INTELLI {
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @class AdaptiveWaiter Utils/AdaptiveWaiter.hpp
+ * @brief Spin-then-park wait for a condition set by other threads, e.g., a SPSC queue becoming non-empty
+ * @note a waiter first spins with a cpu pause for @ref spinIterations rounds, then yields for
+ * @ref yieldIterations rounds, then parks on a condition variable, so short gaps are served at spin latency
+ * while idle threads stop burning cores
+ * @note producers call @ref notify after making the condition true, which only takes the lock
+ * when some thread is parked, so the fast path of a producer is one fence and one atomic load
+ * @note a parked thread also re-checks the condition every @ref parkMicroseconds, as a bound for a missed notify
+ * @note special parameters
+ * - waitSpinIterations the rounds of busy spin before yielding, I64, default 4096
+ * - waitYieldIterations the rounds of std::this_thread::yield before parking, I64, default 64
+ * - waitParkMicroseconds the timeout of one park, I64, default 1000, set <=0 to never park (pure busy wait)
+ */
+class AdaptiveWaiter {
+ protected:
+  std::mutex mtx;
+  std::condition_variable cv;
+  std::atomic<int64_t> sleepers{0};
+  int64_t spinIterations = 4096;
+  int64_t yieldIterations = 64;
+  int64_t parkMicroseconds = 1000;
+  static inline void cpuRelax() {
+#if defined(__x86_64__) || defined(__i386__)
+    __builtin_ia32_pause();
+#elif defined(__aarch64__)
+    asm volatile("yield" ::: "memory");
+#endif
+  }
+ public:
+  AdaptiveWaiter() = default;
+  ~AdaptiveWaiter() = default;
+  /**
+   * @brief set the strategy directly
+   * @param spin the rounds of busy spin
+   * @param yield the rounds of yield
+   * @param parkUs the timeout of one park in microseconds, <=0 to never park
+   */
+  void setStrategy(int64_t spin, int64_t yield, int64_t parkUs) {
+    spinIterations = spin > 0 ? spin : 0;
+    yieldIterations = yield > 0 ? yield : 0;
+    parkMicroseconds = parkUs;
+  }
+  /**
+   * @brief set the strategy from config, see the special parameters
+   * @param cfg the config
+   */
+  void setConfig(ConfigMapPtr cfg) {
+    setStrategy(cfg->tryI64("waitSpinIterations", 4096, true),
+                cfg->tryI64("waitYieldIterations", 64, true),
+                cfg->tryI64("waitParkMicroseconds", 1000, true));
+  }
+  /**
+   * @brief block until ready() returns true
+   * @param ready the condition, must be cheap and thread-safe to evaluate
+   */
+  template<typename Pred>
+  void waitUntil(Pred ready) {
+    for (int64_t i = 0; i < spinIterations; i++) {
+      if (ready()) {
+        return;
+      }
+      cpuRelax();
+    }
+    if (parkMicroseconds <= 0) {
+      while (!ready()) {
+        cpuRelax();
+      }
+      return;
+    }
+    for (int64_t i = 0; i < yieldIterations; i++) {
+      if (ready()) {
+        return;
+      }
+      std::this_thread::yield();
+    }
+    std::unique_lock<std::mutex> lk(mtx);
+    sleepers.fetch_add(1, std::memory_order_seq_cst);
+    std::atomic_thread_fence(std::memory_order_seq_cst);
+    while (!ready()) {
+      cv.wait_for(lk, std::chrono::microseconds(parkMicroseconds));
+    }
+    sleepers.fetch_sub(1, std::memory_order_relaxed);
+  }
+  /**
+   * @brief wake up parked waiters, call this after making their condition true
+   */
+  void notify() {
+    std::atomic_thread_fence(std::memory_order_seq_cst);
+    if (sleepers.load(std::memory_order_seq_cst) > 0) {
+      std::lock_guard<std::mutex> lk(mtx);
+      cv.notify_all();
+    }
+  }
+};
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @typedef AdaptiveWaiterPtr
+ * @brief The class to describe a shared pointer to @ref AdaptiveWaiter
+ */
+typedef std::shared_ptr<AdaptiveWaiter> AdaptiveWaiterPtr;
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @def newAdaptiveWaiter
+ * @brief (Macro) To creat a new @ref AdaptiveWaiter under shared pointer.
+ */
+#define newAdaptiveWaiter std::make_shared<INTELLI::AdaptiveWaiter>
+}
+#endif //_INCLUDE_UTILS_ADAPTIVEWAITER_HPP_
@@ -0,0 +1,125 @@
+/*! \file GroundTruthStore.h*/
+
+#ifndef INTELLISTREAM_UTILS_GROUNDTRUTHSTORE_H_
+#define INTELLISTREAM_UTILS_GROUNDTRUTHSTORE_H_
+#include <string>
+#include <tuple>
+#include <functional>
+#include <memory>
+#include <torch/torch.h>
+namespace INTELLI {
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @{
+ */
+/**
+ * @class GroundTruthStore Utils/GroundTruthStore.h
+ * @brief Persisted exact-kNN ground truth, one file per (dataset, initialRows, streamRows, ANNK, metric)
+ * @note the file holds a fixed header, the (nq x k) int64 ids and the (nq x k) float distances,
+ * and is memory-mapped on load, the ids index into the concatenation of initial and stream rows
+ * @note validation is done by two hashes in the header, one over the data and query tensors that produced
+ * the ground truth (provided by caller, see @ref hashTensor), one over the payload itself
+ * @note files are written to a temporary name and renamed, so concurrent runs never observe partial files
+ * @note usage
+ * - create with the folder of ground truth files
+ * - call @ref hashTensor over initial, stream and query tensors to get the data hash
+ * - call @ref getOrCompute, the compute function only runs if no valid file exists
+ */
+class GroundTruthStore {
+ protected:
+  std::string folder;
+  /**
+   * @brief the on-disk header, followed by ids and distances
+   */
+  struct FileHeader {
+    char magic[8];
+    int64_t version;
+    int64_t queries;
+    int64_t k;
+    uint64_t dataHash;
+    uint64_t payloadHash;
+  };
+  static constexpr char fileMagic[8] = {'C', 'A', 'N', 'D', 'Y', 'G', 'T', 'S'};
+  static constexpr int64_t fileVersion = 1;
+ public:
+  GroundTruthStore() = default;
+  /**
+   * @brief create a store over a folder, which will be created on first save
+   * @param folderName the folder of ground truth files
+   */
+  explicit GroundTruthStore(const std::string &folderName);
+  ~GroundTruthStore() = default;
+  /**
+   * @brief hash the raw bytes of a tensor, can be chained over several tensors
+   * @param t the tensor, will be made contiguous if not
+   * @param seed the hash of previous tensors, or the default seed for the first one
+   * @return the 64-bit hash
+   */
+  static uint64_t hashTensor(torch::Tensor t, uint64_t seed = 14695981039346656037ULL);
+  /**
+   * @brief get the file name of a key
+   * @param dataset the name of dataset, non-alphanumeric characters are replaced by '_'
+   * @param initialRows the rows loaded before streaming
+   * @param streamRows the rows of stream prefix covered by this ground truth
+   * @param annk the k of kNN
+   * @param metric the metric, e.g., L2 or IP
+   * @return the full path
+   */
+  std::string fileName(const std::string &dataset,
+                       int64_t initialRows,
+                       int64_t streamRows,
+                       int64_t annk,
+                       const std::string &metric) const;
+  /**
+   * @brief load a ground truth by memory mapping its file
+   * @param path the file, see @ref fileName
+   * @param dataHash the expected data hash
+   * @param ids the (nq x k) int64 ids, backed by the mapping
+   * @param distances the (nq x k) float distances, backed by the mapping
+   * @return true if the file exists and both hashes match
+   */
+  static bool load(const std::string &path, uint64_t dataHash, torch::Tensor &ids, torch::Tensor &distances);
+  /**
+   * @brief save a ground truth, atomically replacing the file
+   * @param path the file, see @ref fileName
+   * @param dataHash the data hash
+   * @param ids the (nq x k) int64 ids
+   * @param distances the (nq x k) float distances
+   * @return true if written
+   */
+  static bool save(const std::string &path, uint64_t dataHash, torch::Tensor ids, torch::Tensor distances);
+  /**
+   * @brief load the ground truth of a key, or compute and save it if missing or invalid
+   * @param dataset the name of dataset
+   * @param initialRows the rows loaded before streaming
+   * @param streamRows the rows of stream prefix covered by this ground truth
+   * @param annk the k of kNN
+   * @param metric the metric, e.g., L2 or IP
+   * @param dataHash the hash of data and query tensors
+   * @param compute the function to compute (ids, distances) on miss
+   * @param redo force to compute and overwrite
+   * @return the (nq x k) ids and distances
+   */
+  std::tuple<torch::Tensor, torch::Tensor> getOrCompute(const std::string &dataset,
+                                                        int64_t initialRows,
+                                                        int64_t streamRows,
+                                                        int64_t annk,
+                                                        const std::string &metric,
+                                                        uint64_t dataHash,
+                                                        const std::function<std::tuple<torch::Tensor,
+                                                                                       torch::Tensor>()> &compute,
+                                                        bool redo = false);
+  /**
+   * @brief turn ground truth ids back to rows, to be compared with the results of searchTensor
+   * @param ids the (nq x k) ids, negative for empty slots
+   * @param rows the concatenation of initial and stream rows that ids refer to
+   * @return one (valid k x dim) tensor per query
+   */
+  static std::vector<torch::Tensor> idsToTensorList(torch::Tensor ids, torch::Tensor rows);
+};
+/**
+ * @}
+ */
+} // INTELLI
+
+#endif //INTELLISTREAM_UTILS_GROUNDTRUTHSTORE_H_
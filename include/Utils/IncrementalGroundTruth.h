@@ -0,0 +1,89 @@
+/*! \file IncrementalGroundTruth.h*/
+
+#ifndef INTELLISTREAM_UTILS_INCREMENTALGROUNDTRUTH_H_
+#define INTELLISTREAM_UTILS_INCREMENTALGROUNDTRUTH_H_
+#include <string>
+#include <tuple>
+#include <vector>
+#include <torch/torch.h>
+namespace INTELLI {
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @{
+ */
+/**
+ * @class IncrementalGroundTruth Utils/IncrementalGroundTruth.h
+ * @brief Exact kNN of a fixed query set, kept up to date along a stream of inserts and deletes
+ * @note each query keeps its current top-k, new rows are only compared with the queries once, in blocks of
+ * @ref blockRows rows, by one matrix product per block and a merge with the current top-k,
+ * so following a whole stream costs about one brute-force scan
+ * @note ids are the insertion order of rows, starting from 0, the same as a faiss flat index fed with the same
+ * rows; deleted ids are never reused
+ * @note a delete only triggers a rescan of the queries whose current top-k contains a deleted id
+ * @note distances follow the faiss convention, i.e., squared L2 (smaller is nearer) or inner product
+ * (larger is nearer), dot and IP are inner product, and cossim is the inner product of l2-normalized rows
+ * @note usage
+ * - call @ref setQueries
+ * - call @ref insertTensor / @ref deleteIds along the stream
+ * - call @ref getIds / @ref getDistances at any checkpoint
+ */
+class IncrementalGroundTruth {
+ protected:
+  torch::Tensor queries, dbTensor, aliveTensor;
+  torch::Tensor topIds, topDistances;
+  int64_t lastNNZ = -1;
+  int64_t k = 1;
+  int64_t blockRows = 4096;
+  int64_t expandStep = 100000;
+  bool isIP = false, isCosine = false;
+  /**
+   * @brief l2-normalize each row under cossim, otherwise return t as is
+   */
+  torch::Tensor normalizeRows(torch::Tensor t);
+  /**
+   * @brief compare the queries in queryIdx against rows [startRow, endRow) and merge into their top-k
+   */
+  void scanRows(torch::Tensor queryIdx, int64_t startRow, int64_t endRow);
+ public:
+  IncrementalGroundTruth() = default;
+  ~IncrementalGroundTruth() = default;
+  /**
+   * @brief set the query set and reset the tracked rows
+   * @param q the (nq x dim) queries
+   * @param annk the k of kNN
+   * @param metric L2, or IP, dot and cossim as in @ref CANDY::AbstractIndex
+   * @param block the rows compared per matrix product, bounds the temporary memory to nq x block floats
+   */
+  void setQueries(torch::Tensor q, int64_t annk, const std::string &metric = "L2", int64_t block = 4096);
+  /**
+   * @brief insert rows, they get the next ids in order
+   * @param t the (n x dim) rows
+   * @return the first id assigned
+   */
+  int64_t insertTensor(torch::Tensor t);
+  /**
+   * @brief delete rows by id, affected queries are rescanned over all alive rows
+   * @param ids the int64 ids
+   */
+  void deleteIds(torch::Tensor ids);
+  /**
+   * @brief the current (nq x k) int64 ids in rank order, -1 for empty slots
+   */
+  torch::Tensor getIds();
+  /**
+   * @brief the current (nq x k) float distances in rank order, NaN for empty slots
+   */
+  torch::Tensor getDistances();
+  /**
+   * @brief the number of rows ever inserted
+   */
+  int64_t size() {
+    return lastNNZ + 1;
+  }
+};
+/**
+ * @}
+ */
+} // INTELLI
+
+#endif //INTELLISTREAM_UTILS_INCREMENTALGROUNDTRUTH_H_
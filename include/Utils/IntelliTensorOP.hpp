@@ -9,6 +9,8 @@
 #include <algorithm>
 #include <iostream>
 #include <fstream>
+#include <limits>
+#include <tuple>
 /**
  *  @ingroup INTELLI_UTIL
  *  @{
@@ -281,7 +283,7 @@ class IntelliTensorOP {
       // return true;
       int64_t requiredExpandSize = *lastNNZ + tTail->size(0) + 1 - tHead->size(0);
       int64_t expandSize = std::max(requiredExpandSize, customExpandSize);
-      *tHead = torch::cat({*tHead, torch::zeros({expandSize, tHead->size(1)})}, 0);
+      *tHead = torch::cat({*tHead, torch::zeros({expandSize, tHead->size(1)}, tHead->options())}, 0);
       if (editRows(tHead, tTail, *lastNNZ + 1)) {
         *lastNNZ = *lastNNZ + tTail->size(0);
         return true;
@@ -433,6 +435,88 @@ class IntelliTensorOP {
     // Divide the input tensor by its norm
     return a / norm;
   }
+  /**
+   * @brief brute-force top-k of each query among one shared block of candidates, by one GEMM and a partial select
+   * @param q the (nq x d) queries
+   * @param cand the (n x d) candidates
+   * @param k the returned neighbors
+   * @param isIP use inner product (larger is nearer) rather than squared L2 (smaller is nearer)
+   * @return the (nq x k) int64 rows of cand, -1 for empty slots, and the (nq x k) distances, NaN for empty slots
+   */
+  static std::tuple<torch::Tensor, torch::Tensor> bruteForceTopK(torch::Tensor q,
+                                                                 torch::Tensor cand,
+                                                                 int64_t k,
+                                                                 bool isIP = false) {
+    int64_t n = cand.size(0);
+    auto dist = torch::matmul(q, cand.t());
+    if (!isIP) {
+      dist = (q.pow(2).sum(1, true) - 2 * dist + cand.pow(2).sum(1).unsqueeze(0)).clamp_min(0);
+    }
+    auto rows = torch::arange(n, torch::kInt64).unsqueeze(0).expand({q.size(0), n});
+    return selectTopK(dist, rows, torch::ones_like(dist, torch::kBool), k, isIP);
+  }
+  /**
+   * @brief brute-force top-k of each query among its own candidates, all queries in one call
+   * @param q the (nq x d) queries
+   * @param cand the candidates of all queries, stacked as (n x d)
+   * @param offsets the (nq+1) int64 offsets, candidates of query i are rows [offsets[i], offsets[i+1]) of cand
+   * @param k the returned neighbors
+   * @param isIP use inner product (larger is nearer) rather than squared L2 (smaller is nearer)
+   * @return the (nq x k) int64 rows of cand, -1 for empty slots, and the (nq x k) distances, NaN for empty slots
+   * @note the candidates are padded to the longest list and compared by one batched matrix product
+   */
+  static std::tuple<torch::Tensor, torch::Tensor> batchedTopK(torch::Tensor q,
+                                                              torch::Tensor cand,
+                                                              torch::Tensor offsets,
+                                                              int64_t k,
+                                                              bool isIP = false) {
+    int64_t nq = q.size(0);
+    auto off = offsets.to(torch::kInt64);
+    auto counts = off.slice(0, 1, nq + 1) - off.slice(0, 0, nq);
+    int64_t maxCount = nq > 0 ? counts.max().item<int64_t>() : 0;
+    if (maxCount <= 0) {
+      return selectTopK(torch::zeros({nq, 0}), torch::zeros({nq, 0}, torch::kInt64),
+                        torch::zeros({nq, 0}, torch::kBool), k, isIP);
+    }
+    auto local = torch::arange(maxCount, torch::kInt64).unsqueeze(0);
+    auto valid = local.lt(counts.unsqueeze(1));
+    auto rows = (off.slice(0, 0, nq).unsqueeze(1) + local).masked_fill(valid.logical_not(), 0);
+    auto gathered = cand.index_select(0, rows.flatten()).view({nq, maxCount, cand.size(1)});
+    auto dist = torch::bmm(gathered, q.unsqueeze(2)).squeeze(2);
+    if (!isIP) {
+      dist = (gathered.pow(2).sum(2) - 2 * dist + q.pow(2).sum(1, true)).clamp_min(0);
+    }
+    return selectTopK(dist, rows, valid, k, isIP);
+  }
+  /**
+   * @brief the partial select shared by @ref bruteForceTopK and @ref batchedTopK
+   * @param dist the (nq x m) distances
+   * @param rows the (nq x m) int64 candidate rows
+   * @param valid the (nq x m) mask of real candidates
+   * @param k the returned neighbors
+   * @param isIP larger is nearer
+   * @return the (nq x k) rows, -1 for empty slots, and the (nq x k) distances, NaN for empty slots
+   */
+  static std::tuple<torch::Tensor, torch::Tensor> selectTopK(torch::Tensor dist,
+                                                             torch::Tensor rows,
+                                                             torch::Tensor valid,
+                                                             int64_t k,
+                                                             bool isIP) {
+    int64_t nq = dist.size(0);
+    auto ids = torch::full({nq, k}, -1, torch::kInt64);
+    auto distances = torch::full({nq, k}, std::numeric_limits<float>::quiet_NaN());
+    int64_t kk = std::min(k, dist.size(1));
+    if (kk <= 0) {
+      return std::make_tuple(ids, distances);
+    }
+    float fill = isIP ? -std::numeric_limits<float>::infinity() : std::numeric_limits<float>::infinity();
+    auto masked = dist.to(torch::kFloat32).masked_fill(valid.logical_not(), fill);
+    auto [d, pos] = masked.topk(kk, 1, isIP, true);
+    auto picked = valid.gather(1, pos);
+    ids.slice(1, 0, kk).copy_(rows.gather(1, pos).masked_fill(picked.logical_not(), -1));
+    distances.slice(1, 0, kk).copy_(d.masked_fill(picked.logical_not(), std::numeric_limits<float>::quiet_NaN()));
+    return std::make_tuple(ids, distances);
+  }
 };
 }
 /**
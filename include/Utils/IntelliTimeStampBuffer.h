@@ -0,0 +1,113 @@
+/*! \file IntelliTimeStampBuffer.h*/
+
+#ifndef _UTILS_INTELLITIMESTAMPBUFFER_H_
+#define _UTILS_INTELLITIMESTAMPBUFFER_H_
+#pragma once
+#include <stdint.h>
+#include <string>
+#include <vector>
+#include <memory>
+/**
+ *  @ingroup INTELLI_UTIL
+ *  @{
+ */
+namespace INTELLI {
+class IntelliTimeStamp;
+/**
+* @class IntelliTimeStampBuffer Utils/IntelliTimeStampBuffer.h
+* @brief The time stamps of a stream in three contiguous columns, one row per streamed tuple
+* @ingroup INTELLI_UTIL_TIMESTAMP
+* @note
+* - the columns have the meanings of @ref IntelliTimeStamp, a processedTime of 0 means not processed yet
+* - a batch is marked as processed by @ref setProcessed, instead of one update per row
+* - percentiles are found by selection, without sorting all latencies
+* - resizing the buffer invalidates pointers to the columns, e.g., the numpy views of PyCANDY
+*/
+class IntelliTimeStampBuffer {
+ public:
+  std::vector<uint64_t> eventTime;
+  std::vector<uint64_t> arrivalTime;
+  std::vector<uint64_t> processedTime;
+  IntelliTimeStampBuffer() {}
+  /**
+   * @brief create rows rows of zero time stamps
+   * @param rows the number of rows
+   */
+  IntelliTimeStampBuffer(size_t rows) {
+    resize(rows);
+  }
+  /**
+   * @brief create from the event and arrival columns, nothing is processed yet
+   * @param te the event time
+   * @param ta the arrival time, must have the size of te
+   */
+  IntelliTimeStampBuffer(std::vector<uint64_t> te, std::vector<uint64_t> ta);
+
+  ~IntelliTimeStampBuffer() {}
+  /**
+   * @brief get the number of rows
+   * @return the rows
+   */
+  size_t size() const {
+    return eventTime.size();
+  }
+  /**
+   * @brief resize all columns, new rows are zero
+   * @param rows the number of rows
+   */
+  void resize(size_t rows);
+  /**
+   * @brief set the processed time of rows [startRow,endRow)
+   * @param startRow the first row
+   * @param endRow the row after the last one, clamped to @ref size
+   * @param tp the processed time
+   */
+  void setProcessed(size_t startRow, size_t endRow, uint64_t tp);
+  /**
+   * @brief get the latencies (processedTime-arrivalTime) of the processed rows
+   * @return the latencies in row order
+   */
+  std::vector<uint64_t> getLatencies();
+  /**
+   * @brief get one latency percentile, the same value as sorting all latencies
+   * @param fraction the percentile in 0~1
+   * @return the latency value, 0 if there is no processed row
+   */
+  double getLatencyPercentage(double fraction);
+  /**
+   * @brief get several latency percentiles by one pass of selections over a shared copy of the latencies
+   * @param fractions the percentiles in 0~1, in any order
+   * @return the latency values, in the order of fractions
+   */
+  std::vector<double> getLatencyPercentages(std::vector<double> fractions);
+  /**
+   * @brief save the time stamps to csv file
+   * @param fname the name of output file
+   * @param skipZero whether skip the rows not processed
+   * @return whether the output is successful
+   */
+  bool saveToFile(std::string fname, bool skipZero = true);
+  /**
+   * @brief convert to one @ref IntelliTimeStamp per row, for code still using the old layout
+   * @return the vector of time stamps
+   */
+  std::vector<std::shared_ptr<INTELLI::IntelliTimeStamp>> toTimeStamps();
+};
+
+/**
+ * @ingroup INTELLI_UTIL_TIMESTAMP
+ * @typedef IntelliTimeStampBufferPtr
+ * @brief The class to describe a shared pointer to @ref IntelliTimeStampBuffer
+ */
+typedef std::shared_ptr<INTELLI::IntelliTimeStampBuffer> IntelliTimeStampBufferPtr;
+/**
+ * @ingroup INTELLI_UTIL_TIMESTAMP
+ * @def newIntelliTimeStampBuffer
+ * @brief (Macro) To creat a new @ref IntelliTimeStampBuffer under shared pointer.
+ */
+#define newIntelliTimeStampBuffer std::make_shared<INTELLI::IntelliTimeStampBuffer>
+}
+/**
+ * @}
+ */
+#endif //_UTILS_INTELLITIMESTAMPBUFFER_H_
@@ -11,6 +11,7 @@
 #include <memory>
 #include <Utils/ConfigMap.hpp>
 #include <Utils/MicroDataSet.hpp>
+#include <Utils/IntelliTimeStampBuffer.h>
 /**
  *  @ingroup INTELLI_UTIL
  *  @{
@@ -76,7 +77,7 @@ typedef std::shared_ptr<INTELLI::IntelliTimeStamp> IntelliTimeStampPtr;
 * @note  Default behavior
 * - create
 * - call @ref setConfig to generate the timestamp under instructions
-* - call @ref getTimeStamps to get the timestamp
+* - call @ref getTimeStampBuffer to get the timestamp in columns, or @ref getTimeStamps for one pointer per row
 */
 class IntelliTimeStampGenerator {
  protected:
@@ -118,6 +119,7 @@ class IntelliTimeStampGenerator {
   ~IntelliTimeStampGenerator() {}
 
   std::vector<INTELLI::IntelliTimeStampPtr> myTs;
+  IntelliTimeStampBufferPtr myBuffer = nullptr;
 
   /**
 * @brief Set the GLOBAL config map related to this TimerStamper
@@ -127,10 +129,15 @@ class IntelliTimeStampGenerator {
   virtual bool setConfig(INTELLI::ConfigMapPtr cfg);
 
   /**
-  * @brief get the vector of time stamps
+  * @brief get the vector of time stamps, built from @ref getTimeStampBuffer on the first call
   * @return the vector
   */
   virtual std::vector<INTELLI::IntelliTimeStampPtr> getTimeStamps();
+  /**
+   * @brief get the time stamps as one columnar buffer, without a per-row allocation
+   * @return the buffer, shared with this generator
+   */
+  virtual IntelliTimeStampBufferPtr getTimeStampBuffer();
 };
 
 }
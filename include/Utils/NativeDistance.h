@@ -0,0 +1,55 @@
+/*! \file NativeDistance.h*/
+
+#ifndef INTELLISTREAM_UTILS_NATIVEDISTANCE_H_
+#define INTELLISTREAM_UTILS_NATIVEDISTANCE_H_
+#include <string>
+#include <torch/torch.h>
+namespace INTELLI {
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @{
+ */
+/**
+ * @class NativeDistance Utils/NativeDistance.h
+ * @brief Exact k-NN scan over rows stored in their native, compact type, i.e., float16, uint8 or int8
+ * @note a row is read in its own type and widened in registers, so the scan moves 2x (float16) or 4x (uint8,
+ * int8) fewer bytes than over float32 rows
+ * @note if the query has the same integer type as the rows, distances are accumulated in int32 and are exact,
+ * which holds for dimensions up to 33025, otherwise the query is taken as float32
+ * @note empty slots of the result follow faiss, i.e., id -1 with the worst distance
+ */
+class NativeDistance {
+ public:
+  /**
+   * @brief the storage type named by a string
+   * @param name float32, float16, uint8 or int8
+   * @return the type, Undefined if the name is unknown
+   */
+  static torch::ScalarType typeFromString(const std::string &name);
+  /**
+   * @brief whether rows of this type can be scanned by @ref knn
+   */
+  static bool isSupported(torch::ScalarType t);
+  /**
+   * @brief search the k-NN of each query over the first dbSize rows of db, in parallel over queries
+   * @param q the (nq x d) queries
+   * @param db the rows, contiguous, of float32, float16, uint8 or int8
+   * @param dbSize the valid rows of db
+   * @param k the returned neighbors
+   * @param isIP whether the metric is inner product, larger is nearer, otherwise squared L2
+   * @param distances the output of nq*k distances, nearest first
+   * @param idx the output of nq*k row ids, nearest first
+   */
+  static void knn(torch::Tensor q,
+                  torch::Tensor db,
+                  int64_t dbSize,
+                  int64_t k,
+                  bool isIP,
+                  float *distances,
+                  int64_t *idx);
+};
+/**
+ * @}
+ */
+} // INTELLI
+#endif //INTELLISTREAM_UTILS_NATIVEDISTANCE_H_
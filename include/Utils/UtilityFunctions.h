@@ -92,15 +92,24 @@ class UtilityFunctions {
       INTELLI_ERROR("No valid latency, maybe there is no AMM result?");
       return 0;
     }
-    std::sort(validLatency.begin(), validLatency.end());
     double t = nonZeroCnt;
     t = t * fraction;
     size_t idx = (size_t) t + 1;
     if (idx >= validLatency.size()) {
       idx = validLatency.size() - 1;
     }
+    std::nth_element(validLatency.begin(), validLatency.begin() + idx, validLatency.end());
     return validLatency[idx];
   }
+  /**
+   * @brief get the latency percentile from a columnar time stamp buffer
+   * @param fraction the percentile in 0~1
+   * @param myTs the time stamp buffer
+   * @return the latency value
+   */
+  static double getLatencyPercentage(double fraction, INTELLI::IntelliTimeStampBufferPtr myTs) {
+    return myTs->getLatencyPercentage(fraction);
+  }
   /**
     * @brief save the time stamps to csv file
     * @param fname the name of output file
@@ -132,6 +141,16 @@ class UtilityFunctions {
     of.close();
     return true;
   }
+  /**
+    * @brief save the columnar time stamps to csv file
+    * @param fname the name of output file
+    * @param myTs the time stamp buffer
+    * @param skipZero whether skip zero time
+    * @return whether the output is successful
+    */
+  static bool saveTimeStampToFile(std::string fname, INTELLI::IntelliTimeStampBufferPtr myTs, bool skipZero = true) {
+    return myTs->saveToFile(fname, skipZero);
+  }
   static bool existRow(torch::Tensor base, torch::Tensor row) {
     for (int64_t i = 0; i < base.size(0); i++) {
       auto tensor1 = base[i].contiguous();
@@ -148,24 +167,188 @@ class UtilityFunctions {
    * @param groundTruth The ground truth
    * @param prob The tensor result to be validated
    * @return the recall in 0~1
+   * @note each query is checked in one broadcast comparison rather than row by row,
+   * use @ref calculateRecallById if the ids of results are available
    */
   static double calculateRecall(std::vector<torch::Tensor> groundTruth, std::vector<torch::Tensor> prob) {
     int64_t truePositives = 0;
-    int64_t falseNegatives = 0;
+    int64_t totalRows = 0;
     for (size_t i = 0; i < prob.size(); i++) {
-      auto gdI = groundTruth[i];
-      auto probI = prob[i];
-      for (int64_t j = 0; j < probI.size(0); j++) {
-        if (existRow(gdI, probI[j])) {
-          truePositives++;
-        } else {
-          falseNegatives++;
-        }
+      auto gdI = groundTruth[i].contiguous();
+      auto probI = prob[i].contiguous();
+      totalRows += probI.size(0);
+      if (probI.size(0) == 0 || gdI.size(0) == 0) {
+        continue;
       }
+      auto hits = probI.unsqueeze(1).eq(gdI.unsqueeze(0)).all(2).any(1);
+      truePositives += hits.sum().item<int64_t>();
+    }
+    if (totalRows == 0) {
+      return 0.0;
     }
-    double recall = static_cast<double>(truePositives) / (truePositives + falseNegatives);
+    double recall = static_cast<double>(truePositives) / totalRows;
     return recall;
   }
+  /**
+   * @brief mark which of the returned ids are true neighbors, for the whole batch at once
+   * @param groundTruthIds The (nq x kg) int64 ids of exact neighbors, negative for empty slots
+   * @param probIds The (nq x k) int64 ids to be validated, negative for empty slots
+   * @param k only the first k columns are evaluated, <=0 for all columns of probIds
+   * @return the (nq x k) bool tensor, true at hits, repeated ids are counted once
+   */
+  static torch::Tensor idHitMask(torch::Tensor groundTruthIds, torch::Tensor probIds, int64_t k = -1) {
+    if (k <= 0 || k > probIds.size(1)) {
+      k = probIds.size(1);
+    }
+    int64_t kg = std::min(k, groundTruthIds.size(1));
+    auto probK = probIds.slice(1, 0, k).to(torch::kInt64).contiguous();
+    if (k == 0 || kg == 0) {
+      return torch::zeros_like(probK, torch::kBool);
+    }
+    auto gdSorted = std::get<0>(groundTruthIds.slice(1, 0, kg).to(torch::kInt64).sort(1));
+    auto pos = torch::searchsorted(gdSorted, probK).clamp_max(kg - 1);
+    auto hits = gdSorted.gather(1, pos).eq(probK).logical_and(probK.ge(0));
+    /**
+     * @brief drop repeated ids, so that one true neighbor is never counted twice
+     */
+    auto sorted = torch::sort(probK, true, 1, false);
+    auto vals = std::get<0>(sorted);
+    auto firstSeen = torch::ones_like(probK, torch::kBool);
+    firstSeen.slice(1, 1, k).copy_(vals.slice(1, 1, k).ne(vals.slice(1, 0, k - 1)));
+    auto keep = torch::empty_like(firstSeen).scatter_(1, std::get<1>(sorted), firstSeen);
+    return hits.logical_and(keep);
+  }
+  /**
+   * @brief arrange the flat ids of a kNN search, e.g., CANDY::AbstractIndex::searchIndex, as an id matrix
+   * @param idx the ids in faiss's order, k per query
+   * @param nq the number of queries
+   * @param k the k of kNN
+   * @return the (nq x k) int64 ids, undefined if idx does not hold nq*k ids, i.e., the index returns no ids
+   */
+  static torch::Tensor idsToMatrix(std::vector<int64_t> idx, int64_t nq, int64_t k) {
+    if ((int64_t) idx.size() != nq * k) {
+      return torch::Tensor();
+    }
+    return torch::from_blob(idx.data(), {nq, k}, torch::kInt64).clone();
+  }
+  /**
+   * @brief give the result rows of ground truth and of an index the same ids where the rows are equal,
+   * so that row results are evaluated by @ref calculateRecallById
+   * @param groundTruth The ground truth rows, one (kg x dim) tensor per query
+   * @param prob The result rows to be validated, one (k x dim) tensor per query
+   * @param k only the first k rows of each tensor are kept
+   * @return the (nq x k) int64 ids of groundTruth and of prob, -1 for missing rows
+   * @note all rows are numbered by one unique over the whole batch, use it when the ids of the index are not
+   * comparable to the ground truth, e.g., after deletions
+   */
+  static std::tuple<torch::Tensor, torch::Tensor> rowsToIds(std::vector<torch::Tensor> groundTruth,
+                                                            std::vector<torch::Tensor> prob,
+                                                            int64_t k) {
+    int64_t nq = prob.size();
+    auto gdIds = torch::full({nq, k}, -1, torch::kInt64);
+    auto probIds = torch::full({nq, k}, -1, torch::kInt64);
+    int64_t dim = -1;
+    for (int64_t i = 0; i < nq && dim < 0; i++) {
+      if (i < (int64_t) groundTruth.size() && groundTruth[i].dim() == 2) {
+        dim = groundTruth[i].size(1);
+      }
+    }
+    std::vector<torch::Tensor> rows;
+    std::vector<std::tuple<torch::Tensor, int64_t, int64_t>> targets;
+    auto collect = [&](torch::Tensor src, torch::Tensor dst, int64_t i) {
+      if (!src.defined() || src.dim() != 2 || src.size(1) != dim || src.size(0) == 0) {
+        return;
+      }
+      auto rowsI = src.slice(0, 0, k).to(torch::kFloat32);
+      targets.emplace_back(dst, i, rowsI.size(0));
+      rows.push_back(rowsI);
+    };
+    for (int64_t i = 0; i < nq; i++) {
+      if (i < (int64_t) groundTruth.size()) {
+        collect(groundTruth[i], gdIds, i);
+      }
+      collect(prob[i], probIds, i);
+    }
+    if (rows.empty()) {
+      return std::make_tuple(gdIds, probIds);
+    }
+    auto inverse = std::get<1>(torch::unique_dim(torch::cat(rows, 0), 0, false, true));
+    int64_t offset = 0;
+    for (auto &[dst, i, len] : targets) {
+      dst[i].slice(0, 0, len).copy_(inverse.slice(0, offset, offset + len));
+      offset += len;
+    }
+    return std::make_tuple(gdIds, probIds);
+  }
+  /**
+   * @brief calculate the recall@k by comparing id matrices with ground truth
+   * @param groundTruthIds The (nq x kg) int64 ids of exact neighbors, negative for empty slots
+   * @param probIds The (nq x k) int64 ids to be validated, negative for empty slots
+   * @param k the k of recall@k, <=0 for all columns of probIds
+   * @return the recall in 0~1
+   */
+  static double calculateRecallById(torch::Tensor groundTruthIds, torch::Tensor probIds, int64_t k = -1) {
+    if (k <= 0 || k > probIds.size(1)) {
+      k = probIds.size(1);
+    }
+    auto hits = idHitMask(groundTruthIds, probIds, k);
+    int64_t kg = std::min(k, groundTruthIds.size(1));
+    int64_t expected = groundTruthIds.slice(1, 0, kg).ge(0).sum().item<int64_t>();
+    if (expected == 0) {
+      return 0.0;
+    }
+    return static_cast<double>(hits.sum().item<int64_t>()) / expected;
+  }
+  /**
+   * @brief calculate the mean average precision (MAP@k) by comparing id matrices with ground truth
+   * @param groundTruthIds The (nq x kg) int64 ids of exact neighbors, negative for empty slots
+   * @param probIds The (nq x k) int64 ids to be validated in rank order, negative for empty slots
+   * @param k the k of MAP@k, <=0 for all columns of probIds
+   * @return the MAP in 0~1
+   */
+  static double calculateMAPById(torch::Tensor groundTruthIds, torch::Tensor probIds, int64_t k = -1) {
+    if (k <= 0 || k > probIds.size(1)) {
+      k = probIds.size(1);
+    }
+    if (probIds.size(0) == 0) {
+      return 0.0;
+    }
+    auto hits = idHitMask(groundTruthIds, probIds, k).to(torch::kFloat64);
+    int64_t kg = std::min(k, groundTruthIds.size(1));
+    auto expected = groundTruthIds.slice(1, 0, kg).ge(0).sum(1).clamp_min(1).to(torch::kFloat64);
+    auto ranks = torch::arange(1, k + 1, torch::kFloat64);
+    auto precisionAtRank = hits.cumsum(1) / ranks;
+    auto ap = (precisionAtRank * hits).sum(1) / expected;
+    return ap.mean().item<double>();
+  }
+  /**
+   * @brief calculate the distance ratio between returned and exact neighbors, 1.0 is the best
+   * @param groundTruthDistances The (nq x k) distances of exact neighbors in rank order
+   * @param probDistances The (nq x k) distances of returned results in rank order
+   * @param k only the first k columns are evaluated, <=0 for all columns
+   * @return the average over queries of sum(probDistances)/sum(groundTruthDistances)
+   * @note non-finite entries (e.g., the NaN of empty slots) are skipped rank-wise,
+   * queries whose exact distances sum to 0 are skipped as well
+   */
+  static double calculateDistanceRatio(torch::Tensor groundTruthDistances,
+                                       torch::Tensor probDistances,
+                                       int64_t k = -1) {
+    int64_t cols = std::min(groundTruthDistances.size(1), probDistances.size(1));
+    if (k <= 0 || k > cols) {
+      k = cols;
+    }
+    auto gd = groundTruthDistances.slice(1, 0, k).to(torch::kFloat64);
+    auto pd = probDistances.slice(1, 0, k).to(torch::kFloat64);
+    auto valid = torch::isfinite(gd).logical_and(torch::isfinite(pd));
+    auto gdSum = torch::where(valid, gd, torch::zeros_like(gd)).sum(1);
+    auto pdSum = torch::where(valid, pd, torch::zeros_like(pd)).sum(1);
+    auto usable = gdSum.ne(0);
+    int64_t queries = usable.sum().item<int64_t>();
+    if (queries == 0) {
+      return 0.0;
+    }
+    return (pdSum.masked_select(usable) / gdSum.masked_select(usable)).sum().item<double>() / queries;
+  }
   /**
   * @brief convert a list of tensors to a folder with multiple flat binary form files, i.e., <rows> <cols> <flat data> for each
   * @param A the list of tensors
@@ -0,0 +1,82 @@
+/*! \file VisitedBitmap.hpp*/
+
+#ifndef _INCLUDE_UTILS_VISITEDBITMAP_HPP_
+#define _INCLUDE_UTILS_VISITEDBITMAP_HPP_
+#pragma once
+
+#include <cstdint>
+#include <memory>
+#include <vector>
+namespace INTELLI {
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @class VisitedBitmap Utils/VisitedBitmap.hpp
+ * @brief A reusable visited set over dense ids, one bit per id
+ * @note the words made non-zero are remembered, so @ref clear costs O(visited) instead of O(ids),
+ * and one bitmap can be kept per thread and reused by all searches of that thread
+ * @note not thread-safe
+ */
+class VisitedBitmap {
+ protected:
+  std::vector<uint64_t> words;
+  std::vector<uint32_t> touched;
+ public:
+  VisitedBitmap() = default;
+  ~VisitedBitmap() = default;
+  /**
+   * @brief make room for ids in [0,n), the bits already set are kept
+   * @param n the number of ids
+   */
+  void reserve(size_t n) {
+    size_t w = (n + 63) >> 6;
+    if (words.size() < w) {
+      words.resize(w, 0);
+    }
+  }
+  /**
+   * @brief mark an id
+   * @param id the id, must be below the reserved size
+   * @return whether the id was already marked
+   */
+  bool testAndSet(size_t id) {
+    uint64_t &w = words[id >> 6];
+    uint64_t mask = uint64_t(1) << (id & 63);
+    if (w & mask) {
+      return true;
+    }
+    if (w == 0) {
+      touched.push_back(uint32_t(id >> 6));
+    }
+    w |= mask;
+    return false;
+  }
+  /**
+   * @brief whether an id is marked
+   */
+  bool test(size_t id) const {
+    return (words[id >> 6] >> (id & 63)) & 1;
+  }
+  /**
+   * @brief unmark all ids
+   */
+  void clear() {
+    for (auto w : touched) {
+      words[w] = 0;
+    }
+    touched.clear();
+  }
+};
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @typedef VisitedBitmapPtr
+ * @brief The class to describe a shared pointer to @ref VisitedBitmap
+ */
+typedef std::shared_ptr<VisitedBitmap> VisitedBitmapPtr;
+/**
+ * @ingroup INTELLI_UTIL_OTHERC20
+ * @def newVisitedBitmap
+ * @brief (Macro) To creat a new @ref VisitedBitmap under shared pointer.
+ */
+#define newVisitedBitmap std::make_shared<INTELLI::VisitedBitmap>
+}
+#endif //_INCLUDE_UTILS_VISITEDBITMAP_HPP_
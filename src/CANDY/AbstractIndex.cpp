@@ -8,6 +8,7 @@
 #include <time.h>
 #include <chrono>
 #include <assert.h>
+#include <limits>
 static std::vector<std::string> u64ObjectToStringObject(std::vector<uint64_t> &u64s) {
   std::vector<std::string> ru(u64s.size());
   for (size_t i = 0; i < u64s.size(); i++) {
@@ -127,6 +128,30 @@ std::vector<faiss::idx_t> CANDY::AbstractIndex::searchIndexParam(torch::Tensor q
     return searchIndex(q,k);
 }
 
+std::tuple<torch::Tensor, torch::Tensor> CANDY::AbstractIndex::searchWithDistances(torch::Tensor &q, int64_t k) {
+  int64_t querySize = q.size(0);
+  auto idx = searchIndex(q, k);
+  idx.resize(querySize * k, -1);
+  auto ids = torch::from_blob(idx.data(), {querySize, k}, torch::kInt64).clone();
+  auto distances = torch::full({querySize, k}, std::numeric_limits<float>::quiet_NaN());
+  auto hits = getTensorByIndex(idx, k);
+  for (int64_t i = 0; i < querySize && i < (int64_t) hits.size(); i++) {
+    auto &hitI = hits[i];
+    if (hitI.dim() != 2 || hitI.size(1) != q.size(1)) {
+      continue;
+    }
+    int64_t rows = std::min(hitI.size(0), k);
+    auto qI = q.slice(0, i, i + 1);
+    auto hitRows = hitI.slice(0, 0, rows);
+    if (faissMetric == faiss::METRIC_INNER_PRODUCT) {
+      distances[i].slice(0, 0, rows) = torch::matmul(hitRows, qI.t()).view({rows});
+    } else {
+      distances[i].slice(0, 0, rows) = (hitRows - qI).pow(2).sum(1);
+    }
+  }
+  distances.masked_fill_(ids < 0, std::numeric_limits<float>::quiet_NaN());
+  return std::make_tuple(ids, distances);
+}
 std::vector<std::vector<std::string>> CANDY::AbstractIndex::searchStringObject(torch::Tensor &q, int64_t k) {
   assert(k > 0);
   assert(q.size(1));
@@ -183,6 +208,9 @@ bool CANDY::AbstractIndex::loadInitialTensorAndQueryDistribution(torch::Tensor &
   assert(query.size(0) > 0);
   return loadInitialTensor(t);
 }
+CANDY::IndexThreadSafety CANDY::AbstractIndex::getThreadSafety() {
+  return THREAD_UNSAFE;
+}
 bool CANDY::AbstractIndex::resetIndexStatistics() {
   return false;
 }
@@ -190,4 +218,7 @@ INTELLI::ConfigMapPtr CANDY::AbstractIndex::getIndexStatistics() {
   auto ru = newConfigMap();
   ru->edit("hasExtraStatistics", (int64_t) 0);
   return ru;
+}
+std::shared_ptr<CANDY::AbstractIndex> CANDY::AbstractIndex::snapshot() {
+  return nullptr;
 }
\ No newline at end of file
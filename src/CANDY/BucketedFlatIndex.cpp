@@ -5,6 +5,7 @@
 
 #include "CANDY/BucketedFlatIndex.h"
 #include "Utils/UtilityFunctions.h"
+#include <map>
 #include <time.h>
 #include <chrono>
 #include <assert.h>
@@ -210,7 +211,8 @@ bool CANDY::BucketedFlatIndex::insertTensor(torch::Tensor &t) {
   if (numberOfBuckets == 1) {
     return buckets[0]->insertTensor(t);
   }
-  auto bktIdx = encodeMultiRows(t);
+  auto tf = t.to(torch::kFloat32);
+  auto bktIdx = encodeMultiRows(tf);
   size_t encodeLines = (size_t) t.size(0);
   for (size_t i = 0; i < encodeLines; i++) {
     auto rowI = t.slice(0, i, i + 1);
@@ -223,7 +225,8 @@ bool CANDY::BucketedFlatIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   if (numberOfBuckets == 1) {
     return buckets[0]->deleteTensor(t, k);
   }
-  auto bktIdx = encodeMultiRows(t);
+  auto tf = t.to(torch::kFloat32);
+  auto bktIdx = encodeMultiRows(tf);
   size_t encodeLines = (size_t) t.size(0);
   for (size_t i = 0; i < encodeLines; i++) {
     auto rowI = t.slice(0, i, i + 1);
@@ -236,7 +239,8 @@ bool CANDY::BucketedFlatIndex::reviseTensor(torch::Tensor &t, torch::Tensor &w)
   if (numberOfBuckets == 1) {
     return buckets[0]->reviseTensor(t, w);
   }
-  auto bktIdx = encodeMultiRows(t);
+  auto tf = t.to(torch::kFloat32);
+  auto bktIdx = encodeMultiRows(tf);
   size_t encodeLines = (size_t) t.size(0);
   for (size_t i = 0; i < encodeLines; i++) {
     auto rowI = t.slice(0, i, i + 1);
@@ -246,47 +250,31 @@ bool CANDY::BucketedFlatIndex::reviseTensor(torch::Tensor &t, torch::Tensor &w)
   return true;
 }
 torch::Tensor CANDY::BucketedFlatIndex::searchSingleRow(torch::Tensor &q, uint64_t bktIdx, int64_t k) {
+  return searchBucketGroup(q, bktIdx, k)[0];
+}
+torch::Tensor CANDY::BucketedFlatIndex::expandCandidates(uint64_t bktIdx, int64_t k) {
   int64_t minimumNum = k;
   size_t bkts = numberOfBuckets;
-  if (bktIdx > bkts) { return torch::zeros({minimumNum, q.size(1)}); }
-  /**
-   * @brief 1. test whether the buckets[idx] has enough tensors,
-   */
-  if (buckets[bktIdx]->size() >= minimumNum) {
-    INTELLI_INFO("Bucket " + to_string(bktIdx) + " , has" + to_string(buckets[bktIdx]->size()) + "candidates");
-    return buckets[bktIdx]->searchTensor(q, k)[0];
-  }
-  INTELLI_WARNING("Warning, need to expand the search");
   size_t testTensors = 0;
-  /**
-  * @brief 2. if not, try to expand
-  */
   uint64_t leftMostExpand = bktIdx;
   uint64_t rightMostExpand = bkts - 1 - bktIdx;
   uint64_t leftExpand = (bktIdx == 0) ? 0 : 1;
   uint64_t rightExpand = (bktIdx == (bkts - 1)) ? 0 : 1;
   bool reachedLeftMost = (bktIdx == 0);
   bool reachedRightMost = (bktIdx == (bkts - 1));
+  std::vector<torch::Tensor> parts;
   testTensors += buckets[bktIdx]->size();
-  torch::Tensor dbTensor = torch::zeros({(int64_t) minimumNum, q.size(1)});
-  int64_t lastNNZ = -1;
   if (testTensors > 0) {
-    auto getTensor = buckets[bktIdx]->rawData();
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &getTensor, &lastNNZ);
-    // //std::cout<<"append\n"<<getTensor<<std::endl;
+    parts.push_back(buckets[bktIdx]->rawData());
   }
   while (testTensors < (uint64_t) minimumNum
-      && ((reachedRightMost && reachedLeftMost) == false)) { // //std::cout<<"enter while"<<std::endl;
+      && ((reachedRightMost && reachedLeftMost) == false)) {
     if ((!reachedLeftMost)) {
       auto getSize = buckets[bktIdx - leftExpand]->size();
-      //  //std::cout<<"try bucket (left)"<<bktIdx-leftExpand<<"size "<<getSize<<std::endl;
       if (getSize > 0) {
-        auto getTensor = buckets[bktIdx - leftExpand]->rawData();
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &getTensor, &lastNNZ);
-        testTensors += getTensor.size(0);
-        // //std::cout<<"append LEFT\n"<<getTensor<<std::endl;
+        parts.push_back(buckets[bktIdx - leftExpand]->rawData());
+        testTensors += parts.back().size(0);
       }
-
       leftExpand++;
       if (leftExpand > leftMostExpand) {
         reachedLeftMost = true;
@@ -295,12 +283,9 @@ torch::Tensor CANDY::BucketedFlatIndex::searchSingleRow(torch::Tensor &q, uint64
     }
     if (!reachedRightMost) {
       auto getSize = buckets[bktIdx + rightExpand]->size();
-      //  //std::cout<<"try bucket (right)"<<bktIdx+rightExpand<<"size "<<getSize<<std::endl;
       if (getSize > 0) {
-        auto getTensor = buckets[bktIdx + rightExpand]->rawData();
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &getTensor, &lastNNZ);
-        testTensors += getTensor.size(0);
-        // //std::cout<<"append right\n"<<getTensor<<std::endl;
+        parts.push_back(buckets[bktIdx + rightExpand]->rawData());
+        testTensors += parts.back().size(0);
       }
       rightExpand++;
       if (rightExpand > rightMostExpand) {
@@ -309,22 +294,45 @@ torch::Tensor CANDY::BucketedFlatIndex::searchSingleRow(torch::Tensor &q, uint64
       }
     }
   }
+  if (parts.empty()) {
+    return torch::zeros({0, vecDim});
+  }
+  return torch::cat(parts, 0);
+}
+std::vector<torch::Tensor> CANDY::BucketedFlatIndex::searchBucketGroup(torch::Tensor &q, uint64_t bktIdx, int64_t k) {
+  int64_t queries = q.size(0);
+  std::vector<torch::Tensor> ru(queries);
+  if (bktIdx >= (uint64_t) numberOfBuckets) {
+    for (int64_t i = 0; i < queries; i++) {
+      ru[i] = torch::zeros({k, q.size(1)});
+    }
+    return ru;
+  }
   /**
-   * @brief search on the expanded dbTensor
+   * @brief 1. test whether the buckets[idx] has enough tensors,
+   */
+  if (buckets[bktIdx]->size() >= k) {
+    INTELLI_INFO("Bucket " + to_string(bktIdx) + " , has" + to_string(buckets[bktIdx]->size()) + "candidates");
+    return buckets[bktIdx]->searchTensor(q, k);
+  }
+  /**
+   * @brief 2. if not, expand to neighbor buckets and search all queries of this group in one call
    */
-  faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-  torch::Tensor ru = torch::zeros({k, q.size(1)});
-  auto queryTensor = q;
-  float *dbData = dbTensor.data_ptr<float>();
-  float *queryData = queryTensor.contiguous().data_ptr<float>();
-  indexFlat.add(dbTensor.size(0), dbData); // add vectors to the index
-  int64_t querySize = 1;
-  std::vector<faiss::idx_t> idxRu(k * querySize);
-  std::vector<float> distance(k * querySize);
-  indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
-  for (int64_t j = 0; j < k; j++) {
-    int64_t tempIdx = idxRu[j];
-    if (tempIdx >= 0) { ru.slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1); }
+  INTELLI_WARNING("Warning, need to expand the search");
+  auto candidates = expandCandidates(bktIdx, k);
+  if (candidates.size(0) == 0) {
+    for (int64_t i = 0; i < queries; i++) {
+      ru[i] = torch::zeros({k, q.size(1)});
+    }
+    return ru;
+  }
+  auto queryTensor = q.to(torch::kFloat32).contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::bruteForceTopK(queryTensor, candidates, k,
+                                                                    faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto rows = candidates.index_select(0, idxRu.clamp_min(0).flatten()).view({queries, k, candidates.size(1)});
+  rows.masked_fill_(idxRu.lt(0).unsqueeze(2), 0);
+  for (int64_t i = 0; i < queries; i++) {
+    ru[i] = rows[i];
   }
   return ru;
 }
@@ -336,10 +344,22 @@ std::vector<torch::Tensor> CANDY::BucketedFlatIndex::searchTensor(torch::Tensor
   }
   size_t queryLen = q.size(0);
   std::vector<torch::Tensor> ru(queryLen);
-  auto bktIdx = encodeMultiRows(q);
+  auto qf = q.to(torch::kFloat32);
+  auto bktIdx = encodeMultiRows(qf);
+  /**
+   * @brief queries of the same bucket share their candidates, so search them as one batch
+   */
+  std::map<uint64_t, std::vector<int64_t>> groups;
   for (size_t i = 0; i < queryLen; i++) {
-    auto rowI = q.slice(0, i, i + 1);
-    ru[i] = searchSingleRow(rowI, bktIdx[i], k);
+    groups[bktIdx[i]].push_back((int64_t) i);
+  }
+  for (auto &[bkt, rowIdx] : groups) {
+    auto groupIdx = torch::tensor(rowIdx, torch::kInt64);
+    auto groupQ = q.index_select(0, groupIdx);
+    auto groupRu = searchBucketGroup(groupQ, bkt, k);
+    for (size_t j = 0; j < rowIdx.size(); j++) {
+      ru[rowIdx[j]] = groupRu[j];
+    }
   }
   return ru;
 }
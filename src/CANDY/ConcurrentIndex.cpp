@@ -7,10 +7,66 @@
 
 #include <CANDY/ConcurrentIndex.h>
 #include <Utils/UtilityFunctions.h>
+#include <Utils/IntelliLog.h>
 #include <time.h>
 #include <chrono>
+#include <cmath>
+#include <random>
 #include <assert.h>
 
+void CANDY::LatencyHistogram::add(int64_t ns) {
+  size_t b = 0;
+  if (ns > 1) {
+    b = std::min((size_t) (63 - __builtin_clzll((uint64_t) ns)), buckets - 1);
+  }
+  counts[b]++;
+  total++;
+  maxNs = std::max(maxNs, ns);
+}
+
+void CANDY::LatencyHistogram::merge(const LatencyHistogram &other) {
+  for (size_t i = 0; i < buckets; i++) {
+    counts[i] += other.counts[i];
+  }
+  total += other.total;
+  maxNs = std::max(maxNs, other.maxNs);
+}
+
+int64_t CANDY::LatencyHistogram::quantileNs(double p) const {
+  if (total == 0) {
+    return 0;
+  }
+  auto rank = (int64_t) std::ceil(p * total);
+  rank = std::max(rank, (int64_t) 1);
+  int64_t seen = 0;
+  for (size_t i = 0; i < buckets; i++) {
+    seen += counts[i];
+    if (seen >= rank) {
+      return std::min(((int64_t) 2 << i) - 1, maxNs);
+    }
+  }
+  return maxNs;
+}
+
+void CANDY::LatencyHistogram::report(INTELLI::ConfigMapPtr cfg, const std::string &prefix) const {
+  cfg->edit(prefix + "Count", total);
+  cfg->edit(prefix + "P50Ns", quantileNs(0.5));
+  cfg->edit(prefix + "P95Ns", quantileNs(0.95));
+  cfg->edit(prefix + "P99Ns", quantileNs(0.99));
+  cfg->edit(prefix + "MaxNs", maxNs);
+  std::string hist;
+  for (size_t i = 0; i < buckets; i++) {
+    hist += (i ? "," : "") + std::to_string(counts[i]);
+  }
+  cfg->edit(prefix + "Histogram", hist);
+}
+
+void CANDY::LatencyHistogram::clear() {
+  std::fill(counts.begin(), counts.end(), 0);
+  total = 0;
+  maxNs = 0;
+}
+
 bool CANDY::ConcurrentIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   assert(cfg);
   std::string concurrentlAlgoTag = cfg->tryString("concurrentAlgoTag", "flat", true);
@@ -20,10 +76,24 @@ bool CANDY::ConcurrentIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
     return false;
   }
 
-  vecDim = cfg->tryI64("vecDim", 128, true);;
-  double writeRatio = cfg->tryDouble("concurrentWriteRatio", 0.5, true);
-  int64_t batchSize = cfg->tryI64("concurrentBatchSize", 100, true);
-  int64_t numThreads = cfg->tryI64("concurrentNumThreads", 1, true);
+  vecDim = cfg->tryI64("vecDim", 128, true);
+  writeRatio = cfg->tryDouble("concurrentWriteRatio", 0.5, true);
+  if (writeRatio <= 0 || writeRatio > 1) {
+    INTELLI_WARNING("concurrentWriteRatio should be in (0,1], use 0.5");
+    writeRatio = 0.5;
+  }
+  batchSize = cfg->tryI64("concurrentBatchSize", 100, true);
+  if (batchSize <= 0) {
+    batchSize = 100;
+  }
+  numThreads = std::max(cfg->tryI64("concurrentNumThreads", 1, true), (int64_t) 1);
+  writeThreads = std::max(cfg->tryI64("concurrentWriteThreads", numThreads, true), (int64_t) 1);
+  readThreads = std::max(cfg->tryI64("concurrentReadThreads", numThreads, true), (int64_t) 1);
+  /**
+   * @brief readers and writers of one batch run at the same time, so the pool holds both
+   */
+  pool = std::make_shared<BS::thread_pool>((BS::concurrency_t) (writeThreads + readThreads));
+  resetIndexStatistics();
 
   myIndexAlgo->setConfig(cfg);
 
@@ -35,38 +105,60 @@ bool CANDY::ConcurrentIndex::loadInitialTensor(torch::Tensor &t) {
   return ru;
 }
 
-std::vector<SearchRecord> CANDY::ConcurrentIndex::ccInsertAndSearchTensor(torch::Tensor &t, 
-    torch::Tensor &qt, int64_t k) {
-  if (!myIndexAlgo) {
+std::vector<SearchRecord> CANDY::ConcurrentIndex::ccInsertAndSearchTensor(torch::Tensor &t,
+                                                                          torch::Tensor &qt, int64_t k) {
+  if (!myIndexAlgo || !pool) {
     throw std::runtime_error("Index algorithm not initialized.");
   }
 
-  std::atomic<size_t> commitedOps(0); 
+  std::atomic<size_t> commitedOps(0);
   size_t writeTotal = t.size(0);
   size_t searchTotal = qt.size(0);
   std::exception_ptr lastException = nullptr;
   std::mutex lastExceptMutex;
-  std::mutex resultMutex;
-  
+
   std::vector<SearchRecord> searchRes;
+  std::vector<LatencyHistogram> localInsertLatency(writeThreads), localSearchLatency(readThreads);
+  std::vector<std::vector<SearchRecord>> localRes(readThreads);
+  size_t batchNo = 0;
+  /**
+   * @brief guard the inner index by what it declares, writers are exclusive unless it is THREAD_SAFE_FULL,
+   * readers are also exclusive if it is THREAD_UNSAFE
+   */
+  threadSafety = myIndexAlgo->getThreadSafety();
+  bool lockWrite = threadSafety != THREAD_SAFE_FULL;
+  bool lockReadShared = threadSafety == THREAD_SAFE_READ;
+  bool lockReadExclusive = threadSafety == THREAD_UNSAFE;
 
   while (commitedOps < writeTotal) {
     size_t insertCnt = std::min(batchSize, static_cast<int64_t>(writeTotal - commitedOps.load()));
-    size_t searchCnt = insertCnt / writeRatio;  
+    /**
+     * @brief writeRatio is the fraction of writes among all operations of this batch
+     */
+    size_t searchCnt = searchTotal ? (size_t) std::llround(insertCnt * (1.0 - writeRatio) / writeRatio) : 0;
 
     std::atomic<size_t> currentInsert(0);
-    std::vector<std::thread> writeThreads;
-    
-    for (size_t i = 0; i < numThreads; i++) {
-      writeThreads.emplace_back([&, i] {
+    for (int64_t i = 0; i < writeThreads; i++) {
+      pool->push_task([&, i] {
+        auto &hist = localInsertLatency[i];
         while (true) {
           size_t idx = currentInsert.fetch_add(1);
           if (idx >= insertCnt) break;
           size_t gIdx = commitedOps.fetch_add(1);
           if (gIdx >= writeTotal) break;
           try {
-            auto in = t[gIdx];
-            myIndexAlgo->insertTensor(in);  
+            auto in = t.slice(0, gIdx, gIdx + 1);
+            auto opStart = std::chrono::steady_clock::now();
+            std::unique_lock<std::shared_mutex> lock(indexMutex, std::defer_lock);
+            if (lockWrite) {
+              lock.lock();
+            }
+            myIndexAlgo->insertTensor(in);
+            if (lock.owns_lock()) {
+              lock.unlock();
+            }
+            hist.add(std::chrono::duration_cast<std::chrono::nanoseconds>(
+                std::chrono::steady_clock::now() - opStart).count());
           } catch (...) {
             std::unique_lock<std::mutex> lock(lastExceptMutex);
             lastException = std::current_exception();
@@ -76,45 +168,54 @@ std::vector<SearchRecord> CANDY::ConcurrentIndex::ccInsertAndSearchTensor(torch:
     }
 
     std::atomic<size_t> currentSearch(0);
-    std::vector<std::thread> readThreads;
-    std::vector<std::vector<SearchRecord>> localRes(numThreads);
-
-    for (size_t i = 0; i < numThreads; i++) {
-      readThreads.emplace_back([&, i] {
-        std::vector<SearchRecord> threadRes;
+    for (int64_t i = 0; i < readThreads; i++) {
+      pool->push_task([&, i] {
+        auto &hist = localSearchLatency[i];
+        std::mt19937_64 rng(batchNo * readThreads + i);
         while (true) {
           size_t idx = currentSearch.fetch_add(1);
           if (idx >= searchCnt) break;
-          size_t queryIdx = std::rand() % searchTotal;
+          size_t queryIdx = rng() % searchTotal;
           try {
-            auto q = qt[queryIdx];
+            auto q = qt.slice(0, queryIdx, queryIdx + 1);
+            auto opStart = std::chrono::steady_clock::now();
+            std::shared_lock<std::shared_mutex> sharedLock(indexMutex, std::defer_lock);
+            std::unique_lock<std::shared_mutex> lock(indexMutex, std::defer_lock);
+            if (lockReadShared) {
+              sharedLock.lock();
+            } else if (lockReadExclusive) {
+              lock.lock();
+            }
             auto res = myIndexAlgo->searchTensor(q, k);
-            threadRes.emplace_back(commitedOps.load(), queryIdx, res);
+            if (sharedLock.owns_lock()) {
+              sharedLock.unlock();
+            }
+            if (lock.owns_lock()) {
+              lock.unlock();
+            }
+            hist.add(std::chrono::duration_cast<std::chrono::nanoseconds>(
+                std::chrono::steady_clock::now() - opStart).count());
+            localRes[i].emplace_back(commitedOps.load(), queryIdx, res);
           } catch (...) {
             std::unique_lock<std::mutex> lock(lastExceptMutex);
             lastException = std::current_exception();
           }
         }
-        localRes[i] = std::move(threadRes);
       });
     }
 
-    for (auto &t : writeThreads) {
-      t.join();
-    }
-    writeThreads.clear();  
-
-    for (auto &t : readThreads) {
-      t.join();
-    }
-    readThreads.clear();  
+    pool->wait_for_tasks();
+    batchNo++;
+  }
 
-    {
-      std::unique_lock<std::mutex> lock(resultMutex);
-      for (const auto& res : localRes) {
-        searchRes.insert(searchRes.end(), res.begin(), res.end());
-      }
-    }
+  for (auto &res : localRes) {
+    searchRes.insert(searchRes.end(), std::make_move_iterator(res.begin()), std::make_move_iterator(res.end()));
+  }
+  for (auto &h : localInsertLatency) {
+    insertLatency.merge(h);
+  }
+  for (auto &h : localSearchLatency) {
+    searchLatency.merge(h);
   }
 
   if (lastException) {
@@ -128,6 +229,28 @@ std::vector<torch::Tensor> CANDY::ConcurrentIndex::searchTensor(torch::Tensor &q
   return myIndexAlgo->searchTensor(q, k);
 }
 
+CANDY::IndexThreadSafety CANDY::ConcurrentIndex::getThreadSafety() {
+  if (!myIndexAlgo) {
+    return THREAD_UNSAFE;
+  }
+  return myIndexAlgo->getThreadSafety();
+}
+
 void CANDY::ConcurrentIndex::reset() {
 
+}
+
+bool CANDY::ConcurrentIndex::resetIndexStatistics() {
+  insertLatency.clear();
+  searchLatency.clear();
+  return true;
+}
+
+INTELLI::ConfigMapPtr CANDY::ConcurrentIndex::getIndexStatistics() {
+  auto cfg = AbstractIndex::getIndexStatistics();
+  cfg->edit("hasExtraStatistics", (int64_t) 1);
+  cfg->edit("ccThreadSafety", (int64_t) threadSafety);
+  insertLatency.report(cfg, "ccInsertLatency");
+  searchLatency.report(cfg, "ccSearchLatency");
+  return cfg;
 }
\ No newline at end of file
@@ -43,7 +43,7 @@ bool CANDY::CongestionDropIndexWorker::setConfig(INTELLI::ConfigMapPtr cfg) {
   initialStrQueue = std::make_shared<INTELLI::SPSCQueue<CANDY::TensorStrPair>>((size_t) parallelWorker_queueSize);
   insertStrQueue = std::make_shared<INTELLI::SPSCQueue<CANDY::TensorStrPair>>((size_t) parallelWorker_queueSize);
   deleteStrQueue = std::make_shared<INTELLI::SPSCQueue<CANDY::TensorIdxPair>>((size_t) parallelWorker_queueSize);
-
+  waiter.setConfig(cfg);
   //setId(1);
   return true;
 }
@@ -4,84 +4,84 @@
 //
 
 #include <CANDY/DPGIndex.h>
+#include <Utils/VisitedBitmap.hpp>
+
+#include <chrono>
+#include <limits>
 
 namespace CANDY {
 void DPGIndex::nnDescent() {
-  std::mt19937 rng(time(NULL));
+  size_t rows = rowCount();
+  std::vector<DescentScratch> scratch(rows);
+  size_t seed = std::random_device()();
   while (true) {
-    parallelFor(graphLayer0.size(), [&](size_t i) {
-      std::unordered_set<size_t>().swap(graphLayer0[i].nnNew);
-      std::unordered_set<size_t>().swap(graphLayer0[i].nnOld);
-      std::unordered_set<size_t>().swap(graphLayer0[i].rnnNew);
-      std::unordered_set<size_t>().swap(graphLayer0[i].rnnOld);
+    parallelFor(rows, [&](size_t i) {
+      scratch[i].nnNew.clear();
+      scratch[i].nnOld.clear();
+      scratch[i].rnnNew.clear();
+      scratch[i].rnnOld.clear();
     });
 
-    parallelFor(graphLayer0.size(), [&](size_t i) {
+    parallelFor(rows, [&](size_t i) {
+      thread_local std::mt19937 rng(
+          seed ^ std::hash<std::thread::id>()(std::this_thread::get_id()));
       std::vector<std::pair<size_t, size_t>> nnNewWithIdx;
-      for (size_t j = 0; j < graphLayer0[i].pool.size(); ++j) {
-        auto &neighbor = graphLayer0[i].pool[j];
+      auto p = poolAt(i);
+      for (size_t j = 0; j < poolSize[i]; ++j) {
+        auto &neighbor = p[j];
         if (neighbor.flag) {
           nnNewWithIdx.push_back({neighbor.id, j});
         } else {
-          graphLayer0[i].nnOld.insert(neighbor.id);
+          scratch[i].nnOld.push_back(neighbor.id);
           std::lock_guard<std::mutex> lockGuard(
-              graphLayer0[neighbor.id].rnnOldLock);
-          graphLayer0[neighbor.id].rnnOld.insert(i);
+              poolLocks[neighbor.id % lockStripes]);
+          scratch[neighbor.id].rnnOld.push_back(i);
         }
       }
       std::vector<size_t> sampledIdx;
       randomSample(rng, sampledIdx, nnNewWithIdx.size(), rho * graphK);
       for (auto idx : sampledIdx) {
-        graphLayer0[i].nnNew.insert(nnNewWithIdx[idx].first);
-        graphLayer0[i].pool[nnNewWithIdx[idx].second].flag = false;
-        std::lock_guard<std::mutex> lockGuard(
-            graphLayer0[nnNewWithIdx[idx].first].rnnNewLock);
-        graphLayer0[nnNewWithIdx[idx].first].rnnNew.insert(i);
+        auto id = nnNewWithIdx[idx].first;
+        scratch[i].nnNew.push_back(id);
+        p[nnNewWithIdx[idx].second].flag = false;
+        std::lock_guard<std::mutex> lockGuard(poolLocks[id % lockStripes]);
+        scratch[id].rnnNew.push_back(i);
       }
     });
 
     std::atomic<size_t> counter(0);
-    parallelFor(graphLayer0.size(), [&](size_t i) {
+    parallelFor(rows, [&](size_t i) {
+      thread_local std::mt19937 rng(
+          ~seed ^ std::hash<std::thread::id>()(std::this_thread::get_id()));
+      auto &s = scratch[i];
       std::vector<size_t> sampledIdx;
+      randomSample(rng, sampledIdx, s.rnnOld.size(), rho * graphK);
+      for (auto idx : sampledIdx) s.nnOld.push_back(s.rnnOld[idx]);
+      randomSample(rng, sampledIdx, s.rnnNew.size(), rho * graphK);
+      for (auto idx : sampledIdx) s.nnNew.push_back(s.rnnNew[idx]);
+      for (auto nn : {&s.nnOld, &s.nnNew}) {
+        std::sort(nn->begin(), nn->end());
+        nn->erase(std::unique(nn->begin(), nn->end()), nn->end());
+      }
 
-      randomSample(rng, sampledIdx, graphLayer0[i].rnnOld.size(), rho * graphK);
-      size_t insertCount = 0, iterateOffset = 0;
-      for (auto it = graphLayer0[i].rnnOld.begin();
-           it != graphLayer0[i].rnnOld.end(), insertCount < sampledIdx.size();
-           ++it, ++iterateOffset)
-        if (iterateOffset == sampledIdx[insertCount++])
-          graphLayer0[i].nnOld.insert(*it);
-
-      randomSample(rng, sampledIdx, graphLayer0[i].rnnNew.size(), rho * graphK);
-      insertCount = iterateOffset = 0;
-      for (auto it = graphLayer0[i].rnnNew.begin();
-           it != graphLayer0[i].rnnNew.end(), insertCount < sampledIdx.size();
-           ++it, ++iterateOffset)
-        if (iterateOffset == sampledIdx[insertCount++])
-          graphLayer0[i].nnNew.insert(*it);
-
-      for (auto u1 : graphLayer0[i].nnNew) {
-        for (auto u2 : graphLayer0[i].nnNew)
+      size_t updated = 0;
+      for (auto u1 : s.nnNew) {
+        for (auto u2 : s.nnNew)
           if (u1 < u2) {
-            auto dist = calcDist(tensor[u1], tensor[u2]);
-            auto neighborUpdated = updateLayer0Neighbor(u1, u2, dist),
-                 reverseNeighborUpdated = updateLayer0Neighbor(u2, u1, dist);
-            counter.fetch_add(updateLayer0Neighbor(u1, u2, dist),
-                              std::memory_order_relaxed);
-            counter.fetch_add(updateLayer0Neighbor(u2, u1, dist),
-                              std::memory_order_relaxed);
+            auto dist = calcDist(vecAt(u1), vecAt(u2));
+            updated += updateLayer0Neighbor(u1, u2, dist);
+            updated += updateLayer0Neighbor(u2, u1, dist);
           }
-        for (auto u2 : graphLayer0[i].nnOld)
-          if (u1 < u2) {
-            auto dist = calcDist(tensor[u1], tensor[u2]);
-            counter.fetch_add(updateLayer0Neighbor(u1, u2, dist),
-                              std::memory_order_relaxed);
-            counter.fetch_add(updateLayer0Neighbor(u2, u1, dist),
-                              std::memory_order_relaxed);
+        for (auto u2 : s.nnOld)
+          if (u1 != u2) {
+            auto dist = calcDist(vecAt(u1), vecAt(u2));
+            updated += updateLayer0Neighbor(u1, u2, dist);
+            updated += updateLayer0Neighbor(u2, u1, dist);
           }
       }
+      counter.fetch_add(updated, std::memory_order_relaxed);
     });
-    if (counter < delta * graphLayer0.size() * graphK) return;
+    if (counter < delta * rows * graphK) return;
   }
 }
 
@@ -108,207 +108,403 @@ void DPGIndex::randomSample(std::mt19937 &rng, std::vector<size_t> &vec,
   }
 }
 
-bool DPGIndex::updateLayer0Neighbor(size_t i, size_t j, double dist) {
-  std::lock_guard<std::mutex> lockGuard(graphLayer0[i].poolLock);
-  if (graphLayer0[i].pool.size() < graphK) {
-    graphLayer0[i].neighborIdxSet.insert(j);
+bool DPGIndex::updateLayer0Neighbor(size_t i, size_t j, float dist) {
+  if (i == j) return false;
+  std::lock_guard<std::mutex> lockGuard(poolLocks[i % lockStripes]);
+  auto p = poolAt(i);
+  uint32_t &n = poolSize[i];
+  for (uint32_t m = 0; m < n; ++m)
+    if (p[m].id == j) return false;
+  if (n < graphK) {
     addLayer1Neighbor(i, j);
-
-    graphLayer0[i].pool.emplace_back(j, dist, true);
-    std::push_heap(graphLayer0[i].pool.begin(), graphLayer0[i].pool.end());
+    p[n++] = Neighbor(j, dist, true);
+    std::push_heap(p, p + n);
     return true;
-  } else if (dist < graphLayer0[i].pool.front().distance &&
-             !graphLayer0[i].neighborIdxSet.count(j)) {
-    graphLayer0[i].neighborIdxSet.erase(graphLayer0[i].pool.front().id);
-    graphLayer0[i].neighborIdxSet.insert(j);
-    removeLayer1Neighbor(i, graphLayer0[i].pool.front().id);
+  } else if (dist < p[0].distance) {
+    removeLayer1Neighbor(i, p[0].id);
     addLayer1Neighbor(i, j);
-
-    std::pop_heap(graphLayer0[i].pool.begin(), graphLayer0[i].pool.end());
-    graphLayer0[i].pool.back() = {j, dist, true};
-    std::push_heap(graphLayer0[i].pool.begin(), graphLayer0[i].pool.end());
+    std::pop_heap(p, p + n);
+    p[n - 1] = Neighbor(j, dist, true);
+    std::push_heap(p, p + n);
     return true;
   }
   return false;
 }
 
 void DPGIndex::addLayer1Neighbor(size_t i, size_t j) {
-  std::lock_guard<std::mutex> lockGuard(graphLayer1[i].neighborLock);
-  if (graphLayer1[i].neighborIdxSet.size() < graphK >> 1) {
-    graphLayer1[i].neighborIdxSet.insert(j);
-    std::lock_guard<std::mutex> lockGuard(graphLayer1[j].reverseNeighborLock);
-    graphLayer1[j].reverseNeighborIdxSet.insert(i);
-  }
+  std::lock_guard<std::mutex> lockGuard(layer1Locks[i % lockStripes]);
+  auto l = layer1At(i);
+  uint32_t &n = layer1Size[i];
+  if (n >= (graphK >> 1)) return;
+  for (uint32_t m = 0; m < n; ++m)
+    if (l[m] == j) return;
+  l[n++] = j;
+  std::lock_guard<std::mutex> reverseLockGuard(
+      reverseLayer1Locks[j % lockStripes]);
+  reverseLayer1[j].push_back(i);
 }
 
 void DPGIndex::removeLayer1Neighbor(size_t i, size_t j) {
   {
-    std::lock_guard<std::mutex> lockGuard(graphLayer1[i].neighborLock);
-    graphLayer1[i].neighborIdxSet.erase(j);
+    std::lock_guard<std::mutex> lockGuard(layer1Locks[i % lockStripes]);
+    auto l = layer1At(i);
+    uint32_t &n = layer1Size[i];
+    auto it = std::find(l, l + n, j);
+    if (it == l + n) return;
+    *it = l[--n];
   }
   {
-    std::lock_guard<std::mutex> lockGuard(graphLayer1[j].reverseNeighborLock);
-    graphLayer1[j].reverseNeighborIdxSet.erase(i);
+    std::lock_guard<std::mutex> lockGuard(reverseLayer1Locks[j % lockStripes]);
+    auto &r = reverseLayer1[j];
+    auto it = std::find(r.begin(), r.end(), i);
+    if (it != r.end()) {
+      *it = r.back();
+      r.pop_back();
+    }
   }
 }
 
-double DPGIndex::calcDist(const torch::Tensor &ta, const torch::Tensor &tb) {
-
-  double ans = 0;
-  if (faissMetric == faiss::METRIC_L2) {
-    // Calculate the squared L2 distance as ||v1 - v2||^2
-    auto diff = ta-tb;
-    auto l2_sqr = torch::sum(diff * diff);
-    // Convert the result back to float and return
-    ans = l2_sqr.item<float>();
-  } else {
-    //for (size_t i = 0; i < vecDim; ++i) ans -= taPtr[i] * tbPtr[i];
-    // Calculate the inner (dot) product
-    auto inner_product = torch::matmul(ta, tb.t());
-    ans = -inner_product.item<float>();
-    // Convert the result back to float and return
-  }
-  return ans;
+size_t DPGIndex::appendRow(const float *x) {
+  size_t id = rowCount();
+  vectors.insert(vectors.end(), x, x + vecDim);
+  pool.resize(pool.size() + graphK);
+  poolSize.push_back(0);
+  layer1.resize(layer1.size() + (graphK >> 1));
+  layer1Size.push_back(0);
+  reverseLayer1.emplace_back();
+  deleted.push_back(0);
+  return id;
 }
 
-torch::Tensor DPGIndex::searchOnce(torch::Tensor q, int64_t k) {
+torch::Tensor DPGIndex::searchOnce(const float *q, int64_t k) {
   auto neighbors = searchOnceInner(q, k);
-  auto ans = torch::zeros({int64_t(neighbors.size()), vecDim});
+  auto ans = torch::empty({int64_t(neighbors.size()), vecDim});
+  auto ansPtr = ans.data_ptr<float>();
   for (size_t i = 0; i < neighbors.size(); ++i)
-    ans.slice(0, i, i + 1) = tensor[neighbors[i].second];
+    std::copy_n(vecAt(neighbors[i].second), vecDim, ansPtr + i * vecDim);
   return ans;
 }
 
-std::vector<faiss::idx_t> DPGIndex::searchOnceIndex(torch::Tensor q, int64_t k) {
-    auto neighbors = searchOnceInner(q, k);
-    auto ans = std::vector<faiss::idx_t>(k);
-    for (size_t i = 0; i < neighbors.size(); ++i)
-        ans[i] = neighbors[i].second;
-    return ans;
+std::vector<faiss::idx_t> DPGIndex::searchOnceIndex(const float *q, int64_t k) {
+  auto neighbors = searchOnceInner(q, k);
+  auto ans = std::vector<faiss::idx_t>(k, -1);
+  for (size_t i = 0; i < neighbors.size() && i < size_t(k); ++i)
+    ans[i] = neighbors[i].second;
+  return ans;
 }
 
-std::vector<std::pair<double, size_t>> DPGIndex::searchOnceInner(
-    torch::Tensor q, int64_t k) {
-  if (graphLayer1.empty()) return std::vector<std::pair<double, size_t>>();
-  std::mt19937 rng(time(NULL));
-  size_t startId = rng() % graphLayer1.size();
-  std::vector<std::pair<double, size_t>> neighbors;
-  neighbors.reserve(k);
-  std::unordered_map<size_t, bool> neighborIdxWithVisitFlag;
-  size_t deletedCountInNeighbors = 0;
-  neighbors.emplace_back(calcDist(tensor[startId], q), startId);
-  neighborIdxWithVisitFlag.insert({startId, false});
-
-  bool exit;
-  do {
-    exit = true;
-    auto curNeighbors = neighbors;
-    for (auto item : curNeighbors)
-      if (!neighborIdxWithVisitFlag[item.second]) {
-        neighborIdxWithVisitFlag[item.second] = true;
-        exit = false;
-        for (auto &neighborIdxSet :
-             {graphLayer1[item.second].neighborIdxSet,
-              graphLayer1[item.second].reverseNeighborIdxSet})
-          for (auto id : neighborIdxSet)
-            if (!neighborIdxWithVisitFlag.count(id)) {
-              auto dist = calcDist(tensor[id], q);
-              if (neighbors.size() < k + deletedCountInNeighbors) {
-                neighborIdxWithVisitFlag.insert({id, false});
-                if (deletedIdxSet.count(id)) ++deletedCountInNeighbors;
-
-                neighbors.emplace_back(dist, id);
-                std::push_heap(neighbors.begin(), neighbors.end());
-              } else if (calcDist(tensor[id], q) < neighbors.front().first) {
-                neighborIdxWithVisitFlag.erase(neighbors.front().second);
-                neighborIdxWithVisitFlag.insert(std::make_pair(id, false));
-                if (deletedIdxSet.count(neighbors.front().second))
-                  --deletedCountInNeighbors;
-                if (deletedIdxSet.count(id)) ++deletedCountInNeighbors;
-
-                std::pop_heap(neighbors.begin(), neighbors.end());
-                neighbors.back() = std::make_pair(dist, id);
-                std::push_heap(neighbors.begin(), neighbors.end());
-              }
-            }
+std::vector<std::pair<float, size_t>> DPGIndex::searchOnceInner(
+    const float *q, int64_t k) {
+  struct Candidate {
+    float distance;
+    size_t id;
+    bool expanded;
+    inline bool operator<(const Candidate &other) const {
+      return distance < other.distance;
+    }
+  };
+  size_t rows = rowCount();
+  if (rows == 0 || k <= 0) return std::vector<std::pair<float, size_t>>();
+  thread_local std::mt19937 rng(std::random_device{}());
+  thread_local INTELLI::VisitedBitmap visited;
+  visited.reserve(rows);
+  visited.clear();
+
+  size_t startId = rng() % rows;
+  std::vector<Candidate> neighbors;
+  neighbors.reserve(k + 1);
+  size_t deletedCountInNeighbors = deleted[startId];
+  visited.testAndSet(startId);
+  neighbors.push_back({calcDist(vecAt(startId), q), startId, false});
+
+  auto visit = [&](size_t id) {
+    if (visited.testAndSet(id)) return;
+    float dist = calcDist(vecAt(id), q);
+    if (neighbors.size() < k + deletedCountInNeighbors) {
+      deletedCountInNeighbors += deleted[id];
+      neighbors.push_back({dist, id, false});
+      std::push_heap(neighbors.begin(), neighbors.end());
+    } else if (dist < neighbors.front().distance) {
+      deletedCountInNeighbors -= deleted[neighbors.front().id];
+      deletedCountInNeighbors += deleted[id];
+      std::pop_heap(neighbors.begin(), neighbors.end());
+      neighbors.back() = {dist, id, false};
+      std::push_heap(neighbors.begin(), neighbors.end());
+    }
+  };
+  std::vector<size_t> toExpand;
+  while (true) {
+    toExpand.clear();
+    for (auto &item : neighbors)
+      if (!item.expanded) {
+        item.expanded = true;
+        toExpand.push_back(item.id);
       }
-  } while (!exit);
+    if (toExpand.empty()) break;
+    for (auto u : toExpand) {
+      auto l = layer1At(u);
+      for (uint32_t m = 0; m < layer1Size[u]; ++m) visit(l[m]);
+      for (auto id : reverseLayer1[u]) visit(id);
+    }
+  }
+  visited.clear();
 
-  std::vector<std::pair<double, size_t>> finalNeighbors;
+  std::vector<std::pair<float, size_t>> finalNeighbors;
   finalNeighbors.reserve(neighbors.size() - deletedCountInNeighbors);
   for (auto &item : neighbors)
-    if (!deletedIdxSet.count(item.second)) finalNeighbors.push_back(item);
+    if (!deleted[item.id]) finalNeighbors.emplace_back(item.distance, item.id);
   return finalNeighbors;
 }
 
-bool DPGIndex::insertOnce(vector<std::pair<double, size_t>> &neighbors,
-                          torch::Tensor t) {
-  tensor.push_back(t);
-  graphLayer0.emplace_back();
-  graphLayer1.emplace_back();
-  graphLayer0.back().pool.resize(neighbors.size());
-  parallelFor(neighbors.size(), [&](size_t i) {
-    graphLayer0.back().pool[i] =
-        Neighbor(neighbors[i].second, neighbors[i].first, true);
-    updateLayer0Neighbor(neighbors[i].second, graphLayer0.size() - 1,
-                         neighbors[i].first);
+void DPGIndex::insertBatch(const float *x, size_t n) {
+  size_t base = rowCount();
+  std::vector<std::vector<std::pair<float, size_t>>> candidates(n);
+  // search the graph before this batch, it is not modified until the merge
+  parallelFor(n, [&](size_t r) {
+    auto &cand = candidates[r];
+    cand = searchOnceInner(x + r * vecDim, graphK);
+    std::make_heap(cand.begin(), cand.end());
+    for (size_t s = 0; s < n; ++s) {
+      if (s == r) continue;
+      float dist = calcDist(x + r * vecDim, x + s * vecDim);
+      if (cand.size() < size_t(graphK)) {
+        cand.emplace_back(dist, base + s);
+        std::push_heap(cand.begin(), cand.end());
+      } else if (dist < cand.front().first) {
+        std::pop_heap(cand.begin(), cand.end());
+        cand.back() = {dist, base + s};
+        std::push_heap(cand.begin(), cand.end());
+      }
+    }
   });
-  buildLayer1(graphLayer0.size() - 1);
-  return true;
-}
-
-bool DPGIndex::deleteOnce(torch::Tensor t, int64_t k) {
-  auto neighbors = searchOnceInner(t, k);
-  for (auto item : neighbors) deletedIdxSet.insert(item.second);
-  return true;
+  vectors.reserve(vectors.size() + n * vecDim);
+  for (size_t r = 0; r < n; ++r) appendRow(x + r * vecDim);
+  // the pool of a new row is only written by its own task
+  parallelFor(n, [&](size_t r) {
+    auto &cand = candidates[r];
+    auto p = poolAt(base + r);
+    size_t m = std::min(cand.size(), size_t(graphK));
+    for (size_t i = 0; i < m; ++i)
+      p[i] = Neighbor(cand[i].second, cand[i].first, true);
+    poolSize[base + r] = m;
+    std::make_heap(p, p + m);
+  });
+  // then every candidate may take the new row as its neighbor
+  parallelFor(n, [&](size_t r) {
+    for (auto &[dist, id] : candidates[r])
+      updateLayer0Neighbor(id, base + r, dist);
+  });
+  // the layer 1 of a new row is built from its final pool
+  parallelFor(n, [&](size_t r) { buildLayer1(base + r); });
 }
 
-void DPGIndex::parallelFor(size_t idxSize, std::function<void(size_t)> action) {
-  std::vector<std::shared_ptr<std::thread>> threads(parallelWorkers);
-  size_t itemPerThread = (idxSize + parallelWorkers - 1) / parallelWorkers;
-  for (size_t id = 0; id < parallelWorkers; ++id)
-    threads[id] = std::make_shared<std::thread>([=]() {
-      size_t threadBegin = id * itemPerThread,
-             threadEnd = std::min(idxSize, (id + 1) * itemPerThread);
-      for (size_t i = threadBegin; i < threadEnd; ++i) action(i);
-    });
-  for (auto thread : threads) thread->join();
+void DPGIndex::parallelFor(size_t idxSize,
+                           std::function<void(size_t)> action) {
+  size_t workers = std::min(size_t(parallelWorkers), idxSize);
+  if (workers <= 1 || workerPool == nullptr) {
+    for (size_t i = 0; i < idxSize; ++i) action(i);
+    return;
+  }
+  // workers grab chunks of indexes, so that uneven items are balanced
+  size_t grain = std::max(size_t(1), idxSize / (workers * 16));
+  std::atomic<size_t> next(0);
+  std::vector<std::future<void>> futures;
+  futures.reserve(workers);
+  for (size_t w = 0; w < workers; ++w)
+    futures.push_back(workerPool->submit([&]() {
+      for (size_t begin = next.fetch_add(grain); begin < idxSize;
+           begin = next.fetch_add(grain)) {
+        size_t end = std::min(idxSize, begin + grain);
+        for (size_t i = begin; i < end; ++i) action(i);
+      }
+    }));
+  for (auto &f : futures) f.get();
 }
 
 void DPGIndex::buildLayer1(size_t idx) {
-  for (size_t i = 0; i < graphLayer0[idx].pool.size(); ++i)
-    for (size_t j = 0; j < graphLayer0[idx].pool.size(); ++j)
-      if (i != j &&
-          calcDist(tensor[i], tensor[j]) < calcDist(tensor[idx], tensor[j])) {
-        ++graphLayer0[idx].pool[j].counter;
-      }
+  auto p = poolAt(idx);
+  size_t n = poolSize[idx];
+  // counter[j] is how many other neighbors are nearer to j than idx is
+  std::vector<size_t> counter(n, 0);
+  for (size_t i = 0; i < n; ++i)
+    for (size_t j = i + 1; j < n; ++j) {
+      auto dist = calcDist(vecAt(p[i].id), vecAt(p[j].id));
+      counter[j] += dist < p[j].distance;
+      counter[i] += dist < p[i].distance;
+    }
   std::vector<std::pair<size_t, size_t>> neighborsWithCounter;  // <counter, id>
   neighborsWithCounter.reserve(graphK >> 1);
-  for (auto neighbor : graphLayer0[idx].pool) {
+  for (size_t j = 0; j < n; ++j) {
     if (neighborsWithCounter.size() < graphK >> 1) {
-      neighborsWithCounter.emplace_back(neighbor.counter, neighbor.id);
+      neighborsWithCounter.emplace_back(counter[j], p[j].id);
       std::push_heap(neighborsWithCounter.begin(), neighborsWithCounter.end());
-    } else if (neighbor.counter < neighborsWithCounter.front().first) {
+    } else if (!neighborsWithCounter.empty() &&
+               counter[j] < neighborsWithCounter.front().first) {
       std::pop_heap(neighborsWithCounter.begin(), neighborsWithCounter.end());
-      neighborsWithCounter.back() = {neighbor.counter, neighbor.id};
+      neighborsWithCounter.back() = {counter[j], p[j].id};
       std::push_heap(neighborsWithCounter.begin(), neighborsWithCounter.end());
     }
   }
   for (auto [_, id] : neighborsWithCounter) addLayer1Neighbor(idx, id);
 }
 
+size_t DPGIndex::memoryBytes() const {
+  size_t bytes = vectors.capacity() * sizeof(float) +
+                 pool.capacity() * sizeof(Neighbor) +
+                 poolSize.capacity() * sizeof(uint32_t) +
+                 layer1.capacity() * sizeof(size_t) +
+                 layer1Size.capacity() * sizeof(uint32_t) +
+                 reverseLayer1.capacity() * sizeof(std::vector<size_t>) +
+                 deleted.capacity() * sizeof(uint8_t);
+  for (auto &r : reverseLayer1) bytes += r.capacity() * sizeof(size_t);
+  return bytes;
+}
+
+int64_t DPGIndex::consolidateDeletes() {
+  if (deletedCount == 0) return 0;
+  auto start = std::chrono::high_resolution_clock::now();
+  size_t rows = rowCount();
+  size_t bytesBefore = memoryBytes();
+  std::vector<size_t> remap(rows, 0);
+  size_t alive = 0;
+  for (size_t i = 0; i < rows; ++i)
+    if (!deleted[i]) remap[i] = alive++;
+
+  // repair layer 0, reading the old pools and writing the compacted ones
+  std::vector<Neighbor> newPool(alive * graphK);
+  std::vector<uint32_t> newPoolSize(alive, 0);
+  parallelFor(rows, [&](size_t i) {
+    if (deleted[i]) return;
+    auto p = poolAt(i);
+    auto np = newPool.data() + remap[i] * graphK;
+    uint32_t &m = newPoolSize[remap[i]];
+    std::vector<size_t> candidates;
+    for (uint32_t j = 0; j < poolSize[i]; ++j) {
+      auto id = p[j].id;
+      if (!deleted[id]) {
+        np[m++] = Neighbor(remap[id], p[j].distance, p[j].flag);
+        continue;
+      }
+      auto dp = poolAt(id);
+      for (uint32_t l = 0; l < poolSize[id]; ++l)
+        if (dp[l].id != i && !deleted[dp[l].id])
+          candidates.push_back(dp[l].id);
+    }
+    std::sort(candidates.begin(), candidates.end());
+    candidates.erase(std::unique(candidates.begin(), candidates.end()),
+                     candidates.end());
+    std::make_heap(np, np + m);
+    for (auto id : candidates) {
+      if (std::any_of(np, np + m,
+                      [&](const Neighbor &n) { return n.id == remap[id]; }))
+        continue;
+      float dist = calcDist(vecAt(i), vecAt(id));
+      if (m < graphK) {
+        np[m++] = Neighbor(remap[id], dist, true);
+        std::push_heap(np, np + m);
+      } else if (dist < np[0].distance) {
+        std::pop_heap(np, np + m);
+        np[m - 1] = Neighbor(remap[id], dist, true);
+        std::push_heap(np, np + m);
+      }
+    }
+  });
+
+  // compact the arena and drop the tombstones
+  std::vector<float> newVectors(alive * vecDim);
+  parallelFor(rows, [&](size_t i) {
+    if (!deleted[i])
+      std::copy_n(vecAt(i), vecDim, newVectors.data() + remap[i] * vecDim);
+  });
+  vectors.swap(newVectors);
+  pool.swap(newPool);
+  poolSize.swap(newPoolSize);
+  std::vector<size_t>(alive * (graphK >> 1)).swap(layer1);
+  std::vector<uint32_t>(alive, 0).swap(layer1Size);
+  std::vector<std::vector<size_t>>(alive).swap(reverseLayer1);
+  std::vector<uint8_t>(alive, 0).swap(deleted);
+  std::vector<float>().swap(newVectors);
+  std::vector<Neighbor>().swap(newPool);
+  std::vector<uint32_t>().swap(newPoolSize);
+  consolidatedRows += deletedCount;
+  deletedCount = 0;
+  parallelFor(alive, [&](size_t i) { buildLayer1(i); });
+
+  int64_t reclaimed = int64_t(bytesBefore) - int64_t(memoryBytes());
+  reclaimedBytes += reclaimed;
+  ++consolidations;
+  consolidateUs += std::chrono::duration_cast<std::chrono::microseconds>(
+                       std::chrono::high_resolution_clock::now() - start)
+                       .count();
+  return reclaimed;
+}
+
+bool DPGIndex::resetIndexStatistics() {
+  consolidations = 0;
+  consolidatedRows = 0;
+  reclaimedBytes = 0;
+  consolidateUs = 0;
+  return true;
+}
+
+INTELLI::ConfigMapPtr DPGIndex::getIndexStatistics() {
+  auto cfg = AbstractIndex::getIndexStatistics();
+  cfg->edit("hasExtraStatistics", (int64_t)1);
+  cfg->edit("deletedRows", (int64_t)deletedCount);
+  cfg->edit("consolidations", consolidations);
+  cfg->edit("consolidatedRows", consolidatedRows);
+  cfg->edit("reclaimedBytes", reclaimedBytes);
+  cfg->edit("consolidateUs", consolidateUs);
+  return cfg;
+}
+
+std::shared_ptr<AbstractIndex> DPGIndex::snapshot() {
+  // the locks can not be copied, so the copy keeps its own default ones
+  auto ru = std::make_shared<DPGIndex>();
+  ru->faissMetric = faissMetric;
+  ru->containerTier = containerTier;
+  ru->graphK = graphK;
+  ru->parallelWorkers = parallelWorkers;
+  ru->vecDim = vecDim;
+  ru->frozenLevel = frozenLevel;
+  ru->insertBatchSize = insertBatchSize;
+  ru->rho = rho;
+  ru->delta = delta;
+  ru->workerPool = std::make_shared<BS::thread_pool>(parallelWorkers);
+  ru->vectors = vectors;
+  ru->pool = pool;
+  ru->poolSize = poolSize;
+  ru->layer1 = layer1;
+  ru->layer1Size = layer1Size;
+  ru->reverseLayer1 = reverseLayer1;
+  ru->deleted = deleted;
+  ru->deletedCount = deletedCount;
+  ru->consolidateRatio = consolidateRatio;
+  ru->consolidations = consolidations;
+  ru->consolidatedRows = consolidatedRows;
+  ru->reclaimedBytes = reclaimedBytes;
+  ru->consolidateUs = consolidateUs;
+  return ru;
+}
+
 bool DPGIndex::loadInitialTensor(torch::Tensor &t) {
   if (frozenLevel == 0) return false;
-  tensor.reserve(tensor.size() + t.size(0));
-  for (size_t i = 0; i < t.size(0); ++i) tensor.push_back(t.slice(0, i, i + 1));
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  vectors.reserve(vectors.size() + tc.size(0) * vecDim);
+  for (int64_t i = 0; i < tc.size(0); ++i) appendRow(ptr + i * vecDim);
   return true;
 }
 
 void DPGIndex::reset() {
-  tensor.clear();
-  graphLayer0.clear();
-  graphLayer1.clear();
-  deletedIdxSet.clear();
+  vectors.clear();
+  pool.clear();
+  poolSize.clear();
+  layer1.clear();
+  layer1Size.clear();
+  reverseLayer1.clear();
+  deleted.clear();
+  deletedCount = 0;
 }
 
 bool DPGIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
@@ -324,24 +520,42 @@ bool DPGIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   parallelWorkers = cfg->tryI64("parallelWorkers", 1, true);
   if (parallelWorkers <= 0)
     parallelWorkers = std::thread::hardware_concurrency();
+  insertBatchSize = cfg->tryI64("insertBatchSize", 256, true);
+  if (insertBatchSize <= 0) insertBatchSize = 1;
+  consolidateRatio = cfg->tryDouble("consolidateRatio", 0.2, true);
+  if (workerPool == nullptr ||
+      workerPool->get_thread_count() != size_t(parallelWorkers))
+    workerPool = std::make_shared<BS::thread_pool>(parallelWorkers);
+  reset();
   return true;
 }
 
 bool DPGIndex::insertTensor(torch::Tensor &t) {
   if (frozenLevel == 0) return false;
-  graphLayer0.reserve(graphLayer0.size() + t.size(0));
-  graphLayer1.reserve(graphLayer1.size() + t.size(0));
-  tensor.reserve(tensor.size() + t.size(0));
-  for (size_t i = 0; i < t.size(0); ++i) {
-    auto neighbors = searchOnceInner(t.slice(0, i, i + 1), graphK);
-    insertOnce(neighbors, t.slice(0, i, i + 1));
-  }
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  size_t rows = tc.size(0);
+  for (size_t i = 0; i < rows; i += insertBatchSize)
+    insertBatch(ptr + i * vecDim, std::min(size_t(insertBatchSize), rows - i));
   return true;
 }
 
 bool DPGIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   if (frozenLevel == 0) return false;
-  for (size_t i = 0; i < t.size(0); ++i) deleteOnce(t.slice(0, i, i + 1), k);
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  std::vector<std::vector<std::pair<float, size_t>>> results(tc.size(0));
+  parallelFor(results.size(), [&](size_t i) {
+    results[i] = searchOnceInner(ptr + i * vecDim, k);
+  });
+  for (auto &neighbors : results)
+    for (auto &item : neighbors)
+      if (!deleted[item.second]) {
+        deleted[item.second] = 1;
+        ++deletedCount;
+      }
+  if (consolidateRatio > 0 && deletedCount > consolidateRatio * rowCount())
+    consolidateDeletes();
   return true;
 }
 
@@ -354,24 +568,27 @@ std::vector<torch::Tensor> DPGIndex::getTensorByIndex(
     std::vector<faiss::idx_t> &idx, int64_t k) {
   std::vector<torch::Tensor> ret;
   size_t offset = 0;
-  for (size_t i = 0; i < tensor.size(); ++i)
-    if (!deletedIdxSet.count(i)) {
-      if (offset == idx[ret.size()]) ret.push_back(tensor[i]);
+  for (size_t i = 0; i < rowCount() && ret.size() < idx.size(); ++i)
+    if (!deleted[i]) {
+      if (offset == idx[ret.size()])
+        ret.push_back(torch::from_blob(const_cast<float *>(vecAt(i)),
+                                       {1, vecDim})
+                          .clone());
       ++offset;
     }
   return ret;
 }
 
 torch::Tensor DPGIndex::rawData() {
-  if (tensor.size() - deletedIdxSet.size() == 0) {
+  if (rowCount() - deletedCount == 0) {
     return torch::Tensor();
   }
-  auto ret =
-      torch::zeros({int64_t(tensor.size() - deletedIdxSet.size()), vecDim});
+  auto ret = torch::empty({int64_t(rowCount() - deletedCount), vecDim});
+  auto retPtr = ret.data_ptr<float>();
   size_t offset = 0;
-  for (size_t i = 0; i < tensor.size(); ++i)
-    if (!deletedIdxSet.count(i)) {
-      ret.slice(0, offset, offset + 1) = tensor[i];
+  for (size_t i = 0; i < rowCount(); ++i)
+    if (!deleted[i]) {
+      std::copy_n(vecAt(i), vecDim, retPtr + offset * vecDim);
       ++offset;
     }
   return ret;
@@ -379,20 +596,49 @@ torch::Tensor DPGIndex::rawData() {
 
 
 std::vector<faiss::idx_t> DPGIndex::searchIndex(torch::Tensor q, int64_t k){
-    std::vector<faiss::idx_t> ans(k * q.size(0));
-    parallelFor(ans.size(),
+    auto qc = q.to(torch::kFloat32).contiguous();
+    auto qPtr = qc.data_ptr<float>();
+    std::vector<faiss::idx_t> ans(k * qc.size(0));
+    parallelFor(qc.size(0),
                 [&](size_t i) {
-        auto results = searchOnceIndex(q.slice(0,i,i+1),k);
+        auto results = searchOnceIndex(qPtr + i * vecDim, k);
         for(size_t j=0; j<k; j++){
                 ans[i*k+j] = results[j]; };
                 });
     return ans;
 }
 
+std::tuple<torch::Tensor, torch::Tensor> DPGIndex::searchWithDistances(
+    torch::Tensor &q, int64_t k) {
+  auto qc = q.to(torch::kFloat32).contiguous();
+  auto qPtr = qc.data_ptr<float>();
+  int64_t querySize = qc.size(0);
+  auto ids = torch::full({querySize, k}, -1, torch::kInt64);
+  auto distances = torch::full({querySize, k},
+                               std::numeric_limits<float>::quiet_NaN());
+  auto idsPtr = ids.data_ptr<int64_t>();
+  auto distPtr = distances.data_ptr<float>();
+  parallelFor(querySize, [&](size_t i) {
+    auto neighbors = searchOnceInner(qPtr + i * vecDim, k);
+    std::sort(neighbors.begin(), neighbors.end());
+    size_t hits = std::min(neighbors.size(), size_t(k));
+    for (size_t j = 0; j < hits; ++j) {
+      idsPtr[i * k + j] = neighbors[j].second;
+      // calcDist negates inner products, so that smaller is always nearer
+      distPtr[i * k + j] = (faissMetric == faiss::METRIC_L2)
+                               ? neighbors[j].first
+                               : -neighbors[j].first;
+    }
+  });
+  return std::make_tuple(ids, distances);
+}
+
 std::vector<torch::Tensor> DPGIndex::searchTensor(torch::Tensor &q, int64_t k) {
-  std::vector<torch::Tensor> ans(q.size(0));
+  auto qc = q.to(torch::kFloat32).contiguous();
+  auto qPtr = qc.data_ptr<float>();
+  std::vector<torch::Tensor> ans(qc.size(0));
   parallelFor(ans.size(),
-              [&](size_t i) { ans[i] = searchOnce(q.slice(0, i, i + 1), k); });
+              [&](size_t i) { ans[i] = searchOnce(qPtr + i * vecDim, k); });
   return ans;
 }
 
@@ -408,23 +654,21 @@ bool DPGIndex::setFrozenLevel(int64_t frozenLv) {
 bool DPGIndex::offlineBuild(torch::Tensor &t) {
   if (!loadInitialTensor(t)) return false;
   std::mt19937 rng(time(NULL));
-  graphLayer0.resize(tensor.size());
-  graphLayer1.resize(tensor.size());
-  for (size_t i = 0; i < tensor.size(); ++i) {
+  size_t rows = rowCount();
+  for (size_t i = 0; i < rows; ++i) {
     std::vector<size_t> sampledIdx;
-    randomSample(rng, sampledIdx, tensor.size() - 1, graphK);
-    graphLayer0[i].pool.resize(sampledIdx.size());
+    randomSample(rng, sampledIdx, rows - 1, graphK);
+    auto p = poolAt(i);
     for (size_t j = 0; j < sampledIdx.size(); ++j) {
       auto idx = sampledIdx[j];
       idx += (idx >= i);
-      graphLayer0[i].pool[j] =
-          Neighbor(idx, calcDist(tensor[idx], tensor[i]), true);
-      graphLayer0[i].neighborIdxSet.insert(idx);
+      p[j] = Neighbor(idx, calcDist(vecAt(idx), vecAt(i)), true);
     }
-    std::make_heap(graphLayer0[i].pool.begin(), graphLayer0[i].pool.end());
+    poolSize[i] = sampledIdx.size();
+    std::make_heap(p, p + poolSize[i]);
   }
   nnDescent();
-  parallelFor(graphLayer1.size(), [&](size_t i) { buildLayer1(i); });
+  parallelFor(rows, [&](size_t i) { buildLayer1(i); });
   return true;
 }
-}  // namespace CANDY
\ No newline at end of file
+}  // namespace CANDY
@@ -74,21 +74,24 @@ bool CANDY::DistributedPartitionIndex::deleteTensor(torch::Tensor &t, int64_t k)
   /**
   * @brief 2. reduce
   */
+  if (tensors == 0) {
+    return true;
+  }
+  int64_t candidatesPerQuery = k * distributedWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = t.contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto queryTensor = t.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * distributedWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
-      int64_t workerNo = tempIdx / k;
-      auto tensorToDelete = dbTensor.slice(0, tempIdx, tempIdx + 1);
+      int64_t tempIdx = idxAcc[i][j];
+      if (tempIdx < 0) {
+        continue;
+      }
+      int64_t workerNo = (tempIdx - (int64_t) i * candidatesPerQuery) / k;
+      auto tensorToDelete = candidates.slice(0, tempIdx, tempIdx + 1);
       workers[workerNo]->deleteTensor(tensorToDelete, 1);
       INTELLI_INFO("tell worker" + std::to_string(workerNo) + " to delete tensor");
     }
@@ -202,20 +205,20 @@ std::vector<torch::Tensor> CANDY::DistributedPartitionIndex::searchTensor(torch:
   /**
   * @brief 2. reduce
   */
+  if (tensors == 0) {
+    return ru;
+  }
+  int64_t candidatesPerQuery = k * distributedWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = q.contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto queryTensor = q.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * distributedWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
-      if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1); }
+      int64_t tempIdx = idxAcc[i][j];
+      if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = candidates.slice(0, tempIdx, tempIdx + 1); }
     }
   }
   return ru;
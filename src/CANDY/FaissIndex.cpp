@@ -11,6 +11,8 @@
 #include <faiss/IndexVanama.h>
 #include <faiss/IndexMNRU.h>
 #include <faiss/IndexNSW.h>
+#include <faiss/clone_index.h>
+#include <faiss/impl/FaissException.h>
 
 bool CANDY::FaissIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   AbstractIndex::setConfig(cfg);
@@ -199,19 +201,22 @@ bool CANDY::FaissIndex::insertTensor(torch::Tensor &t) {
   }
 }
 std::vector<faiss::idx_t> CANDY::FaissIndex::searchIndexParam(torch::Tensor q, int64_t k, int64_t param){
-    if(index_type=="HNSW") {
-        auto indexHNSW = static_cast<faiss::IndexHNSW *>(index);
-        indexHNSW->hnsw.efSearch = param;
-    } else if(index_type=="MNRU") {
-        auto indexMNRU = static_cast<faiss::IndexMNRU *>(index);
-        indexMNRU->main_index.efSearch = param;
-        indexMNRU->backup_index.efSearch = param;
+    if(index_type=="HNSW" || index_type=="MNRU") {
+        // passed to this search only, the efSearch kept by the index is left untouched
+        faiss::SearchParametersHNSW params;
+        params.efSearch = param;
+        return searchIndexWithParams(q, k, &params);
     }
 
     return searchIndex(q,k);
 
 }
 std::vector<faiss::idx_t> CANDY::FaissIndex::searchIndex(torch::Tensor q, int64_t k) {
+  return searchIndexWithParams(q, k, nullptr);
+}
+std::vector<faiss::idx_t> CANDY::FaissIndex::searchIndexWithParams(torch::Tensor q,
+                                                                   int64_t k,
+                                                                   const faiss::SearchParameters *params) {
 
   auto queryData = q.contiguous().data_ptr<float>();
 	std::cout<<"tiny wait"<<std::endl; 
@@ -227,7 +232,7 @@ std::vector<faiss::idx_t> CANDY::FaissIndex::searchIndex(torch::Tensor q, int64_
 	std::cout<<"tiny wait"<<std::endl;
       std::vector<faiss::idx_t> ru(k * querySize);
       std::vector<float> distance(k * querySize);
-      index->search(querySize, queryData_padding, k, distance.data(), ru.data());
+      index->search(querySize, queryData_padding, k, distance.data(), ru.data(), params);
       return ru;
     } else if (vecDim == 1369) {
       auto q_temp = torch::zeros({querySize, vecDim + 7});
@@ -237,14 +242,14 @@ std::vector<faiss::idx_t> CANDY::FaissIndex::searchIndex(torch::Tensor q, int64_
       auto queryData_padding = q_temp.contiguous().data_ptr<float>();
       std::vector<faiss::idx_t> ru(k * querySize);
       std::vector<float> distance(k * querySize);
-      index->search(querySize, queryData_padding, k, distance.data(), ru.data());
+      index->search(querySize, queryData_padding, k, distance.data(), ru.data(), params);
       return ru;
     }
   }
 
   std::vector<faiss::idx_t> ru(k * querySize);
   std::vector<float> distance(k * querySize);
-  index->search(querySize, queryData, k, distance.data(), ru.data());
+  index->search(querySize, queryData, k, distance.data(), ru.data(), params);
   return ru;
 }
 
@@ -253,28 +258,77 @@ std::vector<torch::Tensor> CANDY::FaissIndex::searchTensor(torch::Tensor &q, int
   return getTensorByIndex(idx, k);
 }
 
+std::tuple<torch::Tensor, torch::Tensor> CANDY::FaissIndex::searchWithDistances(torch::Tensor &q, int64_t k) {
+  int64_t querySize = q.size(0);
+  auto queryTensor = q.contiguous();
+  if (index->d != vecDim) {
+    // PQ and IVFPQ are built with zero-padded dimensions, see setConfig
+    queryTensor = torch::zeros({querySize, (int64_t) index->d});
+    queryTensor.slice(1, 0, vecDim) = q;
+    queryTensor = queryTensor.nan_to_num(0.0).contiguous();
+  }
+  auto ids = torch::empty({querySize, k}, torch::kInt64);
+  auto distances = torch::empty({querySize, k}, torch::kFloat32);
+  index->search(querySize, queryTensor.data_ptr<float>(), k, distances.data_ptr<float>(), ids.data_ptr<int64_t>());
+  return std::make_tuple(ids, distances);
+}
+
 std::vector<torch::Tensor> CANDY::FaissIndex::getTensorByIndex(std::vector<faiss::idx_t> &idx, int64_t k) {
   int64_t size = idx.size() / k;
   std::vector<torch::Tensor> ru(size);
+  /**
+   * @brief reconstruct all valid hits in one batch, rather than one row at a time
+   */
+  std::vector<faiss::idx_t> validIdx;
+  std::vector<int64_t> validPos;
+  validIdx.reserve(size * k);
+  validPos.reserve(size * k);
+  for (int64_t i = 0; i < size * k; i++) {
+    if (idx[i] >= 0) {
+      validIdx.push_back(idx[i]);
+      validPos.push_back(i);
+    }
+  }
+  auto allRows = torch::zeros({size * k, (int64_t) index->d});
+  if (!validIdx.empty()) {
+    auto recons = torch::empty({(int64_t) validIdx.size(), (int64_t) index->d});
+    index->reconstruct_batch(validIdx.size(), validIdx.data(), recons.data_ptr<float>());
+    auto posTensor = torch::from_blob(validPos.data(), {(int64_t) validPos.size()}, torch::kInt64);
+    allRows.index_copy_(0, posTensor, recons);
+  }
+  auto perQuery = allRows.slice(1, 0, vecDim).reshape({size, k, vecDim});
   for (int64_t i = 0; i < size; i++) {
-    ru[i] = torch::zeros({k, vecDim});
-    for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idx[i * k + j];
-      //printf("%ld%ld=%ld\n", i,j,tempIdx);
-      float tempSlice[vecDim];
-//            if(index_type=="FaissIVFPQ" || index_type == "FaissPQ"){
-//                if(vecDim=100 || vecDim == 420){
-//
-//                } else if (vecDim==1369){
-//
-//                }
-//            }
-          index->reconstruct(tempIdx, tempSlice);
-          auto tempTensor = torch::from_blob(tempSlice, {1, vecDim});
-          if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = tempTensor; };
-
+    ru[i] = perQuery[i];
+  }
+  return ru;
+}
+CANDY::FaissIndex::FaissIndex(const FaissIndex &src, faiss::Index *copied)
+    : AbstractIndex(src),
+      isFaissTrained(src.isFaissTrained),
+      index(copied),
+      index_type(src.index_type),
+      metricType(src.metricType),
+      vecDim(src.vecDim),
+      dbTensor(src.dbTensor.clone()),
+      lastNNZ(src.lastNNZ),
+      expandStep(src.expandStep) {
+}
 
-    }
+std::shared_ptr<CANDY::AbstractIndex> CANDY::FaissIndex::snapshot() {
+  if (index == nullptr) {
+    return nullptr;
+  }
+  std::unique_ptr<faiss::Index> copied;
+  try {
+    copied.reset(faiss::clone_index(index));
+  } catch (const faiss::FaissException &e) {
+    INTELLI_WARNING("faiss index " + index_type + " has no snapshot: " + e.what());
+    return nullptr;
   }
+  /**
+   * @brief the clone is released to the new object only once it is built, so it always has exactly one owner
+   */
+  std::shared_ptr<CANDY::FaissIndex> ru(new CANDY::FaissIndex(*this, copied.get()));
+  copied.release();
   return ru;
 }
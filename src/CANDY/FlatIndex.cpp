@@ -8,26 +8,93 @@
 #include <time.h>
 #include <chrono>
 #include <assert.h>
+#include <faiss/utils/distances.h>
+#include <Utils/NativeDistance.h>
+#include <Utils/IntelliLog.h>
+#include <typeinfo>
 bool CANDY::FlatIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   AbstractIndex::setConfig(cfg);
   vecDim = cfg->tryI64("vecDim", 768, true);
   initialVolume = cfg->tryI64("initialVolume", 1000, true);
   expandStep = cfg->tryI64("expandStep", 100, true);
-  dbTensor = torch::zeros({initialVolume, vecDim});
+  std::string storageName = cfg->tryString("storageType", "float32", true);
+  storageType = INTELLI::NativeDistance::typeFromString(storageName);
+  if (storageType == torch::ScalarType::Undefined) {
+    INTELLI_ERROR("unknown storageType " + storageName);
+    storageType = torch::kFloat32;
+    return false;
+  }
+  dbTensor = torch::zeros({initialVolume, vecDim}, storageType);
+  dbNorms = torch::zeros({initialVolume});
   lastNNZ = -1;
   return true;
 }
+void CANDY::FlatIndex::updateNorms(int64_t startRow, int64_t endRow) {
+  if (storageType != torch::kFloat32) {
+    return;
+  }
+  if (dbNorms.size(0) != dbTensor.size(0)) {
+    auto newNorms = torch::zeros({dbTensor.size(0)});
+    int64_t keep = std::min(dbNorms.size(0), dbTensor.size(0));
+    newNorms.slice(0, 0, keep).copy_(dbNorms.slice(0, 0, keep));
+    dbNorms = newNorms;
+  }
+  if (endRow > startRow) {
+    dbNorms.slice(0, startRow, endRow).copy_(dbTensor.slice(0, startRow, endRow).pow(2).sum(1));
+  }
+}
+void CANDY::FlatIndex::searchInPlace(torch::Tensor &q, int64_t k, float *distances, int64_t *idx) {
+  size_t querySize = q.size(0);
+  size_t dbSize = lastNNZ + 1;
+  if (storageType != torch::kFloat32) {
+    INTELLI::NativeDistance::knn(q, dbTensor, dbSize, k, faissMetric == faiss::METRIC_INNER_PRODUCT, distances, idx);
+    return;
+  }
+  if (q.scalar_type() != torch::kFloat32) {
+    q = q.to(torch::kFloat32).contiguous();
+  }
+  if (faissMetric == faiss::METRIC_INNER_PRODUCT) {
+    faiss::knn_inner_product(q.data_ptr<float>(), dbTensor.data_ptr<float>(), vecDim, querySize, dbSize, k,
+                             distances, idx);
+  } else {
+    faiss::knn_L2sqr(q.data_ptr<float>(), dbTensor.data_ptr<float>(), vecDim, querySize, dbSize, k,
+                     distances, idx, dbNorms.data_ptr<float>());
+  }
+}
 void CANDY::FlatIndex::reset() {
   lastNNZ = -1;
 }
 bool CANDY::FlatIndex::insertTensor(torch::Tensor &t) {
-  return INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &t, &lastNNZ, expandStep);
+  int64_t startRow = lastNNZ + 1;
+  auto tc = t.to(storageType);
+  bool ru = INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &tc, &lastNNZ, expandStep);
+  updateNorms(startRow, lastNNZ + 1);
+  return ru;
 }
 
 bool CANDY::FlatIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   std::vector<faiss::idx_t> idxToDelete = searchIndex(t, k);
-  std::vector<int64_t> &int64Vector = reinterpret_cast<std::vector<int64_t> &>(idxToDelete);
-  return INTELLI::IntelliTensorOP::deleteRowsBufferMode(&dbTensor, int64Vector, &lastNNZ);
+  std::vector<int64_t> int64Vector;
+  for (auto i : idxToDelete) {
+    if (i >= 0) {
+      int64Vector.push_back(i);
+    }
+  }
+  std::sort(int64Vector.begin(), int64Vector.end());
+  int64Vector.erase(std::unique(int64Vector.begin(), int64Vector.end()), int64Vector.end());
+  if (int64Vector.empty()) {
+    return false;
+  }
+  bool ru = INTELLI::IntelliTensorOP::deleteRowsBufferMode(&dbTensor, int64Vector, &lastNNZ);
+  /**
+   * @brief deleted slots are refilled by the former last rows, refresh their norms
+   */
+  for (auto i : int64Vector) {
+    if (i <= lastNNZ) {
+      updateNorms(i, i + 1);
+    }
+  }
+  return ru;
 }
 
 bool CANDY::FlatIndex::reviseTensor(torch::Tensor &t, torch::Tensor &w) {
@@ -35,34 +102,37 @@ bool CANDY::FlatIndex::reviseTensor(torch::Tensor &t, torch::Tensor &w) {
     return false;
   }
   int64_t rows = t.size(0);
-  faiss::IndexFlat indexFlat(vecDim); // call constructor
-  float *dbData = dbTensor.contiguous().data_ptr<float>();
-  indexFlat.add(lastNNZ + 1, dbData); // add vectors to the index
+  auto queryTensor = t.contiguous();
+  std::vector<float> distance(rows);
+  std::vector<int64_t> idx(rows);
+  searchInPlace(queryTensor, 1, distance.data(), idx.data());
   for (int64_t i = 0; i < rows; i++) {
-    float distance;
-    faiss::idx_t idx;
-    auto rowI = t.slice(0, i, i + 1).contiguous();
-    float *queryData = rowI.data_ptr<float>();
-    indexFlat.search(1, queryData, 1, &distance, &idx);
-    if (0 <= idx && idx <= lastNNZ) {
+    if (0 <= idx[i] && idx[i] <= lastNNZ) {
       auto rowW = w.slice(0, i, i + 1);
-      INTELLI::IntelliTensorOP::editRows(&dbTensor, &rowW, (int64_t) idx);
+      INTELLI::IntelliTensorOP::editRows(&dbTensor, &rowW, idx[i]);
+      updateNorms(idx[i], idx[i] + 1);
     }
   }
   return true;
 }
 std::vector<faiss::idx_t> CANDY::FlatIndex::searchIndex(torch::Tensor q, int64_t k) {
-  faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-  float *dbData = dbTensor.contiguous().data_ptr<float>();
-  float *queryData = q.contiguous().data_ptr<float>();
-  indexFlat.add(lastNNZ + 1, dbData); // add vectors to the index
+  auto queryTensor = q.contiguous();
   int64_t querySize = q.size(0);
   std::vector<faiss::idx_t> ru(k * querySize);
   std::vector<float> distance(k * querySize);
-  indexFlat.search(querySize, queryData, k, distance.data(), ru.data());
+  searchInPlace(queryTensor, k, distance.data(), ru.data());
   return ru;
 }
 
+std::tuple<torch::Tensor, torch::Tensor> CANDY::FlatIndex::searchWithDistances(torch::Tensor &q, int64_t k) {
+  int64_t querySize = q.size(0);
+  auto ids = torch::empty({querySize, k}, torch::kInt64);
+  auto distances = torch::empty({querySize, k}, torch::kFloat32);
+  auto queryTensor = q.contiguous();
+  searchInPlace(queryTensor, k, distances.data_ptr<float>(), ids.data_ptr<int64_t>());
+  return std::make_tuple(ids, distances);
+}
+
 std::vector<torch::Tensor> CANDY::FlatIndex::getTensorByIndex(std::vector<faiss::idx_t> &idx, int64_t k) {
   int64_t tensors = idx.size() / k;
   std::vector<torch::Tensor> ru(tensors);
@@ -77,10 +147,19 @@ std::vector<torch::Tensor> CANDY::FlatIndex::getTensorByIndex(std::vector<faiss:
   return ru;
 }
 torch::Tensor CANDY::FlatIndex::rawData() {
-  return dbTensor.slice(0, 0, lastNNZ + 1).contiguous();
+  return dbTensor.slice(0, 0, lastNNZ + 1).to(torch::kFloat32).contiguous();
 }
 
 std::vector<torch::Tensor> CANDY::FlatIndex::searchTensor(torch::Tensor &q, int64_t k) {
   auto idx = searchIndex(q, k);
   return getTensorByIndex(idx, k);
-}
\ No newline at end of file
+}
+std::shared_ptr<CANDY::AbstractIndex> CANDY::FlatIndex::snapshot() {
+  if (typeid(*this) != typeid(CANDY::FlatIndex)) {
+    return nullptr;
+  }
+  auto ru = std::make_shared<CANDY::FlatIndex>(*this);
+  ru->dbTensor = dbTensor.clone();
+  ru->dbNorms = dbNorms.clone();
+  return ru;
+}
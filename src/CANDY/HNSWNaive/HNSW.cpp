@@ -18,11 +18,11 @@ void CANDY::HNSW::search(CANDY::DistanceQueryer &qdis, int k,
     float d_nearest;
     if(qdis.is_search && opt_mode_==OPT_LVQ){
         if(nearest->code_final_ == nullptr) {
-            nearest->code_final_ = qdis.compute_code(nearest->id);
+            nearest->code_final_ = qdis.compute_code(getVector(nearest->vid));
         }
         d_nearest = qdis(nearest->code_final_);
     } else {
-        d_nearest = qdis(nearest->id);
+        d_nearest = qdis(getVector(nearest->vid));
     }
 
 
@@ -60,7 +60,7 @@ search_from_candidates_unbounded(CANDY::HNSW &hnsw, CANDY::HNSW::Node &node,
   vt.set(node.second);
   while (!candidates.empty()) {
     float d0;
-    INTELLI::TensorPtr v0;
+    CANDY::VertexPtr v0;
     std::tie(d0, v0) = candidates.top();
 
     if (d0 > top_candidates.top().first) {
@@ -71,13 +71,12 @@ search_from_candidates_unbounded(CANDY::HNSW &hnsw, CANDY::HNSW::Node &node,
 
     size_t begin, end;
     hnsw.neighbor_range(0, &begin, &end);
-    // auto nlist = hnsw.getNeighborsByPtr(v0);
-    auto nlist = std::vector<INTELLI::TensorPtr>(0);
+    const auto &nlist = v0->neighbors;
 
     for (auto it = nlist.begin() + begin;
          it != nlist.end() && it != nlist.begin() + end && begin < nlist.size();
          it++) {
-      auto v1 = *it;
+      auto &v1 = *it;
       if (v1 == nullptr) {
         break;
       }
@@ -85,16 +84,7 @@ search_from_candidates_unbounded(CANDY::HNSW &hnsw, CANDY::HNSW::Node &node,
         continue;
       }
       vt.set(v1);
-      float d1 = qdis(v1);
-//      float d1;
-//      if(qdis.is_search && hnsw.opt_mode_ == OPT_LVQ){
-//          if(v1->code_final_ == nullptr){
-//              v1->code_final_ = qdis.compute_code(v1->id);
-//          }
-//          d=qdis(v1->code_final_);
-//      } else {
-//          d1 = qdis(v1->id);
-//      }
+      float d1 = qdis(hnsw.getVector(v1->vid));
 
       if (top_candidates.top().first > d1 || top_candidates.size() < ef) {
         candidates.emplace(d1, v1);
@@ -105,6 +95,7 @@ search_from_candidates_unbounded(CANDY::HNSW &hnsw, CANDY::HNSW::Node &node,
       }
     }
   }
+  vt.advance();
   return top_candidates;
 }
 int search_from_candidates(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &qdis,
@@ -140,13 +131,12 @@ int search_from_candidates(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &qdis,
 
     size_t begin, end;
     hnsw.neighbor_range(level, &begin, &end);
-    // auto nlist = hnsw.getNeighborsByPtr(v0);
-    auto nlist = v0->neighbors;
+    const auto &nlist = v0->neighbors;
 
     for (auto it = nlist.begin() + begin;
          it != nlist.end() && it != nlist.begin() + end && begin < nlist.size();
          it++) {
-      auto v1 = *it;
+      auto &v1 = *it;
       if (v1 == nullptr) {
         break;
       }
@@ -161,7 +151,7 @@ int search_from_candidates(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &qdis,
 
       if(qdis.is_search && hnsw.opt_mode_ == OPT_LVQ){
           if(v1->code_final_ == nullptr) {
-              v1->code_final_ = qdis.compute_code(v1->id);
+              v1->code_final_ = qdis.compute_code(hnsw.getVector(v1->vid));
           }
           d=qdis(v1->code_final_);
       } else if(hnsw.opt_mode_==OPT_DCO){
@@ -178,7 +168,7 @@ int search_from_candidates(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &qdis,
               continue;
           }
       } else {
-          d = qdis(v1->id);
+          d = qdis(hnsw.getVector(v1->vid));
       }
       if (nres < k) {
         // std::cout<<"pushing  "<<*v1<<" with dist= "<<d<<" to
@@ -216,8 +206,7 @@ CANDY::VertexPtr greedy_update_nearest(CANDY::HNSW &hnsw,
     size_t begin;
     size_t end;
     hnsw.neighbor_range(level, &begin, &end);
-    // auto neighbors = hnsw.getNeighborsByPtr(nearest);
-    auto neighbors = nearest->neighbors;
+    const auto &neighbors = prev_nearest->neighbors;
     for (auto it = neighbors.begin() + begin;
          it != neighbors.end() && it != neighbors.begin() + end &&
          begin < neighbors.size();
@@ -226,15 +215,15 @@ CANDY::VertexPtr greedy_update_nearest(CANDY::HNSW &hnsw,
         break;
       }
       // INTELLI_INFO("FINDING NEAREST...");
-      auto vertex = *it;
+      auto &vertex = *it;
       float dis;
       if(disq.is_search && hnsw.opt_mode_==OPT_LVQ){
           if(vertex->code_final_ == nullptr){
-              vertex->code_final_ = disq.compute_code(vertex->id);
+              vertex->code_final_ = disq.compute_code(hnsw.getVector(vertex->vid));
           }
           dis = disq(vertex->code_final_);
       } else {
-          dis = disq(vertex->id);
+          dis = disq(hnsw.getVector(vertex->vid));
       }
       if (dis < d_nearest) {
         d_nearest = dis;
@@ -242,27 +231,7 @@ CANDY::VertexPtr greedy_update_nearest(CANDY::HNSW &hnsw,
         // std::cout<<"moving to "<<*nearest<<std::endl;
       }
     }
-    //
-    //        if(torch::equal(*(nearest->id), *(prev_nearest->id))){
-    //            //std::cout<<"nearest vector: "<<*nearest<<std::endl;
-    //            INTELLI_INFO("OUT!");
-    //            return nearest;
-    //        }
-    // std::cout<<"prev:"<<*(prev_nearest->id);
-    // std::cout<<"new:"<<*(nearest->id);
-    auto tensor1 = (*(prev_nearest->id));
-    auto tensor2 = (*(nearest->id));
-    if (torch::equal(tensor1, tensor2)) {
-      return nearest;
-    }
     if (prev_nearest == nearest) {
-      //            auto same = torch::equal(*(nearest->id),
-      //            *(prev_nearest->id)); std::cout<<same<<std::endl;
-      //            if(!torch::equal(*(nearest->id), *(prev_nearest->id))){
-      //                //std::cout<<"nearest vector: "<<*nearest<<std::endl;
-      //                INTELLI_INFO("with different vectors!");
-      //            }
-      // INTELLI_INFO("OUT from equal ptr!");
       return nearest;
     }
   }
@@ -275,7 +244,7 @@ void CANDY::HNSW::add_without_lock(CANDY::DistanceQueryer &disq,
   // update global mean for LVQ
   ntotal += 1;
   if (opt_mode_ == OPT_LVQ) {
-    auto new_data = (*(pt_id->id)).contiguous().data_ptr<float>();
+    auto new_data = getVector(pt_id->vid);
     for (int64_t i = 0; i < vecDim_; i++) {
       auto div = (new_data[i] - mean_[i]) / ntotal;
       mean_[i] += div;
@@ -290,7 +259,7 @@ void CANDY::HNSW::add_without_lock(CANDY::DistanceQueryer &disq,
 
   // level from which to add neighbors
   int level = max_level_;
-  float d_nearest = disq(nearest->id);
+  float d_nearest = disq(getVector(nearest->vid));
   // from top level to greedy search to assigned_level
   disq.set_rank(false);
   for (level = max_level_; level > assigned_level; level--) {
@@ -319,7 +288,7 @@ void CANDY::HNSW::add_links_starting_from(CANDY::DistanceQueryer &disq,
   // control size
   int M = nb_neighbors(level);
 
-  hnsw_shrink_neighbor_list(disq, link_targets, M);
+  hnsw_shrink_neighbor_list(*this, disq, link_targets, M);
 
   std::vector<CANDY::VertexPtr> neighbors;
   neighbors.reserve(link_targets.size());
@@ -327,9 +296,7 @@ void CANDY::HNSW::add_links_starting_from(CANDY::DistanceQueryer &disq,
   // add links between chosen nearest's chosen neighbors and new query
   while (!link_targets.empty()) {
     auto other_id = link_targets.top().id;
-    auto other_vector = (*(other_id->id));
-    auto pt_vector = (*(pt_id->id));
-    if (torch::equal(other_vector, pt_vector)) {
+    if (other_id->vid == pt_id->vid) {
       link_targets.pop();
       continue;
     }
@@ -339,21 +306,15 @@ void CANDY::HNSW::add_links_starting_from(CANDY::DistanceQueryer &disq,
     link_targets.pop();
   }
   // way round
-  for (auto nei : neighbors) {
-    auto nei_vector = (*(nei->id));
-    auto pt_vector = (*(pt_id->id));
-    if (torch::equal(nei_vector, pt_vector)) {
-      continue;
-    }
+  for (auto &nei : neighbors) {
     add_link(*this, disq, nei, pt_id, level);
   }
 }
 void add_link(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
               CANDY::VertexPtr src, CANDY::VertexPtr dest, int level) {
   size_t begin, end;
-  // auto nlist = hnsw.getNeighborsByPtr(src);
-  auto nlist = src->neighbors;
-  disq.set_query(*(src->id));
+  auto &nlist = src->neighbors;
+  disq.set_query(hnsw.getVector(src->vid));
   if (!nlist.size()) {
     return;
   }
@@ -368,9 +329,7 @@ void add_link(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
     if (*it == nullptr) {
       break;
     }
-    auto it_vector = (*((*it)->id));
-    auto dest_vector = (*(dest->id));
-    if (torch::equal(it_vector, dest_vector)) {
+    if ((*it)->vid == dest->vid) {
       return;
     }
   }
@@ -391,16 +350,16 @@ void add_link(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
   }
   // need prune some neighbors
   std::priority_queue<CANDY::HNSW::NodeDistCloser> resultSet;
-  resultSet.emplace(disq(dest->id), dest);
+  resultSet.emplace(disq(hnsw.getVector(dest->vid)), dest);
   for (auto it = nlist.begin() + begin;
        it != nlist.end() && it != nlist.begin() + end && begin < nlist.size();
        it++) {
     auto nei = *it;
-    resultSet.emplace(disq(nei->id), nei);
+    resultSet.emplace(disq(hnsw.getVector(nei->vid)), nei);
   }
   // prune neighbors that is farther in the same direction as a previous
   // neighbor
-  hnsw_shrink_neighbor_list(disq, resultSet, end - begin);
+  hnsw_shrink_neighbor_list(hnsw, disq, resultSet, end - begin);
 
   size_t i = begin;
   while (resultSet.size()) {
@@ -415,7 +374,7 @@ void add_link(CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
   return;
 }
 void hnsw_shrink_neighbor_list(
-    CANDY::DistanceQueryer &disq,
+    CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
     std::priority_queue<CANDY::HNSW::NodeDistCloser> &resultSet_prev,
     size_t max_size) {
   if (resultSet_prev.size() < max_size) {
@@ -428,23 +387,23 @@ void hnsw_shrink_neighbor_list(
     resultSet_prev.pop();
   }
   // rebuild resultSet_prev from returnList
-  shrink_neighbor_list(disq, resultSet, returnList, max_size);
+  shrink_neighbor_list(hnsw, disq, resultSet, returnList, max_size);
   for (auto node : returnList) {
     resultSet_prev.emplace(node.dist, node.id);
   }
 }
 void shrink_neighbor_list(
-    CANDY::DistanceQueryer &disq,
+    CANDY::HNSW &hnsw, CANDY::DistanceQueryer &disq,
     std::priority_queue<CANDY::HNSW::NodeDistFarther> &input,
     std::vector<CANDY::HNSW::NodeDistFarther> &output, size_t max_size) {
   while (input.size() > 0) {
     CANDY::HNSW::NodeDistFarther v1 = input.top();
-    disq.set_query(*(v1.id->id));
+    disq.set_query(hnsw.getVector(v1.id->vid));
     input.pop();
     float dist_v1_q = v1.dist;
     bool ok = true;
     for (auto v2 : output) {
-      float dist_v1_v2 = disq(v2.id->id);
+      float dist_v1_v2 = disq(hnsw.getVector(v2.id->vid));
       // v1 not ok if there is a neighbor v2 of v1 that is closer to v1 than v1
       // closer to query to prevent v1 getting kicked out
       if (dist_v1_v2 < dist_v1_q) {
@@ -487,14 +446,13 @@ void search_neighbors_to_add(
     // iterate over neighbors
     size_t begin, end;
     hnsw.neighbor_range(level, &begin, &end);
-    // auto neighbors = hnsw.getNeighborsByPtr(currNode);
-    auto neighbors = currNode->neighbors;
+    const auto &neighbors = currNode->neighbors;
     // hnsw.printNeighborsByPtr(currNode);
     for (auto it = neighbors.begin() + begin;
          it != neighbors.end() && it != neighbors.begin() + end &&
          begin < neighbors.size();
          it++) {
-      auto nodeId = *it;
+      auto &nodeId = *it;
 
       if (nodeId == nullptr) {
         break;
@@ -505,7 +463,7 @@ void search_neighbors_to_add(
       }
       vt.set(nodeId);
 
-      float dis = disq(nodeId->id);
+      float dis = disq(hnsw.getVector(nodeId->vid));
       CANDY::HNSW::NodeDistFarther evE1(dis, nodeId);
       // when results set does not reach efConstruction, append to it with
       // nearer vectors
@@ -548,6 +506,14 @@ void CANDY::HNSW::set_probs(int64_t M, float levelMult) {
     cum_nneighbor_per_level_.push_back(nn);
   }
 }
+faiss::idx_t CANDY::HNSW::appendVectors(torch::Tensor &x) {
+  auto xc = x.to(torch::kFloat32).contiguous();
+  faiss::idx_t first = arena_.size() / vecDim_;
+  auto src = xc.data_ptr<float>();
+  arena_.insert(arena_.end(), src, src + xc.numel());
+  vertices_.resize(arena_.size() / vecDim_, nullptr);
+  return first;
+}
 int CANDY::HNSW::getLevelsByTensor(torch::Tensor &t) {
   return getLevelsByPtr(newTensor(t));
 }
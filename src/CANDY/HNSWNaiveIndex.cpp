@@ -15,6 +15,7 @@ bool CANDY::HNSWNaiveIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
       faissMetric = faiss::METRIC_INNER_PRODUCT;
   }
   hnsw = HNSW(vecDim, M_);
+  vt = VisitedTable();
 
 
   opt_mode_ = cfg->tryI64("opt_mode", 0, true);
@@ -44,33 +45,35 @@ bool CANDY::HNSWNaiveIndex::insertTensor(torch::Tensor &t) {
   auto n = t.size(0);
   hnsw.levels_ = std::vector<int>(n, -1);
   int max_level = hnsw.prepare_level_tab(t, false, is_NSW);
+  /**
+   * @brief rows go to the arena first, so row i of t gets vid first+i whatever the level order is
+   */
+  auto first = hnsw.appendVectors(t);
 
   if (is_NSW) {
     // only need to insert all vectors at level 0
     INTELLI_INFO("START INSERTION AS NSW");
-    CANDY::VisitedTable vt;
     auto qdis = new CANDY::DistanceQueryer(vecDim);
     qdis->set_mode(opt_mode_, faissMetric);
     if (qdis->opt_mode_ == OPT_LVQ) {
       qdis->mean_ = &hnsw.mean_;
     }
-    for (size_t i = 0; i < n; i++) {
-      auto id = newTensor(t.slice(0, i, i + 1));
+    for (int64_t i = 0; i < n; i++) {
       auto level = 0;
       auto new_in_vertex = std::make_shared<CANDY::HNSWVertex>(
-          CANDY::HNSWVertex(id, level, hnsw.cum_nb_neighbors(level + 1)));
-      qdis->set_query(*id);
+          first + i, level, hnsw.cum_nb_neighbors(level + 1));
+      hnsw.vertices_[first + i] = new_in_vertex;
+      qdis->set_query(hnsw.getVector(first + i));
       hnsw.add_without_lock(*qdis, level, new_in_vertex, vt);
     }
+    delete qdis;
   } else {
     // need to add the vector from higher to lower level
     // making buckets for each level
-    std::vector<std::vector<INTELLI::TensorPtr>> orders(
-        max_level + 1, std::vector<INTELLI::TensorPtr>(0));
+    std::vector<std::vector<int64_t>> orders(max_level + 1, std::vector<int64_t>(0));
     for (int64_t i = 0; i < n; i++) {
-      auto id = newTensor(t.slice(0, i, i + 1));
       auto assigned_level = hnsw.levels_[i] - 1;
-      orders[assigned_level].push_back(id);
+      orders[assigned_level].push_back(i);
       // INTELLI_INFO("LEVEL: "+std::to_string(assigned_level));
     }
       auto qdis = new CANDY::DistanceQueryer(vecDim);
@@ -83,28 +86,24 @@ bool CANDY::HNSWNaiveIndex::insertTensor(torch::Tensor &t) {
           qdis->ads->set_transformed(&hnsw.transformMatrix);
           qdis->ads->set_step(adSampling_step,adSampling_epsilon0);
       }
-      int j=0;
     for (int level = orders.size() - 1; level >= 0; level--) {
-      CANDY::VisitedTable vt;
-
-
       for (size_t i = 0; i < orders[level].size(); i++) {
-        auto id = orders[level][i];
+        faiss::idx_t vid = first + orders[level][i];
         auto new_in_vertex = std::make_shared<CANDY::HNSWVertex>(
-            CANDY::HNSWVertex(id, level, hnsw.cum_nb_neighbors(level + 1)));
-        new_in_vertex->vid = ntotal+j;
-        qdis->set_query(*id);
+            vid, level, hnsw.cum_nb_neighbors(level + 1));
+        hnsw.vertices_[vid] = new_in_vertex;
+        qdis->set_query(hnsw.getVector(vid));
         if(qdis->opt_mode_ == OPT_LVQ && is_local_lvq) {
-            new_in_vertex->code_final_ = qdis->compute_code(id);
+            new_in_vertex->code_final_ = qdis->compute_code(hnsw.getVector(vid));
         }
         if(qdis->opt_mode_ == OPT_DCO){
-            auto transformed = qdis->compute_transformed(id);
+            auto transformed = qdis->compute_transformed(newTensor(hnsw.getTensor(vid)));
             new_in_vertex->transformed = newTensor(transformed);
         }
         hnsw.add_without_lock(*qdis, level, new_in_vertex, vt);
-        j++;
       }
     }
+    delete qdis;
   }
   ntotal += n;
   return true;
@@ -123,7 +122,7 @@ std::vector<torch::Tensor> CANDY::HNSWNaiveIndex::searchTensor(torch::Tensor &q,
     }
   int64_t query_size = q.size(0);
   std::vector<torch::Tensor> ru(query_size);
-  CANDY::VisitedTable vt;
+  CANDY::VisitedTable vt(hnsw.vertices_.size());
   for (int64_t i = 0; i < query_size; i++) {
     auto query = q.slice(0, i, i + 1);
     if(disq.opt_mode_ == OPT_DCO){
@@ -140,7 +139,9 @@ std::vector<torch::Tensor> CANDY::HNSWNaiveIndex::searchTensor(torch::Tensor &q,
 
     hnsw.search(disq, k, I, D.data(), vt);
     for (int64_t j = 0; j < k; j++) {
-      ru[i].slice(0, j, j + 1) = *(I[j]->id);
+      if (I[j] != nullptr) {
+        ru[i].slice(0, j, j + 1) = hnsw.getTensor(I[j]->vid);
+      }
     }
   }
   return ru;
@@ -159,7 +160,7 @@ std::vector<faiss::idx_t> CANDY::HNSWNaiveIndex::searchIndex(torch::Tensor q, in
     }
     int64_t query_size = q.size(0);
     std::vector<faiss::idx_t> ru(query_size*k);
-    CANDY::VisitedTable vt;
+    CANDY::VisitedTable vt(hnsw.vertices_.size());
     for (int64_t i = 0; i < query_size; i++) {
         auto query = q.slice(0, i, i + 1);
         if(disq.opt_mode_ == OPT_DCO){
@@ -175,8 +176,48 @@ std::vector<faiss::idx_t> CANDY::HNSWNaiveIndex::searchIndex(torch::Tensor q, in
 
         hnsw.search(disq, k, I, D.data(), vt);
         for (int64_t j = 0; j < k; j++) {
-            ru[i*k+j]= I[j]->vid;
+            ru[i*k+j] = I[j] != nullptr ? I[j]->vid : -1;
         }
     }
     return ru;
-}
\ No newline at end of file
+}
+
+std::shared_ptr<CANDY::AbstractIndex> CANDY::HNSWNaiveIndex::snapshot() {
+  auto ru = std::make_shared<CANDY::HNSWNaiveIndex>(*this);
+  if (storage) {
+    ru->storage = new CANDY::FlatIndex(*std::dynamic_pointer_cast<CANDY::FlatIndex>(storage->snapshot()));
+  }
+  ru->hnsw.transformMatrix = hnsw.transformMatrix.clone();
+  /**
+   * @brief the vertices link each other by shared pointers, so the copy gets new vertices, relinked by vid
+   */
+  auto &src = hnsw.vertices_;
+  auto &dst = ru->hnsw.vertices_;
+  for (size_t i = 0; i < src.size(); i++) {
+    if (src[i] == nullptr) {
+      continue;
+    }
+    dst[i] = std::make_shared<CANDY::HNSWVertex>(*src[i]);
+    if (src[i]->code_final_) {
+      dst[i]->code_final_ = new int8_t[vecDim];
+      std::copy(src[i]->code_final_, src[i]->code_final_ + vecDim, dst[i]->code_final_);
+    }
+    if (src[i]->transformed) {
+      dst[i]->transformed = newTensor(src[i]->transformed->clone());
+    }
+  }
+  for (auto &v : dst) {
+    if (v == nullptr) {
+      continue;
+    }
+    for (auto &nb : v->neighbors) {
+      if (nb != nullptr) {
+        nb = dst[nb->vid];
+      }
+    }
+  }
+  if (hnsw.entry_point_) {
+    ru->hnsw.entry_point_ = dst[hnsw.entry_point_->vid];
+  }
+  return ru;
+}
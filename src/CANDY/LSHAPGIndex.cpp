@@ -2,6 +2,7 @@
 // Created by Isshin on 2024/5/31.
 //
 #include <CANDY/LSHAPGIndex.h>
+#include <limits>
 int _lsh_UB=0;
 int _G_COST=0;
 int _g_dist_mes=0;
@@ -57,6 +58,27 @@ std::vector<faiss::idx_t> CANDY::LSHAPGIndex::searchIndex(torch::Tensor q, int64
 
 }
 
+std::tuple<torch::Tensor, torch::Tensor> CANDY::LSHAPGIndex::searchWithDistances(torch::Tensor &q, int64_t k) {
+    auto querySize = q.size(0);
+    auto queryTensor = q.contiguous();
+    prep.set_query(queryTensor.data_ptr<float>(), querySize);
+    if(divG) divG->ef = k+150;
+    auto results = search_candy(c,k,divG,prep,beta,2);
+    auto ids = torch::full({querySize, k}, -1, torch::kInt64);
+    auto distances = torch::full({querySize, k}, std::numeric_limits<float>::quiet_NaN());
+    auto idsPtr = ids.data_ptr<int64_t>();
+    auto distPtr = distances.data_ptr<float>();
+    for(int64_t i=0; i<querySize; i++) {
+        auto &res = results[i]->res;
+        int64_t hits = std::min((int64_t) res.size(), k);
+        for(int64_t j=0; j<hits; j++) {
+            idsPtr[i*k+j] = res[j].id;
+            distPtr[i*k+j] = res[j].dist;
+        }
+    }
+    return std::make_tuple(ids, distances);
+}
+
 std::vector<torch::Tensor> CANDY::LSHAPGIndex::searchTensor(torch::Tensor &q, int64_t k){
     auto idx = searchIndex(q,k);
     return getTensorByIndex(idx,k);
@@ -81,6 +103,43 @@ std::vector<torch::Tensor> CANDY::LSHAPGIndex::getTensorByIndex(std::vector<fais
     return ru;
 
 }
+std::shared_ptr<AbstractIndex> LSHAPGIndex::snapshot() {
+  auto ru = std::make_shared<LSHAPGIndex>();
+  ru->faissMetric = faissMetric;
+  ru->containerTier = containerTier;
+  ru->c = c;
+  ru->k = k;
+  ru->L = L;
+  ru->K = K;
+  ru->beta = beta;
+  ru->Qnum = Qnum;
+  ru->W = W;
+  ru->T = T;
+  ru->efC = efC;
+  ru->pC = pC;
+  ru->pQ = pQ;
+  ru->datasetName = datasetName;
+  ru->isbuilt = isbuilt;
+  ru->vecDim = vecDim;
+  ru->flatBuffer = *std::dynamic_pointer_cast<FlatIndex>(flatBuffer.snapshot());
+  /**
+   * @brief the graph reads the rows of prep, so the copy gets its own rows before its graph
+   */
+  ru->prep.data.dim = prep.data.dim;
+  ru->prep.data.N = prep.data.N;
+  ru->prep.data.oldN = prep.data.oldN;
+  if (prep.data.val) {
+    ru->prep.data.val = new float *[prep.data.N];
+    for (unsigned i = 0; i < prep.data.N; i++) {
+      ru->prep.data.val[i] = new float[prep.data.dim];
+      std::copy(prep.data.val[i], prep.data.val[i] + prep.data.dim, ru->prep.data.val[i]);
+    }
+  }
+  if (divG) {
+    ru->divG = new divGraph(*divG, ru->prep);
+  }
+  return ru;
+}
 bool LSHAPGIndex::insertTensor(torch::Tensor &t) {
   auto tc=t.clone();
   divG->appendTensor(tc,&prep);
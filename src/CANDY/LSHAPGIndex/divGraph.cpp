@@ -235,6 +235,74 @@ divGraph::divGraph(Preprocess* prep, const std::string& path, double probQ):link
   showInfo(prep);
 }
 
+divGraph::divGraph(const divGraph& src, Preprocess& prep) :link_list_locks_(src.link_list_locks_.size()), hash_locks_(src.hash_locks_.size())
+{
+  N = src.N;
+  dim = src.dim;
+  S = src.S;
+  L = src.L;
+  K = src.K;
+  W = src.W;
+  hashMins = src.hashMins;
+  hashMaxs = src.hashMaxs;
+  hashPar.rndBs = new float[S];
+  std::copy(src.hashPar.rndBs, src.hashPar.rndBs + S, hashPar.rndBs);
+  hashPar.rndAs = new float* [S];
+  for (int i = 0; i < S; ++i) {
+    hashPar.rndAs[i] = new float[dim];
+    std::copy(src.hashPar.rndAs[i], src.hashPar.rndAs[i] + dim, hashPar.rndAs[i]);
+  }
+  hashval = new float* [N];
+  for (int i = 0; i < N; ++i) {
+    hashval[i] = new float[S];
+    std::copy(src.hashval[i], src.hashval[i] + S, hashval[i]);
+  }
+  u = src.u;
+  hashTables = src.hashTables;
+
+  file = src.file;
+  edgeTotal = src.edgeTotal;
+  ng = src.ng;
+  rnd = src.rnd;
+  records = src.records;
+  clusterFlag = src.clusterFlag;
+  maxT = src.maxT;
+  unitL = src.unitL;
+  time_append = src.time_append;
+  compCostConstruction = src.compCostConstruction.load();
+  pruningConstruction = src.pruningConstruction.load();
+  indexingTime = src.indexingTime;
+  foundEdges = src.foundEdges;
+  efC = src.efC;
+  coeff = src.coeff;
+  coeffq = src.coeffq;
+  T = src.T;
+  step = src.step;
+  nnD = src.nnD;
+  lowDim = src.lowDim;
+  myData = prep.data.val;
+  flagStates = src.flagStates;
+  ef = src.ef;
+  first_id = src.first_id;
+  visited_list_pool_ = new threadPoollib::VisitedListPool(1, N);
+  /**
+   * @brief the nodes point into linkListBase, so they are rebuilt at the same offsets of the copied base
+   */
+  linkListBase = src.linkListBase;
+  linkLists.resize(src.linkLists.size(), nullptr);
+  for (size_t i = 0; i < linkLists.size(); ++i) {
+    auto srcNode = src.linkLists[i];
+    if (srcNode == nullptr) {
+      continue;
+    }
+    auto node = new Node2(srcNode->id, linkListBase.data() + (srcNode->neighbors - src.linkListBase.data()));
+    node->in = srcNode->in;
+    node->out = srcNode->out;
+    node->remainings = srcNode->remainings;
+    linkLists[i] = node;
+  }
+}
+
 int  divGraph::searchLSH(int pId, std::vector<zint>& keys, std::priority_queue<Res>& candTable, std::unordered_set<int>& checkedArrs_local, threadPoollib::vl_type tag)
 {
 
@@ -811,7 +879,7 @@ void divGraph::appendTensor(torch::Tensor &t, Preprocess *prep){
   //printf("new list first neighbor is %d\n", new_linkListBase[0].id);
   //printf("old list first neighbor is %d\n", linkListBase[0].id);
   //printf("link list first neighbor is %d\n",  linkLists[0]->neighbors[0].id);
-  linkListBase = new_linkListBase;
+  linkListBase = std::move(new_linkListBase);
 
   // copy linkLists
 
@@ -4,81 +4,81 @@
 //
 
 #include <CANDY/NNDescentIndex.h>
+#include <Utils/VisitedBitmap.hpp>
 
 namespace CANDY {
 void NNDescentIndex::nnDescent() {
-  std::mt19937 rng(time(NULL));
+  size_t rows = rowCount();
+  std::vector<DescentScratch> scratch(rows);
+  size_t seed = std::random_device()();
   while (true) {
-    parallelFor(graph.size(), [&](size_t i) {
-      std::unordered_set<size_t>().swap(graph[i].nnNew);
-      std::unordered_set<size_t>().swap(graph[i].nnOld);
-      std::unordered_set<size_t>().swap(graph[i].rnnNew);
-      std::unordered_set<size_t>().swap(graph[i].rnnOld);
+    parallelFor(rows, [&](size_t i) {
+      scratch[i].nnNew.clear();
+      scratch[i].nnOld.clear();
+      scratch[i].rnnNew.clear();
+      scratch[i].rnnOld.clear();
     });
 
-    parallelFor(graph.size(), [&](size_t i) {
+    parallelFor(rows, [&](size_t i) {
+      thread_local std::mt19937 rng(
+          seed ^ std::hash<std::thread::id>()(std::this_thread::get_id()));
       std::vector<std::pair<size_t, size_t>> nnNewWithIdx;
-      for (size_t j = 0; j < graph[i].pool.size(); ++j) {
-        auto &neighbor = graph[i].pool[j];
+      auto p = poolAt(i);
+      for (size_t j = 0; j < poolSize[i]; ++j) {
+        auto &neighbor = p[j];
         if (neighbor.flag) {
           nnNewWithIdx.push_back({neighbor.id, j});
         } else {
-          graph[i].nnOld.insert(neighbor.id);
-          std::lock_guard<std::mutex> lockGuard(graph[neighbor.id].rnnOldLock);
-          graph[neighbor.id].rnnOld.insert(i);
+          scratch[i].nnOld.push_back(neighbor.id);
+          std::lock_guard<std::mutex> lockGuard(
+              poolLocks[neighbor.id % lockStripes]);
+          scratch[neighbor.id].rnnOld.push_back(i);
         }
       }
       std::vector<size_t> sampledIdx;
       randomSample(rng, sampledIdx, nnNewWithIdx.size(), rho * graphK);
       for (auto idx : sampledIdx) {
-        graph[i].nnNew.insert(nnNewWithIdx[idx].first);
-        graph[i].pool[nnNewWithIdx[idx].second].flag = false;
-        std::lock_guard<std::mutex> lockGuard(
-            graph[nnNewWithIdx[idx].first].rnnNewLock);
-        graph[nnNewWithIdx[idx].first].rnnNew.insert(i);
+        auto id = nnNewWithIdx[idx].first;
+        scratch[i].nnNew.push_back(id);
+        p[nnNewWithIdx[idx].second].flag = false;
+        std::lock_guard<std::mutex> lockGuard(poolLocks[id % lockStripes]);
+        scratch[id].rnnNew.push_back(i);
       }
     });
 
     std::atomic<size_t> counter(0);
-    parallelFor(graph.size(), [&](size_t i) {
+    parallelFor(rows, [&](size_t i) {
+      thread_local std::mt19937 rng(
+          ~seed ^ std::hash<std::thread::id>()(std::this_thread::get_id()));
+      auto &s = scratch[i];
       std::vector<size_t> sampledIdx;
+      randomSample(rng, sampledIdx, s.rnnOld.size(), rho * graphK);
+      for (auto idx : sampledIdx) s.nnOld.push_back(s.rnnOld[idx]);
+      randomSample(rng, sampledIdx, s.rnnNew.size(), rho * graphK);
+      for (auto idx : sampledIdx) s.nnNew.push_back(s.rnnNew[idx]);
+      for (auto nn : {&s.nnOld, &s.nnNew}) {
+        std::sort(nn->begin(), nn->end());
+        nn->erase(std::unique(nn->begin(), nn->end()), nn->end());
+      }
 
-      randomSample(rng, sampledIdx, graph[i].rnnOld.size(), rho * graphK);
-      size_t insertCount = 0, iterateOffset = 0;
-      for (auto it = graph[i].rnnOld.begin();
-           it != graph[i].rnnOld.end(), insertCount < sampledIdx.size();
-           ++it, ++iterateOffset)
-        if (iterateOffset == sampledIdx[insertCount++])
-          graph[i].nnOld.insert(*it);
-
-      randomSample(rng, sampledIdx, graph[i].rnnNew.size(), rho * graphK);
-      insertCount = iterateOffset = 0;
-      for (auto it = graph[i].rnnNew.begin();
-           it != graph[i].rnnNew.end(), insertCount < sampledIdx.size();
-           ++it, ++iterateOffset)
-        if (iterateOffset == sampledIdx[insertCount++])
-          graph[i].nnNew.insert(*it);
-
-      for (auto u1 : graph[i].nnNew) {
-        for (auto u2 : graph[i].nnNew)
+      size_t updated = 0;
+      for (auto u1 : s.nnNew) {
+        for (auto u2 : s.nnNew)
           if (u1 < u2) {
-            auto dist = calcDist(tensor[u1], tensor[u2]);
-            counter.fetch_add(updateNN(u1, u2, dist),
-                              std::memory_order_relaxed);
-            counter.fetch_add(updateNN(u2, u1, dist),
-                              std::memory_order_relaxed);
+            auto dist = calcDist(vecAt(u1), vecAt(u2));
+            updated += updateNN(u1, u2, dist);
+            updated += updateNN(u2, u1, dist);
           }
-        for (auto u2 : graph[i].nnOld)
-          if (u1 < u2) {
-            auto dist = calcDist(tensor[u1], tensor[u2]);
-            counter.fetch_add(updateNN(u1, u2, dist),
-                              std::memory_order_relaxed);
-            counter.fetch_add(updateNN(u2, u1, dist),
-                              std::memory_order_relaxed);
+        for (auto u2 : s.nnOld)
+          if (u1 != u2) {
+            auto dist = calcDist(vecAt(u1), vecAt(u2));
+            updated += updateNN(u1, u2, dist);
+            updated += updateNN(u2, u1, dist);
           }
       }
+      counter.fetch_add(updated, std::memory_order_relaxed);
     });
-    if (counter < delta * graph.size() * graphK) return;
+    if (counter < delta * rows * graphK) return;
   }
 }
 
@@ -105,150 +105,184 @@ void NNDescentIndex::randomSample(std::mt19937 &rng, std::vector<size_t> &vec,
   }
 }
 
-bool NNDescentIndex::updateNN(size_t i, size_t j, double dist) {
-  std::lock_guard<std::mutex> lockGuard(graph[i].poolLock);
-  if (graph[i].pool.size() < graphK) {
-    graph[i].neighborIdxSet.insert(j);
-
-    graph[i].pool.emplace_back(j, dist, true);
-    std::push_heap(graph[i].pool.begin(), graph[i].pool.end());
+bool NNDescentIndex::updateNN(size_t i, size_t j, float dist) {
+  if (i == j) return false;
+  std::lock_guard<std::mutex> lockGuard(poolLocks[i % lockStripes]);
+  auto p = poolAt(i);
+  uint32_t &n = poolSize[i];
+  for (uint32_t m = 0; m < n; ++m)
+    if (p[m].id == j) return false;
+  if (n < graphK) {
+    p[n++] = Neighbor(j, dist, true);
+    std::push_heap(p, p + n);
     return true;
-  } else if (dist < graph[i].pool.front().distance &&
-             !graph[i].neighborIdxSet.count(j)) {
-    graph[i].neighborIdxSet.erase(graph[i].pool.front().id);
-    graph[i].neighborIdxSet.insert(j);
-
-    std::pop_heap(graph[i].pool.begin(), graph[i].pool.end());
-    graph[i].pool.back() = {j, dist, true};
-    std::push_heap(graph[i].pool.begin(), graph[i].pool.end());
+  } else if (dist < p[0].distance) {
+    std::pop_heap(p, p + n);
+    p[n - 1] = Neighbor(j, dist, true);
+    std::push_heap(p, p + n);
     return true;
   }
   return false;
 }
 
-double NNDescentIndex::calcDist(const torch::Tensor &ta,
-                                const torch::Tensor &tb) {
-  double ans = 0;
-  if (faissMetric == faiss::METRIC_L2) {
-    // Calculate the squared L2 distance as ||v1 - v2||^2
-    auto diff = ta-tb;
-    auto l2_sqr = torch::sum(diff * diff);
-    // Convert the result back to float and return
-    ans = l2_sqr.item<float>();
-  } else {
-    //for (size_t i = 0; i < vecDim; ++i) ans -= taPtr[i] * tbPtr[i];
-    // Calculate the inner (dot) product
-    auto inner_product = torch::matmul(ta, tb.t());
-    ans = -inner_product.item<float>();
-    // Convert the result back to float and return
-  }
-  return ans;
+size_t NNDescentIndex::appendRow(const float *x) {
+  size_t id = rowCount();
+  vectors.insert(vectors.end(), x, x + vecDim);
+  pool.resize(pool.size() + graphK);
+  poolSize.push_back(0);
+  deleted.push_back(0);
+  return id;
 }
 
-torch::Tensor NNDescentIndex::searchOnce(torch::Tensor q, int64_t k) {
+torch::Tensor NNDescentIndex::searchOnce(const float *q, int64_t k) {
   auto neighbors = searchOnceInner(q, k);
-  auto ans = torch::zeros({int64_t(neighbors.size()), vecDim});
+  auto ans = torch::empty({int64_t(neighbors.size()), vecDim});
+  auto ansPtr = ans.data_ptr<float>();
   for (size_t i = 0; i < neighbors.size(); ++i)
-    ans.slice(0, i, i + 1) = tensor[neighbors[i].second];
+    std::copy_n(vecAt(neighbors[i].second), vecDim, ansPtr + i * vecDim);
   return ans;
 }
 
-std::vector<std::pair<double, size_t>> NNDescentIndex::searchOnceInner(
-    torch::Tensor q, int64_t k) {
-  if (graph.empty()) return std::vector<std::pair<double, size_t>>();
-  std::mt19937 rng(time(NULL));
-  size_t startId = rng() % graph.size();
-  std::vector<std::pair<double, size_t>> neighbors;
-  neighbors.reserve(k);
-  std::unordered_map<size_t, bool> neighborIdxWithVisitFlag;
-  size_t deletedCountInNeighbors = 0;
-  neighbors.emplace_back(calcDist(tensor[startId], q), startId);
-  neighborIdxWithVisitFlag.insert({startId, false});
-
-  bool exit;
-  do {
-    exit = true;
-    auto curNeighbors = neighbors;
-    for (auto item : curNeighbors)
-      if (!neighborIdxWithVisitFlag[item.second]) {
-        neighborIdxWithVisitFlag[item.second] = true;
-        exit = false;
-        for (auto neighbor : graph[item.second].pool)
-          if (!neighborIdxWithVisitFlag.count(neighbor.id)) {
-            auto dist = calcDist(tensor[neighbor.id], q);
-            if (neighbors.size() < k + deletedCountInNeighbors) {
-              neighborIdxWithVisitFlag.insert({neighbor.id, false});
-              if (deletedIdxSet.count(neighbor.id)) ++deletedCountInNeighbors;
-
-              neighbors.emplace_back(dist, neighbor.id);
-              std::push_heap(neighbors.begin(), neighbors.end());
-            } else if (calcDist(tensor[neighbor.id], q) <
-                       neighbors.front().first) {
-              neighborIdxWithVisitFlag.erase(neighbors.front().second);
-              neighborIdxWithVisitFlag.insert(
-                  std::make_pair(neighbor.id, false));
-              if (deletedIdxSet.count(neighbors.front().second))
-                --deletedCountInNeighbors;
-              if (deletedIdxSet.count(neighbor.id)) ++deletedCountInNeighbors;
-
-              std::pop_heap(neighbors.begin(), neighbors.end());
-              neighbors.back() = std::make_pair(dist, neighbor.id);
-              std::push_heap(neighbors.begin(), neighbors.end());
-            }
-          }
+std::vector<std::pair<float, size_t>> NNDescentIndex::searchOnceInner(
+    const float *q, int64_t k) {
+  struct Candidate {
+    float distance;
+    size_t id;
+    bool expanded;
+    inline bool operator<(const Candidate &other) const {
+      return distance < other.distance;
+    }
+  };
+  size_t rows = rowCount();
+  if (rows == 0 || k <= 0) return std::vector<std::pair<float, size_t>>();
+  thread_local std::mt19937 rng(std::random_device{}());
+  thread_local INTELLI::VisitedBitmap visited;
+  visited.reserve(rows);
+  visited.clear();
+
+  size_t startId = rng() % rows;
+  std::vector<Candidate> neighbors;
+  neighbors.reserve(k + 1);
+  size_t deletedCountInNeighbors = deleted[startId];
+  visited.testAndSet(startId);
+  neighbors.push_back({calcDist(vecAt(startId), q), startId, false});
+
+  auto visit = [&](size_t id) {
+    if (visited.testAndSet(id)) return;
+    float dist = calcDist(vecAt(id), q);
+    if (neighbors.size() < k + deletedCountInNeighbors) {
+      deletedCountInNeighbors += deleted[id];
+      neighbors.push_back({dist, id, false});
+      std::push_heap(neighbors.begin(), neighbors.end());
+    } else if (dist < neighbors.front().distance) {
+      deletedCountInNeighbors -= deleted[neighbors.front().id];
+      deletedCountInNeighbors += deleted[id];
+      std::pop_heap(neighbors.begin(), neighbors.end());
+      neighbors.back() = {dist, id, false};
+      std::push_heap(neighbors.begin(), neighbors.end());
+    }
+  };
+  std::vector<size_t> toExpand;
+  while (true) {
+    toExpand.clear();
+    for (auto &item : neighbors)
+      if (!item.expanded) {
+        item.expanded = true;
+        toExpand.push_back(item.id);
       }
-  } while (!exit);
+    if (toExpand.empty()) break;
+    for (auto u : toExpand) {
+      auto p = poolAt(u);
+      for (uint32_t m = 0; m < poolSize[u]; ++m) visit(p[m].id);
+    }
+  }
+  visited.clear();
 
-  std::vector<std::pair<double, size_t>> finalNeighbors;
+  std::vector<std::pair<float, size_t>> finalNeighbors;
   finalNeighbors.reserve(neighbors.size() - deletedCountInNeighbors);
   for (auto &item : neighbors)
-    if (!deletedIdxSet.count(item.second)) finalNeighbors.push_back(item);
+    if (!deleted[item.id]) finalNeighbors.emplace_back(item.distance, item.id);
   return finalNeighbors;
 }
 
-bool NNDescentIndex::insertOnce(vector<std::pair<double, size_t>> &neighbors,
-                                torch::Tensor t) {
-  tensor.push_back(t);
-  graph.emplace_back();
-  graph.back().pool.resize(neighbors.size());
-  parallelFor(neighbors.size(), [&](size_t i) {
-    graph.back().pool[i] =
-        Neighbor(neighbors[i].second, neighbors[i].first, true);
-    updateNN(neighbors[i].second, graph.size() - 1, neighbors[i].first);
+void NNDescentIndex::insertBatch(const float *x, size_t n) {
+  size_t base = rowCount();
+  std::vector<std::vector<std::pair<float, size_t>>> candidates(n);
+  // search the graph before this batch, it is not modified until the merge
+  parallelFor(n, [&](size_t r) {
+    auto &cand = candidates[r];
+    cand = searchOnceInner(x + r * vecDim, graphK);
+    std::make_heap(cand.begin(), cand.end());
+    for (size_t s = 0; s < n; ++s) {
+      if (s == r) continue;
+      float dist = calcDist(x + r * vecDim, x + s * vecDim);
+      if (cand.size() < size_t(graphK)) {
+        cand.emplace_back(dist, base + s);
+        std::push_heap(cand.begin(), cand.end());
+      } else if (dist < cand.front().first) {
+        std::pop_heap(cand.begin(), cand.end());
+        cand.back() = {dist, base + s};
+        std::push_heap(cand.begin(), cand.end());
+      }
+    }
+  });
+  vectors.reserve(vectors.size() + n * vecDim);
+  for (size_t r = 0; r < n; ++r) appendRow(x + r * vecDim);
+  // the pool of a new row is only written by its own task
+  parallelFor(n, [&](size_t r) {
+    auto &cand = candidates[r];
+    auto p = poolAt(base + r);
+    size_t m = std::min(cand.size(), size_t(graphK));
+    for (size_t i = 0; i < m; ++i)
+      p[i] = Neighbor(cand[i].second, cand[i].first, true);
+    poolSize[base + r] = m;
+    std::make_heap(p, p + m);
+  });
+  // then every candidate may take the new row as its neighbor
+  parallelFor(n, [&](size_t r) {
+    for (auto &[dist, id] : candidates[r])
+      updateNN(id, base + r, dist);
   });
-  return true;
-}
-
-bool NNDescentIndex::deleteOnce(torch::Tensor t, int64_t k) {
-  auto neighbors = searchOnceInner(t, k);
-  for (auto item : neighbors) deletedIdxSet.insert(item.second);
-  return true;
 }
 
 void NNDescentIndex::parallelFor(size_t idxSize,
                                  std::function<void(size_t)> action) {
-  std::vector<std::shared_ptr<std::thread>> threads(parallelWorkers);
-  size_t itemPerThread = (idxSize + parallelWorkers - 1) / parallelWorkers;
-  for (size_t id = 0; id < parallelWorkers; ++id)
-    threads[id] = std::make_shared<std::thread>([=]() {
-      size_t threadBegin = id * itemPerThread,
-             threadEnd = std::min(idxSize, (id + 1) * itemPerThread);
-      for (size_t i = threadBegin; i < threadEnd; ++i) action(i);
-    });
-  for (auto thread : threads) thread->join();
+  size_t workers = std::min(size_t(parallelWorkers), idxSize);
+  if (workers <= 1 || workerPool == nullptr) {
+    for (size_t i = 0; i < idxSize; ++i) action(i);
+    return;
+  }
+  // workers grab chunks of indexes, so that uneven items are balanced
+  size_t grain = std::max(size_t(1), idxSize / (workers * 16));
+  std::atomic<size_t> next(0);
+  std::vector<std::future<void>> futures;
+  futures.reserve(workers);
+  for (size_t w = 0; w < workers; ++w)
+    futures.push_back(workerPool->submit([&]() {
+      for (size_t begin = next.fetch_add(grain); begin < idxSize;
+           begin = next.fetch_add(grain)) {
+        size_t end = std::min(idxSize, begin + grain);
+        for (size_t i = begin; i < end; ++i) action(i);
+      }
+    }));
+  for (auto &f : futures) f.get();
 }
 
 bool NNDescentIndex::loadInitialTensor(torch::Tensor &t) {
   if (frozenLevel == 0) return false;
-  tensor.reserve(tensor.size() + t.size(0));
-  for (size_t i = 0; i < t.size(0); ++i) tensor.push_back(t.slice(0, i, i + 1));
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  vectors.reserve(vectors.size() + tc.size(0) * vecDim);
+  for (int64_t i = 0; i < tc.size(0); ++i) appendRow(ptr + i * vecDim);
   return true;
 }
 
 void NNDescentIndex::reset() {
-  tensor.clear();
-  graph.clear();
-  deletedIdxSet.clear();
+  vectors.clear();
+  pool.clear();
+  poolSize.clear();
+  deleted.clear();
+  deletedCount = 0;
 }
 
 bool NNDescentIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
@@ -264,23 +298,39 @@ bool NNDescentIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   parallelWorkers = cfg->tryI64("parallelWorkers", 1, true);
   if (parallelWorkers <= 0)
     parallelWorkers = std::thread::hardware_concurrency();
+  insertBatchSize = cfg->tryI64("insertBatchSize", 256, true);
+  if (insertBatchSize <= 0) insertBatchSize = 1;
+  if (workerPool == nullptr ||
+      workerPool->get_thread_count() != size_t(parallelWorkers))
+    workerPool = std::make_shared<BS::thread_pool>(parallelWorkers);
+  reset();
   return true;
 }
 
 bool NNDescentIndex::insertTensor(torch::Tensor &t) {
   if (frozenLevel == 0) return false;
-  graph.reserve(graph.size() + t.size(0));
-  tensor.reserve(tensor.size() + t.size(0));
-  for (size_t i = 0; i < t.size(0); ++i) {
-    auto neighbors = searchOnceInner(t.slice(0, i, i + 1), graphK);
-    insertOnce(neighbors, t.slice(0, i, i + 1));
-  }
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  size_t rows = tc.size(0);
+  for (size_t i = 0; i < rows; i += insertBatchSize)
+    insertBatch(ptr + i * vecDim, std::min(size_t(insertBatchSize), rows - i));
   return true;
 }
 
 bool NNDescentIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   if (frozenLevel == 0) return false;
-  for (size_t i = 0; i < t.size(0); ++i) deleteOnce(t.slice(0, i, i + 1), k);
+  auto tc = t.to(torch::kFloat32).contiguous();
+  auto ptr = tc.data_ptr<float>();
+  std::vector<std::vector<std::pair<float, size_t>>> results(tc.size(0));
+  parallelFor(results.size(), [&](size_t i) {
+    results[i] = searchOnceInner(ptr + i * vecDim, k);
+  });
+  for (auto &neighbors : results)
+    for (auto &item : neighbors)
+      if (!deleted[item.second]) {
+        deleted[item.second] = 1;
+        ++deletedCount;
+      }
   return true;
 }
 
@@ -293,24 +343,27 @@ std::vector<torch::Tensor> NNDescentIndex::getTensorByIndex(
     std::vector<faiss::idx_t> &idx, int64_t k) {
   std::vector<torch::Tensor> ret;
   size_t offset = 0;
-  for (size_t i = 0; i < tensor.size(); ++i)
-    if (!deletedIdxSet.count(i)) {
-      if (offset == idx[ret.size()]) ret.push_back(tensor[i]);
+  for (size_t i = 0; i < rowCount() && ret.size() < idx.size(); ++i)
+    if (!deleted[i]) {
+      if (offset == idx[ret.size()])
+        ret.push_back(torch::from_blob(const_cast<float *>(vecAt(i)),
+                                       {1, vecDim})
+                          .clone());
       ++offset;
     }
   return ret;
 }
 
 torch::Tensor NNDescentIndex::rawData() {
-  if (tensor.size() - deletedIdxSet.size() == 0) {
+  if (rowCount() - deletedCount == 0) {
     return torch::Tensor();
   }
-  auto ret =
-      torch::zeros({int64_t(tensor.size() - deletedIdxSet.size()), vecDim});
+  auto ret = torch::empty({int64_t(rowCount() - deletedCount), vecDim});
+  auto retPtr = ret.data_ptr<float>();
   size_t offset = 0;
-  for (size_t i = 0; i < tensor.size(); ++i)
-    if (!deletedIdxSet.count(i)) {
-      ret.slice(0, offset, offset + 1) = tensor[i];
+  for (size_t i = 0; i < rowCount(); ++i)
+    if (!deleted[i]) {
+      std::copy_n(vecAt(i), vecDim, retPtr + offset * vecDim);
       ++offset;
     }
   return ret;
@@ -318,9 +371,11 @@ torch::Tensor NNDescentIndex::rawData() {
 
 std::vector<torch::Tensor> NNDescentIndex::searchTensor(torch::Tensor &q,
                                                         int64_t k) {
-  std::vector<torch::Tensor> ans(q.size(0));
+  auto qc = q.to(torch::kFloat32).contiguous();
+  auto qPtr = qc.data_ptr<float>();
+  std::vector<torch::Tensor> ans(qc.size(0));
   parallelFor(ans.size(),
-              [&](size_t i) { ans[i] = searchOnce(q.slice(0, i, i + 1), k); });
+              [&](size_t i) { ans[i] = searchOnce(qPtr + i * vecDim, k); });
   return ans;
 }
 
@@ -336,20 +391,41 @@ bool NNDescentIndex::setFrozenLevel(int64_t frozenLv) {
 bool NNDescentIndex::offlineBuild(torch::Tensor &t) {
   if (!loadInitialTensor(t)) return false;
   std::mt19937 rng(time(NULL));
-  graph.resize(tensor.size());
-  for (size_t i = 0; i < tensor.size(); ++i) {
+  size_t rows = rowCount();
+  for (size_t i = 0; i < rows; ++i) {
     std::vector<size_t> sampledIdx;
-    randomSample(rng, sampledIdx, tensor.size() - 1, graphK);
-    graph[i].pool.resize(sampledIdx.size());
+    randomSample(rng, sampledIdx, rows - 1, graphK);
+    auto p = poolAt(i);
     for (size_t j = 0; j < sampledIdx.size(); ++j) {
       auto idx = sampledIdx[j];
       idx += (idx >= i);
-      graph[i].pool[j] = Neighbor(idx, calcDist(tensor[idx], tensor[i]), true);
-      graph[i].neighborIdxSet.insert(idx);
+      p[j] = Neighbor(idx, calcDist(vecAt(idx), vecAt(i)), true);
     }
-    std::make_heap(graph[i].pool.begin(), graph[i].pool.end());
+    poolSize[i] = sampledIdx.size();
+    std::make_heap(p, p + poolSize[i]);
   }
   nnDescent();
   return true;
 }
-}  // namespace CANDY
\ No newline at end of file
+
+std::shared_ptr<AbstractIndex> NNDescentIndex::snapshot() {
+  // the locks can not be copied, so the copy keeps its own default ones
+  auto ru = std::make_shared<NNDescentIndex>();
+  ru->faissMetric = faissMetric;
+  ru->containerTier = containerTier;
+  ru->graphK = graphK;
+  ru->parallelWorkers = parallelWorkers;
+  ru->vecDim = vecDim;
+  ru->frozenLevel = frozenLevel;
+  ru->insertBatchSize = insertBatchSize;
+  ru->rho = rho;
+  ru->delta = delta;
+  ru->workerPool = std::make_shared<BS::thread_pool>(parallelWorkers);
+  ru->vectors = vectors;
+  ru->pool = pool;
+  ru->poolSize = poolSize;
+  ru->deleted = deleted;
+  ru->deletedCount = deletedCount;
+  return ru;
+}
+}  // namespace CANDY
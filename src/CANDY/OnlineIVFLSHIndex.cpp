@@ -249,7 +249,8 @@ std::vector<torch::Tensor> CANDY::OnlineIVFLSHIndex::searchTensor(torch::Tensor
         }
       }
     } else {
-      ru[i] = candidateTensor;
+      // the candidates may be a view into the IVF list
+      ru[i] = candidateTensor.clone();
     }
 
   }
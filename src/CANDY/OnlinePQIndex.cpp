@@ -8,6 +8,9 @@
 #include <time.h>
 #include <chrono>
 #include <assert.h>
+#include <algorithm>
+#include <cstring>
+#include <faiss/utils/distances.h>
 bool CANDY::OnlinePQIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   assert(cfg);
   vecDim = cfg->tryI64("vecDim", 768, true);
@@ -20,6 +23,12 @@ bool CANDY::OnlinePQIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   maxBuildIteration = cfg->tryI64("maxBuildIteration", 1000, true);
   candidateTimes = cfg->tryI64("candidateTimes", 1, true);
   disableADC = cfg->tryI64("disableADC", 0, true);
+  adcScan = cfg->tryI64("adcScan", 0, true);
+  adcProbes = cfg->tryI64("adcProbes", 1, true);
+  rerankTimes = cfg->tryI64("rerankTimes", 4, true);
+  if (adcProbes < 1) {
+    adcProbes = 1;
+  }
   lastNNZ = -1;
   if (disableADC) {
     INTELLI_WARNING("running under IVFPQ");
@@ -34,6 +43,15 @@ bool CANDY::OnlinePQIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
     fineGrainedClusters = 256;
   }
   IVFList.init(coarseGrainedClusters, subQuantizers);
+  codeLists.clear();
+  if (adcScan) {
+    INTELLI_INFO("scanning packed codes by distance tables, rerankTimes=" + std::to_string(rerankTimes));
+    codeLists = std::vector<PQCodeListPtr>((size_t) coarseGrainedClusters);
+    for (int64_t i = 0; i < coarseGrainedClusters; i++) {
+      codeLists[i] = newPQCodeList();
+      codeLists[i]->init(subQuantizers, vecDim, rerankTimes > 0);
+    }
+  }
   /**
    * @brief create cluster instances
    */
@@ -206,6 +224,9 @@ std::vector<std::vector<uint8_t>> CANDY::OnlinePQIndex::fineGrainedEncode(torch:
 }
 void CANDY::OnlinePQIndex::reset() {
   lastNNZ = -1;
+  for (auto &list : codeLists) {
+    list->init(subQuantizers, vecDim, rerankTimes > 0);
+  }
 }
 bool CANDY::OnlinePQIndex::insertTensor(torch::Tensor &t) {
   if (!isBuilt) {
@@ -215,9 +236,14 @@ bool CANDY::OnlinePQIndex::insertTensor(torch::Tensor &t) {
   auto coarseBkt = coarseGrainedEncode(t, &residential);
   auto fineEncode = fineGrainedEncode(residential);
   int64_t rows = t.size(0);
+  auto tc = t.contiguous();
   for (int64_t i = 0; i < rows; i++) {
     auto rowI = t.slice(0, i, i + 1);
-    IVFList.insertTensorWithEncode(rowI, fineEncode[i], (uint64_t) coarseBkt[i]);
+    if (adcScan) {
+      codeLists[coarseBkt[i]]->insertRow(tc.data_ptr<float>() + i * vecDim, fineEncode[i].data());
+    } else {
+      IVFList.insertTensorWithEncode(rowI, fineEncode[i], (uint64_t) coarseBkt[i]);
+    }
     if (frozenLevel > 0 && frozenLevel != 2) {
       coarseQuantizerPtr->addSingleRowWithIdx(rowI, coarseBkt[i], 1);
     }
@@ -238,10 +264,14 @@ bool CANDY::OnlinePQIndex::deleteRowsInline(torch::Tensor &t) {
   torch::Tensor residential;
   auto coarseBkt = coarseGrainedEncode(t, &residential);
   auto fineEncode = fineGrainedEncode(residential);
+  auto tc = t.contiguous();
   for (int64_t i = 0; i < rows; i++) {
     auto rowI = t.slice(0, i, i + 1);
-
-    IVFList.deleteTensorWithEncode(rowI, fineEncode[i], (uint64_t) coarseBkt[i]);
+    if (adcScan) {
+      codeLists[coarseBkt[i]]->deleteRow(tc.data_ptr<float>() + i * vecDim, fineEncode[i].data());
+    } else {
+      IVFList.deleteTensorWithEncode(rowI, fineEncode[i], (uint64_t) coarseBkt[i]);
+    }
     if (frozenLevel > 0 && frozenLevel != 2) {
       coarseQuantizerPtr->deleteSingleRowWithIdx(rowI, coarseBkt[i], 1);
     }
@@ -272,8 +302,109 @@ bool CANDY::OnlinePQIndex::reviseTensor(torch::Tensor &t, torch::Tensor &w) {
   return true;
 }
 
+void CANDY::OnlinePQIndex::computeDistanceTable(const float *residual,
+                                                std::vector<torch::Tensor> &fineCentroids,
+                                                std::vector<float> &table,
+                                                int64_t ksub) {
+  for (int64_t m = 0; m < subQuantizers; m++) {
+    int64_t start = subQuantizerStartPos[m];
+    faiss::fvec_L2sqr_ny(table.data() + m * ksub,
+                         residual + start,
+                         fineCentroids[m].data_ptr<float>(),
+                         subQuantizerEndPos[m] - start,
+                         ksub);
+  }
+}
+torch::Tensor CANDY::OnlinePQIndex::decodeEntry(int64_t bkt, const uint8_t *code) {
+  torch::Tensor ru;
+  if (disableADC) {
+    ru = torch::zeros({1, vecDim});
+  } else {
+    ru = coarseQuantizerPtr->exportCentroids().slice(0, bkt, bkt + 1).clone();
+  }
+  for (int64_t m = 0; m < subQuantizers; m++) {
+    auto subCentroids = fineQuantizerPtrs[m]->exportCentroids();
+    ru.slice(1, subQuantizerStartPos[m], subQuantizerEndPos[m]) += subCentroids.slice(0, code[m], code[m] + 1);
+  }
+  return ru;
+}
+torch::Tensor CANDY::OnlinePQIndex::searchRowADC(torch::Tensor &rowI, int64_t k) {
+  auto ru = torch::zeros({k, vecDim});
+  auto query = rowI.contiguous();
+  auto coarseCentroids = coarseQuantizerPtr->exportCentroids();
+  int64_t probes = std::min(adcProbes, coarseCentroids.size(0));
+  /**
+   * @brief 1. pick the nearest coarse-grained buckets
+   */
+  auto coarseDist = SimpleStreamClustering::euclideanDistance(query, coarseCentroids);
+  auto probeIdx = std::get<1>(coarseDist.topk(probes, 1, false, true)).contiguous();
+  std::vector<torch::Tensor> fineCentroids((size_t) subQuantizers);
+  for (int64_t m = 0; m < subQuantizers; m++) {
+    fineCentroids[m] = fineQuantizerPtrs[m]->exportCentroids().contiguous();
+  }
+  int64_t ksub = fineCentroids[0].size(0);
+  /**
+   * @brief 2. scan the codes of each bucket with the table of its residual
+   */
+  size_t shortlist = (size_t) (rerankTimes > 0 ? k * rerankTimes : k);
+  std::vector<std::pair<float, int64_t>> heap;
+  heap.reserve(shortlist);
+  std::vector<float> table((size_t) (subQuantizers * ksub));
+  const int64_t *probePtr = probeIdx.data_ptr<int64_t>();
+  /**
+   * @brief the probed lists stay shared-locked until the shortlist is copied out, so no deletion moves its entries
+   */
+  for (int64_t p = 0; p < probes; p++) {
+    codeLists[probePtr[p]]->lockShared();
+  }
+  for (int64_t p = 0; p < probes; p++) {
+    int64_t bkt = probePtr[p];
+    if (codeLists[bkt]->size() == 0) {
+      continue;
+    }
+    torch::Tensor residual = query;
+    if (!disableADC) {
+      residual = (query - coarseCentroids.slice(0, bkt, bkt + 1)).contiguous();
+    }
+    computeDistanceTable(residual.data_ptr<float>(), fineCentroids, table, ksub);
+    codeLists[bkt]->scanWithTable(table.data(), ksub, bkt, heap, shortlist);
+  }
+  std::sort_heap(heap.begin(), heap.end());
+  /**
+   * @brief 3. rerank the shortlist by exact distance
+   */
+  if (rerankTimes > 0) {
+    const float *queryData = query.data_ptr<float>();
+    for (auto &h : heap) {
+      h.first = faiss::fvec_L2sqr(queryData, codeLists[h.second >> 32]->rowAt(h.second & 0xffffffff), vecDim);
+    }
+    std::sort(heap.begin(), heap.end());
+  }
+  int64_t found = std::min((int64_t) heap.size(), k);
+  float *ruData = ru.data_ptr<float>();
+  for (int64_t j = 0; j < found; j++) {
+    int64_t bkt = heap[j].second >> 32, entry = heap[j].second & 0xffffffff;
+    if (rerankTimes > 0) {
+      std::memcpy(ruData + j * vecDim, codeLists[bkt]->rowAt(entry), vecDim * sizeof(float));
+    } else {
+      ru.slice(0, j, j + 1) = decodeEntry(bkt, codeLists[bkt]->codeAt(entry));
+    }
+  }
+  for (int64_t p = 0; p < probes; p++) {
+    codeLists[probePtr[p]]->unlockShared();
+  }
+  return ru;
+}
 std::vector<torch::Tensor> CANDY::OnlinePQIndex::searchTensor(torch::Tensor &q, int64_t k) {
   int64_t rows = q.size(0);
+  if (adcScan) {
+    std::vector<torch::Tensor> ru((size_t) rows);
+    for (int64_t i = 0; i < rows; i++) {
+      auto rowI = q.slice(0, i, i + 1);
+      ru[i] = searchRowADC(rowI, k);
+    }
+    return ru;
+  }
   torch::Tensor residential;
   auto coarseBkt = coarseGrainedEncode(q, &residential);
   auto fineEncode = fineGrainedEncode(residential);
@@ -307,7 +438,8 @@ std::vector<torch::Tensor> CANDY::OnlinePQIndex::searchTensor(torch::Tensor &q,
         }
       }
     } else {
-      ru[i] = candidateTensor;
+      // the candidates may be a view into the IVF list
+      ru[i] = candidateTensor.clone();
     }
 
   }
@@ -1,12 +1,35 @@
 #include <CANDY/OnlinePQIndex/IVFTensorEncodingList.h>
 #include <Utils/IntelliLog.h>
 #include <algorithm>
-void CANDY::IVFListCell::insertTensorPtr(INTELLI::TensorPtr tp) {
-  tl.push_back(tp);
-  tensors++;
+void CANDY::IVFListCell::reserveRows(int64_t rows, int64_t cols) {
+  int64_t capacity = rowBuffer.defined() ? rowBuffer.size(0) : 0;
+  if (rows <= capacity) {
+    return;
+  }
+  int64_t newCapacity = std::max(rows, std::max(capacity * 2, (int64_t) 4));
+  auto newRows = torch::empty({newCapacity, cols});
+  auto newIds = torch::empty({newCapacity}, torch::kInt64);
+  if (tensors > 0) {
+    newRows.slice(0, 0, tensors).copy_(rowBuffer.slice(0, 0, tensors));
+    newIds.slice(0, 0, tensors).copy_(idBuffer.slice(0, 0, tensors));
+  }
+  rowBuffer = newRows;
+  idBuffer = newIds;
 }
-void CANDY::IVFListCell::insertTensor(torch::Tensor &t) {
-  insertTensorPtr(newTensor(t));
+void CANDY::IVFListCell::insertTensor(torch::Tensor &t, int64_t id) {
+  int64_t rows = t.size(0);
+  reserveRows(tensors + rows, t.size(1));
+  rowBuffer.slice(0, tensors, tensors + rows).copy_(t);
+  auto idSlice = idBuffer.slice(0, tensors, tensors + rows);
+  if (id >= 0) {
+    idSlice.copy_(torch::arange(id, id + rows, torch::kInt64));
+  } else {
+    idSlice.fill_(-1);
+  }
+  tensors += rows;
+}
+void CANDY::IVFListCell::insertTensorPtr(INTELLI::TensorPtr tp) {
+  insertTensor(*tp);
 }
 
 static std::string encodeToString(std::vector<uint8_t> &encode) {
@@ -17,169 +40,215 @@ static std::string encodeToString(std::vector<uint8_t> &encode) {
   }
   return str;
 }
-bool CANDY::IVFListCell::deleteTensorPtr(INTELLI::TensorPtr tp) {
-  for (auto ele = tl.begin(); ele != tl.end(); ++ele) {
-    if (*ele == tp) {
-      tl.erase(ele);
-      tensors--;
-      return true;
-    }
+/**
+ * @brief concatenate the views into one tensor, padded with zero rows up to minRows
+ */
+static torch::Tensor catRows(std::vector<torch::Tensor> &views, int64_t minRows, int64_t cols) {
+  int64_t rows = 0;
+  for (auto &v : views) {
+    rows += v.size(0);
+  }
+  if (rows < minRows) {
+    views.push_back(torch::zeros({minRows - rows, cols}));
+  }
+  if (views.empty()) {
+    return torch::zeros({0, cols});
   }
-  return false;
+  if (views.size() == 1) {
+    return views[0];
+  }
+  return torch::cat(views, 0);
+}
+bool CANDY::IVFListCell::deleteTensorPtr(INTELLI::TensorPtr tp) {
+  return deleteTensor(*tp);
 }
 
 bool CANDY::IVFListCell::deleteTensor(torch::Tensor &t) {
-  for (auto ele = tl.begin(); ele != tl.end(); ++ele) {
-    auto tp = *ele;
-    if (torch::equal(*tp, t)) {
-      tl.erase(ele);
-      tensors--;
-      return true;
-    }
+  if (tensors == 0 || t.dim() != 2 || t.size(0) != 1 || t.size(1) != rowBuffer.size(1)) {
+    return false;
+  }
+  auto hit = rowBuffer.slice(0, 0, tensors).eq(t.to(rowBuffer.dtype())).all(1).nonzero();
+  if (hit.size(0) == 0) {
+    return false;
+  }
+  int64_t idx = hit[0][0].item<int64_t>();
+  int64_t last = tensors - 1;
+  /**
+   * @brief copy on write, the views held by readers keep the old rows
+   */
+  if (rowBuffer.storage().use_count() > 1) {
+    rowBuffer = rowBuffer.clone();
+  }
+  if (idBuffer.storage().use_count() > 1) {
+    idBuffer = idBuffer.clone();
+  }
+  if (idx != last) {
+    rowBuffer[idx].copy_(rowBuffer[last]);
+    idBuffer[idx].copy_(idBuffer[last]);
   }
-  return false;
+  tensors--;
+  return true;
 }
 torch::Tensor CANDY::IVFListCell::getAllTensors(void) {
   if (tensors == 0) {
     return torch::zeros({1, 1});
   }
-  auto startRow = *tl.begin();
-  auto cols = startRow->size(1);
-  torch::Tensor ru = torch::zeros({tensors, cols});
-  int64_t lastNNZ = -1;
-  for (auto ele = tl.begin(); ele != tl.end(); ++ele) {
-    auto tp = *ele;
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, tp.get(), &lastNNZ);
+  return rowBuffer.slice(0, 0, tensors);
+}
+torch::Tensor CANDY::IVFListCell::getIds(void) {
+  if (tensors == 0) {
+    return torch::empty({0}, torch::kInt64);
   }
-  return ru;
+  return idBuffer.slice(0, 0, tensors);
 }
 void CANDY::IVFListBucket::insertTensorWithEncode(torch::Tensor &t, std::vector<uint8_t> &encode, bool isConcurrent) {
-  if (isConcurrent) {
-    lock();
-    tensors++;
-    unlock();
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        celPtr->lock();
-        celPtr->insertTensor(t);
-        celPtr->unlock();
-        return;
-      }
+  /**
+   * @brief 1. append to an existing cell, other cells stay readable and writable
+   */
+  lockShared();
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    auto celPtr = *ele;
+    if (celPtr->getEncode() == encode) {
+      celPtr->lock();
+      celPtr->insertTensor(t);
+      celPtr->unlock();
+      tensors++;
+      unlockShared();
+      return;
     }
-    IVFListCellPtr cellNew = newIVFListCell();
-    cellNew->setEncode(encode);
-    cellNew->insertTensor(t);
-    cellPtrs.push_back(cellNew);
-    return;
-  } else {
-    tensors++;
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        celPtr->insertTensor(t);
-        return;
-      }
+  }
+  unlockShared();
+  /**
+   * @brief 2. create the cell, another writer may have created it meanwhile
+   */
+  lock();
+  IVFListCellPtr target = nullptr;
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    if ((*ele)->getEncode() == encode) {
+      target = *ele;
+      break;
     }
-    IVFListCellPtr cellNew = newIVFListCell();
-    cellNew->setEncode(encode);
-    cellNew->insertTensor(t);
-    cellPtrs.push_back(cellNew);
-    return;
   }
+  if (target == nullptr) {
+    target = newIVFListCell();
+    target->setEncode(encode);
+    cellPtrs.push_back(target);
+  }
+  target->insertTensor(t);
+  tensors++;
+  unlock();
 }
 
 bool CANDY::IVFListBucket::deleteTensorWithEncode(torch::Tensor &t, std::vector<uint8_t> &encode, bool isConcurrent) {
-  bool probeDeletion;
-  if (isConcurrent) {
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        celPtr->lock();
-        probeDeletion = celPtr->deleteTensor(t);
-        celPtr->unlock();
-        if (probeDeletion) {
-
-          lock();
-          tensors--;
-          if (celPtr->size() == 0) {
-            cellPtrs.erase(ele);
-          }
-          unlock();
-          return true;
-        }
-
-      }
-    }
-    return false;
-  } else {
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        probeDeletion = celPtr->deleteTensor(t);
-        if (probeDeletion) {
-          tensors--;
-          if (celPtr->size() == 0) {
-            cellPtrs.erase(ele);
-          }
-          return true;
-        }
-
+  bool probeDeletion = false;
+  bool emptied = false;
+  lockShared();
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    auto celPtr = *ele;
+    if (celPtr->getEncode() == encode) {
+      celPtr->lock();
+      probeDeletion = celPtr->deleteTensor(t);
+      emptied = (celPtr->size() == 0);
+      celPtr->unlock();
+      if (probeDeletion) {
+        break;
       }
     }
+  }
+  unlockShared();
+  if (!probeDeletion) {
     return false;
   }
+  tensors--;
+  if (emptied) {
+    /**
+     * @brief drop empty cells, no cell is accessed without the bucket lock
+     */
+    lock();
+    cellPtrs.remove_if([](const IVFListCellPtr &c) { return c->size() == 0; });
+    unlock();
+  }
+  return true;
 }
 
 bool CANDY::IVFListBucket::deleteTensor(torch::Tensor &t, bool isConcurrent) {
-  bool probeDeletion;
-  if (isConcurrent) {
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      celPtr->lock();
-      probeDeletion = celPtr->deleteTensor(t);
-      celPtr->unlock();
-      if (probeDeletion) {
-        lock();
-        tensors--;
-        unlock();
-        return true;
-      }
+  bool probeDeletion = false;
+  lockShared();
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    auto celPtr = *ele;
+    celPtr->lock();
+    probeDeletion = celPtr->deleteTensor(t);
+    celPtr->unlock();
+    if (probeDeletion) {
+      tensors--;
+      break;
     }
-    return false;
-  } else {
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      probeDeletion = celPtr->deleteTensor(t);
-      if (probeDeletion) {
-        tensors--;
-        return true;
-      }
+  }
+  unlockShared();
+  return probeDeletion;
+}
+int64_t CANDY::IVFListBucket::collectTensors(std::vector<torch::Tensor> &views) {
+  int64_t rows = 0;
+  lockShared();
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    (*ele)->lockShared();
+    int64_t cellRows = (*ele)->size();
+    if (cellRows > 0) {
+      views.push_back((*ele)->getAllTensors());
+      rows += cellRows;
     }
-    return false;
+    (*ele)->unlockShared();
   }
+  unlockShared();
+  return rows;
 }
 torch::Tensor CANDY::IVFListBucket::getAllTensors() {
   if (tensors == 0) {
     torch::Tensor emptyRu;
     return emptyRu;
   }
-  auto firstCell = *cellPtrs.begin();
-  auto cols = firstCell->getAllTensors().size(1);
-  torch::Tensor ru = torch::zeros({tensors, cols});
-  int64_t lastNNZ = -1;
+  std::vector<torch::Tensor> views;
+  collectTensors(views);
+  if (views.empty()) {
+    torch::Tensor emptyRu;
+    return emptyRu;
+  }
+  if (views.size() == 1) {
+    return views[0];
+  }
+  return torch::cat(views, 0);
+}
+int64_t CANDY::IVFListBucket::collectTensorsWithEncode(std::vector<uint8_t> &_encode,
+                                                       std::vector<torch::Tensor> &views) {
+  int64_t rows = 0;
+  lockShared();
   for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-    auto t = (*ele)->getAllTensors();
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &t, &lastNNZ);
+    if ((*ele)->getEncode() == _encode) {
+      (*ele)->lockShared();
+      rows = (*ele)->size();
+      if (rows > 0) {
+        views.push_back((*ele)->getAllTensors());
+      }
+      (*ele)->unlockShared();
+      break;
+    }
   }
-  return ru;
+  unlockShared();
+  return rows;
 }
 torch::Tensor CANDY::IVFListBucket::getAllTensorsWithEncode(std::vector<uint8_t> &_encode) {
+  torch::Tensor ru;
+  lockShared();
   for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-    if ((*ele)->getEncode() == _encode) { return (*ele)->getAllTensors(); }
+    if ((*ele)->getEncode() == _encode) {
+      (*ele)->lockShared();
+      ru = (*ele)->getAllTensors();
+      (*ele)->unlockShared();
+      break;
+    }
   }
-  torch::Tensor emptyRu;
-  return emptyRu;
+  unlockShared();
+  return ru;
 }
 static uint64_t hammingDistance(const std::vector<uint8_t> &a, const std::vector<uint8_t> &b) {
   // Check if vectors have the same length
@@ -188,87 +257,74 @@ static uint64_t hammingDistance(const std::vector<uint8_t> &a, const std::vector
     return -1;  // Return an error code
   }
   uint64_t distance = 0;
-  // Iterate over elements and count differences
+  // count the different bits of each byte
   for (size_t i = 0; i < a.size(); ++i) {
-    // Assuming elements are uint8_t (8-bit unsigned integers)
-    uint8_t xorResult = a[i] ^ b[i];
-    // Count set bits in the XOR result using __builtin_clz
-    while (xorResult) {
-      distance += 8 - __builtin_clz(xorResult);
-      xorResult <<= 8 - __builtin_clz(xorResult);
-    }
+    distance += __builtin_popcount((unsigned) (a[i] ^ b[i]));
   }
-
   return distance;
 }
-static std::vector<size_t> argsort(const std::vector<uint64_t> &vec) {
-  // Initialize an index vector with the same size as the input vector
-  std::vector<size_t> indices(vec.size());
-  std::iota(indices.begin(), indices.end(), 0);  // Fill with 0, 1, 2, ...
 
-  // Sort indices based on the values in the vector
-  std::sort(indices.begin(), indices.end(), [&vec](size_t i, size_t j) {
-    return vec[i] < vec[j];
-  });
-
-  return indices;
-}
-
-torch::Tensor CANDY::IVFListBucket::getMinimumTensorsUnderHamming(std::vector<uint8_t> &encode,
-                                                                  int64_t minNumber,
-                                                                  int64_t vecDim) {
-  torch::Tensor ru = torch::zeros({(int64_t) minNumber, vecDim});
-  int64_t lastNNZ = -1;
-  int64_t testSize = 0;
-  int64_t enoughNumber = (minNumber > tensors) ? tensors : minNumber;
+int64_t CANDY::IVFListBucket::collectMinimumTensorsUnderHamming(std::vector<uint8_t> &encode,
+                                                                int64_t minNumber,
+                                                                std::vector<torch::Tensor> &views) {
+  lockShared();
+  int64_t bucketRows = tensors;
+  int64_t enoughNumber = (minNumber > bucketRows) ? bucketRows : minNumber;
   /**
-   * @brief 1. try exact match
+   * @brief 1. rank the non-empty cells by hamming distance, the exact match comes first
    */
-  auto exactMatch = getAllTensorsWithEncode(encode);
-  testSize += exactMatch.size(0);
-  if (testSize >= enoughNumber) {
-    return exactMatch;
-  }
-  if (testSize > 0) {
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &exactMatch, &lastNNZ);
-  }
-  /**
-  * @brief 2. scan
-  */
-  size_t encodingsCnt = cellPtrs.size();
-  std::vector<IVFListCellPtr> cellVec(encodingsCnt);
-  std::vector<uint64_t> hammingDistanceVec(encodingsCnt);
-  size_t i = 0;
+  std::vector<std::pair<uint64_t, IVFListCell *>> ranked;
+  ranked.reserve(cellPtrs.size());
   for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-    cellVec[i] = (*ele);
-    auto eleEncode = (*ele)->getEncode();
-    hammingDistanceVec[i] = hammingDistance(eleEncode, encode);
-    i++;
+    ranked.emplace_back(hammingDistance((*ele)->getEncode(), encode), ele->get());
   }
+  std::stable_sort(ranked.begin(), ranked.end(),
+                   [](const std::pair<uint64_t, IVFListCell *> &x, const std::pair<uint64_t, IVFListCell *> &y) {
+                     return x.first < y.first;
+                   });
   /**
-   * @brief 3. sort
+   * @brief 2. take the views of the nearest cells until enough
    */
-  auto sortedIdx = argsort(hammingDistanceVec);
-  for (size_t i = 0; i < sortedIdx.size(); i++) {
-    auto matchi = cellVec[i]->getAllTensors();
-    if (matchi.size(0) > 0) {
-      testSize += matchi.size(0);
-      INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &matchi, &lastNNZ);
-    }
+  int64_t testSize = 0;
+  for (auto &[dist, cell] : ranked) {
     if (testSize >= enoughNumber) {
-      return ru;
+      break;
     }
+    cell->lockShared();
+    int64_t cellRows = cell->size();
+    if (cellRows > 0) {
+      views.push_back(cell->getAllTensors());
+      testSize += cellRows;
+    }
+    cell->unlockShared();
   }
-  return ru;
+  unlockShared();
+  return testSize;
+}
+
+torch::Tensor CANDY::IVFListBucket::getMinimumTensorsUnderHamming(std::vector<uint8_t> &encode,
+                                                                  int64_t minNumber,
+                                                                  int64_t vecDim) {
+  std::vector<torch::Tensor> views;
+  int64_t testSize = collectMinimumTensorsUnderHamming(encode, minNumber, views);
+  if (views.size() == 1 && testSize >= std::min(minNumber, tensors.load())) {
+    return views[0];
+  }
+  return catRows(views, minNumber, vecDim);
 }
 int64_t CANDY::IVFListBucket::sizeWithEncode(std::vector<uint8_t> &_encode) {
+  int64_t ru = 0;
+  lockShared();
   for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
     if ((*ele)->getEncode() == _encode) {
-      return (*ele)->size();
-
+      (*ele)->lockShared();
+      ru = (*ele)->size();
+      (*ele)->unlockShared();
+      break;
     }
   }
-  return 0;
+  unlockShared();
+  return ru;
 }
 void CANDY::IVFTensorEncodingList::init(size_t bkts, size_t _encodeLen) {
   bucketPtrs = std::vector<IVFListBucketPtr>(bkts);
@@ -304,18 +360,15 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensors(torch::Tensor
                                                                    int64_t minimumNum) {
   size_t testTensors = 0;
   size_t bkts = bucketPtrs.size();
-  if (bktIdx > bkts) { return torch::zeros({minimumNum, t.size(1)}); }
+  if (bktIdx >= bkts) { return torch::zeros({minimumNum, t.size(1)}); }
   /**
    * @brief 1. test whether the buckt[idx] has enough tensors,
    */
-  /*INTELLI_INFO(
-      std::to_string(bktIdx) + ",code=" + encodeToString(encode) + " has " + std::to_string(bucketPtrs[bktIdx]->size())
-          + " candidates");*/
   if (bucketPtrs[bktIdx]->size() >= minimumNum) {
     return getMinimumNumOfTensorsInsideBucket(t, encode, bktIdx, minimumNum);
   }
   /**
-  * @brief 2. if not, try to expand
+  * @brief 2. if not, try to expand, the views of cells are gathered and copied only once at the end
   */
   uint64_t leftMostExpand = bktIdx;
   uint64_t rightMostExpand = bkts - 1 - bktIdx;
@@ -323,28 +376,12 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensors(torch::Tensor
   uint64_t rightExpand = (bktIdx == (bkts - 1)) ? 0 : 1;
   bool reachedLeftMost = (bktIdx == 0);
   bool reachedRightMost = (bktIdx == (bkts - 1));
-  testTensors += bucketPtrs[bktIdx]->size();
-  torch::Tensor ru = torch::zeros({(int64_t) minimumNum, t.size(1)});
-  int64_t lastNNZ = -1;
-  if (testTensors > 0) {
-    auto getTensor = bucketPtrs[bktIdx]->getAllTensors();
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-    // //std::cout<<"append\n"<<getTensor<<std::endl;
-  }
-  //std::cout<<reachedLeftMost<<reachedRightMost<<std::endl;
-
+  std::vector<torch::Tensor> views;
+  testTensors += bucketPtrs[bktIdx]->collectTensors(views);
   while (testTensors < (uint64_t) minimumNum
-      && ((reachedRightMost && reachedLeftMost) == false)) { // //std::cout<<"enter while"<<std::endl;
+      && ((reachedRightMost && reachedLeftMost) == false)) {
     if ((!reachedLeftMost)) {
-      auto getSize = bucketPtrs[bktIdx - leftExpand]->size();
-      testTensors += getSize;
-      //  //std::cout<<"try bucket (left)"<<bktIdx-leftExpand<<"size "<<getSize<<std::endl;
-      if (getSize > 0) {
-        auto getTensor = bucketPtrs[bktIdx - leftExpand]->getAllTensors();
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-        // //std::cout<<"append LEFT\n"<<getTensor<<std::endl;
-      }
-
+      testTensors += bucketPtrs[bktIdx - leftExpand]->collectTensors(views);
       leftExpand++;
       if (leftExpand > leftMostExpand) {
         reachedLeftMost = true;
@@ -352,14 +389,7 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensors(torch::Tensor
       }
     }
     if (!reachedRightMost) {
-      auto getSize = bucketPtrs[bktIdx + rightExpand]->size();
-      testTensors += getSize;
-      //  //std::cout<<"try bucket (right)"<<bktIdx+rightExpand<<"size "<<getSize<<std::endl;
-      if (getSize > 0) {
-        auto getTensor = bucketPtrs[bktIdx + rightExpand]->getAllTensors();
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-        // //std::cout<<"append right\n"<<getTensor<<std::endl;
-      }
+      testTensors += bucketPtrs[bktIdx + rightExpand]->collectTensors(views);
       rightExpand++;
       if (rightExpand > rightMostExpand) {
         reachedRightMost = true;
@@ -367,7 +397,7 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensors(torch::Tensor
       }
     }
   }
-  return ru;
+  return catRows(views, minimumNum, t.size(1));
 }
 
 torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsHamming(torch::Tensor &t,
@@ -376,10 +406,7 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsHamming(torch:
                                                                           int64_t minimumNum) {
   size_t testTensors = 0;
   size_t bkts = bucketPtrs.size();
-  if (bktIdx > bkts) { return torch::zeros({minimumNum, t.size(1)}); }
-  /*INTELLI_INFO(
-      std::to_string(bktIdx) + ",code=" + encodeToString(encode) + " has " + std::to_string(bucketPtrs[bktIdx]->size())
-          + " candidates");*/
+  if (bktIdx >= bkts) { return torch::zeros({minimumNum, t.size(1)}); }
   /**
    * @brief 1. test whether the buckt[idx] has enough tensors,
    */
@@ -388,7 +415,7 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsHamming(torch:
     return getMinimumNumOfTensorsInsideBucketHamming(t, encode, bktIdx, minimumNum);
   }
   /**
-  * @brief 2. if not, try to expand
+  * @brief 2. if not, try to expand, the views of cells are gathered and copied only once at the end
   */
   uint64_t leftMostExpand = bktIdx;
   uint64_t rightMostExpand = bkts - 1 - bktIdx;
@@ -396,43 +423,24 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsHamming(torch:
   uint64_t rightExpand = (bktIdx == (bkts - 1)) ? 0 : 1;
   bool reachedLeftMost = (bktIdx == 0);
   bool reachedRightMost = (bktIdx == (bkts - 1));
-  testTensors += bucketPtrs[bktIdx]->size();
-  torch::Tensor ru = torch::zeros({(int64_t) minimumNum, t.size(1)});
-  int64_t lastNNZ = -1;
-  if (testTensors > 0) {
-    auto getTensor = bucketPtrs[bktIdx]->getAllTensors();
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-    // //std::cout<<"append\n"<<getTensor<<std::endl;
-  }
-  //std::cout<<reachedLeftMost<<reachedRightMost<<std::endl;
-
+  std::vector<torch::Tensor> views;
+  testTensors += bucketPtrs[bktIdx]->collectTensors(views);
   while (testTensors < (uint64_t) minimumNum
-      && ((reachedRightMost && reachedLeftMost) == false)) { // //std::cout<<"enter while"<<std::endl;
+      && ((reachedRightMost && reachedLeftMost) == false)) {
     if ((!reachedLeftMost)) {
-      auto getSize = bucketPtrs[bktIdx - leftExpand]->size();
-      //  //std::cout<<"try bucket (left)"<<bktIdx-leftExpand<<"size "<<getSize<<std::endl;
-      if (getSize > 0) {
-        auto getTensor = getMinimumNumOfTensorsInsideBucketHamming(t, encode, bktIdx - leftExpand, minimumNum);
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-        testTensors += getTensor.size(0);
-        // //std::cout<<"append LEFT\n"<<getTensor<<std::endl;
-      }
-
+      testTensors += bucketPtrs[bktIdx - leftExpand]->collectMinimumTensorsUnderHamming(encode,
+                                                                                      minimumNum - testTensors,
+                                                                                      views);
       leftExpand++;
       if (leftExpand > leftMostExpand) {
         reachedLeftMost = true;
         leftExpand = leftMostExpand;
       }
     }
-    if (!reachedRightMost) {
-      auto getSize = bucketPtrs[bktIdx + rightExpand]->size();
-      //  //std::cout<<"try bucket (right)"<<bktIdx+rightExpand<<"size "<<getSize<<std::endl;
-      if (getSize > 0) {
-        auto getTensor = getMinimumNumOfTensorsInsideBucketHamming(t, encode, bktIdx + rightExpand, minimumNum);
-        INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-        testTensors += getTensor.size(0);
-        // //std::cout<<"append right\n"<<getTensor<<std::endl;
-      }
+    if (!reachedRightMost && testTensors < (uint64_t) minimumNum) {
+      testTensors += bucketPtrs[bktIdx + rightExpand]->collectMinimumTensorsUnderHamming(encode,
+                                                                                       minimumNum - testTensors,
+                                                                                       views);
       rightExpand++;
       if (rightExpand > rightMostExpand) {
         reachedRightMost = true;
@@ -440,7 +448,7 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsHamming(torch:
       }
     }
   }
-  return ru;
+  return catRows(views, minimumNum, t.size(1));
 }
 torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsInsideBucket(torch::Tensor &t,
                                                                                std::vector<uint8_t> &encode,
@@ -462,24 +470,18 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsInsideBucket(t
     }
   }
   /**
-   * @brief 1. get the exact encode
+   * @brief 1. get the exact encode, a view of its cell is enough if it has minimumNum rows
    */
-  auto exactEncodeTensor = bucketPtrs[bktIdx]->getAllTensorsWithEncode(encode);
-  if (exactEncodeTensor.size(0) >= minimumNum) {
-    return exactEncodeTensor;
-  }
-  torch::Tensor ru = torch::zeros({(int64_t) minimumNum, t.size(1)});
-  int64_t lastNNZ = -1;
-  testTensors += exactEncodeTensor.size(0);
-  if (exactEncodeTensor.size(0) > 0) {
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &exactEncodeTensor, &lastNNZ);
-    //std::cout<<"append\n"<<exactEncodeTensor<<std::endl;
+  std::vector<torch::Tensor> views;
+  testTensors += bucketPtrs[bktIdx]->collectTensorsWithEncode(encode, views);
+  if (testTensors >= (size_t) minimumNum && !views.empty()) {
+    return views[0];
   }
   uint16_t leftExpand = 1;
   uint16_t rightExpand = 1;
+  auto tempEncode = encode;
   while (testTensors < (uint64_t) minimumNum && (reachedLeftMostCnt + reachedRightMostCnt < 2 * bytes)
       && (leftExpand <= 255)) {
-    //std::cout<<"inside, expand up to"<<(int)leftExpand<<std::endl;
     /**
      * @brief probe the i th byte with left and right expand
      */
@@ -487,44 +489,32 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsInsideBucket(t
      * @brief left
      */
       if (!reachedLeftMost[i]) {
-        auto tempEncode = encode;
         bool ri = reachedLeftMost[i];
         tempEncode[i] = getLeftIdxU8(encode[i], leftExpand, &ri);
         reachedLeftMost[i] = ri;
         if (ri == true) {
           reachedLeftMostCnt++;
         }
-        auto getTensor = bucketPtrs[bktIdx]->getAllTensorsWithEncode(tempEncode);
-        auto getSize = getTensor.size(0);
-        testTensors += getSize;
-        if (getSize > 0) {
-          INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-          //std::cout<<"append left\n"<<getTensor<<std::endl;
-        }
+        testTensors += bucketPtrs[bktIdx]->collectTensorsWithEncode(tempEncode, views);
+        tempEncode[i] = encode[i];
         if (testTensors >= (size_t) minimumNum) {
-          return ru;
+          return catRows(views, minimumNum, t.size(1));
         }
       }
       /**
      * @brief right
      */
       if (!reachedRightMost[i]) {
-        auto tempEncode = encode;
         bool li = reachedRightMost[i];
         tempEncode[i] = getRightIdxU8(encode[i], rightExpand, &li);
         reachedRightMost[i] = li;
         if (li == true) {
           reachedRightMostCnt++;
         }
-        auto getTensor = bucketPtrs[bktIdx]->getAllTensorsWithEncode(tempEncode);
-        auto getSize = getTensor.size(0);
-        testTensors += getSize;
-        if (getSize > 0) {
-          INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &getTensor, &lastNNZ);
-          //std::cout<<"append right\n"<<getTensor<<std::endl;
-        }
+        testTensors += bucketPtrs[bktIdx]->collectTensorsWithEncode(tempEncode, views);
+        tempEncode[i] = encode[i];
         if (testTensors >= (size_t) minimumNum) {
-          return ru;
+          return catRows(views, minimumNum, t.size(1));
         }
       }
     }
@@ -540,10 +530,9 @@ torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsInsideBucket(t
     torch::Tensor probs = torch::ones(n) / n;  // default: uniform
     // Sample k indices from range 0 to n for given probability distribution
     torch::Tensor indices = torch::multinomial(probs, minimumNum - testTensors, true);
-    auto addedTensor = moreTensor.index_select(0, indices);
-    INTELLI::IntelliTensorOP::appendRowsBufferMode(&ru, &addedTensor, &lastNNZ);
+    views.push_back(moreTensor.index_select(0, indices));
   }
-  return ru;
+  return catRows(views, minimumNum, t.size(1));
 }
 
 torch::Tensor CANDY::IVFTensorEncodingList::getMinimumNumOfTensorsInsideBucketHamming(torch::Tensor &t,
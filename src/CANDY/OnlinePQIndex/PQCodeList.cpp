@@ -0,0 +1,80 @@
+/*! \file PQCodeList.cpp*/
+
+#include <CANDY/OnlinePQIndex/PQCodeList.h>
+#include <algorithm>
+#include <cstring>
+
+void CANDY::PQCodeList::init(int64_t _codeLen, int64_t _vecDim, bool _keepRows) {
+  std::unique_lock<std::shared_mutex> lock(m_mut);
+  codeLen = _codeLen;
+  vecDim = _vecDim;
+  keepRows = _keepRows;
+  entries = 0;
+  codes.clear();
+  rows.clear();
+}
+
+void CANDY::PQCodeList::insertRow(const float *row, const uint8_t *code) {
+  std::unique_lock<std::shared_mutex> lock(m_mut);
+  codes.insert(codes.end(), code, code + codeLen);
+  if (keepRows) {
+    rows.insert(rows.end(), row, row + vecDim);
+  }
+  entries++;
+}
+
+bool CANDY::PQCodeList::deleteRow(const float *row, const uint8_t *code) {
+  std::unique_lock<std::shared_mutex> lock(m_mut);
+  for (int64_t i = 0; i < entries; i++) {
+    if (std::memcmp(codeAt(i), code, codeLen) != 0) {
+      continue;
+    }
+    if (keepRows && std::memcmp(rowAt(i), row, vecDim * sizeof(float)) != 0) {
+      continue;
+    }
+    int64_t last = entries - 1;
+    if (i != last) {
+      std::memcpy(codes.data() + i * codeLen, codeAt(last), codeLen);
+      if (keepRows) {
+        std::memcpy(rows.data() + i * vecDim, rowAt(last), vecDim * sizeof(float));
+      }
+    }
+    codes.resize(last * codeLen);
+    if (keepRows) {
+      rows.resize(last * vecDim);
+    }
+    entries = last;
+    return true;
+  }
+  return false;
+}
+
+void CANDY::PQCodeList::scanWithTable(const float *table,
+                                      int64_t ksub,
+                                      int64_t listNo,
+                                      std::vector<std::pair<float, int64_t>> &heap,
+                                      size_t heapSize) {
+  if (heapSize == 0) {
+    return;
+  }
+  const uint8_t *c = codes.data();
+  for (int64_t i = 0; i < entries; i++, c += codeLen) {
+    float dist = 0;
+    const float *t = table;
+    int64_t m = 0;
+    for (; m + 4 <= codeLen; m += 4, t += 4 * ksub) {
+      dist += t[c[m]] + t[ksub + c[m + 1]] + t[2 * ksub + c[m + 2]] + t[3 * ksub + c[m + 3]];
+    }
+    for (; m < codeLen; m++, t += ksub) {
+      dist += t[c[m]];
+    }
+    if (heap.size() < heapSize) {
+      heap.emplace_back(dist, (listNo << 32) | i);
+      std::push_heap(heap.begin(), heap.end());
+    } else if (dist < heap.front().first) {
+      std::pop_heap(heap.begin(), heap.end());
+      heap.back() = {dist, (listNo << 32) | i};
+      std::push_heap(heap.begin(), heap.end());
+    }
+  }
+}
@@ -26,6 +26,8 @@ bool CANDY::ParallelPartitionIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   //reduceQueue=std::make_shared<INTELLI::SPSCQueue<CANDY::TensorListIdxPair>>((size_t)(parallelWorkers*10));
   vecDim = cfg->tryI64("vecDim", 768, true);
   sharedBuild = cfg->tryI64("sharedBuild", 1, true);
+  reduceWaiter = newAdaptiveWaiter();
+  reduceWaiter->setConfig(cfg);
   for (size_t i = 0; i < (size_t) parallelWorkers; i++) {
     workers[i] = newParallelIndexWorker();
     workers[i]->setConfig(cfg);
@@ -34,6 +36,7 @@ bool CANDY::ParallelPartitionIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
     reduceStrQueue[i] = std::make_shared<INTELLI::SPSCQueue<CANDY::TensorStrVecPair>>((size_t) (10));
     workers[i]->setReduceQueue(reduceQueue[i]);
     workers[i]->setReduceStrQueue(reduceStrQueue[i]);
+    workers[i]->setReduceWaiter(reduceWaiter);
   }
   insertIdx = 0;
 
@@ -174,9 +177,7 @@ bool CANDY::ParallelPartitionIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   }
   int64_t collectedRu = 0;
   while (collectedRu < parallelWorkers) {
-    while (reduceQueue[collectedRu]->empty()) {
-
-    }
+    reduceWaiter->waitUntil([&]() { return !reduceQueue[collectedRu]->empty(); });
 
     auto tlp = *reduceQueue[collectedRu]->front();
     reduceQueue[collectedRu]->pop();
@@ -190,24 +191,26 @@ bool CANDY::ParallelPartitionIndex::deleteTensor(torch::Tensor &t, int64_t k) {
   /**
   * @brief 3. reduce
   */
+  if (tensors == 0) {
+    return true;
+  }
+  int64_t candidatesPerQuery = k * parallelWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = t.to(torch::kFloat32).contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto queryTensor = t.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * parallelWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
-      int64_t workerNo = tempIdx / k;
-      auto tensorToDelete = dbTensor.slice(0, tempIdx, tempIdx + 1);
+      int64_t tempIdx = idxAcc[i][j];
+      if (tempIdx < 0) {
+        continue;
+      }
+      int64_t workerNo = (tempIdx - (int64_t) i * candidatesPerQuery) / k;
+      auto tensorToDelete = candidates.slice(0, tempIdx, tempIdx + 1);
       workers[workerNo]->deleteTensor(tensorToDelete, 1);
       INTELLI_INFO("tell worker" + std::to_string(workerNo) + " to delete tensor");
-      // if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1); }
     }
   }
   return true;
@@ -231,9 +234,7 @@ bool CANDY::ParallelPartitionIndex::deleteStringObject(torch::Tensor &t, int64_t
   }
   int64_t collectedRu = 0;
   while (collectedRu < parallelWorkers) {
-    while (reduceQueue[collectedRu]->empty()) {
-
-    }
+    reduceWaiter->waitUntil([&]() { return !reduceQueue[collectedRu]->empty(); });
 
     auto tlp = *reduceQueue[collectedRu]->front();
     reduceQueue[collectedRu]->pop();
@@ -247,24 +248,26 @@ bool CANDY::ParallelPartitionIndex::deleteStringObject(torch::Tensor &t, int64_t
   /**
   * @brief 3. reduce
   */
+  if (tensors == 0) {
+    return true;
+  }
+  int64_t candidatesPerQuery = k * parallelWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = t.to(torch::kFloat32).contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto queryTensor = t.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * parallelWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
-      int64_t workerNo = tempIdx / k;
-      auto tensorToDelete = dbTensor.slice(0, tempIdx, tempIdx + 1);
+      int64_t tempIdx = idxAcc[i][j];
+      if (tempIdx < 0) {
+        continue;
+      }
+      int64_t workerNo = (tempIdx - (int64_t) i * candidatesPerQuery) / k;
+      auto tensorToDelete = candidates.slice(0, tempIdx, tempIdx + 1);
       workers[workerNo]->deleteStringObject(tensorToDelete, 1);
       INTELLI_INFO("tell worker" + std::to_string(workerNo) + " to delete tensor");
-      // if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1); }
     }
   }
   return true;
@@ -318,9 +321,7 @@ std::vector<torch::Tensor> CANDY::ParallelPartitionIndex::searchTensor(torch::Te
   }
   int64_t collectedRu = 0;
   while (collectedRu < parallelWorkers) {
-    while (reduceQueue[collectedRu]->empty()) {
-
-    }
+    reduceWaiter->waitUntil([&]() { return !reduceQueue[collectedRu]->empty(); });
     auto tlp = *reduceQueue[collectedRu]->front();
     reduceQueue[collectedRu]->pop();
     for (size_t i = 0; i < tensors; i++) {
@@ -336,20 +337,20 @@ std::vector<torch::Tensor> CANDY::ParallelPartitionIndex::searchTensor(torch::Te
   /**
   * @brief 3. reduce
   */
+  if (tensors == 0) {
+    return ru;
+  }
+  int64_t candidatesPerQuery = k * parallelWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = q.to(torch::kFloat32).contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto queryTensor = q.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * parallelWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
-      if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1); }
+      int64_t tempIdx = idxAcc[i][j];
+      if (tempIdx >= 0) { ru[i].slice(0, j, j + 1) = candidates.slice(0, tempIdx, tempIdx + 1); }
     }
   }
   return ru;
@@ -381,9 +382,7 @@ std::tuple<std::vector<torch::Tensor>,
   int64_t collectedRu = 0;
   //INTELLI_INFO("enter collection");
   while (collectedRu < parallelWorkers) {
-    while (reduceStrQueue[collectedRu]->empty()) {
-
-    }
+    reduceWaiter->waitUntil([&]() { return !reduceStrQueue[collectedRu]->empty(); });
     auto tlp = *reduceStrQueue[collectedRu]->front();
     // auto tlp = *reduceQueue[collectedRu]->front();
     reduceStrQueue[collectedRu]->pop();
@@ -402,23 +401,22 @@ std::tuple<std::vector<torch::Tensor>,
   /**
   * @brief 3. reduce
   */
+  if (tensors == 0) {
+    return std::make_tuple(ru, ruString);
+  }
+  int64_t candidatesPerQuery = k * parallelWorkers;
+  auto candidates = torch::cat(ruTemp, 0).contiguous();
+  auto offsets = torch::arange((int64_t) tensors + 1, torch::kInt64) * candidatesPerQuery;
+  auto queryTensor = q.to(torch::kFloat32).contiguous();
+  auto [idxRu, distance] = INTELLI::IntelliTensorOP::batchedTopK(queryTensor, candidates, offsets, k,
+                                                                 faissMetric == faiss::METRIC_INNER_PRODUCT);
+  auto idxAcc = idxRu.accessor<int64_t, 2>();
   for (size_t i = 0; i < tensors; i++) {
-    faiss::IndexFlat indexFlat(vecDim, faissMetric); // call constructor
-    auto dbTensor = ruTemp[i].contiguous();
-    auto dbString = ruStringTemp[i];
-    auto queryTensor = q.slice(0, i, i + 1).contiguous();
-    float *dbData = dbTensor.data_ptr<float>();
-    float *queryData = queryTensor.contiguous().data_ptr<float>();
-    indexFlat.add(k * parallelWorkers, dbData); // add vectors to the index
-    int64_t querySize = 1;
-    std::vector<faiss::idx_t> idxRu(k * querySize);
-    std::vector<float> distance(k * querySize);
-    indexFlat.search(querySize, queryData, k, distance.data(), idxRu.data());
     for (int64_t j = 0; j < k; j++) {
-      int64_t tempIdx = idxRu[j];
+      int64_t tempIdx = idxAcc[i][j];
       if (tempIdx >= 0) {
-        ru[i].slice(0, j, j + 1) = dbTensor.slice(0, tempIdx, tempIdx + 1);
-        ruString[i][j] = dbString[tempIdx];
+        ru[i].slice(0, j, j + 1) = candidates.slice(0, tempIdx, tempIdx + 1);
+        ruString[i][j] = ruStringTemp[i][tempIdx - (int64_t) i * candidatesPerQuery];
       }
     }
   }
@@ -14,6 +14,11 @@ void CANDY::ParallelIndexWorker::reset() {
   }
 
 }
+bool CANDY::ParallelIndexWorker::hasPendingWork() {
+  return !(buildQueue->empty() && initialLoadQueue->empty() && initialStrQueue->empty() && insertQueue->empty()
+      && insertStrQueue->empty() && reviseQueue0->empty() && deleteQueue->empty() && deleteStrQueue->empty()
+      && queryQueue->empty() && queryStrQueue->empty() && cmdQueue->empty());
+}
 void CANDY::ParallelIndexWorker::inlineMain() {
   INTELLI_INFO("parallel worker" + std::to_string(myId) + " has started");
   bool shouldLoop = 1;
@@ -23,7 +28,7 @@ void CANDY::ParallelIndexWorker::inlineMain() {
     /**
      * @brief 0. offline stages
      */
-    while (!m_mut.try_lock());
+    m_mut.lock();
     while (!buildQueue->empty()) {
       auto buildTensor = *buildQueue->front();
       buildQueue->pop();
@@ -42,7 +47,7 @@ void CANDY::ParallelIndexWorker::inlineMain() {
     }
     m_mut.unlock();
     while (!initialStrQueue->empty()) {
-      while (!m_mut.try_lock());
+      m_mut.lock();
       auto initialQ = *initialStrQueue->front();
       auto initialLoadTensor = initialQ.t;
       auto initialLoadStr = initialQ.strObj;
@@ -56,7 +61,7 @@ void CANDY::ParallelIndexWorker::inlineMain() {
     /**
       * @brief 1. insert first
       */
-    while (!m_mut.try_lock());
+    m_mut.lock();
     while (!insertQueue->empty()) {
       auto insertTensor = *insertQueue->front();
       insertQueue->pop();
@@ -120,6 +125,9 @@ void CANDY::ParallelIndexWorker::inlineMain() {
         //std::cout<<"worker "+std::to_string(myId)
         TensorListIdxPair tlp(tl, myId, querySeq);
         reduceQueue->push(tlp);
+        if (reduceWaiter != nullptr) {
+          reduceWaiter->notify();
+        }
         querySeq++;
         /* int64_t tensors = tip.t.size(0);
          std::vector<torch::Tensor> ru(tensors);
@@ -141,6 +149,9 @@ void CANDY::ParallelIndexWorker::inlineMain() {
         auto ruS = std::get<1>(tl);
         TensorStrVecPair tlp(ruT, myId, querySeq, ruS);
         reduceStrQueue->push(tlp);
+        if (reduceWaiter != nullptr) {
+          reduceWaiter->notify();
+        }
         querySeq++;
         /* int64_t tensors = tip.t.size(0);
          std::vector<torch::Tensor> ru(tensors);
@@ -163,7 +174,10 @@ void CANDY::ParallelIndexWorker::inlineMain() {
         return;
       }
     }
-    // usleep(1000)
+    /**
+     * @brief 6. wait for new work, spin first and park if idle for long
+     */
+    waiter.waitUntil([this]() { return hasPendingWork(); });
   }
 
 }
@@ -203,26 +217,41 @@ bool CANDY::ParallelIndexWorker::setConfig(INTELLI::ConfigMapPtr cfg) {
   singleWorkerOpt = cfg->tryI64("singleWorkerOpt", 0, true);
   // reduceStrQueue = std::make_shared<INTELLI::SPSCQueue<CANDY::TensorStrVecPair>>((size_t) parallelWorker_queueSize);
   congestionDrop = cfg->tryI64("congestionDrop", 0, true);
+  waiter.setConfig(cfg);
   return true;
 }
 bool CANDY::ParallelIndexWorker::insertTensor(torch::Tensor &t) {
   if (insertQueue->empty() || (!congestionDrop)) {
     insertQueue->push(t);
+    waiter.notify();
   } else {
     INTELLI_WARNING("Drop data");
   }
   return true;
 }
 
+CANDY::AbstractIndexPtr CANDY::ParallelIndexWorker::snapshotIndex() {
+  std::lock_guard<std::mutex> lk(m_mut);
+  if (myIndexAlgo == nullptr) {
+    return nullptr;
+  }
+  return myIndexAlgo->snapshot();
+}
+void CANDY::ParallelIndexWorker::adoptIndex(AbstractIndexPtr idx, int64_t ingested) {
+  std::lock_guard<std::mutex> lk(m_mut);
+  myIndexAlgo = idx;
+  ingestedVectors = ingested;
+}
 bool CANDY::ParallelIndexWorker::loadInitialTensor(torch::Tensor &t) {
   if (singleWorkerOpt) {
     INTELLI_WARNING("Optimized for single worker");
-    while (!m_mut.try_lock());
+    m_mut.lock();
     auto ru = myIndexAlgo->loadInitialTensor(t);
     m_mut.unlock();
     return ru;
   }
   initialLoadQueue->push(t);
+  waiter.notify();
   return true;
 }
 bool CANDY::ParallelIndexWorker::deleteTensor(torch::Tensor &t, int64_t k) {
@@ -230,6 +259,7 @@ bool CANDY::ParallelIndexWorker::deleteTensor(torch::Tensor &t, int64_t k) {
   assert(k > 0);
   TensorIdxPair tip(t, k);
   deleteQueue->push(tip);
+  waiter.notify();
   return true;
 }
 
@@ -237,6 +267,7 @@ bool CANDY::ParallelIndexWorker::reviseTensor(torch::Tensor &t, torch::Tensor &w
   assert(t.size(1) == w.size(1));
   reviseQueue0->push(t);
   reviseQueue1->push(w);
+  waiter.notify();
   return false;
 }
 std::vector<faiss::idx_t> CANDY::ParallelIndexWorker::searchIndex(torch::Tensor q, int64_t k) {
@@ -252,10 +283,12 @@ std::vector<faiss::idx_t> CANDY::ParallelIndexWorker::searchIndex(torch::Tensor
 void CANDY::ParallelIndexWorker::pushSearch(torch::Tensor q, int64_t k) {
   TensorIdxPair tip(q, k);
   queryQueue->push(tip);
+  waiter.notify();
 }
 void CANDY::ParallelIndexWorker::pushSearchStr(torch::Tensor q, int64_t k) {
   TensorIdxPair tip(q, k);
   queryStrQueue->push(tip);
+  waiter.notify();
 }
 std::vector<torch::Tensor> CANDY::ParallelIndexWorker::getTensorByIndex(std::vector<faiss::idx_t> &idx, int64_t k) {
   if (myIndexAlgo != nullptr) {
@@ -309,12 +342,14 @@ bool CANDY::ParallelIndexWorker::startHPC() {
 
 bool CANDY::ParallelIndexWorker::endHPC() {
   cmdQueue->push(-1);
+  waiter.notify();
   return false;
 }
 
 bool CANDY::ParallelIndexWorker::offlineBuild(torch::Tensor &t) {
   if (myIndexAlgo != nullptr) {
     buildQueue->push(t);
+    waiter.notify();
     return true;
   }
   return false;
@@ -330,6 +365,7 @@ bool CANDY::ParallelIndexWorker::insertStringObject(torch::Tensor &t, std::vecto
   if (insertStrQueue->empty() || (!congestionDrop)) {
     TensorStrPair tasp(t, -1, strs);
     insertStrQueue->push(tasp);
+    waiter.notify();
   } else {
     INTELLI_WARNING("Drop data");
   }
@@ -338,6 +374,7 @@ bool CANDY::ParallelIndexWorker::insertStringObject(torch::Tensor &t, std::vecto
 bool CANDY::ParallelIndexWorker::deleteStringObject(torch::Tensor &t, int64_t k) {
   TensorIdxPair tip(t, k);
   deleteStrQueue->push(tip);
+  waiter.notify();
   return true;
 }
 std::vector<std::vector<std::string>> CANDY::ParallelIndexWorker::searchStringObject(torch::Tensor &q, int64_t k) {
@@ -394,5 +431,6 @@ std::tuple<std::vector<torch::Tensor>,
 bool CANDY::ParallelIndexWorker::loadInitialStringObject(torch::Tensor &t, std::vector<std::string> &strs) {
   TensorStrPair tasp(t, -1, strs);
   initialStrQueue->push(tasp);
+  waiter.notify();
   return true;
 }
\ No newline at end of file
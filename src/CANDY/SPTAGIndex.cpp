@@ -11,6 +11,14 @@
 
 bool CANDY::SPTAGIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   FlatIndex::setConfig(cfg);
+  /**
+   * @brief rows are kept in float32 whatever storageType says, as SPTAG is built on float rows
+   */
+  if (storageType != torch::kFloat32) {
+    INTELLI_WARNING("storageType is ignored, rows are kept in float32");
+    storageType = torch::kFloat32;
+    dbTensor = dbTensor.to(torch::kFloat32);
+  }
     sptag = SPTAG::VectorIndex::CreateInstance(SPTAG::IndexAlgoType::BKT,
                                                SPTAG::VectorValueType::Float);
   if(faissMetric == faiss::METRIC_INNER_PRODUCT) {
@@ -82,4 +90,28 @@ std::vector<torch::Tensor> CANDY::SPTAGIndex::searchTensor(torch::Tensor &q, int
     }
   }
   return ru;
-}
\ No newline at end of file
+}
+std::shared_ptr<CANDY::AbstractIndex> CANDY::SPTAGIndex::snapshot() {
+  if (!isInitialized || sptag == nullptr) {
+    INTELLI_WARNING("SPTAG snapshot is only taken after loadInitialTensor");
+    return nullptr;
+  }
+  auto bufferSize = sptag->CalculateBufferSize();
+  std::vector<SPTAG::ByteArray> blobs;
+  for (auto &bytes : *bufferSize) {
+    blobs.push_back(SPTAG::ByteArray::Alloc(bytes));
+  }
+  std::string sptagCfg;
+  std::shared_ptr<SPTAG::VectorIndex> copied;
+  if (sptag->SaveIndex(sptagCfg, blobs) != SPTAG::ErrorCode::Success
+      || SPTAG::VectorIndex::LoadIndex(sptagCfg, blobs, copied) != SPTAG::ErrorCode::Success) {
+    INTELLI_ERROR("failed to serialize SPTAG index for a snapshot");
+    return nullptr;
+  }
+  auto ru = std::make_shared<CANDY::SPTAGIndex>(*this);
+  ru->dbTensor = dbTensor.clone();
+  ru->dbNorms = dbNorms.clone();
+  ru->sptag = copied;
+  ru->snapshotBlobs = blobs;
+  return ru;
+}
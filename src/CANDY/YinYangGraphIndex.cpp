@@ -13,6 +13,14 @@
 
 bool CANDY::YinYangGraphIndex::setConfig(INTELLI::ConfigMapPtr cfg) {
   FlatIndex::setConfig(cfg);
+  /**
+   * @brief rows are kept in float32 whatever storageType says, as the graph reads them as float
+   */
+  if (storageType != torch::kFloat32) {
+    INTELLI_WARNING("storageType is ignored, rows are kept in float32");
+    storageType = torch::kFloat32;
+    dbTensor = dbTensor.to(torch::kFloat32);
+  }
   distanceFunc = distanceIP;
   if (faissMetric != faiss::METRIC_INNER_PRODUCT) {
     INTELLI_WARNING("Switch to L2");
@@ -125,7 +133,7 @@ bool CANDY::YinYangGraphIndex::loadInitialTensorInline(torch::Tensor &t) {
     indices = indices.to(torch::kCPU);
   }
   INTELLI::IntelliTensorOP::appendRowsBufferMode(&similarityTensor, &indices, &lastNNZSim, expandStep);
-  INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor, &t, &lastNNZ, expandStep);
+  FlatIndex::insertTensor(t);
   return true;
 }
 bool CANDY::YinYangGraphIndex::loadInitialTensor(torch::Tensor &t) {
@@ -247,7 +255,7 @@ bool CANDY::YinYangGraphIndex::insertTensorBatch(torch::Tensor &t, int64_t maxIt
   }
   tempIdx[0][3] = rowIdxInsert;
   INTELLI::IntelliTensorOP::appendRowsBufferMode(&similarityTensor, &tempIdx, &lastNNZSim, expandStep);
-  INTELLI::IntelliTensorOP::appendRowsBufferMode(&dbTensor,&t,&lastNNZ,expandStep);
+  FlatIndex::insertTensor(t);
   return true;
 }
 torch::Tensor CANDY::YinYangGraphIndex::distanceIP(torch::Tensor &db,
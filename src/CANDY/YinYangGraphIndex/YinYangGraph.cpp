@@ -557,13 +557,19 @@ void CANDY::YinYangGraph_ListCell::insertTensor(torch::Tensor &t,
 
 }
 YinYangVertexPtr CANDY::YinYangGraph_ListBucket::getVertexWithEncode(std::vector<uint8_t> &encode) {
+  YinYangVertexPtr ru = nullptr;
+  lockShared();
   for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-    if ((*ele)->getEncode() == encode) { return (*ele)->getVertex(); }
+    if ((*ele)->getEncode() == encode) {
+      ru = (*ele)->getVertex();
+      break;
+    }
   }
-  if (cellPtrs.size() > 0) {
-    return (*cellPtrs.begin())->getVertex();
+  if (ru == nullptr && cellPtrs.size() > 0) {
+    ru = (*cellPtrs.begin())->getVertex();
   }
-  return nullptr;
+  unlockShared();
+  return ru;
 }
 void CANDY::YinYangGraph_ListBucket::insertTensorWithEncode(torch::Tensor &t,
                                                             int64_t maxNeighborCnt,
@@ -571,39 +577,38 @@ void CANDY::YinYangGraph_ListBucket::insertTensorWithEncode(torch::Tensor &t,
                                                             CANDY::YinYangVertexMap &yin0Map,
                                                             std::vector<YinYangVertexMap> &vertexMapGe1Vec,
                                                             bool isConcurrent) {
-  if (isConcurrent) {
-    lock();
-    tensors++;
-    unlock();
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        celPtr->lock();
-        celPtr->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
-        celPtr->unlock();
-        return;
-      }
+  lockShared();
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    auto celPtr = *ele;
+    if (celPtr->getEncode() == encode) {
+      celPtr->lock();
+      celPtr->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
+      celPtr->unlock();
+      tensors++;
+      unlockShared();
+      return;
     }
-    YinYangGraph_ListCellPtr cellNew = newYinYangGraph_ListCell();
-    cellNew->setEncode(encode);
-    cellNew->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
-    cellPtrs.push_back(cellNew);
-    return;
-  } else {
-    tensors++;
-    for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
-      auto celPtr = *ele;
-      if (celPtr->getEncode() == encode) {
-        celPtr->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
-        return;
-      }
+  }
+  unlockShared();
+  /**
+   * @brief create the cell, another writer may have created it meanwhile
+   */
+  lock();
+  YinYangGraph_ListCellPtr target = nullptr;
+  for (auto ele = cellPtrs.begin(); ele != cellPtrs.end(); ++ele) {
+    if ((*ele)->getEncode() == encode) {
+      target = *ele;
+      break;
     }
-    YinYangGraph_ListCellPtr cellNew = newYinYangGraph_ListCell();
-    cellNew->setEncode(encode);
-    cellNew->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
-    cellPtrs.push_back(cellNew);
-    return;
   }
+  if (target == nullptr) {
+    target = newYinYangGraph_ListCell();
+    target->setEncode(encode);
+    cellPtrs.push_back(target);
+  }
+  target->insertTensor(t, maxNeighborCnt, yin0Map, vertexMapGe1Vec);
+  tensors++;
+  unlock();
 }
 void CANDY::YinYangGraph::init(size_t bkts, size_t _encodeLen, int64_t _maxCon) {
   bucketPtrs = std::vector<YinYangGraph_ListBucketPtr>(bkts);
@@ -4,6 +4,8 @@
 
 #include <DataLoader/AbstractDataLoader.h>
 #include <Utils/IntelliLog.h>
+#include <algorithm>
+#include <vector>
 //do nothing in abstract class
 using namespace std;
 
@@ -40,4 +42,73 @@ int64_t CANDY::AbstractDataLoader::size() {
 int64_t CANDY::AbstractDataLoader::getDimension() {
   auto ru = getData();
   return ru.size(1);
-}
\ No newline at end of file
+}
+void CANDY::AbstractDataLoader::resetStream(int64_t startPos) {
+  streamCursor = std::max(startPos, (int64_t) 0);
+}
+torch::Tensor CANDY::AbstractDataLoader::nextChunk(int64_t rows) {
+  int64_t endPos = std::min(streamCursor + std::max(rows, (int64_t) 0), size());
+  if (endPos <= streamCursor) {
+    return torch::empty({0, getDimension()});
+  }
+  auto ru = getDataAt(streamCursor, endPos);
+  streamCursor = endPos;
+  return ru;
+}
+bool CANDY::AbstractDataLoader::hasNextChunk() {
+  return streamCursor < size();
+}
+torch::Tensor CANDY::AbstractDataLoader::getDataByIds(torch::Tensor ids) {
+  auto idc = ids.to(torch::kLong).contiguous();
+  int64_t n = idc.numel();
+  auto ru = torch::zeros({n, getDimension()});
+  auto idp = idc.data_ptr<int64_t>();
+  for (int64_t i = 0; i < n; i++) {
+    ru.slice(0, i, i + 1).copy_(getDataAt(idp[i], idp[i] + 1));
+  }
+  return ru;
+}
+torch::Tensor CANDY::AbstractDataLoader::getNeighbors(int64_t k) {
+  return torch::Tensor();
+}
+torch::Tensor CANDY::AbstractDataLoader::blockRowsAt(int64_t startPos,
+                                                   int64_t endPos,
+                                                   int64_t blockRows,
+                                                   const std::function<torch::Tensor(int64_t)> &generateBlock) {
+  int64_t volume = size();
+  startPos = std::clamp(startPos, (int64_t) 0, volume);
+  endPos = std::clamp(endPos, startPos, volume);
+  if (endPos == startPos) {
+    return torch::empty({0, getDimension()});
+  }
+  std::vector<torch::Tensor> blocks;
+  for (int64_t b = startPos / blockRows; b * blockRows < endPos; b++) {
+    blocks.push_back(generateBlock(b));
+  }
+  int64_t offset = startPos - (startPos / blockRows) * blockRows;
+  return torch::cat(blocks, 0).slice(0, offset, offset + endPos - startPos).contiguous();
+}
+torch::Tensor CANDY::AbstractDataLoader::blockRowsByIds(torch::Tensor ids,
+                                                      int64_t blockRows,
+                                                      const std::function<torch::Tensor(int64_t)> &generateBlock) {
+  auto idc = ids.to(torch::kLong).contiguous();
+  int64_t n = idc.numel();
+  auto ru = torch::zeros({n, getDimension()});
+  auto idp = idc.data_ptr<int64_t>();
+  std::vector<int64_t> order(n);
+  for (int64_t i = 0; i < n; i++) {
+    order[i] = i;
+  }
+  std::sort(order.begin(), order.end(), [idp](int64_t a, int64_t b) { return idp[a] < idp[b]; });
+  int64_t cachedBlock = -1;
+  torch::Tensor block;
+  for (auto i : order) {
+    int64_t b = idp[i] / blockRows;
+    if (b != cachedBlock) {
+      block = generateBlock(b);
+      cachedBlock = b;
+    }
+    ru[i].copy_(block[idp[i] - b * blockRows]);
+  }
+  return ru;
+}
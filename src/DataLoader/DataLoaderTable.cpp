@@ -7,10 +7,12 @@
 #include <DataLoader/ZipfDataLoader.h>
 #include <DataLoader/ExpFamilyDataLoader.h>
 #include <DataLoader/FVECSDataLoader.h>
+#include <DataLoader/MMapVECSDataLoader.h>
 #include <DataLoader/RBTDataLoader.h>
 #include <include/hdf5_config.h>
 #if CANDY_HDF5 == 1
 #include <DataLoader/HDF5DataLoader.h>
+#include <DataLoader/HDF5StreamDataLoader.h>
 #endif
 
 namespace CANDY {
@@ -27,6 +29,7 @@ CANDY::DataLoaderTable::DataLoaderTable() {
   loaderMap["null"] = newAbstractDataLoader();
   loaderMap["random"] = newRandomDataLoader();
   loaderMap["fvecs"] = newFVECSDataLoader();
+  loaderMap["mmapVecs"] = newMMapVECSDataLoader();
   loaderMap["zipf"] = newZipfDataLoader();
   loaderMap["expFamily"] = newExpFamilyDataLoader();
   /**
@@ -40,6 +43,7 @@ CANDY::DataLoaderTable::DataLoaderTable() {
   loaderMap["rbt"] = newRBTDataLoader();
 #if CANDY_HDF5 == 1
   loaderMap["hdf5"] = newHDF5DataLoader();
+  loaderMap["hdf5Stream"] = newHDF5StreamDataLoader();
 #endif
 }
 
@@ -3,45 +3,69 @@
 //
 
 #include <DataLoader/ExpFamilyDataLoader.h>
+#include <ATen/CPUGeneratorImpl.h>
+#include <algorithm>
 
-torch::Tensor CANDY::ExpFamilyDataLoader::generateExp() {
-  return torch::exponential(torch::empty({vecVolume, vecDim}));
+torch::Tensor CANDY::ExpFamilyDataLoader::generateExp(int64_t rows, c10::optional<at::Generator> gen) {
+  return torch::empty({rows, vecDim}).exponential_(1.0, gen);
 }
 
 bool CANDY::ExpFamilyDataLoader::hijackConfig(INTELLI::ConfigMapPtr cfg) {
   distributionOverwrite = cfg->tryString("distributionOverwrite", "exp", true);
   return true;
 }
-torch::Tensor CANDY::ExpFamilyDataLoader::generateBeta() {
-  auto tensor1 = torch::randn({vecVolume, vecDim}).abs_();
-  auto tensor2 = torch::randn({vecVolume, vecDim}).abs_();
+torch::Tensor CANDY::ExpFamilyDataLoader::generateBeta(int64_t rows, c10::optional<at::Generator> gen) {
+  auto tensor1 = torch::randn({rows, vecDim}, gen).abs_();
+  auto tensor2 = torch::randn({rows, vecDim}, gen).abs_();
   tensor1 = tensor1.pow(1. / parameterBetaA);
   tensor2 = tensor2.pow(1. / parameterBetaB);
   return tensor1 / (tensor1 + tensor2);
 }
 
-torch::Tensor CANDY::ExpFamilyDataLoader::generateGaussian() {
-  return torch::randn({vecVolume, vecDim});
+torch::Tensor CANDY::ExpFamilyDataLoader::generateGaussian(int64_t rows, c10::optional<at::Generator> gen) {
+  return torch::randn({rows, vecDim}, gen);
 }
-torch::Tensor CANDY::ExpFamilyDataLoader::generatePoisson() {
-  return torch::poisson(torch::empty({vecVolume, vecDim}));
+torch::Tensor CANDY::ExpFamilyDataLoader::generatePoisson(int64_t rows, c10::optional<at::Generator> gen) {
+  /**
+   * @brief the rates must be defined, otherwise a regenerated block would not repeat its rows
+   */
+  return torch::poisson(torch::ones({rows, vecDim}), gen);
 }
-torch::Tensor CANDY::ExpFamilyDataLoader::generateData() {
-  torch::Tensor ru;
+torch::Tensor CANDY::ExpFamilyDataLoader::generateRaw(int64_t rows, c10::optional<at::Generator> gen) {
   if (distributionOverwrite == "poisson") {
-    ru = generatePoisson();
+    return generatePoisson(rows, gen);
   } else if (distributionOverwrite == "gaussian") {
-    ru = generateGaussian();
+    return generateGaussian(rows, gen);
   } else if (distributionOverwrite == "beta") {
-    ru = generateBeta();
-  } else {
-    ru = generateExp();
+    return generateBeta(rows, gen);
   }
+  return generateExp(rows, gen);
+}
+torch::Tensor CANDY::ExpFamilyDataLoader::generateData() {
+  torch::Tensor ru = generateRaw(vecVolume);
   if (normalizeTensor) {
     ru = INTELLI::IntelliTensorOP::l2Normalize(ru);
   }
   return ru;
 }
+torch::Tensor CANDY::ExpFamilyDataLoader::rawBlock(int64_t blockIdx) {
+  int64_t startPos = blockIdx * blockRows;
+  int64_t endPos = std::min(startPos + blockRows, vecVolume);
+  auto gen = at::make_generator<at::CPUGeneratorImpl>((uint64_t) seed * 1000003ULL + (uint64_t) blockIdx);
+  return generateRaw(endPos - startPos, gen);
+}
+torch::Tensor CANDY::ExpFamilyDataLoader::generateBlock(int64_t blockIdx) {
+  int64_t startPos = blockIdx * blockRows;
+  auto ru = rawBlock(blockIdx);
+  if (normalizeTensor) {
+    ru.div_(columnNorms);
+  }
+  if (driftPosition > 0 && driftPosition < vecVolume && driftPosition < startPos + ru.size(0)) {
+    int64_t driftStart = std::max(driftPosition, startPos) - startPos;
+    ru.slice(0, driftStart, ru.size(0)).add_(driftOffset);
+  }
+  return ru;
+}
 bool CANDY::ExpFamilyDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   assert(cfg);
   vecDim = cfg->tryI64("vecDim", 768, true);
@@ -55,6 +79,7 @@ bool CANDY::ExpFamilyDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   queryNoiseFraction = cfg->tryDouble("queryNoiseFraction", 0, true);
   manualChangeDistribution = cfg->tryI64("manualChangeDistribution", 0, true);
   normalizeTensor = cfg->tryI64("normalizeTensor", 0, true);
+  generateOnTheFly = cfg->tryI64("generateOnTheFly", 0, true);
   if (manualChangeDistribution) {
     distributionOverwrite = cfg->tryString("distributionOverwrite", "exp", true);
   }
@@ -72,6 +97,23 @@ bool CANDY::ExpFamilyDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   INTELLI_INFO(
       "Generating [" + to_string(vecVolume) + "x" + to_string(vecDim) + "]" + ", query size " + to_string(querySize));
   torch::manual_seed(seed);
+  if (generateOnTheFly) {
+    A = torch::Tensor();
+    if (normalizeTensor) {
+      /**
+       * @brief the column norms of the whole volume, so each block is scaled as l2Normalize would scale A
+       */
+      auto squareSum = torch::zeros({1, vecDim}, torch::kFloat64);
+      for (int64_t b = 0; b * blockRows < vecVolume; b++) {
+        squareSum += rawBlock(b).to(torch::kFloat64).square().sum(0, true);
+      }
+      columnNorms = squareSum.sqrt().to(torch::kFloat32);
+    }
+    auto indices = torch::randint(vecVolume, {querySize}, torch::kLong);
+    B = getDataByIds(indices);
+    B = (1 - queryNoiseFraction) * B + queryNoiseFraction * torch::rand({querySize, vecDim});
+    return true;
+  }
   A = generateData();
   if (driftPosition > 0 && driftPosition < vecVolume) {
     INTELLI_INFO(
@@ -87,10 +129,35 @@ bool CANDY::ExpFamilyDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   return true;
 }
 
+torch::Tensor CANDY::ExpFamilyDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  if (!generateOnTheFly) {
+    return AbstractDataLoader::getDataAt(startPos, endPos);
+  }
+  return blockRowsAt(startPos, endPos, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
+torch::Tensor CANDY::ExpFamilyDataLoader::getDataByIds(torch::Tensor ids) {
+  if (!generateOnTheFly) {
+    return A.index_select(0, ids.to(torch::kLong).contiguous());
+  }
+  return blockRowsByIds(ids, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
 torch::Tensor CANDY::ExpFamilyDataLoader::getData() {
+  if (generateOnTheFly) {
+    return getDataAt(0, vecVolume);
+  }
   return A;
 }
 
+int64_t CANDY::ExpFamilyDataLoader::getDimension() {
+  return vecDim;
+}
+
+int64_t CANDY::ExpFamilyDataLoader::size() {
+  return vecVolume;
+}
+
 torch::Tensor CANDY::ExpFamilyDataLoader::getQuery() {
   return B;
 }
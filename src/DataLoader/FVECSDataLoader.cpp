@@ -3,6 +3,7 @@
 //
 
 #include <DataLoader/FVECSDataLoader.h>
+#include <DataLoader/MMapVECSDataLoader.h>
 
 bool CANDY::FVECSDataLoader::generateData(std::string fname) {
   auto dataTensor = CANDY::FVECSDataLoader::tensorFromFVECS(fname);
@@ -45,29 +46,14 @@ bool CANDY::FVECSDataLoader::generateQuery(std::string fname) {
 }
 torch::Tensor CANDY::FVECSDataLoader::tensorFromFVECS(std::string fname) {
   torch::Tensor ru;
-  unsigned num, dim;
-  std::ifstream in(fname, std::ios::binary);    //以二进制的方式打开文件
-  if (!in.is_open()) {
-    INTELLI_ERROR(
-        "Double check your data path: " + fname);
+  /**
+   * @brief map the file and copy the strided payload once, instead of reading row by row into a buffer and cloning it
+   */
+  auto mapped = newMMapVECSFile();
+  if (!mapped->open(fname, "fvecs")) {
     return ru;
   }
-  in.read((char *) &dim, 4);    //读取向量维度
-  in.seekg(0, std::ios::end);    //光标定位到文件末尾
-  std::ios::pos_type ss = in.tellg();    //获取文件大小（多少字节）
-  size_t fsize = (size_t) ss;
-  num = (unsigned) (fsize / (dim + 1) / 4);    //数据的个数
-  std::vector<float> dataVec((size_t) num * (size_t) dim);
-  float *data = reinterpret_cast<float *>(dataVec.data());
-  in.seekg(0, std::ios::beg);    //光标定位到起始处
-  for (size_t i = 0; i < num; i++) {
-    in.seekg(4, std::ios::cur);    //光标向右移动4个字节
-    in.read((char *) (data + i * dim), dim * 4);    //读取数据到一维数据data中
-  }
-  in.close();
-
-  torch::TensorOptions options(torch::kFloat32);
-  ru = torch::from_blob(data, {(int64_t) num, (int64_t) dim}, options).clone();
+  ru = mapped->rawView(0, mapped->size()).contiguous();
   return ru;
 }
 bool CANDY::FVECSDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
@@ -81,6 +67,8 @@ bool CANDY::FVECSDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   auto queryPath = cfg->tryString("queryPath", "datasets/fvecs/sift10K/siftsmall_query.fvecs", true);
   auto dataPath = cfg->tryString("dataPath", "datasets/fvecs/sift10K/siftsmall_base.fvecs", true);
   useSeparateQuery = cfg->tryI64("useSeparateQuery", 1, true);
+  streamFromFile = cfg->tryI64("streamFromFile", 0, true);
+  fileReader = nullptr;
   if (queryNoiseFraction < 0) {
     queryNoiseFraction = 0;
   }
@@ -92,6 +80,21 @@ bool CANDY::FVECSDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
     return false;
   }
   torch::manual_seed(seed);
+  if (streamFromFile) {
+    A = torch::Tensor();
+    auto readerCfg = newConfigMap();
+    readerCfg->loadFrom(*cfg);
+    readerCfg->edit("vecsFormat", "fvecs");
+    readerCfg->edit("normalizeTensor", (int64_t) normalizeTensor);
+    auto reader = newMMapVECSDataLoader();
+    if (!reader->setConfig(readerCfg)) {
+      return false;
+    }
+    fileReader = reader;
+    B = fileReader->getQuery();
+    INTELLI_INFO("Data is streamed from " + dataPath);
+    return true;
+  }
   if (generateData(dataPath) == false) {
     return false;
   }
@@ -110,8 +113,60 @@ bool CANDY::FVECSDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
 }
 
 torch::Tensor CANDY::FVECSDataLoader::getData() {
+  if (fileReader != nullptr) {
+    return fileReader->getData();
+  }
   return A;
 }
+torch::Tensor CANDY::FVECSDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  if (fileReader != nullptr) {
+    return fileReader->getDataAt(startPos, endPos);
+  }
+  return AbstractDataLoader::getDataAt(startPos, endPos);
+}
+
+torch::Tensor CANDY::FVECSDataLoader::getDataByIds(torch::Tensor ids) {
+  if (fileReader != nullptr) {
+    return fileReader->getDataByIds(ids);
+  }
+  return A.index_select(0, ids.to(torch::kLong).contiguous());
+}
+
+int64_t CANDY::FVECSDataLoader::getDimension() {
+  if (fileReader != nullptr) {
+    return fileReader->getDimension();
+  }
+  return AbstractDataLoader::getDimension();
+}
+
+int64_t CANDY::FVECSDataLoader::size() {
+  if (fileReader != nullptr) {
+    return fileReader->size();
+  }
+  return AbstractDataLoader::size();
+}
+
+void CANDY::FVECSDataLoader::resetStream(int64_t startPos) {
+  if (fileReader != nullptr) {
+    fileReader->resetStream(startPos);
+    return;
+  }
+  AbstractDataLoader::resetStream(startPos);
+}
+
+torch::Tensor CANDY::FVECSDataLoader::nextChunk(int64_t rows) {
+  if (fileReader != nullptr) {
+    return fileReader->nextChunk(rows);
+  }
+  return AbstractDataLoader::nextChunk(rows);
+}
+
+bool CANDY::FVECSDataLoader::hasNextChunk() {
+  if (fileReader != nullptr) {
+    return fileReader->hasNextChunk();
+  }
+  return AbstractDataLoader::hasNextChunk();
+}
 
 torch::Tensor CANDY::FVECSDataLoader::getQuery() {
   return B;
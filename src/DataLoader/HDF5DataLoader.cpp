@@ -3,6 +3,7 @@
 //
 
 #include <DataLoader/HDF5DataLoader.h>
+#include <DataLoader/HDF5StreamDataLoader.h>
 #include <hdf5.h>
 bool CANDY::HDF5DataLoader::generateData(std::string fname) {
   std::string attr = "dataset";
@@ -48,7 +49,7 @@ bool CANDY::HDF5DataLoader::generateQuery(std::string fname) {
 torch::Tensor CANDY::HDF5DataLoader::tensorFromHDF5(std::string fname, std::string attr) {
   torch::Tensor ru;
   herr_t status;
-  hid_t file_id = H5Fopen(fname.c_str(), H5F_ACC_RDWR, H5P_DEFAULT);
+  hid_t file_id = H5Fopen(fname.c_str(), H5F_ACC_RDONLY, H5P_DEFAULT);
   if (file_id < 0) {
     INTELLI_ERROR(
         "invalid hdf5 file " + fname);
@@ -70,22 +71,24 @@ torch::Tensor CANDY::HDF5DataLoader::tensorFromHDF5(std::string fname, std::stri
 
   hsize_t dims_out[2];
   H5Sget_simple_extent_dims(space_id, dims_out, NULL);
-  std::vector<float> dataVec(dims_out[0] * dims_out[1]);
-  float *dataset = reinterpret_cast<float *>(dataVec.data());
-  //dataset = flann::Matrix<T>(new T[dims_out[0]*dims_out[1]], dims_out[0], dims_out[1]);
-
-  status = H5Dread(dataset_id, H5T_NATIVE_FLOAT, H5S_ALL, H5S_ALL, H5P_DEFAULT, dataset);
+  /**
+   * @brief read straight into the returned tensor rather than through a buffer
+   */
+  auto readTensor = torch::empty({(int64_t) dims_out[0], (int64_t) dims_out[1]}, torch::kFloat32);
+  status = H5Dread(dataset_id, H5T_NATIVE_FLOAT, H5S_ALL, H5S_ALL, H5P_DEFAULT, readTensor.data_ptr<float>());
   if (status < 0) {
     INTELLI_ERROR(
         "invalid reading " + attr + "at " + fname);
+    H5Sclose(space_id);
+    H5Dclose(dataset_id);
+    H5Fclose(file_id);
     return ru;
   }
 
   H5Sclose(space_id);
   H5Dclose(dataset_id);
   H5Fclose(file_id);
-  torch::TensorOptions options(torch::kFloat32);
-  ru = torch::from_blob(dataset, {(int64_t) dims_out[0], (int64_t) dims_out[1]}, options).clone();
+  ru = readTensor;
   return ru;
 }
 bool CANDY::HDF5DataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
@@ -98,6 +101,8 @@ bool CANDY::HDF5DataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   normalizeTensor = cfg->tryI64("normalizeTensor", 1, true);
   auto dataPath = cfg->tryString("dataPath", "datasets/hdf5/sun/sun.hdf5", true);
   useSeparateQuery = cfg->tryI64("useSeparateQuery", 1, true);
+  streamFromFile = cfg->tryI64("streamFromFile", 0, true);
+  fileReader = nullptr;
   if (queryNoiseFraction < 0) {
     queryNoiseFraction = 0;
   }
@@ -109,6 +114,22 @@ bool CANDY::HDF5DataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
     return false;
   }
   torch::manual_seed(seed);
+  if (streamFromFile) {
+    A = torch::Tensor();
+    auto readerCfg = newConfigMap();
+    readerCfg->loadFrom(*cfg);
+    readerCfg->edit("dataAttr", "dataset");
+    readerCfg->edit("queryAttr", "query");
+    readerCfg->edit("normalizeTensor", (int64_t) normalizeTensor);
+    auto reader = newHDF5StreamDataLoader();
+    if (!reader->setConfig(readerCfg)) {
+      return false;
+    }
+    fileReader = reader;
+    B = fileReader->getQuery();
+    INTELLI_INFO("Data is streamed from " + dataPath);
+    return true;
+  }
   if (generateData(dataPath) == false) {
     return false;
   }
@@ -127,8 +148,60 @@ bool CANDY::HDF5DataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
 }
 
 torch::Tensor CANDY::HDF5DataLoader::getData() {
+  if (fileReader != nullptr) {
+    return fileReader->getData();
+  }
   return A;
 }
+torch::Tensor CANDY::HDF5DataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  if (fileReader != nullptr) {
+    return fileReader->getDataAt(startPos, endPos);
+  }
+  return AbstractDataLoader::getDataAt(startPos, endPos);
+}
+
+torch::Tensor CANDY::HDF5DataLoader::getDataByIds(torch::Tensor ids) {
+  if (fileReader != nullptr) {
+    return fileReader->getDataByIds(ids);
+  }
+  return A.index_select(0, ids.to(torch::kLong).contiguous());
+}
+
+int64_t CANDY::HDF5DataLoader::getDimension() {
+  if (fileReader != nullptr) {
+    return fileReader->getDimension();
+  }
+  return AbstractDataLoader::getDimension();
+}
+
+int64_t CANDY::HDF5DataLoader::size() {
+  if (fileReader != nullptr) {
+    return fileReader->size();
+  }
+  return AbstractDataLoader::size();
+}
+
+void CANDY::HDF5DataLoader::resetStream(int64_t startPos) {
+  if (fileReader != nullptr) {
+    fileReader->resetStream(startPos);
+    return;
+  }
+  AbstractDataLoader::resetStream(startPos);
+}
+
+torch::Tensor CANDY::HDF5DataLoader::nextChunk(int64_t rows) {
+  if (fileReader != nullptr) {
+    return fileReader->nextChunk(rows);
+  }
+  return AbstractDataLoader::nextChunk(rows);
+}
+
+bool CANDY::HDF5DataLoader::hasNextChunk() {
+  if (fileReader != nullptr) {
+    return fileReader->hasNextChunk();
+  }
+  return AbstractDataLoader::hasNextChunk();
+}
 
 torch::Tensor CANDY::HDF5DataLoader::getQuery() {
   return B;
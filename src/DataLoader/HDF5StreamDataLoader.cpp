@@ -0,0 +1,329 @@
+/*! \file HDF5StreamDataLoader.cpp*/
+
+#include <DataLoader/HDF5StreamDataLoader.h>
+#include <Utils/IntelliLog.h>
+#include <hdf5.h>
+#include <algorithm>
+#include <vector>
+
+/**
+ * @brief open a 2-D dataset and get its shape
+ * @return the dataset, <0 if it does not exist or is not 2-D
+ */
+static hid_t openDataset2D(hid_t fileId, const std::string &attr, int64_t &rows, int64_t &cols) {
+  if (H5Lexists(fileId, attr.c_str(), H5P_DEFAULT) <= 0) {
+    return -1;
+  }
+#if H5Dopen_vers == 2
+  hid_t dset = H5Dopen2(fileId, attr.c_str(), H5P_DEFAULT);
+#else
+  hid_t dset = H5Dopen(fileId, attr.c_str());
+#endif
+  if (dset < 0) {
+    return -1;
+  }
+  hid_t space = H5Dget_space(dset);
+  hsize_t dims[2] = {0, 0};
+  if (H5Sget_simple_extent_ndims(space) != 2) {
+    H5Sclose(space);
+    H5Dclose(dset);
+    return -1;
+  }
+  H5Sget_simple_extent_dims(space, dims, NULL);
+  H5Sclose(space);
+  rows = (int64_t) dims[0];
+  cols = (int64_t) dims[1];
+  return dset;
+}
+/**
+ * @brief read rows [startPos,startPos+rows) of a 2-D dataset by a hyperslab, converted by hdf5 into memType
+ */
+static bool readHyperslab(hid_t dset, hid_t memType, int64_t startPos, int64_t rows, int64_t cols, void *out) {
+  hid_t fileSpace = H5Dget_space(dset);
+  hsize_t offset[2] = {(hsize_t) startPos, 0};
+  hsize_t count[2] = {(hsize_t) rows, (hsize_t) cols};
+  H5Sselect_hyperslab(fileSpace, H5S_SELECT_SET, offset, NULL, count, NULL);
+  hid_t memSpace = H5Screate_simple(2, count, NULL);
+  herr_t status = H5Dread(dset, memType, memSpace, fileSpace, H5P_DEFAULT, out);
+  H5Sclose(memSpace);
+  H5Sclose(fileSpace);
+  return status >= 0;
+}
+
+/**
+ * @brief read a string attribute of the file root, either fixed or variable length
+ * @return the string, empty if it does not exist
+ */
+static std::string readRootStringAttr(hid_t fileId, const std::string &name) {
+  std::string ru;
+  if (H5Aexists(fileId, name.c_str()) <= 0) {
+    return ru;
+  }
+  hid_t attr = H5Aopen(fileId, name.c_str(), H5P_DEFAULT);
+  if (attr < 0) {
+    return ru;
+  }
+  hid_t fileType = H5Aget_type(attr);
+  if (H5Tget_class(fileType) == H5T_STRING) {
+    hid_t memType = H5Tcopy(H5T_C_S1);
+    if (H5Tis_variable_str(fileType) > 0) {
+      H5Tset_size(memType, H5T_VARIABLE);
+      H5Tset_cset(memType, H5Tget_cset(fileType));
+      char *buf = nullptr;
+      if (H5Aread(attr, memType, &buf) >= 0 && buf != nullptr) {
+        ru = buf;
+        H5free_memory(buf);
+      }
+    } else {
+      size_t len = H5Tget_size(fileType);
+      H5Tset_size(memType, len);
+      std::vector<char> buf(len + 1, 0);
+      if (H5Aread(attr, memType, buf.data()) >= 0) {
+        ru = std::string(buf.data());
+      }
+    }
+    H5Tclose(memType);
+  }
+  H5Tclose(fileType);
+  H5Aclose(attr);
+  return ru;
+}
+/**
+ * @brief whether the distance the file was built with is the metric of this run
+ * @param distance the distance attribute, e.g., euclidean or angular in ann-benchmarks
+ * @param metricType the metric of the run, the names of @ref AbstractIndex
+ */
+static bool distanceMatchesMetric(const std::string &distance, const std::string &metricType) {
+  if (distance == "euclidean" || distance == "l2") {
+    return metricType == "L2";
+  }
+  if (distance == "angular" || distance == "cosine") {
+    return metricType == "cossim";
+  }
+  if (distance == "ip" || distance == "dot" || distance == "inner_product") {
+    return metricType == "IP" || metricType == "dot";
+  }
+  return false;
+}
+
+void CANDY::HDF5StreamDataLoader::close() {
+  dropPending();
+  if (dataId >= 0) {
+    H5Dclose((hid_t) dataId);
+    dataId = -1;
+  }
+  if (fileId >= 0) {
+    H5Fclose((hid_t) fileId);
+    fileId = -1;
+  }
+}
+
+void CANDY::HDF5StreamDataLoader::dropPending() {
+  if (pending.valid()) {
+    pending.wait();
+    pending = std::future<torch::Tensor>();
+  }
+  pendingStart = -1;
+  pendingEnd = -1;
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::readRows(int64_t startPos, int64_t endPos) {
+  auto ru = torch::empty({endPos - startPos, vecDim});
+  if (endPos > startPos && !readHyperslab((hid_t) dataId, H5T_NATIVE_FLOAT, startPos, endPos - startPos, vecDim,
+                                          ru.data_ptr<float>())) {
+    INTELLI_ERROR("invalid reading " + dataAttr + " at rows " + std::to_string(startPos));
+    ru.zero_();
+  }
+  if (normalizeTensor) {
+    ru.div_(columnNorms);
+  }
+  return ru;
+}
+
+void CANDY::HDF5StreamDataLoader::computeColumnNorms() {
+  const int64_t blockRows = 65536;
+  auto sq = torch::zeros({1, vecDim}, torch::kFloat64);
+  int64_t keep = normalizeTensor;
+  normalizeTensor = 0;
+  for (int64_t b = 0; b < vecVolume; b += blockRows) {
+    sq += readRows(b, std::min(b + blockRows, vecVolume)).to(torch::kFloat64).pow(2).sum(0, true);
+  }
+  normalizeTensor = keep;
+  columnNorms = sq.sqrt().to(torch::kFloat32);
+}
+
+bool CANDY::HDF5StreamDataLoader::generateQuery() {
+  if (!useSeparateQuery) {
+    auto indices = torch::randint(vecVolume, {querySize}, torch::kLong);
+    B = getDataByIds(indices);
+    B = (1 - queryNoiseFraction) * B + queryNoiseFraction * torch::rand({querySize, vecDim});
+    return true;
+  }
+  int64_t rows = 0, cols = 0;
+  hid_t qId = openDataset2D((hid_t) fileId, queryAttr, rows, cols);
+  if (qId < 0) {
+    INTELLI_ERROR("invalid hdf5 attribute " + queryAttr);
+    return false;
+  }
+  if (cols != vecDim) {
+    INTELLI_ERROR("conflict dimension in " + queryAttr);
+    H5Dclose(qId);
+    return false;
+  }
+  if (querySize <= 0 || querySize > rows) {
+    querySize = rows;
+  }
+  B = torch::empty({querySize, vecDim});
+  bool ok = readHyperslab(qId, H5T_NATIVE_FLOAT, 0, querySize, vecDim, B.data_ptr<float>());
+  H5Dclose(qId);
+  if (!ok) {
+    INTELLI_ERROR("invalid reading " + queryAttr);
+    return false;
+  }
+  if (normalizeTensor) {
+    B = INTELLI::IntelliTensorOP::l2Normalize(B);
+  }
+  return true;
+}
+
+bool CANDY::HDF5StreamDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
+  assert(cfg);
+  close();
+  vecDim = cfg->tryI64("vecDim", 512, true);
+  vecVolume = cfg->tryI64("vecVolume", 10000, true);
+  querySize = cfg->tryI64("querySize", 10, true);
+  seed = cfg->tryI64("seed", 7758258, true);
+  queryNoiseFraction = cfg->tryDouble("queryNoiseFraction", 0, true);
+  normalizeTensor = cfg->tryI64("normalizeTensor", 0, true);
+  useSeparateQuery = cfg->tryI64("useSeparateQuery", 1, true);
+  prefetchChunks = cfg->tryI64("prefetchChunks", 1, true);
+  auto dataPath = cfg->tryString("dataPath", "datasets/hdf5/sun/sun.hdf5", true);
+  dataAttr = cfg->tryString("dataAttr", "train", true);
+  queryAttr = cfg->tryString("queryAttr", "test", true);
+  neighborsAttr = cfg->tryString("neighborsAttr", "neighbors", true);
+  metricType = cfg->tryString("metricType", "IP", true);
+  if (queryNoiseFraction < 0) {
+    queryNoiseFraction = 0;
+  }
+  if (queryNoiseFraction > 1) {
+    queryNoiseFraction = 1;
+  }
+  fileId = H5Fopen(dataPath.c_str(), H5F_ACC_RDONLY, H5P_DEFAULT);
+  if (fileId < 0) {
+    INTELLI_ERROR("invalid hdf5 file " + dataPath);
+    return false;
+  }
+  int64_t cols = 0;
+  dataId = openDataset2D((hid_t) fileId, dataAttr, fileRows, cols);
+  if (dataId < 0) {
+    INTELLI_ERROR("invalid hdf5 attribute " + dataAttr);
+    return false;
+  }
+  if (cols != vecDim) {
+    INTELLI_ERROR("conflict dimension in " + dataPath);
+    return false;
+  }
+  if (vecVolume <= 0 || vecVolume > fileRows) {
+    vecVolume = fileRows;
+  }
+  if (querySize > vecVolume && !useSeparateQuery) {
+    INTELLI_ERROR("invalid size of query");
+    return false;
+  }
+  torch::manual_seed(seed);
+  if (normalizeTensor) {
+    computeColumnNorms();
+  }
+  if (generateQuery() == false) {
+    return false;
+  }
+  neighborsValid = useSeparateQuery && !normalizeTensor && vecVolume == fileRows;
+  if (neighborsValid) {
+    auto distance = readRootStringAttr((hid_t) fileId, "distance");
+    neighborsValid = distanceMatchesMetric(distance, metricType);
+    if (!neighborsValid) {
+      INTELLI_WARNING("stored " + neighborsAttr + " is built with distance '" + distance + "', not " + metricType
+                          + ", ground truth will be computed");
+    }
+  }
+  resetStream(0);
+  INTELLI_INFO(
+      "Streaming [" + std::to_string(vecVolume) + "x" + std::to_string(vecDim) + "]" + ", query size "
+          + std::to_string(B.size(0)));
+  return true;
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  dropPending();
+  startPos = std::clamp(startPos, (int64_t) 0, vecVolume);
+  endPos = std::clamp(endPos, startPos, vecVolume);
+  return readRows(startPos, endPos);
+}
+
+void CANDY::HDF5StreamDataLoader::resetStream(int64_t startPos) {
+  dropPending();
+  AbstractDataLoader::resetStream(startPos);
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::nextChunk(int64_t rows) {
+  int64_t endPos = std::min(streamCursor + std::max(rows, (int64_t) 0), vecVolume);
+  if (endPos <= streamCursor) {
+    return torch::empty({0, vecDim});
+  }
+  torch::Tensor ru;
+  if (pending.valid() && pendingStart == streamCursor && pendingEnd == endPos) {
+    ru = pending.get();
+    pendingStart = -1;
+    pendingEnd = -1;
+  } else {
+    ru = getDataAt(streamCursor, endPos);
+  }
+  streamCursor = endPos;
+  if (prefetchChunks && streamCursor < vecVolume) {
+    pendingStart = streamCursor;
+    pendingEnd = std::min(streamCursor + rows, vecVolume);
+    int64_t s = pendingStart, e = pendingEnd;
+    pending = std::async(std::launch::async, [this, s, e]() { return readRows(s, e); });
+  }
+  return ru;
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::getData() {
+  return getDataAt(0, vecVolume);
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::getQuery() {
+  return B;
+}
+
+int64_t CANDY::HDF5StreamDataLoader::getDimension() {
+  return vecDim;
+}
+
+int64_t CANDY::HDF5StreamDataLoader::size() {
+  return vecVolume;
+}
+
+torch::Tensor CANDY::HDF5StreamDataLoader::getNeighbors(int64_t k) {
+  if (!neighborsValid || fileId < 0) {
+    return torch::Tensor();
+  }
+  dropPending();
+  int64_t rows = 0, cols = 0;
+  hid_t nId = openDataset2D((hid_t) fileId, neighborsAttr, rows, cols);
+  if (nId < 0) {
+    return torch::Tensor();
+  }
+  if (rows < B.size(0) || cols < k) {
+    INTELLI_WARNING("stored " + neighborsAttr + " is too small, ground truth will be computed");
+    H5Dclose(nId);
+    return torch::Tensor();
+  }
+  auto all = torch::empty({B.size(0), cols}, torch::kInt64);
+  bool ok = readHyperslab(nId, H5T_NATIVE_INT64, 0, B.size(0), cols, all.data_ptr<int64_t>());
+  H5Dclose(nId);
+  if (!ok) {
+    return torch::Tensor();
+  }
+  return all.slice(1, 0, k).contiguous();
+}
@@ -0,0 +1,217 @@
+/*! \file MMapVECSDataLoader.cpp*/
+
+#include <DataLoader/MMapVECSDataLoader.h>
+#include <Utils/IntelliLog.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <algorithm>
+#include <cstring>
+
+std::string CANDY::MMapVECSFile::formatOf(const std::string &fname) {
+  auto endsWith = [&fname](const std::string &ext) {
+    return fname.size() >= ext.size() && fname.compare(fname.size() - ext.size(), ext.size(), ext) == 0;
+  };
+  if (endsWith(".bvecs")) {
+    return "bvecs";
+  }
+  if (endsWith(".ivecs")) {
+    return "ivecs";
+  }
+  return "fvecs";
+}
+
+bool CANDY::MMapVECSFile::open(const std::string &fname, const std::string &format, bool isSigned) {
+  close();
+  std::string fmt = (format == "auto") ? formatOf(fname) : format;
+  if (fmt == "bvecs") {
+    elemBytes = 1;
+    dtype = isSigned ? torch::kInt8 : torch::kUInt8;
+  } else if (fmt == "ivecs") {
+    elemBytes = 4;
+    dtype = torch::kInt32;
+  } else {
+    elemBytes = 4;
+    dtype = torch::kFloat32;
+  }
+  fd = ::open(fname.c_str(), O_RDONLY);
+  if (fd < 0) {
+    INTELLI_ERROR("Double check your data path: " + fname);
+    return false;
+  }
+  struct stat st;
+  if (fstat(fd, &st) != 0 || st.st_size < 4) {
+    INTELLI_ERROR("empty or unreadable file: " + fname);
+    close();
+    return false;
+  }
+  bytes = (size_t) st.st_size;
+  void *addr = mmap(nullptr, bytes, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+  if (addr == MAP_FAILED) {
+    INTELLI_ERROR("failed to map " + fname);
+    bytes = 0;
+    close();
+    return false;
+  }
+  base = (uint8_t *) addr;
+  madvise(base, bytes, MADV_SEQUENTIAL);
+  int32_t d;
+  std::memcpy(&d, base, 4);
+  dim = d;
+  rowBytes = 4 + dim * elemBytes;
+  if (dim <= 0 || bytes % rowBytes != 0) {
+    INTELLI_ERROR("not a valid " + fmt + " file: " + fname);
+    close();
+    return false;
+  }
+  rows = (int64_t) (bytes / rowBytes);
+  std::memcpy(&d, base + (rows - 1) * rowBytes, 4);
+  if (d != dim) {
+    INTELLI_ERROR("conflict dimension in the last row of " + fname);
+    close();
+    return false;
+  }
+  return true;
+}
+
+void CANDY::MMapVECSFile::close() {
+  if (base != nullptr) {
+    munmap(base, bytes);
+    base = nullptr;
+  }
+  if (fd >= 0) {
+    ::close(fd);
+    fd = -1;
+  }
+  bytes = 0;
+  rows = 0;
+}
+
+torch::Tensor CANDY::MMapVECSFile::rawView(int64_t startPos, int64_t endPos) {
+  startPos = std::clamp(startPos, (int64_t) 0, rows);
+  endPos = std::clamp(endPos, startPos, rows);
+  if (endPos == startPos) {
+    return torch::empty({0, dim}, torch::TensorOptions().dtype(dtype));
+  }
+  auto keep = shared_from_this();
+  return torch::from_blob(base + startPos * rowBytes + 4,
+                          {endPos - startPos, dim},
+                          {rowBytes / elemBytes, 1},
+                          [keep](void *) {},
+                          torch::TensorOptions().dtype(dtype));
+}
+
+void CANDY::MMapVECSDataLoader::computeColumnNorms() {
+  const int64_t blockRows = 65536;
+  auto sq = torch::zeros({1, vecDim}, torch::kFloat64);
+  for (int64_t b = 0; b < vecVolume; b += blockRows) {
+    auto block = dataFile->rawView(b, std::min(b + blockRows, vecVolume)).to(torch::kFloat64);
+    sq += block.pow(2).sum(0, true);
+  }
+  columnNorms = sq.sqrt().to(torch::kFloat32);
+}
+
+bool CANDY::MMapVECSDataLoader::generateQuery(std::string fname, bool isSigned) {
+  if (!useSeparateQuery) {
+    auto indices = torch::randperm(vecVolume, torch::kLong).slice(0, 0, querySize);
+    B = dataFile->rawView(0, vecVolume).index_select(0, indices).to(torch::kFloat32);
+    if (normalizeTensor) {
+      B = B / columnNorms;
+    }
+    B = (1 - queryNoiseFraction) * B + queryNoiseFraction * torch::rand({querySize, vecDim});
+    return true;
+  }
+  auto queryFile = newMMapVECSFile();
+  std::string fmt = (vecsFormat == "auto") ? MMapVECSFile::formatOf(fname) : vecsFormat;
+  if (!queryFile->open(fname, fmt, isSigned)) {
+    return false;
+  }
+  if (queryFile->getDimension() != vecDim) {
+    INTELLI_ERROR("conflict dimension in" + fname);
+    return false;
+  }
+  auto queryTensor = queryFile->rawView(0, queryFile->size()).to(torch::kFloat32).contiguous();
+  if (normalizeTensor) {
+    queryTensor = INTELLI::IntelliTensorOP::l2Normalize(queryTensor);
+  }
+  B = INTELLI::IntelliTensorOP::rowSampling(queryTensor, querySize);
+  return true;
+}
+
+bool CANDY::MMapVECSDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
+  assert(cfg);
+  vecDim = cfg->tryI64("vecDim", 128, true);
+  vecVolume = cfg->tryI64("vecVolume", 10000, true);
+  querySize = cfg->tryI64("querySize", 10, true);
+  seed = cfg->tryI64("seed", 7758258, true);
+  queryNoiseFraction = cfg->tryDouble("queryNoiseFraction", 0, true);
+  normalizeTensor = cfg->tryI64("normalizeTensor", 1, true);
+  auto queryPath = cfg->tryString("queryPath", "datasets/fvecs/sift10K/siftsmall_query.fvecs", true);
+  auto dataPath = cfg->tryString("dataPath", "datasets/fvecs/sift10K/siftsmall_base.fvecs", true);
+  vecsFormat = cfg->tryString("vecsFormat", "auto", true);
+  bool isSigned = cfg->tryI64("bvecsSigned", 0, true) != 0;
+  useSeparateQuery = cfg->tryI64("useSeparateQuery", 1, true);
+  if (queryNoiseFraction < 0) {
+    queryNoiseFraction = 0;
+  }
+  if (queryNoiseFraction > 1) {
+    queryNoiseFraction = 1;
+  }
+  dataFile = newMMapVECSFile();
+  if (!dataFile->open(dataPath, vecsFormat, isSigned)) {
+    return false;
+  }
+  if (dataFile->getDimension() != vecDim) {
+    INTELLI_ERROR("conflict dimension in" + dataPath);
+    return false;
+  }
+  if (vecVolume <= 0 || vecVolume > dataFile->size()) {
+    vecVolume = dataFile->size();
+  }
+  if (querySize > vecVolume && !useSeparateQuery) {
+    INTELLI_ERROR("invalid size of query");
+    return false;
+  }
+  torch::manual_seed(seed);
+  if (normalizeTensor) {
+    computeColumnNorms();
+  }
+  if (generateQuery(queryPath, isSigned) == false) {
+    return false;
+  }
+  INTELLI_INFO(
+      "Mapping [" + std::to_string(vecVolume) + "x" + std::to_string(vecDim) + "]" + ", query size "
+          + std::to_string(B.size(0)));
+  return true;
+}
+
+torch::Tensor CANDY::MMapVECSDataLoader::getRawDataAt(int64_t startPos, int64_t endPos) {
+  startPos = std::clamp(startPos, (int64_t) 0, vecVolume);
+  endPos = std::clamp(endPos, startPos, vecVolume);
+  return dataFile->rawView(startPos, endPos);
+}
+
+torch::Tensor CANDY::MMapVECSDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  auto ru = getRawDataAt(startPos, endPos).to(torch::kFloat32).contiguous();
+  if (normalizeTensor) {
+    ru.div_(columnNorms);
+  }
+  return ru;
+}
+
+torch::Tensor CANDY::MMapVECSDataLoader::getData() {
+  return getDataAt(0, vecVolume);
+}
+
+torch::Tensor CANDY::MMapVECSDataLoader::getQuery() {
+  return B;
+}
+
+int64_t CANDY::MMapVECSDataLoader::getDimension() {
+  return vecDim;
+}
+
+int64_t CANDY::MMapVECSDataLoader::size() {
+  return vecVolume;
+}
@@ -3,6 +3,8 @@
 //
 
 #include <DataLoader/RandomDataLoader.h>
+#include <ATen/CPUGeneratorImpl.h>
+#include <algorithm>
 
 //do nothing in Random class
 
@@ -15,6 +17,7 @@ bool CANDY::RandomDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   driftPosition = cfg->tryI64("driftPosition", 0, true);
   driftOffset = cfg->tryDouble("driftOffset", 0.5, true);
   queryNoiseFraction = cfg->tryDouble("queryNoiseFraction", 0, true);
+  generateOnTheFly = cfg->tryI64("generateOnTheFly", 0, true);
   if (queryNoiseFraction < 0) {
     queryNoiseFraction = 0;
   }
@@ -28,6 +31,13 @@ bool CANDY::RandomDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   INTELLI_INFO(
       "Generating [" + to_string(vecVolume) + "x" + to_string(vecDim) + "]" + ", query size " + to_string(querySize));
   torch::manual_seed(seed);
+  if (generateOnTheFly) {
+    A = torch::Tensor();
+    auto indices = torch::randint(vecVolume, {querySize}, torch::kLong);
+    B = getDataByIds(indices);
+    B = (1 - queryNoiseFraction) * B + queryNoiseFraction * torch::rand({querySize, vecDim});
+    return true;
+  }
   A = torch::rand({vecVolume, vecDim});
   if (driftPosition > 0 && driftPosition < vecVolume) {
     INTELLI_INFO(
@@ -43,10 +53,47 @@ bool CANDY::RandomDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   return true;
 }
 
+torch::Tensor CANDY::RandomDataLoader::generateBlock(int64_t blockIdx) {
+  int64_t startPos = blockIdx * blockRows;
+  int64_t endPos = std::min(startPos + blockRows, vecVolume);
+  auto gen = at::make_generator<at::CPUGeneratorImpl>((uint64_t) seed * 1000003ULL + (uint64_t) blockIdx);
+  auto ru = torch::rand({endPos - startPos, vecDim}, gen);
+  if (driftPosition > 0 && driftPosition < endPos) {
+    int64_t driftStart = std::max(driftPosition, startPos) - startPos;
+    ru.slice(0, driftStart, ru.size(0)).mul_(1.0 - driftOffset);
+  }
+  return ru;
+}
+
+torch::Tensor CANDY::RandomDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  if (!generateOnTheFly) {
+    return AbstractDataLoader::getDataAt(startPos, endPos);
+  }
+  return blockRowsAt(startPos, endPos, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
+torch::Tensor CANDY::RandomDataLoader::getDataByIds(torch::Tensor ids) {
+  if (!generateOnTheFly) {
+    return A.index_select(0, ids.to(torch::kLong).contiguous());
+  }
+  return blockRowsByIds(ids, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
 torch::Tensor CANDY::RandomDataLoader::getData() {
+  if (generateOnTheFly) {
+    return getDataAt(0, vecVolume);
+  }
   return A;
 }
 
+int64_t CANDY::RandomDataLoader::getDimension() {
+  return vecDim;
+}
+
+int64_t CANDY::RandomDataLoader::size() {
+  return vecVolume;
+}
+
 torch::Tensor CANDY::RandomDataLoader::getQuery() {
   return B;
 }
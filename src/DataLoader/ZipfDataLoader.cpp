@@ -3,6 +3,9 @@
 //
 
 #include <DataLoader/ZipfDataLoader.h>
+#include <ATen/CPUGeneratorImpl.h>
+#include <algorithm>
+#include <cmath>
 
 //do nothing in Zipf class
 torch::Tensor CANDY::ZipfDataLoader::generateZipfDistribution(int64_t n, int64_t m, double alpha) {
@@ -25,6 +28,33 @@ torch::Tensor CANDY::ZipfDataLoader::generateZipfDistribution(int64_t n, int64_t
   // Reshape the 1D tensor to an nxm tensor
   return ru;
 }
+torch::Tensor CANDY::ZipfDataLoader::zipfFromUniform(torch::Tensor values, double alpha, double minU) {
+  if (alpha == 0) {
+    return values;
+  }
+  /**
+   * @brief 1/u^(1/alpha) decreases with u, so the maximum of a range comes from its smallest draw
+   */
+  values.pow_(-1.0 / alpha).mul_(std::pow(minU, 1.0 / alpha));
+  return values;
+}
+torch::Tensor CANDY::ZipfDataLoader::uniformBlock(int64_t blockIdx) {
+  int64_t startPos = blockIdx * blockRows;
+  int64_t endPos = std::min(startPos + blockRows, vecVolume);
+  auto gen = at::make_generator<at::CPUGeneratorImpl>((uint64_t) seed * 1000003ULL + (uint64_t) blockIdx);
+  return torch::rand({endPos - startPos, vecDim}, gen);
+}
+torch::Tensor CANDY::ZipfDataLoader::generateBlock(int64_t blockIdx) {
+  int64_t startPos = blockIdx * blockRows;
+  auto ru = uniformBlock(blockIdx);
+  int64_t driftStart = ru.size(0);
+  if (driftPosition > 0 && driftPosition < vecVolume) {
+    driftStart = std::clamp(driftPosition - startPos, (int64_t) 0, (int64_t) ru.size(0));
+  }
+  zipfFromUniform(ru.slice(0, 0, driftStart), zipfAlpha, minUniform[0]);
+  zipfFromUniform(ru.slice(0, driftStart, ru.size(0)), zipfAlpha + driftOffset, minUniform[1]);
+  return ru;
+}
 bool CANDY::ZipfDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   assert(cfg);
   vecDim = cfg->tryI64("vecDim", 768, true);
@@ -35,6 +65,7 @@ bool CANDY::ZipfDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   driftOffset = cfg->tryDouble("driftOffset", 0.5, true);
   queryNoiseFraction = cfg->tryDouble("queryNoiseFraction", 0, true);
   zipfAlpha = cfg->tryDouble("zipfAlpha", 0.0, false);
+  generateOnTheFly = cfg->tryI64("generateOnTheFly", 0, true);
   if (queryNoiseFraction < 0) {
     queryNoiseFraction = 0;
   }
@@ -48,6 +79,26 @@ bool CANDY::ZipfDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   INTELLI_INFO(
       "Generating [" + to_string(vecVolume) + "x" + to_string(vecDim) + "]" + ", query size " + to_string(querySize));
   torch::manual_seed(seed);
+  if (generateOnTheFly) {
+    A = torch::Tensor();
+    int64_t driftStart = (driftPosition > 0 && driftPosition < vecVolume) ? driftPosition : vecVolume;
+    minUniform[0] = 1.0;
+    minUniform[1] = 1.0;
+    for (int64_t b = 0; b * blockRows < vecVolume; b++) {
+      auto u = uniformBlock(b);
+      int64_t split = std::clamp(driftStart - b * blockRows, (int64_t) 0, (int64_t) u.size(0));
+      if (split > 0) {
+        minUniform[0] = std::min(minUniform[0], u.slice(0, 0, split).min().item<double>());
+      }
+      if (split < u.size(0)) {
+        minUniform[1] = std::min(minUniform[1], u.slice(0, split, u.size(0)).min().item<double>());
+      }
+    }
+    auto indices = torch::randint(vecVolume, {querySize}, torch::kLong);
+    B = getDataByIds(indices);
+    B = (1 - queryNoiseFraction) * B + queryNoiseFraction * torch::rand({querySize, vecDim});
+    return true;
+  }
   A = generateZipfDistribution((int64_t) vecVolume, (int64_t) vecDim, zipfAlpha);
   if (driftPosition > 0 && driftPosition < vecVolume) {
     INTELLI_INFO(
@@ -64,10 +115,35 @@ bool CANDY::ZipfDataLoader::setConfig(INTELLI::ConfigMapPtr cfg) {
   return true;
 }
 
+torch::Tensor CANDY::ZipfDataLoader::getDataAt(int64_t startPos, int64_t endPos) {
+  if (!generateOnTheFly) {
+    return AbstractDataLoader::getDataAt(startPos, endPos);
+  }
+  return blockRowsAt(startPos, endPos, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
+torch::Tensor CANDY::ZipfDataLoader::getDataByIds(torch::Tensor ids) {
+  if (!generateOnTheFly) {
+    return A.index_select(0, ids.to(torch::kLong).contiguous());
+  }
+  return blockRowsByIds(ids, blockRows, [this](int64_t b) { return generateBlock(b); });
+}
+
 torch::Tensor CANDY::ZipfDataLoader::getData() {
+  if (generateOnTheFly) {
+    return getDataAt(0, vecVolume);
+  }
   return A;
 }
 
+int64_t CANDY::ZipfDataLoader::getDimension() {
+  return vecDim;
+}
+
+int64_t CANDY::ZipfDataLoader::size() {
+  return vecVolume;
+}
+
 torch::Tensor CANDY::ZipfDataLoader::getQuery() {
   return B;
 }
@@ -7,6 +7,7 @@
 #include <pybind11/numpy.h>
 #include <torch/extension.h>
 #include <torch/torch.h>
+#include <ATen/DLConvertor.h>
 #include <Utils/ConfigMap.hpp>
 #include <Utils/IntelliLog.h>
 #include <Utils/SPSCQueue.hpp>
@@ -14,6 +15,7 @@
 
 
 #include <CANDY/IndexTable.h>
+#include <DataLoader/DataLoaderTable.h>
 #include <include/papi_config.h>
 #if CANDY_PAPI == 1
 #include <Utils/ThreadPerfPAPI.hpp>
@@ -28,11 +30,30 @@
 
 
 #include<puck/pyapi_wrapper/py_api_wrapper.h>
+#include <Utils/UtilityFunctions.h>
+#include <Utils/IntelliTimeStampBuffer.h>
 
 namespace py = pybind11;
 using namespace INTELLI;
 using namespace pybind11::literals;
 using namespace CANDY;
+/**
+ * @brief view one column of a time stamp buffer as a 1-D uint64 numpy array, keeping the buffer alive
+ * @note the view is invalid after the buffer is resized
+ */
+static py::array_t<uint64_t> timeStampColumn(py::object self, std::vector<uint64_t> IntelliTimeStampBuffer::*col) {
+  auto &buf = self.cast<IntelliTimeStampBuffer &>();
+  auto &v = buf.*col;
+  return py::array_t<uint64_t>({(py::ssize_t) v.size()}, {(py::ssize_t) sizeof(uint64_t)}, v.data(), self);
+}
+/**
+ * @brief generate the time stamps of a stream, see @ref IntelliTimeStampGenerator for the config
+ */
+static IntelliTimeStampBufferPtr generateTimeStamps(INTELLI::ConfigMapPtr cfg) {
+  IntelliTimeStampGenerator gen;
+  gen.setConfig(cfg);
+  return gen.getTimeStampBuffer();
+}
 torch::Tensor add_tensors(torch::Tensor a, torch::Tensor b) {
   return a + b;
 }
@@ -109,44 +130,56 @@ AbstractIndexPtr createIndex(std::string nameTag, int64_t dim) {
     return ru;
 }
 
-//AbstractDataLoaderPtr creatDataLoader(std::string nameTag) {
-//  DataLoaderTable dt;
-//  auto ru = dt.findDataLoader(nameTag);
-//  if (ru == nullptr) {
-//    INTELLI_ERROR("No index named " + nameTag + ", return flat");
-//    nameTag = "random";
-//    return dt.findDataLoader(nameTag);
-//  }
-//  return ru;
-//}
-static bool existRow(torch::Tensor base, torch::Tensor row) {
-  for (int64_t i = 0; i < base.size(0); i++) {
-    auto tensor1 = base[i].contiguous();
-    auto tensor2 = row.contiguous();
-    //std::cout<<"base: "<<tensor1<<std::endl;
-    //std::cout<<"query: "<<tensor2<<std::endl;
-    if (torch::equal(tensor1, tensor2)) {
-      return true;
-    }
+AbstractDataLoaderPtr createDataLoader(std::string nameTag) {
+  DataLoaderTable dt;
+  auto ru = dt.findDataLoader(nameTag);
+  if (ru == nullptr) {
+    INTELLI_ERROR("No data loader named " + nameTag + ", return random");
+    nameTag = "random";
+    return dt.findDataLoader(nameTag);
   }
-  return false;
+  return ru;
 }
-double recallOfTensorList(std::vector<torch::Tensor> groundTruth, std::vector<torch::Tensor> prob) {
-  int64_t truePositives = 0;
-  int64_t falseNegatives = 0;
-  for (size_t i = 0; i < prob.size(); i++) {
-    auto gdI = groundTruth[i];
-    auto probI = prob[i];
-    for (int64_t j = 0; j < probI.size(0); j++) {
-      if (existRow(gdI, probI[j])) {
-        truePositives++;
-      } else {
-        falseNegatives++;
-      }
-    }
+/**
+ * @brief wrap a c-contiguous float32 numpy array as a 2-D tensor, without copying
+ * @param arr the numpy array, 1-D is treated as a single row
+ * @note the tensor borrows the buffer of arr, so it is only valid while arr is alive
+ * @note forcecast only copies when the input is not already c-contiguous float32
+ * @return the tensor view
+ */
+static torch::Tensor numpyToTensor(const py::array_t<float, py::array::c_style | py::array::forcecast> &arr) {
+  py::buffer_info buf = arr.request();
+  if (buf.ndim != 1 && buf.ndim != 2) {
+    throw std::invalid_argument("expect a 1-D or 2-D array, got ndim=" + std::to_string(buf.ndim));
+  }
+  int64_t rows = (buf.ndim == 1) ? 1 : buf.shape[0];
+  int64_t cols = (buf.ndim == 1) ? buf.shape[0] : buf.shape[1];
+  return torch::from_blob(buf.ptr, {rows, cols}, torch::kFloat32);
+}
+/**
+ * @brief consume a DLPack capsule and view it as a 2-D float32 tensor
+ * @param cap the capsule produced by __dlpack__() or torch.utils.dlpack.to_dlpack
+ * @note the capsule is renamed to used_dltensor as required by the DLPack protocol
+ * @note no copy is made if the producer already holds c-contiguous float32 on cpu
+ * @return the tensor
+ */
+static torch::Tensor dlpackToTensor(const py::capsule &cap) {
+  if (std::strcmp(cap.name(), "dltensor") != 0) {
+    throw std::invalid_argument("expect an unconsumed DLPack capsule named dltensor");
+  }
+  auto *dlm = cap.get_pointer<DLManagedTensor>();
+  torch::Tensor t = at::fromDLPack(dlm);
+  PyCapsule_SetName(cap.ptr(), "used_dltensor");
+  if (t.dim() == 1) {
+    t = t.view({1, t.size(0)});
+  }
+  if (t.dim() != 2) {
+    throw std::invalid_argument("expect a 1-D or 2-D DLPack tensor, got ndim=" + std::to_string(t.dim()));
   }
-  double recall = static_cast<double>(truePositives) / (truePositives + falseNegatives);
-  return recall;
+  return t.to(torch::kCPU, torch::kFloat32).contiguous();
+}
+double recallOfTensorList(std::vector<torch::Tensor> groundTruth, std::vector<torch::Tensor> prob) {
+  return INTELLI::UtilityFunctions::calculateRecall(groundTruth, prob);
 }
 
 
@@ -313,47 +346,161 @@ PYBIND11_MODULE(PyCANDYAlgo, m) {
   /***
    * @brief abstract index
    */
+  py::enum_<IndexThreadSafety>(m, "IndexThreadSafety")
+      .value("THREAD_UNSAFE", IndexThreadSafety::THREAD_UNSAFE)
+      .value("THREAD_SAFE_READ", IndexThreadSafety::THREAD_SAFE_READ)
+      .value("THREAD_SAFE_FULL", IndexThreadSafety::THREAD_SAFE_FULL)
+      .export_values();
   py::class_<AbstractIndex, std::shared_ptr<AbstractIndex>>(m, "AbstractIndex")
       .def(py::init<>())
       .def("setTier", &AbstractIndex::setTier)
       .def("reset", &AbstractIndex::reset, py::call_guard<py::gil_scoped_release>())
       .def("setConfigClass", &AbstractIndex::setConfigClass, py::call_guard<py::gil_scoped_release>())
       .def("setConfig", &AbstractIndex::setConfig, py::call_guard<py::gil_scoped_release>())
-      .def("startHPC", &AbstractIndex::startHPC)
-      .def("insertTensor", &AbstractIndex::insertTensor)
-      .def("insertTensorWithIds", &AbstractIndex::insertTensorWithIds)
-      .def("loadInitialTensor", &AbstractIndex::loadInitialTensor)
-      .def("loadInitialTensorWithIds", &AbstractIndex::loadInitialTensorWithIds)
-      .def("deleteTensor", &AbstractIndex::deleteTensor)
-      .def("deleteIndex", &AbstractIndex::deleteIndex)
-      .def("reviseTensor", &AbstractIndex::reviseTensor)
-      .def("searchIndex", &AbstractIndex::searchIndex)
-      .def("searchIndexParam", &AbstractIndex::searchIndexParam)
-      .def("rawData", &AbstractIndex::rawData)
-      .def("ccInsertAndSearchTensor", &AbstractIndex::ccInsertAndSearchTensor)
-      .def("searchTensor", &AbstractIndex::searchTensor)
-      .def("endHPC", &AbstractIndex::endHPC)
+      .def("startHPC", &AbstractIndex::startHPC, py::call_guard<py::gil_scoped_release>())
+      .def("insertTensor", &AbstractIndex::insertTensor, py::call_guard<py::gil_scoped_release>())
+      .def("insertTensorWithIds", &AbstractIndex::insertTensorWithIds, py::call_guard<py::gil_scoped_release>())
+      .def("loadInitialTensor", &AbstractIndex::loadInitialTensor, py::call_guard<py::gil_scoped_release>())
+      .def("loadInitialTensorWithIds", &AbstractIndex::loadInitialTensorWithIds, py::call_guard<py::gil_scoped_release>())
+      .def("deleteTensor", &AbstractIndex::deleteTensor, py::call_guard<py::gil_scoped_release>())
+      .def("deleteIndex", &AbstractIndex::deleteIndex, py::call_guard<py::gil_scoped_release>())
+      .def("reviseTensor", &AbstractIndex::reviseTensor, py::call_guard<py::gil_scoped_release>())
+      .def("searchIndex", &AbstractIndex::searchIndex, py::call_guard<py::gil_scoped_release>())
+      .def("searchIndexParam", &AbstractIndex::searchIndexParam, py::call_guard<py::gil_scoped_release>())
+      .def("searchWithDistances", &AbstractIndex::searchWithDistances, py::call_guard<py::gil_scoped_release>())
+      .def("rawData", &AbstractIndex::rawData, py::call_guard<py::gil_scoped_release>())
+      .def("ccInsertAndSearchTensor", &AbstractIndex::ccInsertAndSearchTensor, py::call_guard<py::gil_scoped_release>())
+      .def("searchTensor", &AbstractIndex::searchTensor, py::call_guard<py::gil_scoped_release>())
+      .def("endHPC", &AbstractIndex::endHPC, py::call_guard<py::gil_scoped_release>())
       .def("setFrozenLevel", &AbstractIndex::setFrozenLevel)
-      .def("offlineBuild", &AbstractIndex::offlineBuild)
-      .def("waitPendingOperations", &AbstractIndex::waitPendingOperations)
-      .def("loadInitialStringObject", &AbstractIndex::loadInitialStringObject)
-      .def("loadInitialU64Object", &AbstractIndex::loadInitialU64Object)
-      .def("insertStringObject", &AbstractIndex::insertStringObject)
-      .def("insertU64Object", &AbstractIndex::insertU64Object)
-      .def("deleteStringObject", &AbstractIndex::deleteStringObject)
-      .def("deleteU64Object", &AbstractIndex::deleteU64Object)
-      .def("searchStringObject", &AbstractIndex::searchStringObject)
-      .def("searchU64Object", &AbstractIndex::searchU64Object)
-      .def("searchTensorAndStringObject", &AbstractIndex::searchTensorAndStringObject)
-      .def("loadInitialTensorAndQueryDistribution", &AbstractIndex::loadInitialTensorAndQueryDistribution)
+      .def("offlineBuild", &AbstractIndex::offlineBuild, py::call_guard<py::gil_scoped_release>())
+      .def("waitPendingOperations", &AbstractIndex::waitPendingOperations, py::call_guard<py::gil_scoped_release>())
+      .def("loadInitialStringObject", &AbstractIndex::loadInitialStringObject, py::call_guard<py::gil_scoped_release>())
+      .def("loadInitialU64Object", &AbstractIndex::loadInitialU64Object, py::call_guard<py::gil_scoped_release>())
+      .def("insertStringObject", &AbstractIndex::insertStringObject, py::call_guard<py::gil_scoped_release>())
+      .def("insertU64Object", &AbstractIndex::insertU64Object, py::call_guard<py::gil_scoped_release>())
+      .def("deleteStringObject", &AbstractIndex::deleteStringObject, py::call_guard<py::gil_scoped_release>())
+      .def("deleteU64Object", &AbstractIndex::deleteU64Object, py::call_guard<py::gil_scoped_release>())
+      .def("searchStringObject", &AbstractIndex::searchStringObject, py::call_guard<py::gil_scoped_release>())
+      .def("searchU64Object", &AbstractIndex::searchU64Object, py::call_guard<py::gil_scoped_release>())
+      .def("searchTensorAndStringObject", &AbstractIndex::searchTensorAndStringObject, py::call_guard<py::gil_scoped_release>())
+      .def("loadInitialTensorAndQueryDistribution", &AbstractIndex::loadInitialTensorAndQueryDistribution, py::call_guard<py::gil_scoped_release>())
       .def("resetIndexStatistics", &AbstractIndex::resetIndexStatistics)
-      .def("getIndexStatistics", &AbstractIndex::getIndexStatistics);
+      .def("getIndexStatistics", &AbstractIndex::getIndexStatistics)
+      .def("snapshot", &AbstractIndex::snapshot, py::call_guard<py::gil_scoped_release>())
+      .def("getThreadSafety", &AbstractIndex::getThreadSafety)
+      /**
+       * @brief zero-copy entries, accepting either a DLPack capsule or a c-contiguous float32 numpy array
+       * @note the capsule overloads are registered first, as forcecast would otherwise try to convert them
+       * @note the GIL is released only after the input is wrapped, the tensor view is dropped after it is re-acquired
+       */
+      .def("insert_numpy", [](AbstractIndex &self, const py::capsule &cap) {
+        auto t = dlpackToTensor(cap);
+        py::gil_scoped_release release;
+        return self.insertTensor(t);
+      })
+      .def("insert_numpy",
+           [](AbstractIndex &self, const py::array_t<float, py::array::c_style | py::array::forcecast> &arr) {
+             auto t = numpyToTensor(arr);
+             py::gil_scoped_release release;
+             return self.insertTensor(t);
+           })
+      .def("load_initial_numpy", [](AbstractIndex &self, const py::capsule &cap) {
+        auto t = dlpackToTensor(cap);
+        py::gil_scoped_release release;
+        return self.loadInitialTensor(t);
+      })
+      .def("load_initial_numpy",
+           [](AbstractIndex &self, const py::array_t<float, py::array::c_style | py::array::forcecast> &arr) {
+             auto t = numpyToTensor(arr);
+             py::gil_scoped_release release;
+             return self.loadInitialTensor(t);
+           })
+      .def("search_numpy", [](AbstractIndex &self, const py::capsule &cap, int64_t k) {
+        auto t = dlpackToTensor(cap);
+        py::gil_scoped_release release;
+        return self.searchTensor(t, k);
+      }, py::arg("q"), py::arg("k"))
+      .def("search_numpy",
+           [](AbstractIndex &self, const py::array_t<float, py::array::c_style | py::array::forcecast> &arr,
+              int64_t k) {
+             auto t = numpyToTensor(arr);
+             py::gil_scoped_release release;
+             return self.searchTensor(t, k);
+           }, py::arg("q"), py::arg("k"))
+      .def("delete_numpy", [](AbstractIndex &self, const py::capsule &cap, int64_t k) {
+        auto t = dlpackToTensor(cap);
+        py::gil_scoped_release release;
+        return self.deleteTensor(t, k);
+      }, py::arg("t"), py::arg("k") = 1)
+      .def("delete_numpy",
+           [](AbstractIndex &self, const py::array_t<float, py::array::c_style | py::array::forcecast> &arr,
+              int64_t k) {
+             auto t = numpyToTensor(arr);
+             py::gil_scoped_release release;
+             return self.deleteTensor(t, k);
+           }, py::arg("t"), py::arg("k") = 1);
   m.def("createIndex", &createIndex, "A function to create new index by name tag");
 
   m.def("add_tensors", &add_tensors, "A function that adds two tensors");
+  /***
+   * @brief data loaders, nextChunk pulls the stream in bounded batches
+   */
+  py::class_<AbstractDataLoader, std::shared_ptr<AbstractDataLoader>>(m, "AbstractDataLoader")
+      .def("setConfig", &AbstractDataLoader::setConfig, py::call_guard<py::gil_scoped_release>())
+      .def("getData", &AbstractDataLoader::getData, py::call_guard<py::gil_scoped_release>())
+      .def("getDataAt", &AbstractDataLoader::getDataAt, py::call_guard<py::gil_scoped_release>())
+      .def("getQuery", &AbstractDataLoader::getQuery, py::call_guard<py::gil_scoped_release>())
+      .def("getQueryAt", &AbstractDataLoader::getQueryAt, py::call_guard<py::gil_scoped_release>())
+      .def("getDimension", &AbstractDataLoader::getDimension)
+      .def("size", &AbstractDataLoader::size)
+      .def("resetStream", &AbstractDataLoader::resetStream, py::arg("startPos") = 0)
+      .def("nextChunk", &AbstractDataLoader::nextChunk, py::call_guard<py::gil_scoped_release>())
+      .def("hasNextChunk", &AbstractDataLoader::hasNextChunk)
+      .def("getDataByIds", &AbstractDataLoader::getDataByIds, py::call_guard<py::gil_scoped_release>());
+  m.def("createDataLoader", &createDataLoader, "A function to create new data loader by name tag");
 
 
   m.def("recallOfTensorList", &recallOfTensorList, "calculate the recall");
+  m.def("recallOfIds", &INTELLI::UtilityFunctions::calculateRecallById,
+        "calculate the recall@k from (nq x k) int64 id matrices",
+        py::arg("groundTruthIds"), py::arg("probIds"), py::arg("k") = -1,
+        py::call_guard<py::gil_scoped_release>());
+  m.def("mapOfIds", &INTELLI::UtilityFunctions::calculateMAPById,
+        "calculate the MAP@k from (nq x k) int64 id matrices",
+        py::arg("groundTruthIds"), py::arg("probIds"), py::arg("k") = -1,
+        py::call_guard<py::gil_scoped_release>());
+  m.def("distanceRatio", &INTELLI::UtilityFunctions::calculateDistanceRatio,
+        "calculate the ratio of returned to exact neighbor distances from (nq x k) matrices",
+        py::arg("groundTruthDistances"), py::arg("probDistances"), py::arg("k") = -1,
+        py::call_guard<py::gil_scoped_release>());
+
+  /**
+   * @brief columnar time stamps, the columns are returned as writable numpy views sharing the buffer
+   */
+  py::class_<IntelliTimeStampBuffer, std::shared_ptr<IntelliTimeStampBuffer>>(m, "TimeStampBuffer")
+      .def(py::init<>())
+      .def(py::init<size_t>())
+      .def(py::init<std::vector<uint64_t>, std::vector<uint64_t>>())
+      .def("size", &IntelliTimeStampBuffer::size)
+      .def("resize", &IntelliTimeStampBuffer::resize)
+      .def("setProcessed", &IntelliTimeStampBuffer::setProcessed)
+      .def("getLatencyPercentage", &IntelliTimeStampBuffer::getLatencyPercentage,
+           py::call_guard<py::gil_scoped_release>())
+      .def("getLatencyPercentages", &IntelliTimeStampBuffer::getLatencyPercentages,
+           py::call_guard<py::gil_scoped_release>())
+      .def("saveToFile", &IntelliTimeStampBuffer::saveToFile, py::arg("fname"), py::arg("skipZero") = true)
+      .def("eventTime", [](py::object self) {
+        return timeStampColumn(self, &IntelliTimeStampBuffer::eventTime);
+      })
+      .def("arrivalTime", [](py::object self) {
+        return timeStampColumn(self, &IntelliTimeStampBuffer::arrivalTime);
+      })
+      .def("processedTime", [](py::object self) {
+        return timeStampColumn(self, &IntelliTimeStampBuffer::processedTime);
+      });
+  m.def("generateTimeStamps", &generateTimeStamps,
+        "generate the time stamps of a stream by IntelliTimeStampGenerator, as a TimeStampBuffer");
 
   /// faiss index APIs only
   py::class_<faiss::Index,std::shared_ptr<faiss::Index>>(m, "IndexFAISS")
@@ -0,0 +1,205 @@
+#include <Utils/GroundTruthStore.h>
+#include <Utils/IntelliLog.h>
+#include <atomic>
+#include <filesystem>
+#include <thread>
+#include <fstream>
+#include <cstring>
+#include <cctype>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+namespace INTELLI {
+static uint64_t hashBytes(const uint8_t *data, size_t len, uint64_t h) {
+  constexpr uint64_t prime = 1099511628211ULL;
+  size_t words = len / sizeof(uint64_t);
+  for (size_t i = 0; i < words; i++) {
+    uint64_t w;
+    std::memcpy(&w, data + i * sizeof(uint64_t), sizeof(uint64_t));
+    h = (h ^ w) * prime;
+    h ^= h >> 29;
+  }
+  for (size_t i = words * sizeof(uint64_t); i < len; i++) {
+    h = (h ^ data[i]) * prime;
+  }
+  return h;
+}
+/**
+ * @brief keeps a file mapping alive for as long as any tensor viewing it
+ */
+struct GroundTruthMapping {
+  void *addr = nullptr;
+  size_t len = 0;
+  ~GroundTruthMapping() {
+    if (addr != nullptr) {
+      munmap(addr, len);
+    }
+  }
+};
+
+GroundTruthStore::GroundTruthStore(const std::string &folderName) {
+  folder = folderName;
+}
+
+uint64_t GroundTruthStore::hashTensor(torch::Tensor t, uint64_t seed) {
+  auto tc = t.contiguous();
+  int64_t shape[2] = {tc.dim() > 0 ? tc.size(0) : 1, tc.numel()};
+  seed = hashBytes(reinterpret_cast<const uint8_t *>(shape), sizeof(shape), seed);
+  return hashBytes(reinterpret_cast<const uint8_t *>(tc.data_ptr()), tc.numel() * tc.element_size(), seed);
+}
+
+std::string GroundTruthStore::fileName(const std::string &dataset,
+                                       int64_t initialRows,
+                                       int64_t streamRows,
+                                       int64_t annk,
+                                       const std::string &metric) const {
+  std::string name = dataset;
+  for (auto &c : name) {
+    if (!std::isalnum(static_cast<unsigned char>(c))) {
+      c = '_';
+    }
+  }
+  return folder + "/" + name + "_" + std::to_string(initialRows) + "_" + std::to_string(streamRows) + "_"
+      + std::to_string(annk) + "_" + metric + ".gts";
+}
+
+bool GroundTruthStore::load(const std::string &path,
+                            uint64_t dataHash,
+                            torch::Tensor &ids,
+                            torch::Tensor &distances) {
+  int fd = open(path.c_str(), O_RDONLY);
+  if (fd < 0) {
+    return false;
+  }
+  struct stat st;
+  if (fstat(fd, &st) != 0 || (size_t) st.st_size < sizeof(FileHeader)) {
+    close(fd);
+    return false;
+  }
+  auto mapping = std::make_shared<GroundTruthMapping>();
+  mapping->len = st.st_size;
+  /**
+   * @brief private and writable, so that in-place edits of the returned tensors never reach the file
+   */
+  mapping->addr = mmap(nullptr, mapping->len, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (mapping->addr == MAP_FAILED) {
+    mapping->addr = nullptr;
+    return false;
+  }
+  FileHeader header;
+  std::memcpy(&header, mapping->addr, sizeof(FileHeader));
+  if (std::memcmp(header.magic, fileMagic, sizeof(fileMagic)) != 0 || header.version != fileVersion) {
+    INTELLI_WARNING("Ground truth file " + path + " is not recognized");
+    return false;
+  }
+  size_t elements = header.queries * header.k;
+  size_t payloadBytes = elements * (sizeof(int64_t) + sizeof(float));
+  if (mapping->len != sizeof(FileHeader) + payloadBytes) {
+    INTELLI_WARNING("Ground truth file " + path + " is truncated");
+    return false;
+  }
+  if (header.dataHash != dataHash) {
+    INTELLI_WARNING("Ground truth file " + path + " was computed on different data");
+    return false;
+  }
+  auto payload = static_cast<uint8_t *>(mapping->addr) + sizeof(FileHeader);
+  if (hashBytes(payload, payloadBytes, dataHash) != header.payloadHash) {
+    INTELLI_WARNING("Ground truth file " + path + " is corrupted");
+    return false;
+  }
+  auto keep = [mapping](void *) {};
+  ids = torch::from_blob(payload, {header.queries, header.k}, keep, torch::kInt64);
+  distances = torch::from_blob(payload + elements * sizeof(int64_t), {header.queries, header.k}, keep,
+                               torch::kFloat32);
+  return true;
+}
+
+bool GroundTruthStore::save(const std::string &path,
+                            uint64_t dataHash,
+                            torch::Tensor ids,
+                            torch::Tensor distances) {
+  auto idc = ids.to(torch::kInt64).contiguous();
+  auto distc = distances.to(torch::kFloat32).contiguous();
+  FileHeader header;
+  std::memcpy(header.magic, fileMagic, sizeof(fileMagic));
+  header.version = fileVersion;
+  header.queries = idc.size(0);
+  header.k = idc.size(1);
+  header.dataHash = dataHash;
+  size_t idBytes = idc.numel() * sizeof(int64_t);
+  size_t distBytes = distc.numel() * sizeof(float);
+  uint64_t h = hashBytes(reinterpret_cast<const uint8_t *>(idc.data_ptr<int64_t>()), idBytes, dataHash);
+  header.payloadHash = hashBytes(reinterpret_cast<const uint8_t *>(distc.data_ptr<float>()), distBytes, h);
+  std::error_code ec;
+  auto folder = std::filesystem::path(path).parent_path();
+  if (!folder.empty()) {
+    std::filesystem::create_directories(folder, ec);
+    if (ec) {
+      INTELLI_ERROR("Can not create ground truth folder " + folder.string() + ", " + ec.message());
+      return false;
+    }
+  }
+  /**
+   * @brief one temp file per writer, i.e., per process, thread and call, so concurrent writers never share it
+   */
+  static std::atomic<uint64_t> tmpCounter{0};
+  std::string tmpName = path + ".tmp." + std::to_string(getpid()) + "."
+      + std::to_string(std::hash<std::thread::id>{}(std::this_thread::get_id())) + "."
+      + std::to_string(tmpCounter.fetch_add(1));
+  {
+    std::ofstream of(tmpName, std::ios::binary | std::ios::trunc);
+    if (!of) {
+      INTELLI_ERROR("Can not write ground truth to " + tmpName);
+      return false;
+    }
+    of.write(reinterpret_cast<const char *>(&header), sizeof(FileHeader));
+    of.write(reinterpret_cast<const char *>(idc.data_ptr<int64_t>()), idBytes);
+    of.write(reinterpret_cast<const char *>(distc.data_ptr<float>()), distBytes);
+    if (!of) {
+      INTELLI_ERROR("Can not write ground truth to " + tmpName);
+      std::filesystem::remove(tmpName, ec);
+      return false;
+    }
+  }
+  std::filesystem::rename(tmpName, path, ec);
+  if (ec) {
+    INTELLI_ERROR("Can not rename ground truth to " + path);
+    std::filesystem::remove(tmpName, ec);
+    return false;
+  }
+  return true;
+}
+
+std::tuple<torch::Tensor, torch::Tensor> GroundTruthStore::getOrCompute(const std::string &dataset,
+                                                                        int64_t initialRows,
+                                                                        int64_t streamRows,
+                                                                        int64_t annk,
+                                                                        const std::string &metric,
+                                                                        uint64_t dataHash,
+                                                                        const std::function<std::tuple<torch::Tensor,
+                                                                                                       torch::Tensor>()> &compute,
+                                                                        bool redo) {
+  auto path = fileName(dataset, initialRows, streamRows, annk, metric);
+  torch::Tensor ids, distances;
+  if (!redo && load(path, dataHash, ids, distances)) {
+    INTELLI_INFO("Ground truth exists, so I load it from " + path);
+    return {ids, distances};
+  }
+  INTELLI_INFO("Ground truth does not exist, so I'll create it");
+  std::tie(ids, distances) = compute();
+  save(path, dataHash, ids, distances);
+  return {ids, distances};
+}
+
+std::vector<torch::Tensor> GroundTruthStore::idsToTensorList(torch::Tensor ids, torch::Tensor rows) {
+  std::vector<torch::Tensor> ru((size_t) ids.size(0));
+  for (int64_t i = 0; i < ids.size(0); i++) {
+    auto idI = ids[i];
+    ru[i] = rows.index_select(0, idI.masked_select(idI.ge(0)));
+  }
+  return ru;
+}
+} // INTELLI
@@ -0,0 +1,103 @@
+#include <Utils/IncrementalGroundTruth.h>
+#include <limits>
+
+namespace INTELLI {
+torch::Tensor IncrementalGroundTruth::normalizeRows(torch::Tensor t) {
+  if (!isCosine) {
+    return t;
+  }
+  return t / t.norm(2, 1, true).clamp_min(1e-12);
+}
+
+void IncrementalGroundTruth::setQueries(torch::Tensor q, int64_t annk, const std::string &metric, int64_t block) {
+  k = annk;
+  /**
+   * @brief the same mapping as @ref CANDY::AbstractIndex, cossim is the inner product of l2-normalized rows
+   */
+  isIP = (metric == "dot" || metric == "IP" || metric == "ip" || metric == "cossim");
+  isCosine = (metric == "cossim");
+  queries = normalizeRows(q.to(torch::kFloat32)).contiguous();
+  blockRows = block > 0 ? block : 4096;
+  float fill = isIP ? -std::numeric_limits<float>::infinity() : std::numeric_limits<float>::infinity();
+  topIds = torch::full({queries.size(0), k}, -1, torch::kInt64);
+  topDistances = torch::full({queries.size(0), k}, fill);
+  dbTensor = torch::zeros({0, queries.size(1)});
+  aliveTensor = torch::zeros({0}, torch::kBool);
+  lastNNZ = -1;
+}
+
+void IncrementalGroundTruth::scanRows(torch::Tensor queryIdx, int64_t startRow, int64_t endRow) {
+  if (queryIdx.numel() == 0 || endRow <= startRow) {
+    return;
+  }
+  float fill = isIP ? -std::numeric_limits<float>::infinity() : std::numeric_limits<float>::infinity();
+  auto q = queries.index_select(0, queryIdx);
+  auto curD = topDistances.index_select(0, queryIdx);
+  auto curI = topIds.index_select(0, queryIdx);
+  torch::Tensor qNorm;
+  if (!isIP) {
+    qNorm = q.pow(2).sum(1, true);
+  }
+  for (int64_t b = startRow; b < endRow; b += blockRows) {
+    int64_t be = std::min(b + blockRows, endRow);
+    auto block = dbTensor.slice(0, b, be);
+    auto dist = torch::matmul(q, block.t());
+    if (!isIP) {
+      dist = (qNorm - 2 * dist + block.pow(2).sum(1).unsqueeze(0)).clamp_min(0);
+    }
+    dist.masked_fill_(aliveTensor.slice(0, b, be).logical_not().unsqueeze(0), fill);
+    auto ids = torch::arange(b, be, torch::kInt64).unsqueeze(0).expand({q.size(0), be - b});
+    auto allD = torch::cat({curD, dist}, 1);
+    auto allI = torch::cat({curI, ids}, 1);
+    auto [d, pos] = allD.topk(k, 1, isIP, true);
+    curD = d;
+    curI = allI.gather(1, pos);
+  }
+  topDistances.index_copy_(0, queryIdx, curD);
+  topIds.index_copy_(0, queryIdx, curI);
+}
+
+int64_t IncrementalGroundTruth::insertTensor(torch::Tensor t) {
+  auto rows = normalizeRows(t.to(torch::kFloat32)).contiguous();
+  int64_t firstId = lastNNZ + 1;
+  int64_t needed = firstId + rows.size(0);
+  if (needed > dbTensor.size(0)) {
+    int64_t expand = std::max(needed - dbTensor.size(0), expandStep);
+    dbTensor = torch::cat({dbTensor, torch::zeros({expand, dbTensor.size(1)})}, 0);
+    aliveTensor = torch::cat({aliveTensor, torch::zeros({expand}, torch::kBool)}, 0);
+  }
+  dbTensor.slice(0, firstId, needed).copy_(rows);
+  aliveTensor.slice(0, firstId, needed).fill_(true);
+  lastNNZ = needed - 1;
+  scanRows(torch::arange(queries.size(0), torch::kInt64), firstId, needed);
+  return firstId;
+}
+
+void IncrementalGroundTruth::deleteIds(torch::Tensor ids) {
+  auto idx = ids.to(torch::kInt64).flatten();
+  idx = idx.masked_select(idx.ge(0).logical_and(idx.le(lastNNZ)));
+  if (idx.numel() == 0) {
+    return;
+  }
+  aliveTensor.index_fill_(0, idx, false);
+  /**
+   * @brief only the queries that lose a current neighbor need a rescan
+   */
+  auto affected = torch::isin(topIds, idx).any(1).nonzero().flatten();
+  if (affected.numel() == 0) {
+    return;
+  }
+  float fill = isIP ? -std::numeric_limits<float>::infinity() : std::numeric_limits<float>::infinity();
+  topIds.index_fill_(0, affected, -1);
+  topDistances.index_fill_(0, affected, fill);
+  scanRows(affected, 0, lastNNZ + 1);
+}
+
+torch::Tensor IncrementalGroundTruth::getIds() {
+  return topIds.masked_fill(torch::isinf(topDistances), -1);
+}
+
+torch::Tensor IncrementalGroundTruth::getDistances() {
+  return topDistances.masked_fill(torch::isinf(topDistances), std::numeric_limits<float>::quiet_NaN());
+}
+} // INTELLI
@@ -0,0 +1,101 @@
+/*! \file IntelliTimeStampBuffer.cpp*/
+
+#include <Utils/IntelliTimeStampBuffer.h>
+#include <Utils/IntelliTimeStampGenerator.h>
+#include <Utils/IntelliLog.h>
+#include <algorithm>
+#include <fstream>
+
+INTELLI::IntelliTimeStampBuffer::IntelliTimeStampBuffer(std::vector<uint64_t> te, std::vector<uint64_t> ta) {
+  eventTime = std::move(te);
+  arrivalTime = std::move(ta);
+  arrivalTime.resize(eventTime.size(), 0);
+  processedTime.assign(eventTime.size(), 0);
+}
+
+void INTELLI::IntelliTimeStampBuffer::resize(size_t rows) {
+  eventTime.resize(rows, 0);
+  arrivalTime.resize(rows, 0);
+  processedTime.resize(rows, 0);
+}
+
+void INTELLI::IntelliTimeStampBuffer::setProcessed(size_t startRow, size_t endRow, uint64_t tp) {
+  endRow = std::min(endRow, size());
+  if (startRow >= endRow) {
+    return;
+  }
+  std::fill(processedTime.begin() + startRow, processedTime.begin() + endRow, tp);
+}
+
+std::vector<uint64_t> INTELLI::IntelliTimeStampBuffer::getLatencies() {
+  size_t rLen = size();
+  std::vector<uint64_t> ru;
+  ru.reserve(rLen);
+  for (size_t i = 0; i < rLen; i++) {
+    if (processedTime[i] >= arrivalTime[i] && processedTime[i] != 0) {
+      ru.push_back(processedTime[i] - arrivalTime[i]);
+    }
+  }
+  return ru;
+}
+
+double INTELLI::IntelliTimeStampBuffer::getLatencyPercentage(double fraction) {
+  return getLatencyPercentages({fraction})[0];
+}
+
+std::vector<double> INTELLI::IntelliTimeStampBuffer::getLatencyPercentages(std::vector<double> fractions) {
+  std::vector<double> ru(fractions.size(), 0);
+  auto validLatency = getLatencies();
+  size_t nonZeroCnt = validLatency.size();
+  if (nonZeroCnt == 0) {
+    INTELLI_ERROR("No valid latency, maybe there is no AMM result?");
+    return ru;
+  }
+  /**
+   * @brief the same rank as @ref UtilityFunctions::getLatencyPercentage, selected in ascending order so that each
+   * selection only scans the part above the previous one
+   */
+  std::vector<std::pair<size_t, size_t>> ranks(fractions.size());
+  for (size_t i = 0; i < fractions.size(); i++) {
+    size_t idx = (size_t) (nonZeroCnt * fractions[i]) + 1;
+    ranks[i] = {std::min(idx, nonZeroCnt - 1), i};
+  }
+  std::sort(ranks.begin(), ranks.end());
+  auto lower = validLatency.begin();
+  for (auto &r : ranks) {
+    auto nth = validLatency.begin() + r.first;
+    if (nth >= lower) {
+      std::nth_element(lower, nth, validLatency.end());
+      lower = nth;
+    }
+    ru[r.second] = *nth;
+  }
+  return ru;
+}
+
+bool INTELLI::IntelliTimeStampBuffer::saveToFile(std::string fname, bool skipZero) {
+  std::ofstream of;
+  of.open(fname);
+  if (of.fail()) {
+    return false;
+  }
+  of << "eventTime,arrivalTime,processedTime\n";
+  size_t rLen = size();
+  for (size_t i = 0; i < rLen; i++) {
+    if (skipZero && processedTime[i] == 0) {
+      continue;
+    }
+    of << eventTime[i] << "," << arrivalTime[i] << "," << processedTime[i] << "\n";
+  }
+  of.close();
+  return true;
+}
+
+std::vector<INTELLI::IntelliTimeStampPtr> INTELLI::IntelliTimeStampBuffer::toTimeStamps() {
+  size_t rLen = size();
+  std::vector<INTELLI::IntelliTimeStampPtr> ru(rLen);
+  for (size_t i = 0; i < rLen; i++) {
+    ru[i] = newIntelliTimeStamp(eventTime[i], arrivalTime[i], processedTime[i]);
+  }
+  return ru;
+}
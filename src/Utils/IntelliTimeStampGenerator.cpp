@@ -54,8 +54,15 @@ std::vector<INTELLI::IntelliTimeStampPtr> INTELLI::IntelliTimeStampGenerator::co
 }
 
 void INTELLI::IntelliTimeStampGenerator::generateFinal() {
-  myTs = constructTimeStamps(eventS, eventS);
+  myTs.clear();
+  myBuffer = newIntelliTimeStampBuffer(eventS, eventS);
 }
 std::vector<INTELLI::IntelliTimeStampPtr> INTELLI::IntelliTimeStampGenerator::getTimeStamps() {
+  if (myTs.empty() && myBuffer != nullptr && myBuffer->size() > 0) {
+    myTs = constructTimeStamps(myBuffer->eventTime, myBuffer->arrivalTime);
+  }
   return myTs;
+}
+INTELLI::IntelliTimeStampBufferPtr INTELLI::IntelliTimeStampGenerator::getTimeStampBuffer() {
+  return myBuffer;
 }
\ No newline at end of file
@@ -0,0 +1,150 @@
+/*! \file NativeDistance.cpp*/
+
+#include <Utils/NativeDistance.h>
+#include <ATen/Parallel.h>
+#include <algorithm>
+#include <limits>
+#include <vector>
+
+namespace INTELLI {
+/**
+ * @brief the squared L2 distance or inner product of a query and a row, in the accumulator type AT
+ */
+template<typename QT, typename XT, typename AT>
+static inline AT rowDistance(const QT *q, const XT *x, int64_t d, bool isIP) {
+  AT a0 = 0, a1 = 0, a2 = 0, a3 = 0;
+  int64_t j = 0;
+  if (isIP) {
+    for (; j + 4 <= d; j += 4) {
+      a0 += (AT) q[j] * (AT) x[j];
+      a1 += (AT) q[j + 1] * (AT) x[j + 1];
+      a2 += (AT) q[j + 2] * (AT) x[j + 2];
+      a3 += (AT) q[j + 3] * (AT) x[j + 3];
+    }
+    for (; j < d; j++) {
+      a0 += (AT) q[j] * (AT) x[j];
+    }
+  } else {
+    for (; j + 4 <= d; j += 4) {
+      AT t0 = (AT) q[j] - (AT) x[j], t1 = (AT) q[j + 1] - (AT) x[j + 1];
+      AT t2 = (AT) q[j + 2] - (AT) x[j + 2], t3 = (AT) q[j + 3] - (AT) x[j + 3];
+      a0 += t0 * t0;
+      a1 += t1 * t1;
+      a2 += t2 * t2;
+      a3 += t3 * t3;
+    }
+    for (; j < d; j++) {
+      AT t0 = (AT) q[j] - (AT) x[j];
+      a0 += t0 * t0;
+    }
+  }
+  return (a0 + a1) + (a2 + a3);
+}
+
+template<typename QT, typename XT, typename AT>
+static void scanAll(const QT *q,
+                    const XT *db,
+                    int64_t nq,
+                    int64_t dbSize,
+                    int64_t d,
+                    int64_t k,
+                    bool isIP,
+                    float *distances,
+                    int64_t *idx) {
+  /**
+   * @brief the heap top is the worst kept candidate, i.e., a max-heap for L2 and a min-heap for IP
+   */
+  auto worse = [isIP](const std::pair<float, int64_t> &a, const std::pair<float, int64_t> &b) {
+    return isIP ? a.first > b.first : a.first < b.first;
+  };
+  float fill = isIP ? -std::numeric_limits<float>::max() : std::numeric_limits<float>::max();
+  at::parallel_for(0, nq, 1, [&](int64_t begin, int64_t end) {
+    std::vector<std::pair<float, int64_t>> heap;
+    heap.reserve(k);
+    for (int64_t i = begin; i < end; i++) {
+      heap.clear();
+      const QT *qi = q + i * d;
+      const XT *x = db;
+      for (int64_t r = 0; r < dbSize; r++, x += d) {
+        float dist = (float) rowDistance<QT, XT, AT>(qi, x, d, isIP);
+        if ((int64_t) heap.size() < k) {
+          heap.emplace_back(dist, r);
+          std::push_heap(heap.begin(), heap.end(), worse);
+        } else if (isIP ? dist > heap.front().first : dist < heap.front().first) {
+          std::pop_heap(heap.begin(), heap.end(), worse);
+          heap.back() = {dist, r};
+          std::push_heap(heap.begin(), heap.end(), worse);
+        }
+      }
+      std::sort_heap(heap.begin(), heap.end(), worse);
+      for (int64_t j = 0; j < k; j++) {
+        bool has = j < (int64_t) heap.size();
+        distances[i * k + j] = has ? heap[j].first : fill;
+        idx[i * k + j] = has ? heap[j].second : -1;
+      }
+    }
+  });
+}
+
+torch::ScalarType NativeDistance::typeFromString(const std::string &name) {
+  if (name == "float16" || name == "fp16" || name == "half") {
+    return torch::kFloat16;
+  }
+  if (name == "uint8" || name == "u8") {
+    return torch::kUInt8;
+  }
+  if (name == "int8" || name == "i8") {
+    return torch::kInt8;
+  }
+  if (name == "float32" || name == "fp32" || name == "float") {
+    return torch::kFloat32;
+  }
+  return torch::ScalarType::Undefined;
+}
+
+bool NativeDistance::isSupported(torch::ScalarType t) {
+  return t == torch::kFloat32 || t == torch::kFloat16 || t == torch::kUInt8 || t == torch::kInt8;
+}
+
+void NativeDistance::knn(torch::Tensor q,
+                         torch::Tensor db,
+                         int64_t dbSize,
+                         int64_t k,
+                         bool isIP,
+                         float *distances,
+                         int64_t *idx) {
+  int64_t nq = q.size(0);
+  int64_t d = db.size(1);
+  dbSize = std::min(dbSize, db.size(0));
+  auto dbType = db.scalar_type();
+  if (q.scalar_type() == dbType && dbType == torch::kUInt8) {
+    auto qc = q.contiguous();
+    scanAll<uint8_t, uint8_t, int32_t>(qc.data_ptr<uint8_t>(), db.data_ptr<uint8_t>(), nq, dbSize, d, k, isIP,
+                                       distances, idx);
+    return;
+  }
+  if (q.scalar_type() == dbType && dbType == torch::kInt8) {
+    auto qc = q.contiguous();
+    scanAll<int8_t, int8_t, int32_t>(qc.data_ptr<int8_t>(), db.data_ptr<int8_t>(), nq, dbSize, d, k, isIP,
+                                     distances, idx);
+    return;
+  }
+  auto qf = q.to(torch::kFloat32).contiguous();
+  const float *qp = qf.data_ptr<float>();
+  switch (dbType) {
+    case torch::kFloat16:
+      scanAll<float, c10::Half, float>(qp, db.data_ptr<c10::Half>(), nq, dbSize, d, k, isIP, distances, idx);
+      break;
+    case torch::kUInt8:
+      scanAll<float, uint8_t, float>(qp, db.data_ptr<uint8_t>(), nq, dbSize, d, k, isIP, distances, idx);
+      break;
+    case torch::kInt8:
+      scanAll<float, int8_t, float>(qp, db.data_ptr<int8_t>(), nq, dbSize, d, k, isIP, distances, idx);
+      break;
+    default: {
+      auto dbf = db.to(torch::kFloat32).contiguous();
+      scanAll<float, float, float>(qp, dbf.data_ptr<float>(), nq, dbSize, d, k, isIP, distances, idx);
+    }
+  }
+}
+} // INTELLI
@@ -0,0 +1,47 @@
+/*! \file ConcurrentIndexTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <CANDY/ConcurrentIndex.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test concurrent index on a persistent pool", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("concurrentAlgoTag", "flat");
+  /**
+   * @brief a small expandStep makes flat reallocate during the run, which is safe as writers exclude readers
+   */
+  cfg->edit("expandStep", (int64_t) 4);
+  cfg->edit("concurrentWriteRatio", 0.25);
+  cfg->edit("concurrentBatchSize", (int64_t) 10);
+  cfg->edit("concurrentWriteThreads", (int64_t) 1);
+  cfg->edit("concurrentReadThreads", (int64_t) 2);
+  auto ccIdx = newConcurrentIndex();
+  REQUIRE(ccIdx->setConfig(cfg));
+  auto initial = torch::rand({20, 4});
+  ccIdx->loadInitialTensor(initial);
+  auto t = torch::rand({30, 4});
+  auto q = torch::rand({5, 4});
+  auto records = ccIdx->ccInsertAndSearchTensor(t, q, 2);
+  /**
+   * @brief 3 batches of 10 writes, each with 30 searches
+   */
+  REQUIRE(records.size() == 90);
+  auto stats = ccIdx->getIndexStatistics();
+  REQUIRE(stats->getI64("ccThreadSafety") == THREAD_SAFE_READ);
+  REQUIRE(stats->getI64("ccInsertLatencyCount") == 30);
+  REQUIRE(stats->getI64("ccSearchLatencyCount") == 90);
+  REQUIRE(stats->getI64("ccSearchLatencyP50Ns") <= stats->getI64("ccSearchLatencyP99Ns"));
+  REQUIRE(stats->getI64("ccSearchLatencyP99Ns") <= stats->getI64("ccSearchLatencyMaxNs"));
+  ccIdx->resetIndexStatistics();
+  REQUIRE(ccIdx->getIndexStatistics()->getI64("ccInsertLatencyCount") == 0);
+}
@@ -6,6 +6,7 @@
 #define CATCH_CONFIG_MAIN
 
 #include <CANDY.h>
+#include <CANDY/DPGIndex.h>
 
 #include <iostream>
 
@@ -54,3 +55,82 @@ TEST_CASE("Test dpg index", "[short]") {
   }
   REQUIRE(a == 0);
 }
+
+TEST_CASE("Test dpg index on the flat arena", "[short]") {
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t)4);
+  cfg->edit("graphK", int64_t(8));
+  cfg->edit("parallelWorkers", int64_t(4));
+  auto dpgIndex = newDPGIndex();
+  dpgIndex->setConfig(cfg);
+  dpgIndex->setFrozenLevel(1);
+  auto ta = torch::rand({200, 4});
+  dpgIndex->offlineBuild(ta);
+  REQUIRE(dpgIndex->rawData().size(0) == 200);
+  auto [ids, distances] = dpgIndex->searchWithDistances(ta, 4);
+  int64_t selfHits = 0;
+  for (int64_t i = 0; i < 200; i++) {
+    selfHits += (ids[i][0].item<int64_t>() == i);
+  }
+  std::cout << "self hits of dpg " << selfHits << std::endl;
+  REQUIRE(selfHits >= 160);
+  auto row0 = ta.slice(0, 0, 1);
+  dpgIndex->deleteTensor(row0, 1);
+  REQUIRE(dpgIndex->rawData().size(0) == 199);
+  auto [ids2, distances2] = dpgIndex->searchWithDistances(row0, 4);
+  REQUIRE(ids2[0][0].item<int64_t>() != 0);
+}
+
+TEST_CASE("Test dpg index batched insert on the worker pool", "[short]") {
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t)4);
+  cfg->edit("graphK", int64_t(8));
+  cfg->edit("parallelWorkers", int64_t(4));
+  cfg->edit("insertBatchSize", int64_t(128));
+  auto dpgIndex = newDPGIndex();
+  dpgIndex->setConfig(cfg);
+  dpgIndex->setFrozenLevel(1);
+  auto ta = torch::rand({1000, 4});
+  dpgIndex->insertTensor(ta);
+  REQUIRE(dpgIndex->rawData().size(0) == 1000);
+  auto [ids, distances] = dpgIndex->searchWithDistances(ta, 4);
+  int64_t selfHits = 0;
+  for (int64_t i = 0; i < 1000; i++) {
+    selfHits += (ids[i][0].item<int64_t>() == i);
+  }
+  std::cout << "self hits of dpg after batched insert " << selfHits << std::endl;
+  REQUIRE(selfHits >= 800);
+}
+
+TEST_CASE("Test dpg index consolidation of deletes", "[short]") {
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t)4);
+  cfg->edit("graphK", int64_t(8));
+  cfg->edit("parallelWorkers", int64_t(4));
+  cfg->edit("consolidateRatio", 0.2);
+  auto dpgIndex = newDPGIndex();
+  dpgIndex->setConfig(cfg);
+  dpgIndex->setFrozenLevel(1);
+  auto ta = torch::rand({300, 4});
+  dpgIndex->offlineBuild(ta);
+  auto toDelete = ta.slice(0, 0, 100);
+  dpgIndex->deleteTensor(toDelete, 1);
+  auto stats = dpgIndex->getIndexStatistics();
+  REQUIRE(stats->getI64("consolidations") == 1);
+  REQUIRE(stats->getI64("deletedRows") == 0);
+  REQUIRE(stats->getI64("reclaimedBytes") > 0);
+  int64_t removed = stats->getI64("consolidatedRows");
+  REQUIRE(dpgIndex->rawData().size(0) == 300 - removed);
+  auto rest = ta.slice(0, 100, 300);
+  auto ru = dpgIndex->searchTensor(rest, 4);
+  int64_t selfHits = 0;
+  for (int64_t i = 0; i < 200; i++) {
+    auto diff = (ru[i] - rest.slice(0, i, i + 1)).abs().sum(1);
+    selfHits += (diff.numel() > 0 && diff.min().item<float>() == 0);
+  }
+  std::cout << "self hits of dpg after consolidation " << selfHits << std::endl;
+  REQUIRE(selfHits >= 160);
+}
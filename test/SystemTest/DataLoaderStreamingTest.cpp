@@ -0,0 +1,83 @@
+/*! \file DataLoaderStreamingTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <DataLoader/RandomDataLoader.h>
+#include <DataLoader/ZipfDataLoader.h>
+#include <DataLoader/ExpFamilyDataLoader.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test chunked streaming of data loaders", "[short]")
+{
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 8);
+  cfg->edit("vecVolume", (int64_t) 10000);
+  cfg->edit("querySize", (int64_t) 5);
+  cfg->edit("driftPosition", (int64_t) 6000);
+  auto loader = newRandomDataLoader();
+  REQUIRE(loader->setConfig(cfg));
+  /**
+   * @brief the chunks of an in-memory loader concatenate to its data
+   */
+  loader->resetStream(0);
+  std::vector<torch::Tensor> chunks;
+  while (loader->hasNextChunk()) {
+    chunks.push_back(loader->nextChunk(3000));
+  }
+  REQUIRE(chunks.size() == 4);
+  REQUIRE(loader->nextChunk(3000).size(0) == 0);
+  REQUIRE(torch::equal(torch::cat(chunks, 0), loader->getData()));
+  /**
+   * @brief rows generated on the fly are the same whatever range or order they are read in
+   */
+  cfg->edit("generateOnTheFly", (int64_t) 1);
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(loader->size() == 10000);
+  auto all = loader->getDataAt(0, 10000);
+  loader->resetStream(4000);
+  auto chunk = loader->nextChunk(3000);
+  REQUIRE(torch::equal(chunk, all.slice(0, 4000, 7000)));
+  REQUIRE(torch::equal(loader->nextChunk(5000), all.slice(0, 7000, 10000)));
+  REQUIRE(!loader->hasNextChunk());
+  auto ids = torch::tensor({9999, 3, 4096, 5000}, torch::kLong);
+  REQUIRE(torch::equal(loader->getDataByIds(ids), all.index_select(0, ids)));
+  REQUIRE(all.slice(0, 6000, 10000).max().item<float>() <= 0.5);
+  REQUIRE(loader->getQuery().size(0) == 5);
+}
+TEST_CASE("Test on-the-fly generation of zipf and exponential family loaders", "[short]")
+{
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 8);
+  cfg->edit("vecVolume", (int64_t) 10000);
+  cfg->edit("querySize", (int64_t) 5);
+  cfg->edit("driftPosition", (int64_t) 6000);
+  cfg->edit("generateOnTheFly", (int64_t) 1);
+  cfg->edit("zipfAlpha", 0.5);
+  cfg->edit("normalizeTensor", (int64_t) 1);
+  cfg->edit("driftOffset", 0.0);
+  std::vector<AbstractDataLoaderPtr> loaders = {newZipfDataLoader(), newExpFamilyDataLoader()};
+  auto ids = torch::tensor({9999, 3, 4096, 5000}, torch::kLong);
+  for (auto &loader : loaders) {
+    REQUIRE(loader->setConfig(cfg));
+    REQUIRE(loader->size() == 10000);
+    auto all = loader->getDataAt(0, 10000);
+    loader->resetStream(4000);
+    REQUIRE(torch::equal(loader->nextChunk(3000), all.slice(0, 4000, 7000)));
+    REQUIRE(torch::equal(loader->getDataByIds(ids), all.index_select(0, ids)));
+    REQUIRE(loader->getQuery().size(0) == 5);
+  }
+  /**
+   * @brief the scaling is decided by the whole volume, as if A were materialized
+   */
+  auto zipf = loaders[0]->getDataAt(0, 10000);
+  REQUIRE(zipf.slice(0, 0, 6000).max().item<float>() == Approx(1.0));
+  REQUIRE(zipf.slice(0, 6000, 10000).max().item<float>() == Approx(1.0));
+  auto expNorms = loaders[1]->getDataAt(0, 10000).norm(2, 0);
+  REQUIRE(torch::allclose(expNorms, torch::ones_like(expNorms), 1e-4, 1e-4));
+}
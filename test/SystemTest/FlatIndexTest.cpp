@@ -45,3 +45,181 @@ TEST_CASE("Test flat index", "[short]")
   std::cout << "the data base is\n" << flatIdx->rawData() << std::endl;
   REQUIRE(a == 0);
 }
+TEST_CASE("Test flat index search with distances", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  auto flatIdx = it.getIndex("flat");
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("metricType", "L2");
+  flatIdx->setConfig(cfg);
+  auto db = torch::rand({10, 4});
+  flatIdx->insertTensor(db);
+  auto q = db.slice(0, 3, 5);
+  auto [ids, distances] = flatIdx->searchWithDistances(q, 2);
+  REQUIRE(ids.size(0) == 2);
+  REQUIRE(ids.size(1) == 2);
+  REQUIRE(ids[0][0].item<int64_t>() == 3);
+  REQUIRE(ids[1][0].item<int64_t>() == 4);
+  REQUIRE(distances[0][0].item<float>() < 1e-6);
+  REQUIRE(distances[0][0].item<float>() <= distances[0][1].item<float>());
+}
+TEST_CASE("Test id-based recall evaluation", "[short]")
+{
+  auto gd = torch::tensor({{0, 1, 2}, {3, 4, 5}}, torch::kInt64);
+  auto prob = torch::tensor({{2, 7, 0}, {3, 3, -1}}, torch::kInt64);
+  /**
+   * @brief 2 hits in the first query, 1 in the second as the repeated 3 counts once
+   */
+  REQUIRE(UtilityFunctions::calculateRecallById(gd, prob) == Approx(0.5));
+  REQUIRE(UtilityFunctions::calculateRecallById(gd, prob, 1) == Approx(0.5));
+  /**
+   * @brief AP of query 0 is (1/1+2/3)/3, AP of query 1 is (1/1)/3
+   */
+  REQUIRE(UtilityFunctions::calculateMAPById(gd, prob) == Approx((5.0 / 9.0 + 1.0 / 3.0) / 2));
+  auto gdDist = torch::tensor({{1.0, 2.0}, {2.0, NAN}});
+  auto probDist = torch::tensor({{1.5, 3.0}, {4.0, 1.0}});
+  REQUIRE(UtilityFunctions::calculateDistanceRatio(gdDist, probDist) == Approx((1.5 + 2.0) / 2));
+
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  auto flatIdx = it.getIndex("flat");
+  cfg->edit("vecDim", (int64_t) 4);
+  flatIdx->setConfig(cfg);
+  auto db = torch::rand({20, 4});
+  flatIdx->insertTensor(db);
+  auto q = torch::rand({5, 4});
+  auto [ids, distances] = flatIdx->searchWithDistances(q, 6);
+  /**
+   * @brief the results share only the 3rd neighbor with the ground truth, both evaluators must agree on it
+   */
+  auto gdIds = ids.slice(1, 0, 3).contiguous();
+  auto probIds = ids.slice(1, 2, 5).contiguous();
+  auto gdRows = INTELLI::GroundTruthStore::idsToTensorList(gdIds, db);
+  auto probRows = INTELLI::GroundTruthStore::idsToTensorList(probIds, db);
+  double recallById = UtilityFunctions::calculateRecallById(gdIds, probIds);
+  REQUIRE(recallById == Approx(1.0 / 3));
+  REQUIRE(UtilityFunctions::calculateRecall(gdRows, probRows) == Approx(recallById));
+  auto [gdRowIds, probRowIds] = UtilityFunctions::rowsToIds(gdRows, probRows, 3);
+  REQUIRE(UtilityFunctions::calculateRecallById(gdRowIds, probRowIds) == Approx(recallById));
+  REQUIRE(UtilityFunctions::idHitMask(gdIds, probIds).sum().item<int64_t>() == q.size(0));
+}
+TEST_CASE("Test flat index in-place search after updates", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  auto flatIdx = it.getIndex("flat");
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("metricType", "L2");
+  cfg->edit("initialVolume", (int64_t) 8);
+  cfg->edit("expandStep", (int64_t) 8);
+  flatIdx->setConfig(cfg);
+  auto db = torch::rand({30, 4});
+  for (int64_t i = 0; i < 30; i += 10) {
+    auto sub = db.slice(0, i, i + 10);
+    flatIdx->insertTensor(sub);
+  }
+  auto toDelete = db.slice(0, 5, 6);
+  flatIdx->deleteTensor(toDelete, 1);
+  auto toRevise = db.slice(0, 7, 8);
+  auto revised = torch::rand({1, 4}) + 10;
+  flatIdx->reviseTensor(toRevise, revised);
+  /**
+   * @brief the norms kept for the in-place L2 kernel must follow every update
+   */
+  auto q = torch::rand({20, 4});
+  auto [ids, distances] = flatIdx->searchWithDistances(q, 3);
+  auto raw = flatIdx->rawData();
+  auto expected = torch::cdist(q, raw).pow(2).topk(3, 1, false, true);
+  REQUIRE(torch::equal(ids, std::get<1>(expected)));
+  REQUIRE(torch::allclose(distances, std::get<0>(expected), 1e-4, 1e-4));
+}
+TEST_CASE("Test batched top-k kernels", "[short]")
+{
+  torch::manual_seed(114514);
+  auto q = torch::rand({3, 4});
+  auto cand = torch::rand({12, 4});
+  auto [ids, distances] = IntelliTensorOP::bruteForceTopK(q, cand, 2);
+  auto expected = torch::cdist(q, cand).pow(2).topk(2, 1, false, true);
+  REQUIRE(torch::equal(ids, std::get<1>(expected)));
+  /**
+   * @brief query 0 owns rows 0~4, query 1 owns rows 5~5, query 2 owns rows 6~11
+   */
+  auto offsets = torch::tensor({0, 5, 6, 12}, torch::kInt64);
+  auto [bIds, bDistances] = IntelliTensorOP::batchedTopK(q, cand, offsets, 2);
+  REQUIRE(bIds[0][0].item<int64_t>() < 5);
+  REQUIRE(bIds[1][0].item<int64_t>() == 5);
+  REQUIRE(bIds[1][1].item<int64_t>() == -1);
+  REQUIRE(std::isnan(bDistances[1][1].item<float>()));
+  REQUIRE(bIds[2][0].item<int64_t>() >= 6);
+  auto own = torch::cdist(q.slice(0, 2, 3), cand.slice(0, 6, 12)).pow(2).topk(2, 1, false, true);
+  REQUIRE(torch::equal(bIds[2] - 6, std::get<1>(own)[0]));
+}
+TEST_CASE("Test flat index with compact storage", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 16);
+  cfg->edit("metricType", "L2");
+  auto db = torch::randint(0, 256, {300, 16}, torch::kUInt8);
+  auto q = db.slice(0, 0, 8);
+  auto ref = newFlatIndex();
+  ref->setConfig(cfg);
+  auto dbF = db.to(torch::kFloat32);
+  ref->insertTensor(dbF);
+  auto qF = q.to(torch::kFloat32);
+  auto [refIds, refDist] = ref->searchWithDistances(qF, 5);
+  /**
+   * @brief uint8 rows searched by uint8 queries are exact integer distances
+   */
+  cfg->edit("storageType", "uint8");
+  auto u8 = newFlatIndex();
+  u8->setConfig(cfg);
+  u8->insertTensor(db);
+  REQUIRE(u8->getStorageType() == torch::kUInt8);
+  REQUIRE(torch::equal(u8->rawData(), dbF));
+  auto [u8Ids, u8Dist] = u8->searchWithDistances(q, 5);
+  REQUIRE(torch::equal(u8Dist, refDist));
+  REQUIRE(torch::equal(u8Ids.select(1, 0), torch::arange(8)));
+  auto [u8FIds, u8FDist] = u8->searchWithDistances(qF, 5);
+  REQUIRE(torch::equal(u8FDist, refDist));
+  auto del = db.slice(0, 3, 4);
+  REQUIRE(u8->deleteTensor(del, 1));
+  REQUIRE(u8->size() == 299);
+  /**
+   * @brief int8 rows under inner product, and float16 rows against float32 queries
+   */
+  cfg->edit("metricType", "IP");
+  cfg->edit("storageType", "int8");
+  auto i8 = newFlatIndex();
+  i8->setConfig(cfg);
+  auto dbI8 = torch::randint(-128, 128, {300, 16}, torch::kInt8);
+  i8->insertTensor(dbI8);
+  auto ipRef = newFlatIndex();
+  cfg->edit("storageType", "float32");
+  ipRef->setConfig(cfg);
+  auto dbI8F = dbI8.to(torch::kFloat32);
+  ipRef->insertTensor(dbI8F);
+  auto qI8 = dbI8.slice(0, 0, 8);
+  auto qI8F = qI8.to(torch::kFloat32);
+  REQUIRE(torch::equal(std::get<1>(i8->searchWithDistances(qI8, 5)), std::get<1>(ipRef->searchWithDistances(qI8F, 5))));
+  cfg->edit("metricType", "L2");
+  cfg->edit("storageType", "float16");
+  auto f16 = newFlatIndex();
+  f16->setConfig(cfg);
+  auto dbH = torch::rand({300, 16});
+  f16->insertTensor(dbH);
+  auto qH = dbH.slice(0, 0, 8).contiguous();
+  auto [hIds, hDist] = f16->searchWithDistances(qH, 1);
+  REQUIRE(torch::equal(hIds.flatten(), torch::arange(8)));
+  REQUIRE(hDist.max().item<float>() < 1e-3);
+  /**
+   * @brief a misspelled storage type is rejected instead of falling back to float32
+   */
+  cfg->edit("storageType", "flaot16");
+  auto bad = newFlatIndex();
+  REQUIRE(!bad->setConfig(cfg));
+}
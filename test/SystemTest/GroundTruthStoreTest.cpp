@@ -0,0 +1,44 @@
+/*! \file GroundTruthStoreTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <Utils/GroundTruthStore.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test ground truth store", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  auto flatIdx = it.getIndex("flat");
+  cfg->edit("vecDim", (int64_t) 4);
+  flatIdx->setConfig(cfg);
+  auto db = torch::rand({20, 4});
+  auto q = torch::rand({5, 4});
+  flatIdx->insertTensor(db);
+  auto dataHash = GroundTruthStore::hashTensor(q, GroundTruthStore::hashTensor(db));
+  GroundTruthStore store("GroundTruthStoreTest");
+  int64_t computed = 0;
+  auto compute = [&]() {
+    computed++;
+    return flatIdx->searchWithDistances(q, 3);
+  };
+  auto [ids, distances] = store.getOrCompute("random", 0, 20, 3, "L2", dataHash, compute, true);
+  auto [ids2, distances2] = store.getOrCompute("random", 0, 20, 3, "L2", dataHash, compute);
+  REQUIRE(computed == 1);
+  REQUIRE(torch::equal(ids, ids2));
+  REQUIRE(torch::equal(distances, distances2));
+  /**
+   * @brief different data must not reuse the stored ground truth
+   */
+  store.getOrCompute("random", 0, 20, 3, "L2", dataHash + 1, compute);
+  REQUIRE(computed == 2);
+  auto rows = GroundTruthStore::idsToTensorList(ids2, db);
+  REQUIRE(UtilityFunctions::calculateRecall(rows, flatIdx->searchTensor(q, 3)) == Approx(1.0));
+}
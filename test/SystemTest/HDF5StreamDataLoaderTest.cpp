@@ -0,0 +1,99 @@
+/*! \file HDF5StreamDataLoaderTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <DataLoader/HDF5StreamDataLoader.h>
+#include <hdf5.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+/**
+ * @brief write a 2-D dataset of the given hdf5 type
+ */
+static void writeDataset(hid_t fileId, const std::string &name, hid_t type, int64_t rows, int64_t cols, void *data) {
+  hsize_t dims[2] = {(hsize_t) rows, (hsize_t) cols};
+  hid_t space = H5Screate_simple(2, dims, NULL);
+  hid_t dset = H5Dcreate2(fileId, name.c_str(), type, space, H5P_DEFAULT, H5P_DEFAULT, H5P_DEFAULT);
+  H5Dwrite(dset, type, H5S_ALL, H5S_ALL, H5P_DEFAULT, data);
+  H5Dclose(dset);
+  H5Sclose(space);
+}
+/**
+ * @brief write a tiny ann-benchmarks style file, the distance attribute is a variable-length string as h5py does
+ */
+static void writeAnnFile(const std::string &path,
+                         torch::Tensor train,
+                         torch::Tensor test,
+                         torch::Tensor neighbors,
+                         const char *distance) {
+  hid_t fileId = H5Fcreate(path.c_str(), H5F_ACC_TRUNC, H5P_DEFAULT, H5P_DEFAULT);
+  writeDataset(fileId, "train", H5T_NATIVE_FLOAT, train.size(0), train.size(1), train.data_ptr<float>());
+  writeDataset(fileId, "test", H5T_NATIVE_FLOAT, test.size(0), test.size(1), test.data_ptr<float>());
+  writeDataset(fileId, "neighbors", H5T_NATIVE_INT64, neighbors.size(0), neighbors.size(1),
+               neighbors.data_ptr<int64_t>());
+  hid_t space = H5Screate(H5S_SCALAR);
+  hid_t strType = H5Tcopy(H5T_C_S1);
+  H5Tset_size(strType, H5T_VARIABLE);
+  H5Tset_cset(strType, H5T_CSET_UTF8);
+  hid_t attr = H5Acreate2(fileId, "distance", strType, space, H5P_DEFAULT, H5P_DEFAULT);
+  H5Awrite(attr, strType, &distance);
+  H5Aclose(attr);
+  H5Tclose(strType);
+  H5Sclose(space);
+  H5Fclose(fileId);
+}
+TEST_CASE("Test hdf5 streaming loader", "[short]")
+{
+  torch::manual_seed(114514);
+  auto train = torch::rand({100, 8});
+  auto test = torch::rand({6, 8});
+  auto neighbors = std::get<1>(torch::cdist(test, train).topk(10, 1, false, true)).contiguous();
+  writeAnnFile("hdf5_stream_test.hdf5", train, test, neighbors, "euclidean");
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 8);
+  cfg->edit("vecVolume", (int64_t) -1);
+  cfg->edit("querySize", (int64_t) -1);
+  cfg->edit("dataPath", "hdf5_stream_test.hdf5");
+  cfg->edit("metricType", "L2");
+  auto loader = newHDF5StreamDataLoader();
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(loader->size() == 100);
+  REQUIRE(torch::equal(loader->getQuery(), test));
+  /**
+   * @brief hyperslabs and read-ahead chunks return the rows in file order
+   */
+  REQUIRE(torch::equal(loader->getDataAt(17, 42), train.slice(0, 17, 42)));
+  loader->resetStream(10);
+  std::vector<torch::Tensor> chunks;
+  while (loader->hasNextChunk()) {
+    chunks.push_back(loader->nextChunk(40));
+  }
+  REQUIRE(chunks.size() == 3);
+  REQUIRE(torch::equal(torch::cat(chunks, 0), train.slice(0, 10, 100)));
+  /**
+   * @brief the stored neighbors are used for the metric the file was built with
+   */
+  REQUIRE(torch::equal(loader->getNeighbors(5), neighbors.slice(1, 0, 5)));
+  /**
+   * @brief any other metric, a partial volume or normalized rows fall back to computing
+   */
+  cfg->edit("metricType", "IP");
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(!loader->getNeighbors(5).defined());
+  cfg->edit("metricType", "L2");
+  cfg->edit("vecVolume", (int64_t) 50);
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(!loader->getNeighbors(5).defined());
+  writeAnnFile("hdf5_stream_test.hdf5", train, test, neighbors, "angular");
+  cfg->edit("vecVolume", (int64_t) -1);
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(!loader->getNeighbors(5).defined());
+  cfg->edit("metricType", "cossim");
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(loader->getNeighbors(5).defined());
+}
@@ -29,3 +29,41 @@ TEST_CASE("Test HNSWiNDEX", "[short]") {
   }
 
 }
+TEST_CASE("Test HNSW dense ids and visited table", "[short]") {
+  CANDY::VisitedTable vt(4);
+  vt.set((faiss::idx_t) 2);
+  REQUIRE(vt.get((faiss::idx_t) 2));
+  REQUIRE(!vt.get((faiss::idx_t) 3));
+  /**
+   * @brief ids beyond the table grow it, advance clears marks even across the epoch wraparound
+   */
+  vt.set((faiss::idx_t) 100);
+  REQUIRE(vt.get((faiss::idx_t) 100));
+  for (int i = 0; i < 70000; i++) {
+    vt.advance();
+    REQUIRE(!vt.get((faiss::idx_t) 2));
+  }
+
+  torch::manual_seed(114514);
+  CANDY::HNSWNaiveIndex hnswIdx;
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 8);
+  cfg->edit("maxConnection", (int64_t) 8);
+  hnswIdx.setConfig(cfg);
+  auto x0 = torch::rand({300, 8});
+  auto x1 = torch::rand({200, 8});
+  hnswIdx.insertTensor(x0);
+  hnswIdx.insertTensor(x1);
+  auto x = torch::cat({x0, x1}, 0);
+  auto ids = hnswIdx.searchIndex(x, 1);
+  int64_t hits = 0;
+  for (int64_t i = 0; i < x.size(0); i++) {
+    hits += (ids[i] == i);
+  }
+  /**
+   * @brief ids follow the insertion order, so most rows should find themselves
+   */
+  REQUIRE(hits >= 450);
+  auto ru = hnswIdx.searchTensor(x1, 1);
+  REQUIRE(torch::equal(ru[0], x1.slice(0, 0, 1)) == (ids[300] == 300));
+}
@@ -0,0 +1,63 @@
+/*! \file IncrementalGroundTruthTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <Utils/IncrementalGroundTruth.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test incremental ground truth", "[short]")
+{
+  torch::manual_seed(114514);
+  auto db = torch::rand({50, 4});
+  auto q = torch::rand({6, 4});
+  IncrementalGroundTruth tracker;
+  tracker.setQueries(q, 3, "L2", 7);
+  tracker.insertTensor(db.slice(0, 0, 20));
+  tracker.insertTensor(db.slice(0, 20, 50));
+  /**
+   * @brief the blocked, incremental result must equal a full scan
+   */
+  auto fullDist = torch::cdist(q, db).pow(2);
+  auto expectedIds = std::get<1>(fullDist.topk(3, 1, false, true));
+  REQUIRE(torch::equal(tracker.getIds(), expectedIds));
+  /**
+   * @brief delete the nearest neighbor of query 0, the rescan must find the next one
+   */
+  tracker.deleteIds(expectedIds.slice(0, 0, 1).slice(1, 0, 1).flatten());
+  fullDist.index_fill_(1, expectedIds[0][0].unsqueeze(0), INFINITY);
+  expectedIds = std::get<1>(fullDist.topk(3, 1, false, true));
+  REQUIRE(torch::equal(tracker.getIds(), expectedIds));
+  REQUIRE(tracker.size() == 50);
+}
+TEST_CASE("Test incremental ground truth under inner-product metrics", "[short]")
+{
+  torch::manual_seed(114514);
+  auto db = torch::rand({50, 4});
+  auto q = torch::rand({6, 4});
+  /**
+   * @brief dot is the inner product, i.e., the largest products are the nearest
+   */
+  IncrementalGroundTruth dotTracker;
+  dotTracker.setQueries(q, 3, "dot", 16);
+  dotTracker.insertTensor(db);
+  auto dotIds = std::get<1>(torch::matmul(q, db.t()).topk(3, 1, true, true));
+  REQUIRE(torch::equal(dotTracker.getIds(), dotIds));
+  /**
+   * @brief cossim compares l2-normalized rows, so the scale of a row does not matter
+   */
+  auto scaled = db * torch::rand({50, 1}) * 10;
+  IncrementalGroundTruth cosTracker;
+  cosTracker.setQueries(q, 3, "cossim", 16);
+  cosTracker.insertTensor(scaled);
+  auto qn = q / q.norm(2, 1, true);
+  auto dn = scaled / scaled.norm(2, 1, true);
+  auto [cosD, cosIds] = torch::matmul(qn, dn.t()).topk(3, 1, true, true);
+  REQUIRE(torch::equal(cosTracker.getIds(), cosIds));
+  REQUIRE(torch::allclose(cosTracker.getDistances(), cosD, 1e-5, 1e-5));
+}
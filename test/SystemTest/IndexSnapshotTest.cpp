@@ -0,0 +1,94 @@
+/*! \file IndexSnapshotTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <CANDY/FaissIndex.h>
+#include <CANDY/NNDescentIndex.h>
+#include <CANDY/HNSWNaiveIndex.h>
+#include <CANDY/LSHAPGIndex.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test index snapshots", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 16);
+  cfg->edit("metricType", "L2");
+  auto db = torch::rand({200, 16});
+  auto more = torch::rand({50, 16});
+  auto q = db.slice(0, 0, 4).contiguous();
+  /**
+   * @brief the copy changes on its own and the source keeps its rows
+   */
+  auto flat = newFlatIndex();
+  flat->setConfig(cfg);
+  flat->loadInitialTensor(db);
+  auto copied = flat->snapshot();
+  REQUIRE(copied != nullptr);
+  copied->insertTensor(more);
+  REQUIRE(copied->rawData().size(0) == 250);
+  REQUIRE(flat->rawData().size(0) == 200);
+  REQUIRE(torch::equal(flat->rawData(), db));
+  REQUIRE(torch::equal(copied->searchIndex(q, 1)[0], flat->searchIndex(q, 1)[0]));
+  /**
+   * @brief a faiss copy owns its own clone of the faiss index
+   */
+  cfg->edit("faissIndexTag", "HNSW");
+  auto faissIdx = newFaissIndex();
+  faissIdx->setConfig(cfg);
+  faissIdx->loadInitialTensor(db);
+  auto faissCopy = faissIdx->snapshot();
+  REQUIRE(faissCopy != nullptr);
+  auto [faissIds, faissDist] = faissIdx->searchWithDistances(q, 4);
+  REQUIRE(torch::equal(std::get<0>(faissCopy->searchWithDistances(q, 4)), faissIds));
+  auto moreQ = more.slice(0, 0, 4).contiguous();
+  faissCopy->insertTensor(more);
+  REQUIRE(std::get<1>(faissCopy->searchWithDistances(moreQ, 1)).max().item<float>() < 1e-5);
+  REQUIRE(torch::equal(std::get<0>(faissIdx->searchWithDistances(q, 4)), faissIds));
+  faissCopy = nullptr;
+  REQUIRE(torch::equal(std::get<0>(faissIdx->searchWithDistances(q, 4)), faissIds));
+  /**
+   * @brief graph indexes keep their graph, and the default is no snapshot
+   */
+  auto nnd = newNNDescentIndex();
+  cfg->edit("graphK", (int64_t) 8);
+  nnd->setConfig(cfg);
+  nnd->loadInitialTensor(db);
+  auto nndCopy = nnd->snapshot();
+  REQUIRE(nndCopy != nullptr);
+  REQUIRE(torch::equal(nndCopy->rawData(), nnd->rawData()));
+  nndCopy->insertTensor(more);
+  REQUIRE(nnd->rawData().size(0) == 200);
+  /**
+   * @brief the copied graphs answer like their sources, and inserts into a copy leave the source as it was
+   */
+  auto moreIds = std::vector<faiss::idx_t>{200, 201, 202, 203};
+  auto hnsw = newHNSWNaiveIndex();
+  hnsw->setConfig(cfg);
+  hnsw->loadInitialTensor(db);
+  auto hnswCopy = hnsw->snapshot();
+  REQUIRE(hnswCopy != nullptr);
+  auto hnswIds = hnsw->searchIndex(q, 4);
+  REQUIRE(hnswCopy->searchIndex(q, 4) == hnswIds);
+  hnswCopy->insertTensor(more);
+  REQUIRE(hnswCopy->searchIndex(moreQ, 1) == moreIds);
+  REQUIRE(hnsw->searchIndex(q, 4) == hnswIds);
+  for (auto id : hnsw->searchIndex(moreQ, 1)) {
+    REQUIRE(id < 200);
+  }
+  auto lsh = newLSHAPGIndex();
+  lsh->setConfig(cfg);
+  lsh->loadInitialTensor(db);
+  auto lshCopy = lsh->snapshot();
+  REQUIRE(lshCopy != nullptr);
+  auto lshIds = lsh->searchIndex(q, 4);
+  REQUIRE(lshCopy->searchIndex(q, 4) == lshIds);
+  lshCopy->insertTensor(more);
+  REQUIRE(lsh->searchIndex(q, 4) == lshIds);
+}
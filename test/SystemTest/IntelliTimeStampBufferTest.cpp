@@ -0,0 +1,39 @@
+/*! \file IntelliTimeStampBufferTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <Utils/IntelliTimeStampBuffer.h>
+#include <Utils/UtilityFunctions.h>
+#include <iostream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test columnar time stamp buffer", "[short]")
+{
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("eventRateTps", (int64_t) 1000);
+  cfg->edit("streamingTupleCnt", (int64_t) 1000);
+  INTELLI::IntelliTimeStampGenerator gen;
+  gen.setConfig(cfg);
+  auto buf = gen.getTimeStampBuffer();
+  REQUIRE(buf->size() == 1000);
+  for (size_t i = 0; i < 1000; i += 100) {
+    buf->setProcessed(i, i + 100, buf->arrivalTime[i + 99] + i + 1);
+  }
+  /**
+   * @brief the same percentiles as the sorted per-row time stamps
+   */
+  auto legacy = buf->toTimeStamps();
+  REQUIRE(legacy[999]->processedTime == buf->processedTime[999]);
+  for (double f : {0.5, 0.95, 0.99}) {
+    REQUIRE(UtilityFunctions::getLatencyPercentage(f, buf) == UtilityFunctions::getLatencyPercentage(f, legacy));
+  }
+  auto ps = buf->getLatencyPercentages({0.99, 0.5});
+  REQUIRE(ps[0] == buf->getLatencyPercentage(0.99));
+  REQUIRE(ps[1] == buf->getLatencyPercentage(0.5));
+  REQUIRE(gen.getTimeStamps().size() == 1000);
+}
@@ -0,0 +1,75 @@
+/*! \file MMapVECSDataLoaderTest.cpp*/
+#include <vector>
+
+#define CATCH_CONFIG_MAIN
+
+#include "catch.hpp"
+#include <CANDY.h>
+#include <DataLoader/MMapVECSDataLoader.h>
+#include <iostream>
+#include <fstream>
+using namespace std;
+using namespace INTELLI;
+using namespace torch;
+using namespace CANDY;
+TEST_CASE("Test memory-mapped vecs loader", "[short]")
+{
+  torch::manual_seed(114514);
+  int32_t dim = 4;
+  int64_t rows = 10;
+  auto db = torch::rand({rows, dim});
+  auto bytesDb = torch::randint(0, 256, {rows, dim}, torch::kUInt8);
+  {
+    std::ofstream fv("mmap_test.fvecs", std::ios::binary), bv("mmap_test.bvecs", std::ios::binary);
+    for (int64_t i = 0; i < rows; i++) {
+      fv.write((char *) &dim, 4);
+      fv.write((char *) db[i].contiguous().data_ptr<float>(), dim * sizeof(float));
+      bv.write((char *) &dim, 4);
+      bv.write((char *) bytesDb[i].contiguous().data_ptr<uint8_t>(), dim);
+    }
+  }
+  REQUIRE(torch::equal(CANDY::FVECSDataLoader::tensorFromFVECS("mmap_test.fvecs"), db));
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) dim);
+  cfg->edit("vecVolume", (int64_t) 8);
+  cfg->edit("querySize", (int64_t) 2);
+  cfg->edit("normalizeTensor", (int64_t) 0);
+  cfg->edit("useSeparateQuery", (int64_t) 0);
+  cfg->edit("dataPath", "mmap_test.fvecs");
+  auto loader = newMMapVECSDataLoader();
+  REQUIRE(loader->setConfig(cfg));
+  REQUIRE(loader->size() == 8);
+  REQUIRE(torch::equal(loader->getDataAt(2, 5), db.slice(0, 2, 5)));
+  REQUIRE(loader->getDataAt(6, 100).size(0) == 2);
+  /**
+   * @brief normalizing a range uses the norms of the whole volume
+   */
+  cfg->edit("normalizeTensor", (int64_t) 1);
+  REQUIRE(loader->setConfig(cfg));
+  auto volume = db.slice(0, 0, 8);
+  auto normalized = INTELLI::IntelliTensorOP::l2Normalize(volume);
+  REQUIRE(torch::allclose(loader->getDataAt(3, 6), normalized.slice(0, 3, 6)));
+  /**
+   * @brief bvecs stay uint8 in the raw view
+   */
+  cfg->edit("normalizeTensor", (int64_t) 0);
+  cfg->edit("dataPath", "mmap_test.bvecs");
+  REQUIRE(loader->setConfig(cfg));
+  auto raw = loader->getRawDataAt(1, 4);
+  REQUIRE(raw.scalar_type() == torch::kUInt8);
+  REQUIRE(torch::equal(raw, bytesDb.slice(0, 1, 4)));
+  REQUIRE(torch::equal(loader->getDataAt(1, 4), bytesDb.slice(0, 1, 4).to(torch::kFloat32)));
+  /**
+   * @brief the fvecs loader hands its reads to the mapping when streaming from file
+   */
+  cfg->edit("dataPath", "mmap_test.fvecs");
+  cfg->edit("streamFromFile", (int64_t) 1);
+  auto fvecsLoader = newFVECSDataLoader();
+  REQUIRE(fvecsLoader->setConfig(cfg));
+  REQUIRE(fvecsLoader->size() == 8);
+  REQUIRE(torch::equal(fvecsLoader->getDataAt(2, 5), db.slice(0, 2, 5)));
+  fvecsLoader->resetStream(6);
+  REQUIRE(torch::equal(fvecsLoader->nextChunk(5), db.slice(0, 6, 8)));
+  REQUIRE(!fvecsLoader->hasNextChunk());
+  REQUIRE(fvecsLoader->getQuery().size(0) == 2);
+}
@@ -6,6 +6,7 @@
 #define CATCH_CONFIG_MAIN
 
 #include <CANDY.h>
+#include <CANDY/NNDescentIndex.h>
 
 #include <iostream>
 
@@ -54,3 +55,27 @@ TEST_CASE("Test nndescent index", "[short]") {
   }
   REQUIRE(a == 0);
 }
+
+TEST_CASE("Test nndescent index on the flat arena", "[short]") {
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("graphK", int64_t(8));
+  cfg->edit("parallelWorkers", int64_t(4));
+  auto nnDescentIndex = newNNDescentIndex();
+  nnDescentIndex->setConfig(cfg);
+  nnDescentIndex->setFrozenLevel(1);
+  auto ta = torch::rand({200, 4});
+  nnDescentIndex->offlineBuild(ta);
+  auto tb = torch::rand({50, 4});
+  nnDescentIndex->insertTensor(tb);
+  REQUIRE(nnDescentIndex->rawData().size(0) == 250);
+  auto ru = nnDescentIndex->searchTensor(tb, 4);
+  int64_t selfHits = 0;
+  for (int64_t i = 0; i < 50; i++) {
+    auto diff = (ru[i] - tb.slice(0, i, i + 1)).abs().sum(1);
+    selfHits += (diff.min().item<float>() == 0);
+  }
+  std::cout << "self hits of nndescent " << selfHits << std::endl;
+  REQUIRE(selfHits >= 40);
+}
@@ -2,6 +2,8 @@
 // Created by tony on 05/01/24.
 //
 #include <vector>
+#include <thread>
+#include <atomic>
 
 #define CATCH_CONFIG_MAIN
 
@@ -9,6 +11,8 @@
 #include <CANDY.h>
 #include <iostream>
 #include <CANDY/OnlinePQIndex/SimpleStreamClustering.h>
+#include <CANDY/OnlinePQIndex/IVFTensorEncodingList.h>
+#include <CANDY/OnlinePQIndex/PQCodeList.h>
 using namespace std;
 using namespace INTELLI;
 using namespace torch;
@@ -75,4 +79,186 @@ TEST_CASE("Test  online pq index insert", "[short]")
   auto pqRu = onlinePQIdx->searchTensor(query, 2);
   std::cout << "pq result is\n" << pqRu[0] << std::endl;
   REQUIRE(a == 0);
-}
\ No newline at end of file
+}
+TEST_CASE("Test  contiguous ivf list cell", "[short]")
+{
+  torch::manual_seed(114514);
+  IVFListCell cell;
+  auto db = torch::rand({10, 4});
+  for (int64_t i = 0; i < 10; i++) {
+    auto row = db.slice(0, i, i + 1);
+    cell.insertTensor(row, i);
+  }
+  REQUIRE(cell.size() == 10);
+  auto all = cell.getAllTensors();
+  REQUIRE(torch::equal(all, db));
+  REQUIRE(all.data_ptr<float>() == cell.getAllTensors().data_ptr<float>());
+  auto row3 = db.slice(0, 3, 4);
+  REQUIRE(cell.deleteTensor(row3));
+  REQUIRE(cell.deleteTensor(row3) == false);
+  REQUIRE(cell.size() == 9);
+  /**
+   * @brief the last row moves into the hole
+   */
+  REQUIRE(torch::equal(cell.getAllTensors()[3], db[9]));
+  REQUIRE(cell.getIds()[3].item<int64_t>() == 9);
+
+  IVFTensorEncodingList ivfList;
+  ivfList.init(4, 2);
+  std::vector<uint8_t> code0 = {0, 0}, code1 = {0, 1};
+  auto a = db.slice(0, 0, 1), b = db.slice(0, 1, 2);
+  ivfList.insertTensorWithEncode(a, code0, 1);
+  ivfList.insertTensorWithEncode(b, code1, 1);
+  auto ru = ivfList.getMinimumNumOfTensors(a, code0, 1, 4);
+  REQUIRE(ru.size(0) == 4);
+  REQUIRE(torch::equal(ru.slice(0, 0, 2), db.slice(0, 0, 2)));
+  ru = ivfList.getMinimumNumOfTensorsHamming(a, code0, 1, 2);
+  REQUIRE(torch::equal(ru[0], db[0]));
+}
+
+TEST_CASE("Test  online pq index adc scan", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  auto onlinePQIdx = it.getIndex("onlinePQ");
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("coarseGrainedClusters", (int64_t) 2);
+  cfg->edit("fineGrainedClusters", (int64_t) 2);
+  cfg->edit("maxBuildIteration", (int64_t) 100);
+  cfg->edit("subQuantizers", (int64_t) 2);
+  cfg->edit("adcScan", (int64_t) 1);
+  cfg->edit("adcProbes", (int64_t) 2);
+  cfg->edit("rerankTimes", (int64_t) 100);
+  cfg->edit("coarseGrainedBuiltPath", "OnlinePQIndex_adc_coarse.rbt");
+  cfg->edit("fineGrainedBuiltPath", "OnlinePQIndex_adc_fine.rbt");
+  onlinePQIdx->setConfig(cfg);
+  auto db = torch::rand({20, 4});
+  onlinePQIdx->loadInitialTensor(db);
+  /**
+   * @brief probing every bucket and reranking every row is exact
+   */
+  auto query = db.slice(0, 5, 6);
+  auto ru = onlinePQIdx->searchTensor(query, 1);
+  REQUIRE(torch::equal(ru[0], query));
+  onlinePQIdx->deleteTensor(query, 1);
+  ru = onlinePQIdx->searchTensor(query, 1);
+  REQUIRE(!torch::equal(ru[0], query));
+  /**
+   * @brief without rerank, the decoded vectors are returned
+   */
+  cfg->edit("rerankTimes", (int64_t) 0);
+  onlinePQIdx->setConfig(cfg);
+  onlinePQIdx->insertTensor(db);
+  ru = onlinePQIdx->searchTensor(query, 3);
+  REQUIRE(ru[0].size(0) == 3);
+  REQUIRE(ru[0].abs().sum().item<float>() > 0);
+}
+
+TEST_CASE("Test  shared locking of ivf list", "[short]")
+{
+  torch::manual_seed(114514);
+  IVFListCell cell;
+  auto db = torch::rand({4, 4});
+  cell.insertTensor(db);
+  /**
+   * @brief a view taken before a deletion is a snapshot
+   */
+  auto snapshot = cell.getAllTensors();
+  auto row0 = db.slice(0, 0, 1);
+  REQUIRE(cell.deleteTensor(row0));
+  REQUIRE(torch::equal(snapshot, db));
+  REQUIRE(torch::equal(cell.getAllTensors()[0], db[3]));
+
+  IVFTensorEncodingList ivfList;
+  ivfList.init(1, 2);
+  int64_t rowsPerWriter = 200;
+  auto rows = torch::rand({rowsPerWriter * 2, 4});
+  std::vector<std::thread> threads;
+  std::atomic<int64_t> shortReads{0};
+  for (int64_t w = 0; w < 2; w++) {
+    threads.emplace_back([&, w]() {
+      std::vector<uint8_t> code = {(uint8_t) w, 0};
+      for (int64_t i = 0; i < rowsPerWriter; i++) {
+        auto row = rows.slice(0, w * rowsPerWriter + i, w * rowsPerWriter + i + 1);
+        ivfList.insertTensorWithEncode(row, code, 0, true);
+      }
+    });
+  }
+  for (int64_t r = 0; r < 2; r++) {
+    threads.emplace_back([&]() {
+      std::vector<uint8_t> code = {0, 0};
+      auto q = rows.slice(0, 0, 1);
+      for (int64_t i = 0; i < rowsPerWriter; i++) {
+        auto ru = ivfList.getMinimumNumOfTensorsHamming(q, code, 0, 8);
+        if (ru.size(0) < 8) {
+          shortReads++;
+        }
+      }
+    });
+  }
+  for (auto &th : threads) {
+    th.join();
+  }
+  REQUIRE(shortReads == 0);
+  std::vector<uint8_t> code0 = {0, 0};
+  auto q = rows.slice(0, 0, 1);
+  auto all = ivfList.getMinimumNumOfTensors(q, code0, 0, rowsPerWriter * 2);
+  REQUIRE(all.size(0) == rowsPerWriter * 2);
+  REQUIRE(torch::equal(std::get<0>(all.sort(0)), std::get<0>(rows.sort(0))));
+}
+
+TEST_CASE("Test  shared locking of pq code list", "[short]")
+{
+  torch::manual_seed(114514);
+  PQCodeList list;
+  list.init(2, 4, true);
+  int64_t rowsPerWriter = 200;
+  auto rows = torch::rand({rowsPerWriter * 2, 4}).contiguous();
+  std::vector<std::vector<uint8_t>> codes;
+  for (int64_t i = 0; i < rowsPerWriter * 2; i++) {
+    codes.push_back({(uint8_t) (i % 4), (uint8_t) (i % 3)});
+  }
+  std::vector<float> table = {0, 1, 2, 3, 0, 1, 2, 3};
+  std::vector<std::thread> threads;
+  std::atomic<int64_t> badReads{0};
+  for (int64_t w = 0; w < 2; w++) {
+    threads.emplace_back([&, w]() {
+      for (int64_t i = w * rowsPerWriter; i < (w + 1) * rowsPerWriter; i++) {
+        list.insertRow(rows.data_ptr<float>() + i * 4, codes[i].data());
+      }
+      for (int64_t i = w * rowsPerWriter; i < w * rowsPerWriter + rowsPerWriter / 2; i++) {
+        list.deleteRow(rows.data_ptr<float>() + i * 4, codes[i].data());
+      }
+    });
+  }
+  for (int64_t r = 0; r < 2; r++) {
+    threads.emplace_back([&]() {
+      for (int64_t i = 0; i < rowsPerWriter; i++) {
+        std::vector<std::pair<float, int64_t>> heap;
+        list.lockShared();
+        list.scanWithTable(table.data(), 4, 0, heap, 8);
+        for (auto &h : heap) {
+          auto entry = h.second & 0xffffffff;
+          auto code = list.codeAt(entry);
+          if (entry >= list.size() || h.first != table[code[0]] + table[4 + code[1]]) {
+            badReads++;
+          }
+        }
+        list.unlockShared();
+      }
+    });
+  }
+  for (auto &th : threads) {
+    th.join();
+  }
+  REQUIRE(badReads == 0);
+  REQUIRE(list.size() == rowsPerWriter);
+  std::vector<torch::Tensor> kept;
+  for (int64_t i = 0; i < list.size(); i++) {
+    kept.push_back(torch::from_blob((void *) list.rowAt(i), {1, 4}).clone());
+  }
+  auto expected = torch::cat({rows.slice(0, rowsPerWriter / 2, rowsPerWriter),
+                              rows.slice(0, rowsPerWriter + rowsPerWriter / 2, rowsPerWriter * 2)}, 0);
+  REQUIRE(torch::equal(std::get<0>(torch::cat(kept, 0).sort(0)), std::get<0>(expected.sort(0))));
+}
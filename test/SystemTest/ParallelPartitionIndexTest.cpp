@@ -44,3 +44,46 @@ TEST_CASE("Test parallel partition index", "[short]")
   ppIndex->endHPC();
   REQUIRE(a == 0);
 }
+TEST_CASE("Test adaptive waiter of parallel workers", "[short]")
+{
+  torch::manual_seed(114514);
+  INTELLI::AdaptiveWaiter waiter;
+  waiter.setStrategy(16, 4, 100000);
+  std::atomic<bool> ready(false);
+  std::thread producer([&]() {
+    std::this_thread::sleep_for(std::chrono::milliseconds(20));
+    ready.store(true);
+    waiter.notify();
+  });
+  auto start = std::chrono::steady_clock::now();
+  waiter.waitUntil([&]() { return ready.load(); });
+  auto waited = std::chrono::duration_cast<std::chrono::milliseconds>(std::chrono::steady_clock::now() - start);
+  producer.join();
+  REQUIRE(ready.load());
+  /**
+   * @brief woken by notify, not by the 100ms park timeout
+   */
+  REQUIRE(waited.count() < 100);
+
+  INTELLI::ConfigMapPtr cfg = newConfigMap();
+  CANDY::IndexTable it;
+  cfg->edit("vecDim", (int64_t) 4);
+  cfg->edit("parallelWorkers", (int64_t) 2);
+  cfg->edit("waitSpinIterations", (int64_t) 1);
+  cfg->edit("waitYieldIterations", (int64_t) 1);
+  cfg->edit("waitParkMicroseconds", (int64_t) 50000);
+  auto ppIndex = it.getIndex("parallelPartition");
+  ppIndex->setConfig(cfg);
+  ppIndex->startHPC();
+  auto ta = torch::rand({6, 4});
+  for (int64_t i = 0; i < 6; i++) {
+    auto asi = ta.slice(0, i, i + 1);
+    ppIndex->insertTensor(asi);
+  }
+  std::this_thread::sleep_for(std::chrono::milliseconds(10));
+  auto as0 = ta.slice(0, 1, 2);
+  auto ru = ppIndex->searchTensor(as0, 2);
+  REQUIRE(ru.size() == 1);
+  REQUIRE(ru[0].size(0) == 2);
+  ppIndex->endHPC();
+}
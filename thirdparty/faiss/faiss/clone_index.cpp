@@ -21,6 +21,7 @@
 #include <faiss/IndexBinaryFlat.h>
 #include <faiss/IndexFlat.h>
 #include <faiss/IndexHNSW.h>
+#include <faiss/IndexMNRU.h>
 #include <faiss/IndexIVF.h>
 #include <faiss/IndexIVFAdditiveQuantizerFastScan.h>
 #include <faiss/IndexIVFFlat.h>
@@ -31,12 +32,14 @@
 #include <faiss/IndexLSH.h>
 #include <faiss/IndexLattice.h>
 #include <faiss/IndexNSG.h>
+#include <faiss/IndexNSW.h>
 #include <faiss/IndexPQ.h>
 #include <faiss/IndexPQFastScan.h>
 #include <faiss/IndexPreTransform.h>
 #include <faiss/IndexRefine.h>
 #include <faiss/IndexRowwiseMinMax.h>
 #include <faiss/IndexScalarQuantizer.h>
+#include <faiss/IndexVanama.h>
 
 #include <faiss/MetaIndexes.h>
 #include <faiss/VectorTransform.h>
@@ -130,6 +133,33 @@ IndexHNSW* clone_IndexHNSW(const IndexHNSW* ihnsw) {
     }
 }
 
+IndexNSW* clone_IndexNSW(const IndexNSW* insw) {
+    TRYCLONE(IndexNSW2Level, insw)
+    TRYCLONE(IndexNSWFlat, insw)
+    TRYCLONE(IndexNSWPQ, insw)
+    TRYCLONE(IndexNSWSQ, insw)
+    TRYCLONE(IndexNSW, insw) {
+        FAISS_THROW_MSG("clone not supported for this type of IndexNSW");
+    }
+}
+
+IndexVanama* clone_IndexVanama(const IndexVanama* ivnm) {
+    TRYCLONE(IndexVanama2Level, ivnm)
+    TRYCLONE(IndexVanamaFlat, ivnm)
+    TRYCLONE(IndexVanamaPQ, ivnm)
+    TRYCLONE(IndexVanamaSQ, ivnm)
+    TRYCLONE(IndexVanama, ivnm) {
+        FAISS_THROW_MSG("clone not supported for this type of IndexVanama");
+    }
+}
+
+IndexMNRU* clone_IndexMNRU(const IndexMNRU* imnru) {
+    TRYCLONE(IndexMNRUFlat, imnru)
+    TRYCLONE(IndexMNRU, imnru) {
+        FAISS_THROW_MSG("clone not supported for this type of IndexMNRU");
+    }
+}
+
 IndexNNDescent* clone_IndexNNDescent(const IndexNNDescent* innd) {
     TRYCLONE(IndexNNDescentFlat, innd)
     TRYCLONE(IndexNNDescent, innd) {
@@ -325,6 +355,22 @@ Index* Cloner::clone_Index(const Index* index) {
         // make sure we don't get a GPU index here
         res->storage = Cloner::clone_Index(ihnsw->storage);
         return res;
+    } else if (const IndexNSW* insw = dynamic_cast<const IndexNSW*>(index)) {
+        IndexNSW* res = clone_IndexNSW(insw);
+        res->own_fields = true;
+        res->storage = Cloner::clone_Index(insw->storage);
+        return res;
+    } else if (
+            const IndexVanama* ivnm = dynamic_cast<const IndexVanama*>(index)) {
+        IndexVanama* res = clone_IndexVanama(ivnm);
+        res->own_fields = true;
+        res->storage = Cloner::clone_Index(ivnm->storage);
+        return res;
+    } else if (const IndexMNRU* imnru = dynamic_cast<const IndexMNRU*>(index)) {
+        IndexMNRU* res = clone_IndexMNRU(imnru);
+        res->own_fields = true;
+        res->storage = Cloner::clone_Index(imnru->storage);
+        return res;
     } else if (const IndexNSG* insg = dynamic_cast<const IndexNSG*>(index)) {
         IndexNSG* res = clone_IndexNSG(insg);
 